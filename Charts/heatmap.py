@@ -1,5 +1,8 @@
 import badger2040
 import math
+from csv_stream import iter_rows
+from grid_agg import Bins, Grid, column_ranges
+from decimate import MinMaxColumns, LTTB
 from badger2040 import WIDTH
 from badger2040 import HEIGHT
 
@@ -11,104 +14,6 @@ display = badger2040.Badger2040()
 display.led(128)
 display.set_update_speed(2)
 
-##########################################################################################
-# Define function that reads CSV files, with up to three variables specified in the columns
-##########################################################################################
-
-def read_csv(filename, x_name, y_name=None, z_name=None):
-    data = {
-        x_name: []
-    }
-    
-    if y_name:
-        data[y_name] = []
-    if z_name:
-        data[z_name] = []
-    # respect the double quote rule about CSV file
-    def split_line_respecting_quotes(line):
-        parts = []
-        temp = ""
-        inside_quotes = False
-
-        for char in line:
-            if char == '"':
-                inside_quotes = not inside_quotes
-            elif char == ',' and not inside_quotes:
-                parts.append(temp.strip())
-                temp = ""
-            else:
-                temp += char
-        if temp:  # Append the last field
-            parts.append(temp.strip())
-
-        return parts
-
-    with open(filename, 'r') as file:
-        lines = file.readlines()
-        headers = split_line_respecting_quotes(lines.pop(0).strip())
-
-        if x_name not in headers:
-            raise ValueError(f"{x_name} column not found in the CSV file.")
-        x_index = headers.index(x_name)
-
-        y_index = headers.index(y_name) if y_name and y_name in headers else None
-        z_index = headers.index(z_name) if z_name and z_name in headers else None
-
-        for line_num, line in enumerate(lines, start=2):  # Starting from 2 because we removed the header
-            values = split_line_respecting_quotes(line.strip())
-            
-            if len(values) <= x_index:
-                print(f"Warning: Line {line_num} has incomplete data: {line}")
-                continue
-
-            try:
-                data[x_name].append(float(values[x_index].replace('"', '')) if values[x_index] != "" else None)
-            except ValueError:
-                print(f"Error at line {line_num}: Cannot convert {values[x_index]} to float for {x_name}")
-                data[x_name].append(None)
-
-            if y_name and len(values) > y_index:
-                try:
-                    data[y_name].append(float(values[y_index].replace('"', '')) if values[y_index] != "" else None)
-                except ValueError:
-                    print(f"Error at line {line_num}: Cannot convert {values[y_index]} to float for {y_name}")
-                    data[y_name].append(None)
-
-            if z_name and len(values) > z_index:
-                try:
-                    data[z_name].append(float(values[z_index].replace('"', '')) if values[z_index] != "" else None)
-                except ValueError:
-                    print(f"Error at line {line_num}: Cannot convert {values[z_index]} to float for {z_name}")
-                    data[z_name].append(None)
-                
-    return data
-
-
-
-
-
-##########################################################################################
-# Define a function that bins numerical data according to your specified number of bins
-##########################################################################################
-def bin_data(values, bin_count=100):
-    min_val = min(v for v in values if v is not None)
-    max_val = max(v for v in values if v is not None)
-    bin_size = (max_val - min_val) / (bin_count - 1)  # adjust bin_size for one less bin_count
-
-    # Function to determine which bin a value belongs to
-    def find_bin(value):
-        if value is None:
-            return None
-        return 1 + int((value - min_val) / bin_size)
-
-    binned_values = [find_bin(value) for value in values]
-
-    # Making sure no value is greater than bin_count
-    binned_values = [None if value is None else min(bin_count, value) for value in binned_values]
-
-    return binned_values
-
-
 ##########################################################################################
 # Define a function that clears the screen and prints a header row
 ##########################################################################################
@@ -132,42 +37,31 @@ def clear():
 ##########################################################################################
 
 def plot_heatmap_binned(filename, x_name, y_name, z_name,AXIS_THICKNESS = 3,TICK_SPACING = 10,TICK_LENGTH = 5,x_offset = 30,y_offset = -10,rect_size_x = 4,rect_size_y = 4,x_bins_number = 50,y_bins_number = 30,z_bins_number = 10, skip = 5):
-    csv_data = read_csv(filename, x_name, y_name, z_name)
-
-    x = csv_data[x_name]
-    y = csv_data[y_name]
-    z = csv_data[z_name]
-
-    binned_x = [x_val * rect_size_x for x_val in bin_data(x, x_bins_number)]
-    binned_y = [y_val * rect_size_y for y_val in bin_data(y, y_bins_number)]
-    binned_z = bin_data(z, z_bins_number)
-
-    # Dictionaries to store the sum of z values and count of data points
-    z_sums = {}
-    counts = {}
-
-    # Iterate and aggregate
-    for x_val, y_val, z_val in zip(binned_x, binned_y, z):
-        if None not in (x_val, y_val, z_val):  
-            if (x_val, y_val) in z_sums:
-                z_sums[(x_val, y_val)] += z_val
-                counts[(x_val, y_val)] += 1
-            else:
-                z_sums[(x_val, y_val)] = z_val
-                counts[(x_val, y_val)] = 1
-
-    # Calculate average z values
-    avg_z = {}
-    for key, value in z_sums.items():
-        avg_z[key] = value / counts[key]
-
-    filtered_data = [(x_val, y_val, z_val) for x_val, y_val, z_val in zip(binned_x, binned_y, binned_z) if None not in (x_val, y_val, z_val)]
-
-    x_origin = min(binned_x)
-    y_origin = HEIGHT - min(binned_y)
-
-    x_endpoint = max(binned_x)
-    y_endpoint = HEIGHT - max(binned_y)
+    names = (x_name, y_name, z_name)
+
+    # First pass over the file: ranges of x, y and z for the bins
+    (x_min, x_max), (y_min, y_max), (z_min, z_max) = column_ranges(filename, names)
+    x_bins = Bins(x_min, x_max, x_bins_number)
+    y_bins = Bins(y_min, y_max, y_bins_number)
+    z_bins = Bins(z_min, z_max, z_bins_number)
+
+    # Second pass: mean z per (x, y) cell, plus the z range of the rows that were plotted
+    grid = Grid(x_bins, y_bins, ("mean",))
+    plotted_min = plotted_max = None
+    for x_val, y_val, z_val in iter_rows(filename, names):
+        if x_val is None or y_val is None or z_val is None:
+            continue
+        grid.add(x_val, y_val, z_val)
+        if plotted_min is None or z_val < plotted_min:
+            plotted_min = z_val
+        if plotted_max is None or z_val > plotted_max:
+            plotted_max = z_val
+
+    x_origin = x_bins.bin(x_min) * rect_size_x
+    y_origin = HEIGHT - y_bins.bin(y_min) * rect_size_y
+
+    x_endpoint = x_bins.bin(x_max) * rect_size_x
+    y_endpoint = HEIGHT - y_bins.bin(y_max) * rect_size_y
 
     display.line(x_origin + x_offset, y_origin + y_offset, x_endpoint + x_offset, y_origin + y_offset, AXIS_THICKNESS)
     display.line(x_origin + x_offset, y_origin + y_offset, x_origin + x_offset, y_endpoint + y_offset, AXIS_THICKNESS)
@@ -188,14 +82,15 @@ def plot_heatmap_binned(filename, x_name, y_name, z_name,AXIS_THICKNESS = 3,TICK
             display.line(x_origin + x_offset, flipped_y, x_origin + x_offset - TICK_LENGTH, flipped_y, 1)
             display.text(str(i), x_origin + x_offset - TICK_LENGTH - 20, flipped_y, 1, 1)
 
-    for (x_val, y_val), z_val in avg_z.items():
-        display.set_pen(int(round(15 - z_val)))
-        flipped_y = HEIGHT - y_val - rect_size_y
-        display.rectangle(x_val + x_offset, flipped_y + y_offset, rect_size_x, rect_size_y)
+    for i in grid.cells():
+        x_bin, y_bin = grid.cell(i)
+        display.set_pen(int(round(15 - grid.value(i, "mean"))))
+        flipped_y = HEIGHT - y_bin * rect_size_y - rect_size_y
+        display.rectangle(x_bin * rect_size_x + x_offset, flipped_y + y_offset, rect_size_x, rect_size_y)
     
-        # Draw legend
-    max_z = max([z for (_, _, z) in filtered_data])
-    min_z = min([z for (_, _, z) in filtered_data])
+    # Draw legend, from the binned z of the plotted rows
+    max_z = z_bins.bin(plotted_max)
+    min_z = z_bins.bin(plotted_min)
     
     legend_steps = 5  # For example, you can adjust this
     legend_width = 20  # Width of the legend box
@@ -219,54 +114,52 @@ def plot_heatmap_binned(filename, x_name, y_name, z_name,AXIS_THICKNESS = 3,TICK
 # Then prints the data as z (pen colour), also binned in to up to 15 levels
 # Print colour is always as dark as possible
 #
-# Note that this is probably only useful when you have a single data point for each value of x and y
-# Otherwise you'll be printing boxes over boxes
+# Rows that round to the same (x, y) would print boxes over boxes, so only the last z of
+# each cell is kept and every cell is drawn once: the picture is the same, but the number
+# of rectangles is bounded by the cells on screen rather than the rows in the file. Cells
+# are only kept for the part of the screen they can be drawn on, so memory depends on the
+# screen too, not on the range of x and y.
 ##########################################################################################    
 def plot_heatmap_rounded(filename, x_name, y_name, z_name, AXIS_THICKNESS=3, TICK_SPACING=10, TICK_LENGTH=5, x_offset=30, y_offset=-10, rect_size_x=4, rect_size_y=4, z_bins_number=10, skip=5):
-    csv_data = read_csv(filename, x_name, y_name, z_name)
+    names = (x_name, y_name, z_name)
 
-    x = csv_data[x_name]
-    y = csv_data[y_name]
-    z = csv_data[z_name]
-    
-    for val in x:
-        if val is not None and (math.isnan(val) or math.isinf(val)):
-            print("Found problematic X:", val)
-
-    for val in y:
-        if val is not None and (math.isnan(val) or math.isinf(val)):
-            print("Found problematic Y:", val)
-    print("Unique types in x:", {type(val) for val in x})
-    print("Unique types in y:", {type(val) for val in y})
-
-    def safe_round(val):
-        try:
-            return int(round(val))
-        except TypeError as e:
-            print(f"Error when processing value {val} of type {type(val)}. Error: {e}")
-            return None
-    
-    rounded_x = [safe_round(x_val) for x_val in x]
-    rounded_y = [safe_round(y_val) for y_val in y]
-    # Round x and y values to the nearest integer
-    rounded_x = [int(round(x_val)) if x_val is not None and not (math.isnan(x_val) or math.isinf(x_val)) else None for x_val in x]
-    rounded_y = [int(round(y_val)) if y_val is not None and not (math.isnan(y_val) or math.isinf(y_val)) else None for y_val in y]
-    binned_z = bin_data(z, z_bins_number)
-
-    scaled_rounded_x = [x_val * rect_size_x for x_val in rounded_x]
-    scaled_rounded_y = [y_val * rect_size_y for y_val in rounded_y]
+    # First pass over the file: ranges of x, y and z
+    (x_min, x_max), (y_min, y_max), (z_min, z_max) = column_ranges(filename, names)
+    z_bins = Bins(z_min, z_max, z_bins_number)
 
-    # Filter out rows with None values
-    filtered_data = [(x_val, y_val, z_val) for x_val, y_val, z_val in zip(scaled_rounded_x, scaled_rounded_y, binned_z) if None not in (x_val, y_val, z_val)]
-   
-    print(filtered_data)
-    # Get the highest value of x and the lowest value of y from the binned data for origins
-    x_origin = min(scaled_rounded_x)
-    y_origin = HEIGHT - min(scaled_rounded_y)  # using HEIGHT to flip the y-axis
+    # Round x and y values to the nearest integer
+    cell_x_min = int(round(x_min))
+    cell_y_min = int(round(y_min))
+
+    # The cells that fall at least partly on the screen: a cell (x, y) is drawn at
+    # x * rect_size_x + x_offset, HEIGHT - (y + 1) * rect_size_y + y_offset
+    grid_x_min = max(cell_x_min, (-x_offset - rect_size_x) // rect_size_x + 1)
+    grid_x_max = min(int(round(x_max)), -((x_offset - WIDTH) // rect_size_x) - 1)
+    grid_y_min = max(cell_y_min, y_offset // rect_size_y)
+    grid_y_max = min(int(round(y_max)), -(-(HEIGHT + y_offset) // rect_size_y) - 1)
+    nx = max(0, grid_x_max - grid_x_min + 1)
+    ny = max(0, grid_y_max - grid_y_min + 1)
+
+    # Second pass: binned z of the last row in each cell (0 for an empty cell)
+    cells = bytearray(nx * ny)
+    for x_val, y_val, z_val in iter_rows(filename, names):
+        if x_val is None or y_val is None or z_val is None:
+            continue
+        if math.isnan(x_val) or math.isinf(x_val) or math.isnan(y_val) or math.isinf(y_val):
+            print("Found problematic X/Y:", x_val, y_val)
+            continue
+        cell_x = int(round(x_val)) - grid_x_min
+        cell_y = int(round(y_val)) - grid_y_min
+        if 0 <= cell_x < nx and 0 <= cell_y < ny:
+            cells[cell_x * ny + cell_y] = z_bins.bin(z_val)
+
+    # Get the highest value of x and the lowest value of y for origins
+    x_origin = cell_x_min * rect_size_x
+    y_origin = HEIGHT - cell_y_min * rect_size_y  # using HEIGHT to flip the y-axis
 
     # For the endpoints:
-    x_endpoint = max(scaled_rounded_x)
-    y_endpoint = HEIGHT - max(scaled_rounded_y)  # This will be the bottom of the screen
+    x_endpoint = int(round(x_max)) * rect_size_x
+    y_endpoint = HEIGHT - int(round(y_max)) * rect_size_y  # This will be the bottom of the screen
 
     # When drawing the X and Y axes:
     display.line(x_origin + x_offset, y_origin + y_offset, x_endpoint + x_offset, y_origin + y_offset, AXIS_THICKNESS)
@@ -290,16 +183,17 @@ def plot_heatmap_rounded(filename, x_name, y_name, z_name, AXIS_THICKNESS=3, TIC
             display.line(x_origin + x_offset, flipped_y, x_origin + x_offset - TICK_LENGTH, flipped_y, 1)
             display.text(str(i), x_origin + x_offset - TICK_LENGTH - 20, flipped_y, 1, 1)  # Adjust the -20 for desired spacing
 
-    # Loop through each filtered row of data
-    for x_val, y_val, z_val in filtered_data:
-        display.set_pen((15 - z_val))
+    # One rectangle per occupied cell
+    for i in range(len(cells)):
+        z_val = cells[i]
+        if z_val == 0:
+            continue
+        display.set_pen(15 - z_val)
+        x_val = (i // ny + grid_x_min) * rect_size_x
+        y_val = (i % ny + grid_y_min) * rect_size_y
         flipped_y = HEIGHT - y_val - rect_size_y
-        display.rectangle(x_val + x_offset, flipped_y + y_offset, rect_size_x, rect_size_y)    
-        # Get the highest and lowest values of z for the legend
-    max_z = max([z for (_, _, z) in filtered_data])
-    min_z = min([z for (_, _, z) in filtered_data])
-    
- 
+        display.rectangle(x_val + x_offset, flipped_y + y_offset, rect_size_x, rect_size_y)
+
     # Define legend properties
     legend_steps = 5
     legend_width = 20  
@@ -309,9 +203,9 @@ def plot_heatmap_rounded(filename, x_name, y_name, z_name, AXIS_THICKNESS=3, TIC
     legend_x_start = x_endpoint + x_offset + 40  
     legend_y_start = y_origin + y_offset - 10  # Position it just above the x-axis
 
-    z_range = max(z) - min(z)
+    z_range = z_max - z_min
     z_step = z_range / z_bins_number
-    z_thresholds = [min(z) + z_step * i for i in range(z_bins_number + 1)]
+    z_thresholds = [z_min + z_step * i for i in range(z_bins_number + 1)]
 
     # Draw the legend
     for step in range(legend_steps):
@@ -327,22 +221,19 @@ def plot_heatmap_rounded(filename, x_name, y_name, z_name, AXIS_THICKNESS=3, TIC
         display.text(str(round(threshold_val, 2)), legend_x_start + legend_width + 5, y_pos, 1, 1)
 
 def plot_barchart(filename, x_name, AXIS_THICKNESS=3, TICK_LENGTH=5, x_offset=30, y_offset=-10, rect_size_x=4, rect_size_y=4, x_bins_number=50, skip=1):
-    csv_data = read_csv(filename, x_name)
-    x = csv_data[x_name]
-    
-    x_bins = bin_data(x, x_bins_number)
-
-    counts = {}
-    for x_bin in x_bins:
-        if x_bin is not None:
-            counts[x_bin] = counts.get(x_bin, 0) + 1
+    # One pass for the range of x, one to count rows per bin
+    (x_min, x_max), = column_ranges(filename, (x_name,))
+    grid = Grid(Bins(x_min, x_max, x_bins_number))
+    for x_val, in iter_rows(filename, (x_name,)):
+        if x_val is not None:
+            grid.add(x_val)
 
-    filtered_data = [(x_bin * rect_size_x, count) for x_bin, count in counts.items()]
+    filtered_data = [(grid.cell(i)[0] * rect_size_x, grid.value(i, "count")) for i in grid.cells()]
 
     x_origin = 0
     y_origin = HEIGHT
     x_endpoint = x_bins_number * rect_size_x
-    max_count = max(counts.values())
+    max_count = grid.max_count()
     y_endpoint = HEIGHT - (max_count * rect_size_y)
 
     display.line(x_origin + x_offset, y_origin + y_offset, x_endpoint + x_offset, y_origin + y_offset, AXIS_THICKNESS)
@@ -374,6 +265,65 @@ def plot_barchart(filename, x_name, AXIS_THICKNESS=3, TICK_LENGTH=5, x_offset=30
 #display.update()
 
 
+##########################################################################################
+# Define a function that draws y against x as a line
+# However many rows the file has, the series is reduced to one bucket per pixel column
+# before drawing (lib/decimate.py), streaming over the file:
+#   method="minmax" draws the min to max of every column plus a joint to the next column,
+#                   which looks the same as drawing every point
+#   method="lttb"   draws a line through one representative point per column
+# x has to be ascending for "lttb".
+##########################################################################################
+def plot_line(filename, x_name, y_name, AXIS_THICKNESS=3, TICK_LENGTH=5, x_offset=30, y_offset=-10, chart_width=200, chart_height=80, method="minmax"):
+    names = (x_name, y_name)
+
+    # First pass over the file: ranges of x and y
+    (x_min, x_max), (y_min, y_max) = column_ranges(filename, names)
+    if method == "lttb":
+        reducer = LTTB(x_min, x_max, chart_width)
+        for x_val, y_val in iter_rows(filename, names):
+            if x_val is not None and y_val is not None:
+                reducer.add_average(x_val, y_val)
+    else:
+        reducer = MinMaxColumns(x_min, x_max, chart_width)
+
+    # Second pass: feed the reducer
+    for x_val, y_val in iter_rows(filename, names):
+        if x_val is not None and y_val is not None:
+            reducer.add(x_val, y_val)
+
+    x_origin = x_offset
+    y_origin = HEIGHT + y_offset
+    y_scale = chart_height / (y_max - y_min) if y_max > y_min else 0
+    x_scale = (chart_width - 1) / (x_max - x_min) if x_max > x_min else 0
+
+    def to_y(value):
+        return y_origin - int((value - y_min) * y_scale)
+
+    display.set_pen(0)
+    display.line(x_origin, y_origin, x_origin + chart_width, y_origin, AXIS_THICKNESS)
+    display.line(x_origin, y_origin, x_origin, y_origin - chart_height, AXIS_THICKNESS)
+
+    # Y-axis ticks at the lowest and highest value
+    for value in (y_min, y_max):
+        display.line(x_origin, to_y(value), x_origin - TICK_LENGTH, to_y(value), 1)
+        display.text(str(round(value, 1)), x_origin - TICK_LENGTH - 25, to_y(value) - 4, 1, 1)
+
+    if method == "lttb":
+        xs, ys = reducer.points()
+        for i in range(1, len(xs)):
+            display.line(x_origin + int((xs[i - 1] - x_min) * x_scale), to_y(ys[i - 1]),
+                         x_origin + int((xs[i] - x_min) * x_scale), to_y(ys[i]), 1)
+    else:
+        previous = None
+        for column, first, low, high, last in reducer.columns():
+            x_pos = x_origin + column
+            if previous is not None:
+                display.line(previous[0], previous[1], x_pos, to_y(first), 1)
+            display.line(x_pos, to_y(low), x_pos, to_y(high), 1)
+            previous = (x_pos, to_y(last))
+
+
 
 
 
@@ -2,15 +2,20 @@ import time
 import machine
 import utime
 import ntptime
-import struct
 import badger2040
 import badger_os
 import ujson as json
 import network
 from pcf85063a import PCF85063A
-import urequests
 from machine import RTC
 import pngdec
+from icon_cache import draw_icon
+from totp_engine import load_engine
+from ics_stream import IcsReader, read_events
+from fetch_cache import FetchCache, read_json
+from event_table import EventTable
+from scheduler import Scheduler, next_multiple
+from panel_layout import Layout
 
 
 #####
@@ -26,6 +31,7 @@ badger.set_update_speed(2)
 WIDTH = badger2040.WIDTH
 HEIGHT = badger2040.HEIGHT
 png = pngdec.PNG(badger.display)
+fetch_cache = FetchCache()  # last calendar and weather, with their ETag / Last-Modified
 
 # Function to read the calendar URL from a file
 def read_calendar_url_from_file(file_path):
@@ -178,10 +184,7 @@ def get_pcf_time():
     current_time_pcf = time.mktime((year, month, day, hour, minute, second, weekday, yearday))
     return current_time_pcf
 
-    
-    
-# Define SHA1 constants and utility functions
-HASH_CONSTANTS = [0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476, 0xC3D2E1F0]
+
 
 ############################################################################################################
 # Main setup: Sync NTP, set time on RTCs
@@ -201,120 +204,12 @@ print("PCF time set")
 ############################################################################################################
 # Define functions for TOTP
 ############################################################################################################
-def left_rotate(n, b):
-    return ((n << b) | (n >> (32 - b))) & 0xFFFFFFFF
-
-def expand_chunk(chunk):
-    w = list(struct.unpack(">16L", chunk)) + [0] * 64
-    for i in range(16, 80):
-        w[i] = left_rotate((w[i - 3] ^ w[i - 8] ^ w[i - 14] ^ w[i - 16]), 1)
-    return w
-
-def sha1(message):
-    h = HASH_CONSTANTS
-    padded_message = message + b"\x80" + \
-        (b"\x00" * (63 - (len(message) + 8) % 64)) + \
-        struct.pack(">Q", 8 * len(message))
-    chunks = [padded_message[i:i+64] for i in range(0, len(padded_message), 64)]
-
-    for chunk in chunks:
-        expanded_chunk = expand_chunk(chunk)
-        a, b, c, d, e = h
-        for i in range(0, 80):
-            if 0 <= i < 20:
-                f = (b & c) | ((~b) & d)
-                k = 0x5A827999
-            elif 20 <= i < 40:
-                f = b ^ c ^ d
-                k = 0x6ED9EBA1
-            elif 40 <= i < 60:
-                f = (b & c) | (b & d) | (c & d)
-                k = 0x8F1BBCDC
-            else:  # 60 <= i < 80
-                f = b ^ c ^ d
-                k = 0xCA62C1D6
-            a, b, c, d, e = (
-                (left_rotate(a, 5) + f + e + k + expanded_chunk[i]) & 0xFFFFFFFF,
-                a,
-                left_rotate(b, 30),
-                c,
-                d,
-            )
-        h = (
-            (h[0] + a) & 0xFFFFFFFF,
-            (h[1] + b) & 0xFFFFFFFF,
-            (h[2] + c) & 0xFFFFFFFF,
-            (h[3] + d) & 0xFFFFFFFF,
-            (h[4] + e) & 0xFFFFFFFF,
-        )
-
-    return struct.pack(">5I", *h)
-
-def hmac_sha1(key, message):
-    key_block = key + (b'\0' * (64 - len(key)))
-    key_inner = bytes((x ^ 0x36) for x in key_block)
-    key_outer = bytes((x ^ 0x5C) for x in key_block)
-
-    inner_message = key_inner + message
-    outer_message = key_outer + sha1(inner_message)
-
-    return sha1(outer_message)
-
-def base32_decode(message):
-    padded_message = message + '=' * (8 - len(message) % 8)
-    chunks = [padded_message[i:i+8] for i in range(0, len(padded_message), 8)]
-
-    decoded = []
-
-    for chunk in chunks:
-        bits = 0
-        bitbuff = 0
-
-        for c in chunk:
-            if 'A' <= c <= 'Z':
-                n = ord(c) - ord('A')
-            elif '2' <= c <= '7':
-                n = ord(c) - ord('2') + 26
-            elif c == '=':
-                continue
-            else:
-                raise ValueError("Not Base32")
-
-            bits += 5
-            bitbuff <<= 5
-            bitbuff |= n
-
-            if bits >= 8:
-                bits -= 8
-                byte = bitbuff >> bits
-                bitbuff &= ~(0xFF << bits)
-                decoded.append(byte)
-
-    return bytes(decoded)
-
-def totp(time, key, step_secs=30, digits=6):
-    hmac = hmac_sha1(base32_decode(key), struct.pack(">Q", time // step_secs))
-    offset = hmac[-1] & 0xF
-    code = ((hmac[offset] & 0x7F) << 24 |
-            (hmac[offset + 1] & 0xFF) << 16 |
-            (hmac[offset + 2] & 0xFF) << 8 |
-            (hmac[offset + 3] & 0xFF))
-    code = str(code % 10 ** digits)
-    
-    return (
-        "0" * (digits - len(code)) + code,
-        step_secs - time % step_secs
-    )
-
-# Load keys from the JSON file
-with open('data/totp_keys.json', 'r') as json_file:
-    keys = json.load(json_file)
+# Load keys from the JSON file; secrets are decoded and HMAC key blocks precomputed once
+engine = load_engine('data/totp_keys.json', 30, 6)
 
 def get_pcf_time():
-    current_time = time.time()
+    # Called on every redraw and idle tick, so keep it quiet
     current_time_pcf = machine.RTC().datetime()
-    print("current time system:", current_time)
-    print("current time pcf:", current_time_pcf)
 
     # Extract the components from the tuple
     year, month, day, weekday, hour, minute, second, yearday = current_time_pcf
@@ -336,37 +231,57 @@ print(f"current time standard : {time.time()}")
 print(f"current time pfc : {get_pcf_time()}")
 print(f"time.time {time.time()}")
 
-def display_otp():
-    key_info = []
-    x = 130  # Initial x position
-    y = 20  # Initial y position
-
-    for key in keys:
-        name = key["name"]
-        secret_key = key["key"]
-        otp_value, sec_remain = totp(get_pcf_time(), secret_key, 30, 6)
-        key_info.append(f"{otp_value}")
-
+# Panel background, in the colours of the moment
+def clear_panel(x, y, w, h):
+    badger.set_pen(pen_color_2)
+    badger.rectangle(x, y, w, h)
     badger.set_pen(pen_color)
-    badger.clear()
-    # Draw the page header
+
+def draw_header(x, y, w, h, colors):
     badger.set_font("bitmap8")
     badger.set_pen(pen_color)
-    badger.rectangle(0, 0, WIDTH, 10)
+    badger.rectangle(x, y, w, h)
     badger.set_pen(pen_color_2)
-    badger.rectangle(0, 10, WIDTH, HEIGHT)
-    badger.text(f"Time to refresh : {sec_remain} S", 180, 1, WIDTH, 0.6)
-
-    badger.set_pen(pen_color)
+    badger.text("Badger Dashboard", x + 10, y + 1, w, 0.6)
+
+def otp_lines(h, count):
+    # Scale, line step and codes a page for count codes in a panel h px high: one code a line,
+    # 30 px apart for one or two keys, closer (and at scale 1 when scale 2 lines no longer fit)
+    # for more
+    space = h - 12
+    step = min(30, space // count)
+    scale = 2 if step >= 18 else 1
+    step = max(step, 10)
+    return scale, step, min(count, (space - 8 * scale) // step + 1)
+
+def otp_pages(count):
+    per_page = otp_lines(OTP_HEIGHT, count)[2] if count else 1
+    return max(1, -(-count // per_page))
+
+def draw_otp(x, y, w, h, colors, codes, page):
+    # Codes that do not all fit are shown a page at a time, with "page/pages" in the top corner
+    clear_panel(x, y, w, h)
+    if not codes:
+        return
+    scale, step, per_page = otp_lines(h, len(codes))
+    pages = -(-len(codes) // per_page)
+    if pages > 1:
+        label = "{}/{}".format(page + 1, pages)
+        badger.text(label, x + w - badger.measure_text(label, 1) - 2, y + 2, w, 1)
+    y += 12
+    for code in codes[page * per_page:(page + 1) * per_page]:
+        badger.text(code, x + 2, y, w - 2, scale)
+        y += step
 
-    for info in key_info:
-        badger.text(info, x, y, WIDTH, 2)
-        y += 30
+def display_otp():
+    otp_values = engine.cached_codes(get_pcf_time())[0]
+    layout.set("otp", pen_color, tuple(otp_values), otp_page % otp_pages(len(otp_values)))
 
-        if y >= HEIGHT - 15:
-            y = 20  # Reset y to its original value
-            x += 100  # Add 80 to x
 
+def draw_time(x, y, w, h, colors, date, clock):
+    clear_panel(x, y, w, h)
+    badger.text(date, x + 10, y + 12, WIDTH, 2)
+    badger.text(clock, x + 10, y + 32, WIDTH, 3)
 
 def show_current_time():
     # Show current date and time
@@ -381,8 +296,7 @@ def show_current_time():
     day = ('00' + str(day))[-2:]
     hour = ('00' + str(hour))[-2:]
     minute = ('00' + str(minute))[-2:]
-    badger.text(f"{year}-{month}-{day}", 10, 20, WIDTH, 2)
-    badger.text(f"{hour}:{minute}", 10, 40, WIDTH, 3)
+    layout.set("time", pen_color, f"{year}-{month}-{day}", f"{hour}:{minute}")
 
 ############################################################################################################
 
@@ -390,226 +304,139 @@ def show_current_time():
 ############################################################################################################
 # Define functions for Calendar
 
-# Function to fetch and process the .ics data
-def fetch_and_process_ics():
-    buffer = ""  # Buffer to accumulate data
-    in_event = False  # Flag to track if we're inside a VEVENT section
-    event_data = []  # List to store the current event's data
-
-    try:
-        response = urequests.get(ics_url)
-        if response.status_code == 200:
-            print(f"Successfully connected: {response.status_code}")
-            print(f"Headers: {response.headers}")
-
-            while True:
-                chunk = response.raw.read(2048)  # Read in 2048-byte chunks
-                if not chunk:
-                    break
-
-                try:
-                    decoded_chunk = chunk.decode('utf-8')  # Decode without 'errors' argument
-                except Exception as e:
-                    print(f"Error decoding chunk: {e}")
-                    break  # Exit on error
-
-                buffer += decoded_chunk
-                lines = buffer.splitlines(keepends=True)
-                buffer = ""  # Clear the buffer
-
-                for line in lines:
-                    if line.startswith("BEGIN:VEVENT"):
-                        in_event = True
-                        event_data = []  # Start collecting event data
-                    if in_event:
-                        event_data.append(line)
-                    if line.startswith("END:VEVENT"):
-                        in_event = False
-                        yield event_data  # Yield the complete event
-                        event_data = []  # Reset for the next event
-
-                if lines[-1][-1] != '\n':  # If the last line was incomplete, keep it in the buffer
-                    buffer = lines[-1]
-        else:
-            print(f"Failed to fetch calendar data. Status code: {response.status_code}")
-            yield None
-    except Exception as e:
-        print(f"Request failed: {e}")
-        yield None
-    finally:
-        try:
-            response.close()
-        except Exception as e:
-            print(f"Error closing response: {e}")
-
-# Parse events for today's date and handle the TZID (time zone information)
-def parse_ics_for_today(ics_generator):
+# Days of events, from today, read from the calendar. Every other event is skipped as soon
+# as its DTSTART has been read, so a feed of several MB parses in one pass over the stream.
+CALENDAR_DAYS = 1
+
+def ics_date(timestamp):
+    tm = time.localtime(timestamp)
+    return "{:04d}{:02d}{:02d}".format(tm[0], tm[1], tm[2])
+
+def parse_datetime(dt_str):
+    # All-day events have a date and no time ("20240603"): they start at midnight
+    year = int(dt_str[0:4])
+    month = int(dt_str[4:6])
+    day = int(dt_str[6:8])
+    hour = int(dt_str[9:11] or 0)
+    minute = int(dt_str[11:13] or 0)
+    second = int(dt_str[13:15] or 0)
+    return time.mktime((year, month, day, hour, minute, second, 0, 0, -1))
+
+def format_datetime(timestamp):
+    tm = time.localtime(timestamp)
+    return "{:04d}{:02d}{:02d}T{:02d}{:02d}{:02d}".format(
+        tm[0], tm[1], tm[2], tm[3], tm[4], tm[5])
+
+# Convert an event time from the TZID of its property to UTC, in ICS format
+def apply_offset(event_time, params):
+    tz_offset = "+0000" # UTC ("...Z") and floating times
+    at = params.find("TZID=")
+    if at >= 0:
+        tz_offset = timezone_offsets.get(params[at + len("TZID="):].split(";")[0].strip('"'), "+0000")
+    sign = 1 if tz_offset[0] == '+' else -1
+    offset_hours = int(tz_offset[1:3]) * sign
+    offset_minutes = int(tz_offset[3:5]) * sign
+    total_offset_seconds = (offset_hours * 3600) + (offset_minutes * 60)
+    return format_datetime(parse_datetime(event_time) - total_offset_seconds)
+
+# Read the events starting in the next CALENDAR_DAYS days (today only by default) from the
+# .ics data as it downloads
+def read_calendar(raw, now):
     events = []
-    now = list(time.localtime())
-    today = "{:04d}{:02d}{:02d}".format(now[0], now[1], now[2])
-    print("Local date (today):", today)
-
-    for event_data in ics_generator:
-        if event_data is None:
-            continue
-
-        event = {}
-        tzoffsetfrom = None
-        tzid = None
-
-        print("\nProcessing new event...")
-
-        for line in event_data:
-            line = line.strip()
-            if line.startswith("SUMMARY:"):
-                event["name"] = line[len("SUMMARY:"):].strip()
-            elif line.startswith("DTSTART;TZID="):
-                tzid = line.split("=")[1].split(":")[0].strip()
-                dtstart = line.split(":")[-1].strip()
-                event["start"] = dtstart
-                print(f"Event start time (before adjustment): {event['start']}")
-                print(f"Detected time zone: {tzid}")
-            elif line.startswith("DTEND;TZID="):
-                tzid = line.split("=")[1].split(":")[0].strip()
-                dtend = line.split(":")[-1].strip()
-                event["end"] = dtend
-                print(f"Event end time (before adjustment): {event['end']}")
-            elif line.startswith("TZOFFSETFROM:"):
-                tzoffsetfrom = line[len("TZOFFSETFROM:"):].strip()
-                print(f"Captured TZOFFSETFROM value: {tzoffsetfrom}")
-
-        if tzoffsetfrom is None and tzid is not None:
-            tzoffsetfrom = timezone_offsets.get(tzid, "+0000")
-            print(f"Inferred TZOFFSETFROM from TZID ({tzid}): {tzoffsetfrom}")
-
-        def parse_datetime(dt_str):
-            year = int(dt_str[0:4])
-            month = int(dt_str[4:6])
-            day = int(dt_str[6:8])
-            hour = int(dt_str[9:11])
-            minute = int(dt_str[11:13])
-            second = int(dt_str[13:15])
-            return time.mktime((year, month, day, hour, minute, second, 0, 0, -1))
-
-        def format_datetime(timestamp):
-            tm = time.localtime(timestamp)
-            return "{:04d}{:02d}{:02d}T{:02d}{:02d}{:02d}".format(
-                tm[0], tm[1], tm[2], tm[3], tm[4], tm[5])
-
-        def apply_offset(event_time, tz_offset):
-            sign = 1 if tz_offset[0] == '+' else -1
-            offset_hours = int(tz_offset[1:3]) * sign
-            offset_minutes = int(tz_offset[3:5]) * sign
-            total_offset_seconds = (offset_hours * 3600) + (offset_minutes * 60)
-
-            print(f"\nApplying timezone adjustment for {tz_offset}:")
-            event_timestamp = parse_datetime(event_time)
-            adjusted_timestamp = event_timestamp - total_offset_seconds
-            print(f"   Adjusted to UTC: {time.localtime(adjusted_timestamp)}")
-
-            return format_datetime(adjusted_timestamp)
-
-        if "start" in event:
-            event["start"] = apply_offset(event["start"], tzoffsetfrom)
-            print(f"Adjusted event start time: {event['start']}")
-
-        if "end" in event:
-            event["end"] = apply_offset(event["end"], tzoffsetfrom)
-            print(f"Adjusted event end time: {event['end']}")
-
-        if event.get("start", "")[:8] == today:
+    today = ics_date(now)
+    last_day = ics_date(now + (CALENDAR_DAYS - 1) * 86400)
+
+    # Event times are in the time zone of the event, so read a day either side and compare
+    # again once they are in UTC
+    first = ics_date(now - 86400).encode()
+    last = ics_date(now + CALENDAR_DAYS * 86400).encode()
+    for fields in read_events(IcsReader(raw), first, last):
+        params, start = fields["DTSTART"]
+        params_end, end = fields.get("DTEND", fields["DTSTART"])
+        event = {"name": fields.get("SUMMARY", ("", ""))[1].strip()}
+        event["start"] = apply_offset(start, params)
+        event["end"] = apply_offset(end, params_end)
+
+        if today <= event["start"][:8] <= last_day:
             events.append(event)
-            print(f"Event '{event['name']}' is happening today. Added to the list.")
+            print(f"Event '{event['name']}' at {event['start']}. Added to the list.")
 
     return events
-# Function to get current and next events
-def get_current_and_next_events(events):
-    current_time = get_current_time_ics_format()  # Get current time in ICS format
 
-    current_event = None
-    next_event = None
-
-    for event in events:
-        # If the event is ongoing, set it as the current event
-        if event["start"] <= current_time <= event["end"]:
-            current_event = event
-        # Find the next upcoming event
-        elif event["start"] > current_time:
-            if not next_event or event["start"] < next_event["start"]:
-                next_event = event
-
-    return current_event, next_event
+# Today's events, kept in the fetch cache for the day: while the calendar is unchanged (304)
+# it is neither downloaded nor parsed again
+def parse_ics_for_today():
+    now = time.time()
+    today = ics_date(now)
+    print("Local date (today):", today)
+    try:
+        return fetch_cache.get(ics_url, lambda raw: read_calendar(raw, now), key=f"{today}+{CALENDAR_DAYS}")
+    except Exception as e:
+        print(f"Request failed: {e}")
+        return []
+# Current time in seconds, on the same clock as the event times (UTC plus timezone_offset)
+def calendar_now():
+    return time.time() + timezone_offset * 3600
 
 
-# Manually format the current time as YYYYMMDDTHHMMSS for comparison with .ics events
-def get_current_time_ics_format():
-    now = list(time.localtime())  # Get current time in list form to modify
-    now[3] = (now[3] + timezone_offset) % 24  # Apply timezone offset and wrap around if necessary
-    
-    # Return formatted time as YYYYMMDDTHHMMSS
-    return "{:04d}{:02d}{:02d}T{:02d}{:02d}{:02d}".format(now[0], now[1], now[2], now[3], now[4], now[5])
+# Event i of the table as the calendar panel shows it, ("HHMM-HHMM", name), or None for -1
+def calendar_event(i):
+    if i < 0:
+        return None
+    start = format_datetime(calendar_events.starts[i])
+    end = format_datetime(calendar_events.ends[i])
+    return (f"{start[9:13]}-{end[9:13]}", calendar_events.title(i))
 
 
 # Display current and next events without labels for "Start:"
-def display_current_and_next_events(current_event, next_event):
-    y = 80
-    badger.set_font("bitmap8")
-    badger.rectangle(0, 0, WIDTH, 10)
-    badger.set_pen(pen_color_2)
-    badger.text("Badger Dashboard", 10, 1, WIDTH, 0.6)
-
-    badger.set_pen(pen_color)
+def draw_calendar(x, y, w, h, colors, current_event, next_event):
+    clear_panel(x, y, w, h)
+    y += 2
 
     if current_event:
-        badger.text(f"{current_event['start'][9:13]}-{current_event['end'][9:13]}", 10, y, WIDTH, 2)
-        badger.text(f"{current_event['name']}", 100, y, WIDTH, 2)
+        badger.text(current_event[0], x + 10, y, WIDTH, 2)
+        badger.text(current_event[1], x + 100, y, WIDTH, 2)
     else:
-        badger.text("No current meeting", 10, y, WIDTH, 2)
+        badger.text("No current meeting", x + 10, y, WIDTH, 2)
 
     if next_event:
-        badger.text(f"{next_event['start'][9:13]}-{next_event['end'][9:13]}", 10, y + 25, WIDTH, 2)
-        badger.text(f"{next_event['name']}", 100, y + 25, WIDTH, 2)
+        badger.text(next_event[0], x + 10, y + 20, WIDTH, 2)
+        badger.text(next_event[1], x + 100, y + 20, WIDTH, 2)
     else:
-        badger.text("No More meetings", 10, y + 25, WIDTH, 2)
+        badger.text("No More meetings", x + 10, y + 20, WIDTH, 2)
 
 
-# Declare global variables to store current and next events
-global_current_event = None
-global_next_event = None
+# Today's events, sorted by start time, and when the current or next meeting next changes:
+# the panel moves on at that time without fetching or parsing the calendar again
+calendar_events = EventTable([])
+next_calendar_change = None
+
+# Show the current and next meetings from the event table
+def show_calendar():
+    global next_calendar_change
+    now = calendar_now()
+    layout.set("calendar", pen_color, calendar_event(calendar_events.current(now)), calendar_event(calendar_events.next(now)))
+    next_calendar_change = calendar_events.next_boundary(now)
 
 # Refresh calendar data
 def refresh_calendar():
-    global global_current_event, global_next_event  # Access the global variables
+    global calendar_events
 
-    ics_generator = fetch_and_process_ics()  # Fetch the calendar data
-    events = parse_ics_for_today(ics_generator)  # Parse today's events
+    events = parse_ics_for_today()  # Fetch the calendar data and parse today's events
 
     if events:
         print(f"Events found: {len(events)}")
         print(events)
-        global_current_event, global_next_event = get_current_and_next_events(events)  # Store events globally
-        display_current_and_next_events(global_current_event, global_next_event)  # Update display
-
     else:
         print("No events found for today.")
-        global_current_event = None
-        global_next_event = None
-
-# Calculate the time left until the next 15-minute mark after manual refresh
-def calculate_time_until_next_refresh():
-    current_minutes = time.localtime()[4]  # Get the current minute
-    if current_minutes % 15 == 0:
-        return 0  # It's exactly on a 15-minute mark
-    else:
-        return 15 - (current_minutes % 15)  # Time left until the next 15-minute interval
+    calendar_events = EventTable([(parse_datetime(event["start"]), parse_datetime(event["end"]), event["name"]) for event in events])
+    show_calendar()  # Update display
 
 # get weather data
 def get_weather_data():
     global weathercode, temperature, windspeed, date
     print(f"Requesting URL: {URL}")
-    r = urequests.get(URL)
-    # open the json data
-    j = r.json()
+    j = fetch_cache.get(URL, read_json)  # no request at all while the last answer is fresh
     print("Data obtained!")
     print(j)
 
@@ -619,152 +446,200 @@ def get_weather_data():
     windspeed = current["windspeed"]
     weathercode = current["weathercode"]
 
-    r.close()
+def draw_weather(x, y, w, h, colors, icon, temperature):
+    clear_panel(x, y, w, h)
+    if icon is not None:
+        draw_icon(badger, png, icon, x + 8, y)
+    if temperature is not None:
+        badger.set_pen(pen_color)
+        badger.text(f"{temperature}°C", x + 2, y + 64, WIDTH, 2)
 
 # show current weather
 def show_weather():
 
+    icon = None
     if temperature is not None:
         # Choose an appropriate icon based on the weather code
         # Weather codes from https://open-meteo.com/en/docs
         # Weather icons from https://fontawesome.com/
         if weathercode in [71, 73, 75, 77, 85, 86]:  # codes for snow
-            png.open_file("/icons/icon-snow.png")
+            icon = "/icons/icon-snow.png"
         elif weathercode in [51, 53, 55, 56, 57, 61, 63, 65, 66, 67, 80, 81, 82]:  # codes for rain
-            png.open_file("/icons/icon-rain.png")
+            icon = "/icons/icon-rain.png"
         elif weathercode in [1, 2, 3, 45, 48]:  # codes for cloud
-            png.open_file("/icons/icon-cloud.png")
+            icon = "/icons/icon-cloud.png"
         elif weathercode in [0]:  # codes for sun
-            png.open_file("/icons/icon-sun.png")
+            icon = "/icons/icon-sun.png"
         elif weathercode in [95, 96, 99]:  # codes for storm
-            png.open_file("/icons/icon-storm.png")
-        png.decode(220, 20)
-        badger.set_pen(pen_color)
-        badger.text(f"{temperature}°C", 130,40, 2)
+            icon = "/icons/icon-storm.png"
+    layout.set("weather", pen_color, icon, temperature)
 
-
-    else:
-        display.text("", 5, 65, WIDTH, 1)
+############################################################################################################
+# Panels
+############################################################################################################
+# Each part of the screen is a panel that is only redrawn when what it shows changes, and
+# pushed with a partial update: a minute tick refreshes the clock (and at the TOTP step the
+# codes) instead of the whole screen. Partial updates leave some ghosting, so every
+# FULL_REFRESH_EVERY of them the next one is a full refresh instead.
+FULL_REFRESH_EVERY = 30  # about 15 minutes of ticks
+
+OTP_HEIGHT = 80
+otp_page = 0  # page of codes shown when they do not all fit, turned with UP and DOWN
+
+layout = Layout(badger, full_every=FULL_REFRESH_EVERY)
+layout.add("header", 0, 0, WIDTH, 8, draw_header)
+layout.add("time", 0, 8, 128, 80, draw_time)
+layout.add("otp", 128, 8, 88, OTP_HEIGHT, draw_otp)
+layout.add("weather", 216, 8, WIDTH - 216, 80, draw_weather)
+layout.add("calendar", 0, 88, WIDTH, HEIGHT - 88, draw_calendar)
+layout.set("header", pen_color)
+temperature = None
 
 ############################################################################################################
-# SET INITIAL STATE
+# Main loop: sleep until the next deadline or button press
 ############################################################################################################
-# Get the current time
-# Initialize the variable to track time since last refresh
-current_time = time.localtime()
-current_minutes = current_time[4]
+# The badge used to wake every second to look at the clock and the buttons. Now the buttons
+# raise a pin interrupt and the clock work has deadlines - the next minute, the next TOTP
+# time step, the next meeting start or end and the next 15 minute refresh - so it sleeps
+# until the earliest of them and wakes twice a minute instead of 60 times.
+MINUTE_MS = 60000
+REFRESH_MS = 15 * MINUTE_MS  # calendar and weather, on the quarter hour
+
+scheduler = Scheduler()
+sleeping = False
+
+# Update the panels and push the ones that changed; deadlines due together ask for one redraw
+def redraw(now=None, full=False):
+    display_otp()  # Display OTP
+    show_current_time()  # Call the function to update the clock display
+    show_weather()
+    show_calendar()  # Current and next meetings from the event table
+    layout.refresh(full)
+
+    # Work out the next time step's codes while idle, so the next redraw needs no hashing
+    engine.prefetch(get_pcf_time())
+    schedule_calendar_change()
+
+def redraw_soon():
+    scheduler.at("redraw", scheduler.now(), redraw)
+
+def on_minute(now):
+    scheduler.at("minute", next_multiple(now, MINUTE_MS), on_minute)
+    redraw_soon()
+
+def on_totp_step(now):
+    scheduler.at("totp", next_multiple(now, engine.step_secs * 1000), on_totp_step)
+    redraw_soon()
+
+# The meeting shown as current or next changes: next_calendar_change is on the calendar's
+# clock (UTC plus timezone_offset)
+def schedule_calendar_change():
+    if sleeping or next_calendar_change is None:
+        scheduler.cancel("calendar_change")
+    else:
+        scheduler.at("calendar_change", (next_calendar_change - timezone_offset * 3600) * 1000, lambda now: redraw_soon())
+
+def on_calendar_refresh(now):
+    scheduler.at("calendar", next_multiple(now, REFRESH_MS), on_calendar_refresh)
+    refresh_calendar()  # Refresh calendar and update events
+    redraw_soon()
+
+def on_weather_refresh(now):
+    scheduler.at("weather", next_multiple(now, REFRESH_MS), on_weather_refresh)
+    get_weather_data()
+    redraw_soon()
+
+def schedule_all():
+    now = scheduler.now()
+    scheduler.at("minute", next_multiple(now, MINUTE_MS), on_minute)
+    scheduler.at("totp", next_multiple(now, engine.step_secs * 1000), on_totp_step)
+    scheduler.at("calendar", next_multiple(now, REFRESH_MS), on_calendar_refresh)
+    scheduler.at("weather", next_multiple(now, REFRESH_MS), on_weather_refresh)
+    schedule_calendar_change()
+
+def toggle_colors():
+    global invert_colors, pen_color, pen_color_2
+    invert_colors = not invert_colors  # Toggle colors
+    pen_color = 0 if invert_colors else 15
+    pen_color_2 = 15 if invert_colors else 0  # Set colors
+    layout.set("header", pen_color)
+
+# Button A: redraw the whole screen, then swap the colours for the next one
+def on_button_a(button):
+    if sleeping:
+        return
+    redraw(full=True)
+    toggle_colors()
+
+# Button B: refresh the calendar and weather now
+def on_button_b(button):
+    if sleeping:
+        return
+    display_otp()  # Display OTP
+    show_current_time()  # Display the updated current time
+    refresh_calendar()  # Refresh calendar and update events
+    get_weather_data()
+    show_weather()
+    layout.refresh(True)
+    schedule_calendar_change()
+    print("Manual refresh triggered.")
+    toggle_colors()
+
+# UP and DOWN: the previous or next page of codes, when there are more than fit the panel
+def on_button_up_down(button):
+    global otp_page
+    if sleeping:
+        return
+    pages = otp_pages(len(engine))
+    otp_page = (otp_page + (1 if button == badger2040.BUTTON_DOWN else -1)) % pages
+    display_otp()
+    layout.refresh()
+
+# Button C: sleep with no deadlines at all until C is pressed again
+def on_button_c(button):
+    global sleeping
+    if not sleeping:
+        print("Entering sleep mode.")
+        sleeping = True
+        for name in list(scheduler.deadlines):
+            scheduler.cancel(name)
+        badger.set_pen(0)
+        badger.clear()
+        badger.set_pen(15)
+        badger.text("Sleeping...", 10, 10, WIDTH, 1.0)
+        badger.update()
+        layout.invalidate()  # the panels are no longer on the screen
+        return
 
-if current_minutes % 15 == 0:
-    time_since_last_refresh = 0
-else:
-    time_since_last_refresh = 15 - (current_minutes % 15)  # Time left until the next 15-minute mark
+    print("Waking up from sleep mode.")
+    sleeping = False
+    badger.set_pen(0)
+    badger.clear()
+    badger.set_pen(15)
+    badger.text("Waking up...", 10, 10, WIDTH, 1.0)
+    badger.update()
+    utime.sleep(1)
+    display_otp()  # Display OTP
+    show_current_time()  # Display the updated current time
+    refresh_calendar()  # Refresh calendar and update events
+    get_weather_data()
+    show_weather()
+    layout.refresh()
+    schedule_all()
 
-badger.clear()
 display_otp()
 show_current_time()
 refresh_calendar()
 get_weather_data()
 show_weather()
-badger.update()
-
-############################################################################################################
+layout.refresh()
 
+scheduler.watch(badger2040.BUTTON_A, on_button_a)
+scheduler.watch(badger2040.BUTTON_B, on_button_b)
+scheduler.watch(badger2040.BUTTON_C, on_button_c)
+scheduler.watch(badger2040.BUTTON_UP, on_button_up_down)
+scheduler.watch(badger2040.BUTTON_DOWN, on_button_up_down)
+schedule_all()
 
 while True:
-    # Get the current time
-    current_time = time.localtime()
-    current_minutes = current_time[4]  # Minutes part of the current time
-    current_seconds = current_time[5]  # Seconds part of the current time
-
-    # Refresh the clock every time the seconds equal 0
-    if current_seconds == 0:
-        display_otp()  # Display OTP
-        show_current_time()  # Call the function to update the clock display
-        show_weather()
-        display_current_and_next_events(global_current_event, global_next_event)  # Display cached events
-        badger.update()
-
-    # Increment time since last refresh
-    time_since_last_refresh += 1  # Assume the loop runs every minute (utime.sleep(60) below)
-
-    # If it's time for the 15-minute interval refresh (both conditions must be met)
-    if time_since_last_refresh >= 15 and current_minutes in [0, 15, 30, 45]:
-        display_otp()  # Display OTP
-        show_current_time()  # Call the function to update the clock display
-        refresh_calendar()  # Refresh calendar and update events
-        get_weather_data()
-        show_weather()
-        time_since_last_refresh = 0  # Reset the timer after refresh
-
-    # Check for Button A press
-    if badger.pressed(badger2040.BUTTON_A):
-        utime.sleep_ms(50)  # Debounce delay
-        if badger.pressed(badger2040.BUTTON_A):  # Ensure it's still pressed
-            display_otp()  # Display OTP
-            show_current_time()  # Display the updated current time
-            display_current_and_next_events(global_current_event, global_next_event)  # Display cached events
-            show_weather()
-            badger.update()
-
-            invert_colors = not invert_colors  # Toggle colors
-            pen_color = 0 if invert_colors else 15
-            pen_color_2 = 15 if invert_colors else 0  # Set colors
-
-            # Debounce wait for release
-            while badger.pressed(badger2040.BUTTON_A):
-                utime.sleep_ms(10)
-
-    if badger.pressed(badger2040.BUTTON_B):
-        utime.sleep_ms(50)  # Debounce delay
-        if badger.pressed(badger2040.BUTTON_B):  # Ensure it's still pressed
-            display_otp()  # Display OTP
-            show_current_time()  # Display the updated current time
-            refresh_calendar()  # Refresh calendar and update events
-            get_weather_data()
-
-            badger.update()
-            # Fully reset time_since_last_refresh to 0 since a manual refresh was triggered
-            time_since_last_refresh = 0  # Manual refresh means no time has passed since the last refresh
-
-            print("Manual refresh triggered, time since last refresh reset.")
-
-            invert_colors = not invert_colors  # Toggle colors
-            pen_color = 0 if invert_colors else 15
-            pen_color_2 = 15 if invert_colors else 0  # Set colors
-
-            # Debounce wait for release
-            while badger.pressed(badger2040.BUTTON_B):
-                utime.sleep_ms(10)
-
-    if badger.pressed(badger2040.BUTTON_C):
-        print("Entering sleep mode.")
-        badger.set_pen(0)
-        badger.clear()
-        badger.set_pen(15)
-        badger.text("Sleeping...", 10, 10, WIDTH, 1.0)
-        badger.update()
-        
-        # Sleep loop until Button C is pressed again
-        while True:
-            utime.sleep(1)  # Sleep for 1 second
-            if badger.pressed(badger2040.BUTTON_C):  # Check if Button C is pressed again
-                print("Waking up from sleep mode.")
-                badger.set_pen(0)
-                badger.clear()
-                badger.set_pen(15)
-                badger.text("Waking up...", 10, 10, WIDTH, 1.0)
-                badger.update()
-                utime.sleep(1)
-                display_otp()  # Display OTP
-                show_current_time()  # Display the updated current time
-                refresh_calendar()  # Refresh calendar and update events
-                get_weather_data()
-                show_weather()
-                badger.update()
-                utime.sleep(1)  # Small delay for visual feedback
-                break  # Exit sleep loop and resume normal operation
-
-
-    # Sleep to reduce polling frequency and save power (1 second sleep to catch the seconds turning 0)
-    utime.sleep(1)
-
+    scheduler.run_once()
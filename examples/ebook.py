@@ -1,6 +1,6 @@
 import badger2040
 import gc
-import badger_os
+from state_journal import StateJournal
 
 # **** Put the name of your text file here *****
 text_file = "/books/289-0-wind-in-the-willows-abridged.txt"  # File must be on the MicroPython device
@@ -70,7 +70,8 @@ state = {
     "text_size": 0.5,
     "offsets": []
 }
-badger_os.state_load("ebook", state)
+journal = StateJournal("ebook")
+journal.load(state)
 
 text_spacing = int(34 * state["text_size"])
 
@@ -241,7 +242,7 @@ while True:
         # Is the next page one we've not displayed before?
         if state["current_page"] >= len(state["offsets"]):
             state["offsets"].append(ebook.tell())  # Add its start position to the state["offsets"] list
-        badger_os.state_save("ebook", state)
+        journal.save(state)
 
         changed = False
 
@@ -11,17 +11,20 @@
 import time
 import utime
 import machine
-import json
-import qrcode
-import ubinascii
 import jpegdec
 import os
 import io
-import random
 import badger2040 # https://github.com/pimoroni/badger2040/blob/main/firmware/PIMORONI_BADGER2040/lib/badger2040.py
 import badger_os #https://github.com/pimoroni/badger2040/blob/main/firmware/PIMORONI_BADGER2040/lib/badger_os.py
 import sys
 from pcf85063a import PCF85063A
+from qr_render import measure_qr, draw_qr
+from form_cache import load_form
+from form_expr import FormLogic
+from icon_cache import draw_icon
+from state_journal import StateJournal
+from submission_writer import SubmissionWriter
+from submission_index import SubmissionIndex
 
 # Set badger CPU speed - higher numbers are faster but draw more power
 # 1-4. 4 is overclocking.
@@ -88,7 +91,8 @@ GREY = 12
 
 CHARS = list("ABCDEFGHIJKLMNOPQRSTUVWXYZ") + ["SPACE", "DEL"]
 
-MAX_MAGNITUDE = 100 # integer controls: x1, x10, x100
+NUMBER_DIGITS = 4 # digits before the point on the digit wheel of a numeric control without a maximum
+DECIMAL_PLACES = 2 # digits after the point for Decimal controls
 
 # ------------------------------
 # Load Form Definition
@@ -96,30 +100,30 @@ MAX_MAGNITUDE = 100 # integer controls: x1, x10, x100
 
 print("loading '{}'".format(form))
 
-formfile = open(form)
-formdef = json.load(formfile)
-formfile.close()
+# Compiled once per change of the .odkbuild file and kept next to it, see lib/form_cache.py
+formdef = load_form(form)
 
 controls = formdef['controls']
-metadata = formdef['metadata']
+writer = SubmissionWriter(formdef, serverform, versionid, submissions)
+uploads = SubmissionIndex()
+
+# Relevance, constraint and calculate expressions, compiled along with the form (lib/form_expr.py)
+logic = FormLogic(controls)
 
 def print_form_info():
     print("Title:", formdef['title'])
-    print("Version:", metadata['version'])
-    print("URL:", metadata['submission_url'])
+    print("Version:", formdef['version'])
+    print("URL:", formdef['submission_url'])
     
     for i, control in enumerate(controls):
         print("control #{}".format(i))
         print("    name:", control['name'])
         print("    type:", control['type'])
-        print("    label:", control['label']['0'])
+        print("    label:", control['label'])
         
         if 'options' in control:
-            options = control['options']
-            opts = [option['text']['0'] for option in options]
-            print("    options:", opts)
-            vals = [option['val'] for option in options]
-            print("    values:", vals)
+            print("    options:", control['options'])
+            print("    values:", control['vals'])
                       
 # ------------------------------
 # State
@@ -131,7 +135,7 @@ state = {
     'current': 0,
     'saved': False,
     'selection': 0, # index of currently highlighted Select control option
-    'magnitude': 1, # 1x, 10x, 100x for Integer control
+    'digit': 0, # digit wheel position of the numeric control (0 = leftmost)
     'char_index': 0, # index of currently selected Text control character; CHARS[0] = A
     'values': [],
     'timestamp': '',
@@ -140,9 +144,32 @@ state = {
     'button_C': None
 }
 
-badger_os.state_load("form", state)
+journal = StateJournal("form")
+journal.load(state)
+if state['values']:
+    logic.evaluate(state['values']) # which questions are relevant to the answers so far
 print("initial state:", state)
 
+# ------------------------------
+# Redraw Tracking
+# ------------------------------
+# Actions that only change part of the current control (the highlighted option, a check box,
+# the value, a menu label) list the parts in `dirty` instead of setting needs_refresh. The
+# main loop then redraws just those parts and pushes them with one partial_update().
+
+dirty = [] # ('option', index), ('digit', wheel position), ('value', None) or ('menu', None)
+composed = False # the framebuffer holds the whole current screen; not so right after waking
+
+option_layouts = {} # control index -> (columns, options per page, option positions)
+menu_widths = {} # menu label -> measured width
+label_wrapping = {} # control index -> whether its label runs onto a second line
+wheel_formats = {} # control index -> (sign, digits before the point, digits after it)
+glyph_widths = {} # character -> measured width on the digit wheel
+
+def invalidate(part, index=None):
+    if (part, index) not in dirty:
+        dirty.append((part, index))
+
 # ------------------------------
 # Button Actions
 # ------------------------------
@@ -154,19 +181,22 @@ def start():
     global needs_refresh
     
     state['at_start'] = False
-    if len(controls) > 0:
-        state['at_end'] = False
-    else:
-        state['at_end'] = True # the form has no controls so jump to end!
-
-    state['current'] = 0
     state['saved'] = False
     state['selection'] = 0
-    state['magnitude'] = 1
+    state['digit'] = 0
     state['char_index'] = 0
     
-    # Initialize all controls to their default value, if any
+    # Initialize all controls to their default value, if any, then work out calculated values and relevance
     state['values'] = list(map(lambda control: control['defaultValue'], controls))
+    logic.evaluate(state['values'])
+
+    first = logic.next_relevant(0)
+    if first is not None:
+        state['at_end'] = False
+        state['current'] = first
+    else:
+        state['at_end'] = True # the form has no (relevant) controls so jump to end!
+        state['current'] = 0
 
     display.set_update_speed(badger2040.UPDATE_FAST)
     needs_refresh = True
@@ -186,50 +216,15 @@ def save():
     global state
     global needs_refresh
 
-    # Add a UUID that is compatible with ODK submissions to Central
-    # Generate a random UUID
-    uuid = '-'.join([''.join([random.choice('0123456789abcdef') for _ in range(8)]),
-                    ''.join([random.choice('0123456789abcdef') for _ in range(4)]),
-                    ''.join([random.choice('0123456789abcdef') for _ in range(4)]),
-                    ''.join([random.choice('0123456789abcdef') for _ in range(4)]),
-                    ''.join([random.choice('0123456789abcdef') for _ in range(12)])])
-
     # ISO8601 local time (no timezone!); see https://github.com/micropython/micropython/issues/3087
     # Badger 2040 doesn't have an RTC, so the time resets when wake up! So the timestamp is only meaningful when running from Thonny!
-    state['timestamp']
-    state['timestamp'] = get_time()
-    state['timestamp'] = format_time(state['timestamp'])
+    state['timestamp'] = format_time(get_time())
     print("Current date and time:", state['timestamp'])
-    # Append csv results to submissions file
+    # Append csv results to submissions file and write the XML instance, with a UUID compatible with ODK Central
     print("saving to '{}'".format(submissions))
-    with open(submissions, "a") as f:
-        f.write(f"uuid:{uuid},{csv()}\n")
-
-    # Create individual XML file for the submission
-    folder_name = "instances/"
-    try:
-        os.mkdir("instances")
-    except OSError:
-        pass  # The directory already exists
-
-    try:
-        os.mkdir(folder_name)
-    except OSError:
-        pass  # The directory already exists
-
-    xml_filename = folder_name + f"/uuid{uuid}.xml"
-    with open(xml_filename, "w") as xml_file:
-        xml_file.write(
-            f"<data xmlns:jr=\"http://openrosa.org/javarosa\" xmlns:orx=\"http://openrosa.org/xforms\" id=\"{serverform}\"  version=\"{versionid}\">\n")
-        for i, control in enumerate(controls):
-            name = control['name']
-            value = state['values'][i]
-            xml_file.write(f"  <{name}>{value}</{name}>\n")
-        xml_file.write(f"  <timestamp>{state['timestamp']}</timestamp>\n")  # Add timestamp field
-        deviceid = ubinascii.hexlify(machine.unique_id()).decode("utf-8")
-        xml_file.write(f"  <device_id>{deviceid}</device_id>\n")  # Add device_id field
-        xml_file.write(f"  <meta><instanceID>uuid:{uuid}</instanceID></meta>\n")  # Add device_id field
-        xml_file.write("</data>")
+    uuid = writer.save(logic.submitted(state['values']), state['timestamp'])
+    if uploads.exists():
+        uploads.queue(uuid) # for sendODK.py; without an index it indexes the instances folder itself
 
     state['saved'] = True
 
@@ -255,17 +250,20 @@ def show_previous():
     if state['at_start']:
         return
     elif state['at_end'] and not state['saved']:
+        last = logic.next_relevant(len(controls) - 1, -1) # skipping questions that are not relevant
+        if last is None:
+            return
         state['at_end'] = False
-        state['current'] = len(controls) - 1
+        state['current'] = last
         state['selection'] = 0
-        state['magnitude'] = 1
+        state['digit'] = 0
         state['char_index'] = 0
         display.set_update_speed(badger2040.UPDATE_FAST)
         needs_refresh = True
-    elif state['current'] > 0:
-        state['current'] -= 1
+    elif not state['at_end'] and logic.next_relevant(state['current'] - 1, -1) is not None:
+        state['current'] = logic.next_relevant(state['current'] - 1, -1)
         state['selection'] = 0
-        state['magnitude'] = 1
+        state['digit'] = 0
         state['char_index'] = 0
         display.set_update_speed(badger2040.UPDATE_FAST)
         needs_refresh = True
@@ -280,15 +278,20 @@ def show_next():
     
     current = state['current']
     value = state['values'][current]
-    if value == '' and controls[current]['required']:
+    if value == '' and controls[current]['required'] and not controls[current]['readOnly']:
         return # disable Next if current control is required but unanswered
+    if not in_range(controls[current], value):
+        return # or if a number is outside the range of the control
+    if not logic.valid(state['values'], current):
+        return # or if the answer does not meet its constraint
     
-    if current < len(controls) - 1:
-        state['current'] += 1
+    following = logic.next_relevant(current + 1) # skipping questions that are not relevant
+    if following is not None:
+        state['current'] = following
         state['selection'] = 0
-        state['magnitude'] = 1
+        state['digit'] = 0
         state['char_index'] = 0
-    elif current == len(controls) - 1:
+    else:
         state['current'] = 0
         state['at_end'] = True
         
@@ -296,96 +299,73 @@ def show_next():
     needs_refresh = True   
 
 
-# Integer control actions
+# Numeric control actions: each press turns one digit of the digit wheel (see wheel_text())
 
-def increment():
+def change_digit(step):
     global state
-    global needs_refresh
 
     current = state['current']
+    control = controls[current]
     value = state['values'][current]
+    text = wheel_text(control, value)
+    i = wheel_positions(text)[state['digit']]
 
-    min_value = controls[current]['range']['min']
-    if min_value != '' and controls[current]['range']['minInclusive'] != True:
-        min_value = str(int(min_value) + 1)
-        
-    max_value = controls[current]['range']['max']
-    if max_value != '' and controls[current]['range']['maxInclusive'] != True:
-        max_value = str(int(max_value) - 1)
-    
-    # if value not yet set then initialize to minimum, if applicable, otherwise 0
-    if value == '':
-        if min_value != '':
-            state['values'][current] = min_value
-        else:
-            state['values'][current] = "0"
-        needs_refresh = True   
+    if text[i] in '+-':
+        char = '-' if text[i] == '+' else '+'
     else:
-        old = int(value)
-        new = old + state['magnitude']
-        if max_value != '':
-            new = min(new, int(max_value)) # clip to maximum, if applicable
-        if new != old:
-            state['values'][current] = str(new)
-            needs_refresh = True  
+        char = str((int(text[i]) + step) % 10) # 9 turns over to 0 without carrying
+    state['values'][current] = wheel_value(text[:i] + char + text[i + 1:])
 
- 
-def decrement():
-    global state
-    global needs_refresh
+    if value == '':
+        invalidate('value') # the whole wheel goes from grey (unanswered) to black
+    elif wheel_text(control, state['values'][current]) != text:
+        invalidate('digit', state['digit'])
 
-    current = state['current']
-    value = state['values'][current]
 
-    min_value = controls[current]['range']['min']
-    if min_value != '' and controls[current]['range']['minInclusive'] != True:
-        min_value = str(int(min_value) + 1) # TODO: decimals?
-    
-    # if value not yet set then initialize to minimum, if applicable, otherwise 0
-    if value == '':
-        if min_value != '':
-            state['values'][current] = min_value
-        else:
-            state['values'][current] = "0"
-        needs_refresh = True   
-    else:
-        old = int(value)
-        new = old - state['magnitude']
-        if min_value != '':
-            new = max(new, int(min_value)) # clip to minimum, if applicable
-        if new != old:
-            state['values'][current] = str(new)
-            needs_refresh = True   
+def digit_up():
+    change_digit(1)
+
+
+def digit_down():
+    change_digit(-1)
 
 
-def change_magnitude():
+def next_digit():
     global state
-    global needs_refresh
 
-    state['magnitude'] *= 10
-    if state['magnitude'] > MAX_MAGNITUDE:
-        state['magnitude'] = 1
-    needs_refresh = True   
+    control = controls[state['current']]
+    positions = wheel_positions(wheel_text(control, state['values'][state['current']]))
+    old = state['digit']
+    state['digit'] = (old + 1) % len(positions)
+    invalidate('digit', old)
+    invalidate('digit', state['digit'])
+    invalidate('menu')
 
 
 # Select control actions
 
-def next_option():
+def move_selection(selection):
     global state
     global needs_refresh
 
+    old = state['selection']
+    state['selection'] = selection
+    control = controls[state['current']]
+    if control.get('appearance') == 'Horizontal Layout' or page_start(control, old) != page_start(control, selection):
+        needs_refresh = True # picture options scroll, and a new page of options is redrawn whole
+    else:
+        invalidate('option', old)
+        invalidate('option', selection)
+
+
+def next_option():
     if state['selection'] < len(controls[state['current']]['options']) - 1:
-        state['selection'] += 1
-        needs_refresh = True   
+        move_selection(state['selection'] + 1)
 
 
 def previous_option():
-    global state
-    global needs_refresh
-
     if state['selection'] > 0:
-        state['selection'] -= 1
-        needs_refresh = True   
+        move_selection(state['selection'] - 1)
 
 
 def select_option():
@@ -396,8 +376,9 @@ def select_option():
     control = controls[current]
     type = control['type']
     value = state['values'][current]
+    before = selected_options(control, value)
 
-    val = control['options'][state['selection']]['val']
+    val = control['vals'][state['selection']]
     if type == 'inputSelectOne':
         if val == value: 
             state['values'][current] = '' # value already selected, so clear it
@@ -412,7 +393,15 @@ def select_option():
                 state['values'][current] = ' '.join(list(filter(lambda v: v != val, values))) # value already selected, so remove it from list
             else:
                 state['values'][current] = ' '.join(values + [val]) # append new value to existing selection        
-    needs_refresh = True   
+
+    if control.get('appearance') == 'Horizontal Layout':
+        needs_refresh = True
+    else:
+        # Only the options that were ticked or unticked change
+        after = selected_options(control, state['values'][current])
+        for i in range(len(after)):
+            if after[i] != before[i]:
+                invalidate('option', i)
 
 
 # Text control actions
@@ -423,7 +412,7 @@ def next_char():
 
     if state['char_index'] < len(CHARS) - 1:
         state['char_index'] += 1
-        needs_refresh = True   
+        invalidate('menu')
 
 
 def previous_char():
@@ -432,7 +421,7 @@ def previous_char():
 
     if state['char_index'] > 0:
         state['char_index'] -= 1
-        needs_refresh = True   
+        invalidate('menu')
 
 
 def select_char():
@@ -454,7 +443,7 @@ def select_char():
         state['values'][current] += ' '
     else:
         state['values'][current] += char
-    needs_refresh = True     
+    invalidate('value')
 
 
 # ------------------------------
@@ -501,54 +490,94 @@ def draw_menu(a, b, c):
     y = HEIGHT - (MENU_HEIGHT // 2)
     max_width = WIDTH // 3
     if a is not None:
-        display.text(a, BUTTONA_X - (display.measure_text(a, MENU_TEXT_SIZE) // 2), y, max_width, MENU_TEXT_SIZE)
+        display.text(a, BUTTONA_X - (menu_width(a) // 2), y, max_width, MENU_TEXT_SIZE)
 
     if b is not None:
-        display.text(b, BUTTONB_X - (display.measure_text(b, MENU_TEXT_SIZE) // 2), y, max_width, MENU_TEXT_SIZE)
+        display.text(b, BUTTONB_X - (menu_width(b) // 2), y, max_width, MENU_TEXT_SIZE)
         
     if c is not None:
-        display.text(c, BUTTONC_X - (display.measure_text(c, MENU_TEXT_SIZE) // 2), y, max_width, MENU_TEXT_SIZE)
+        display.text(c, BUTTONC_X - (menu_width(c) // 2), y, max_width, MENU_TEXT_SIZE)
     
 
-def draw_options(options, selected, current, x, y, width, height, item_height, multiselect):
+def menu_width(label):
+    width = menu_widths.get(label)
+    if width is None:
+        width = menu_widths[label] = display.measure_text(label, MENU_TEXT_SIZE)
+    return width
+
+
+def option_layout(options, width, height, item_height):
+    # Columns, options per page and the (x, y) of each option on a page, measured once per
+    # control: the controls are always drawn in the same area
+    layout = option_layouts.get(state['current'])
+    if layout is not None:
+        return layout
+
     # Determine maximum number of columns per page based on the longest option
     longest = max(map(lambda option: display.measure_text(option, OPTION_TEXT_SIZE), options))
     columns = width // (longest + item_height + 5) # text + checkbox + padding
     rows = height // item_height
-
-    # Determine first option shown on the page containing the current option
     options_per_page = rows * columns
-    start = (current // options_per_page) * options_per_page
 
+    # Fill rows top to bottom, wrapping to the next column above the menu
+    positions = []
     item_x = 0
     item_y = 0
     column = 0
-
-    for i in range(start, len(options)):
-        top = item_y + y - (item_height // 2)
-        
-        # Highlight current option
-        if i == current:
-            display.set_pen(GREY)
-            display.rectangle(item_x, top, width // columns, item_height)
-            
-        display.set_pen(BLACK)
-        display.text(options[i], item_x + x + item_height, item_y + y, WIDTH, OPTION_TEXT_SIZE)
-        
-        if multiselect:
-            draw_check_box(item_x, top, item_height, selected[i], 2, 2)
-        else:
-            draw_radio_button(item_x, top, item_height, selected[i], 2, 2)
-        
-        # Check if wrap to next column
+    while column < columns:
+        positions.append((item_x, item_y))
         item_y += item_height
         if item_y >= height - MENU_HEIGHT - (item_height // 2):
             item_x += width // columns
             item_y = 0
             column += 1
-            if column >= columns:
-                return
-            
+
+    layout = option_layouts[state['current']] = (columns, options_per_page, positions)
+    return layout
+
+
+def page_start(control, selection):
+    # First option shown on the page containing the given option
+    _, options_per_page, _ = option_layout(control['options'], WIDTH - SCROLLBAR_WIDTH - 2, CONTROL_HEIGHT, OPTION_HEIGHT)
+    return (selection // options_per_page) * options_per_page
+
+
+def selected_options(control, value):
+    if control['type'] == 'inputSelectMany':
+        values = value.split() # convert space separated select-multi value into array to match against
+        return [val in values for val in control['vals']]
+    return [val == value for val in control['vals']] # select-one only has one single value
+
+
+def draw_options(options, selected, current, x, y, width, height, item_height, multiselect):
+    columns, options_per_page, positions = option_layout(options, width, height, item_height)
+
+    # Determine first option shown on the page containing the current option
+    start = (current // options_per_page) * options_per_page
+
+    for i in range(start, min(start + len(positions), len(options))):
+        draw_option(options[i], selected[i], i == current, positions[i - start], x, y, width // columns, item_height, multiselect)
+
+
+def draw_option(option, selected, highlighted, position, x, y, cell_width, item_height, multiselect):
+    # One option of a select control; returns the rectangle it covers
+    item_x, item_y = position
+    top = item_y + y - (item_height // 2)
+
+    # Highlight current option
+    if highlighted:
+        display.set_pen(GREY)
+        display.rectangle(item_x, top, cell_width, item_height)
+
+    display.set_pen(BLACK)
+    display.text(option, item_x + x + item_height, item_y + y, WIDTH, OPTION_TEXT_SIZE)
+
+    if multiselect:
+        draw_check_box(item_x, top, item_height, selected, 2, 2)
+    else:
+        draw_radio_button(item_x, top, item_height, selected, 2, 2)
+    return item_x, top, cell_width, item_height
+
  
 def draw_check_box(x, y, size, selected, padding, thickness):
     x0 = x + padding + (thickness // 2)
@@ -610,8 +639,7 @@ def draw_pic_options(options, selected, current, x, y, width, height, pic_size):
             display.set_pen(WHITE)
             display.rectangle(item_x - 1, y - 1, pic_size + 2, pic_size + 2)
 
-        jpeg.open_file("/icons/" + options[i]) # option label provides the icon filename
-        jpeg.decode(item_x, y)
+        draw_icon(display, jpeg, "/icons/" + options[i], item_x, y) # option label provides the icon filename
         
         # Next column
         item_x += pic_size + padding
@@ -624,31 +652,9 @@ def draw_pic_options(options, selected, current, x, y, width, height, pic_size):
 # ------------------------------
 
 def csv():
-    # https://docs.pycom.io/firmwareapi/pycom/machine/
-    deviceid = ubinascii.hexlify(machine.unique_id()).decode("utf-8")
-
-    values = [formdef['title'], str(metadata['version']), deviceid, state['timestamp']]
-    values += state['values']
-    return ','.join(values)
+    return writer.csv_row(logic.submitted(state['values']), state['timestamp'])
     
-# Below QR functions copied verbatim from qrgen.py example!
-
-def measure_qr_code(size, code):
-    w, h = code.get_size()
-    module_size = int(size / w)
-    return module_size * w, module_size
-
-
-def draw_qr_code(ox, oy, size, code):
-    size, module_size = measure_qr_code(size, code)
-    display.set_pen(WHITE)
-    display.rectangle(ox, oy, size, size)
-    
-    display.set_pen(BLACK)
-    for x in range(size):
-        for y in range(size):
-            if code.get_module(x, y):
-                display.rectangle(ox + x * module_size, oy + y * module_size, module_size, module_size)
+# QR drawing is shared with news.py and qrgen.py, see lib/qr_render.py
 
 # ------------------------------
 # Disk Usage
@@ -677,12 +683,12 @@ def show_start_page():
     y = TITLE_HEIGHT // 2
     display.text(formdef['title'], 0, y, WIDTH, TITLE_TEXT_SIZE)
     y += TITLE_HEIGHT
-    display.text("version " + str(metadata['version']), 0, y, WIDTH, OPTION_TEXT_SIZE)
+    display.text("version " + str(formdef['version']), 0, y, WIDTH, OPTION_TEXT_SIZE)
     
     y += OPTION_HEIGHT * 2
     display.text(str(len(controls)) + " questions", 0, y, WIDTH, OPTION_TEXT_SIZE)
     
-    total_required = len(list(filter(lambda control: control['required'], controls)))
+    total_required = formdef['required']
     y += OPTION_HEIGHT
     display.text(str(total_required) + " mandatory", 0, y, WIDTH, OPTION_TEXT_SIZE)
     
@@ -714,11 +720,10 @@ def show_end_page():
     if state['saved']:
         display.text("Form saved!", 0, y, WIDTH, TITLE_TEXT_SIZE)
         
-        # Show QR-code with csv
-        code = qrcode.QRCode()
-        code.set_text(csv())
-        size, _ = measure_qr_code(HEIGHT, code)
-        draw_qr_code(WIDTH - size, (HEIGHT - size) // 2, HEIGHT, code)
+        # Show QR-code with csv; the rectangles are cached per payload so redraws are cheap
+        payload = csv()
+        size, _ = measure_qr(payload, HEIGHT)
+        draw_qr(display, payload, WIDTH - size, (HEIGHT - size) // 2, HEIGHT, WHITE, BLACK)
     
         datetime = state['timestamp'].split(' ')
         y += OPTION_HEIGHT * 2
@@ -733,13 +738,15 @@ def show_end_page():
     else:
         #answered = len(list(filter(lambda control: len(str(control['value'])) > 0, controls)))
         answered = len(list(filter(lambda value: value != '', state['values'])))
-        total_required = len(list(filter(lambda control: control['required'], controls)))
         
         #required = len(list(filter(lambda control: control['required'] and len(str(control['value'])) > 0, controls)))
         required = 0
+        total_required = 0 # only questions that are relevant to the answers given are mandatory
         for i, control in enumerate(controls):
-            if control['required'] and state['values'][i] != '':
-                required += 1
+            if control['required'] and logic.relevant[i]:
+                total_required += 1
+                if state['values'][i] != '':
+                    required += 1
         
         display.text("End of form", 0, y, WIDTH, TITLE_TEXT_SIZE)
         y += TITLE_HEIGHT * 2
@@ -759,72 +766,308 @@ def show_end_page():
             state['button_C'] = None
 
 
+def control_menu(control):
+    # Menu labels and button actions of a control, None for controls without input
+    type = control['type']
+    if control['readOnly']:
+        return None # notes (and calculated values) take no input
+    elif type == 'inputNumeric':
+        return ("-", digit_label(wheel_text(control, state['values'][state['current']])), "+"), ('digit_down', 'next_digit', 'digit_up')
+    elif type == 'inputSelectOne' or type == 'inputSelectMany':
+        return ("Prev", "Select", "Next"), ('previous_option', 'select_option', 'next_option')
+    elif type == 'inputText':
+        return ("<", CHARS[state['char_index']], ">"), ('previous_char', 'select_char', 'next_char')
+    return None
+
+
+def value_y():
+    # Vertical centre of the value of integer and text controls
+    return TITLE_HEIGHT // 2 + TITLE_HEIGHT + (CONTROL_HEIGHT - TITLE_HEIGHT) // 2
+
+
+def draw_value(value):
+    display.text(value, WIDTH // 2 - (display.measure_text(value, TITLE_TEXT_SIZE) // 2), value_y(), WIDTH, TITLE_TEXT_SIZE)
+
+
+# Digit wheel of numeric controls: the value is shown with a fixed number of digits (leading
+# zeros, the decimal places of Decimal controls and a sign unless the range has a minimum of
+# zero or more) and the buttons turn the digit at the cursor, so only that digit is redrawn
+
+def wheel_format(control):
+    format = wheel_formats.get(state['current'])
+    if format is None:
+        limits = control.get('range', {})
+        numbers = [limits[key] for key in ('min', 'max') if limits.get(key, '') != '']
+        numbers += [value for value in (control['defaultValue'], state['values'][state['current']]) if value != '']
+        sizes = [len(str(int(abs(float(number))))) for number in numbers]
+        if limits.get('max', '') == '':
+            sizes.append(NUMBER_DIGITS)
+        # A sign position unless the minimum rules out negative numbers and none is already given
+        sign = limits.get('min', '') == '' or any(float(number) < 0 for number in numbers)
+        places = DECIMAL_PLACES if control.get('kind') == 'Decimal' else 0
+        format = wheel_formats[state['current']] = (sign, max(sizes), places)
+    return format
+
+
+def wheel_text(control, value):
+    # "0042", "+0012.50"...; an unanswered control shows its minimum, or zero
+    sign, digits, places = wheel_format(control)
+    if value == '':
+        minimum = control.get('range', {}).get('min', '')
+        value = minimum if minimum != '' and float(minimum) > 0 else '0'
+    number = float(value)
+    text = str(int(abs(number) * 10 ** places + 0.5))
+    text = '0' * (digits + places - len(text)) + text
+    if places:
+        text = text[:-places] + '.' + text[-places:]
+    if sign:
+        text = ('-' if number < 0 else '+') + text
+    return text
+
+
+def wheel_value(text):
+    # The answer for a wheel text: no leading zeros, trailing decimal zeros or plus sign
+    negative = text[0] == '-'
+    whole, _, fraction = text.lstrip('+-').partition('.')
+    value = whole.lstrip('0') or '0'
+    fraction = fraction.rstrip('0')
+    if fraction:
+        value += '.' + fraction
+    if negative and value != '0':
+        value = '-' + value
+    return value
+
+
+def wheel_positions(text):
+    # Indexes of the characters of a wheel text the cursor can be on (not the point)
+    return [i for i in range(len(text)) if text[i] != '.']
+
+
+def digit_label(text):
+    # Menu label for the wheel position under the cursor: +/-, x100, x1, x0.1...
+    i = wheel_positions(text)[state['digit']]
+    if text[i] in '+-':
+        return "+/-"
+    point = text.find('.')
+    if point < 0:
+        point = len(text)
+    if i < point:
+        return "x" + str(10 ** (point - i - 1))
+    return "x0." + "0" * (i - point - 1) + "1"
+
+
+def glyph_width(char):
+    width = glyph_widths.get(char)
+    if width is None:
+        width = glyph_widths[char] = display.measure_text(char, TITLE_TEXT_SIZE)
+    return width
+
+
+def wheel_cells(text):
+    # (x, width) of each character of a wheel text, centred on the screen like draw_value()
+    cell = max(glyph_width(digit) for digit in "0123456789") + 4
+    widths = [glyph_width('.') + 2 if char == '.' else cell for char in text]
+    x = WIDTH // 2 - sum(widths) // 2
+    cells = []
+    for width in widths:
+        cells.append((x, width))
+        x += width
+    return cells
+
+
+def digit_rect(text, position):
+    x, width = wheel_cells(text)[wheel_positions(text)[position]]
+    return x, value_y() - TITLE_HEIGHT // 2, width, TITLE_HEIGHT
+
+
+def draw_wheel(control, value, position=None):
+    # The whole wheel, or only the character at one cursor position
+    text = wheel_text(control, value)
+    cells = wheel_cells(text)
+    positions = wheel_positions(text)
+    cursor = positions[state['digit']]
+    only = None if position is None else positions[position]
+    y = value_y()
+    for i, char in enumerate(text):
+        if only is not None and i != only:
+            continue
+        x, width = cells[i]
+        display.set_pen(GREY if value == '' else BLACK)
+        display.text(char, x + (width - glyph_width(char)) // 2, y, WIDTH, TITLE_TEXT_SIZE)
+        if i == cursor:
+            display.set_pen(BLACK)
+            display.rectangle(x + 2, y + TITLE_HEIGHT // 2 - 3, width - 4, 3) # cursor under the digit
+    display.set_pen(BLACK)
+
+
+def in_range(control, value):
+    # Whether a numeric answer is within the range of its control (unanswered is)
+    if value == '' or control['type'] != 'inputNumeric' or 'range' not in control:
+        return True
+    limits = control['range']
+    number = float(value)
+    if limits['min'] != '':
+        minimum = float(limits['min'])
+        if number < minimum or (number == minimum and limits['minInclusive'] != True):
+            return False
+    if limits['max'] != '':
+        maximum = float(limits['max'])
+        if number > maximum or (number == maximum and limits['maxInclusive'] != True):
+            return False
+    return True
+
+
+def label_wraps(control):
+    wraps = label_wrapping.get(state['current'])
+    if wraps is None:
+        indent = 10 if control['required'] else 0
+        wraps = label_wrapping[state['current']] = indent + display.measure_text(control['label'], TITLE_TEXT_SIZE) > WIDTH - SCROLLBAR_WIDTH - 2
+    return wraps
+
+
+def draw_label(control):
+    display.set_pen(BLACK)
+    width = WIDTH - SCROLLBAR_WIDTH - 2
+    x = 0
+    y = TITLE_HEIGHT // 2
+    
+    if control['required']: # asterisk icon to indicate required controls (sans font's asterisk looks lowsy...)
+        x += 10
+        draw_asterisk(0,y-4)
+    
+    display.text(control['label'], x, y, width, TITLE_TEXT_SIZE)
+    display.line(0, y + TITLE_HEIGHT // 2 - 1, width, y + TITLE_HEIGHT // 2 - 1)
+
+
 def show_current_control():
     global state
     
     current = state['current']
     control = controls[current]
     type = control['type']
-    label = control['label']['0']
     value = state['values'][current] # value of the current control
     
     width = WIDTH - SCROLLBAR_WIDTH - 2
-    x = 0
     y = TITLE_HEIGHT // 2
     
-    if control['required']: # asterisk icon to indicate required controls (sans font's asterisk looks lowsy...)
-        x += 10
-        draw_asterisk(0,y-4)
-    
-    display.text(label, x, y, width, TITLE_TEXT_SIZE)
-    display.line(0, y + TITLE_HEIGHT // 2 - 1, width, y + TITLE_HEIGHT // 2 - 1)
+    draw_label(control)
     y += TITLE_HEIGHT
 
-    if type == 'inputNumeric' and control['kind'] == 'Integer':
-        display.text(value, WIDTH // 2 - (display.measure_text(value, TITLE_TEXT_SIZE) // 2), y + (CONTROL_HEIGHT - TITLE_HEIGHT) // 2, WIDTH, TITLE_TEXT_SIZE)
-        
-        draw_menu("-", "x"+str(state['magnitude']), "+")
-        state['button_A'] = 'decrement'
-        state['button_B'] = 'change_magnitude'
-        state['button_C'] = 'increment'
+    menu = control_menu(control)
+
+    if type == 'inputNumeric' and not control['readOnly']:
+        draw_wheel(control, value)
         
     elif type == 'inputSelectOne' or type == 'inputSelectMany':
-        options = [option['text']['0'] for option in control['options']]
-        values = [option['val'] for option in control['options']]
-        
-        if type == 'inputSelectMany':
-            # select-multi
-            selected = list(map(lambda val: val in value.split(), values)) # convert space separated select-multi value into array to match against
-            if control['appearance'] == 'Horizontal Layout': # option labels contain the icon filenames to display
-                draw_pic_options(options, selected, state['selection'], 0, y, width + SCROLLBAR_WIDTH, CONTROL_HEIGHT, 64) # add SCROLLBAR_WIDTH to center middle icon over B button
-            else:
-                draw_options(options, selected, state['selection'], 0, y, width, CONTROL_HEIGHT, OPTION_HEIGHT, True)
+        options = control['options']
+        selected = selected_options(control, value)
+        multiselect = type == 'inputSelectMany'
+        if control.get('appearance') == 'Horizontal Layout': # option labels contain the icon filenames to display
+            draw_pic_options(options, selected, state['selection'], 0, y, width + SCROLLBAR_WIDTH, CONTROL_HEIGHT, 64) # add SCROLLBAR_WIDTH to center middle icon over B button
         else:
-            # select-one
-            selected = list(map(lambda val: val == value, values)) # select-one only has one single value
-            if control['appearance'] == 'Horizontal Layout': # option labels contain the icon filenames to display
-                draw_pic_options(options, selected, state['selection'], 0, y, width + SCROLLBAR_WIDTH, CONTROL_HEIGHT, 64) # add SCROLLBAR_WIDTH to center middle icon over B button
-            else:
-                draw_options(options, selected, state['selection'], 0, y, width, CONTROL_HEIGHT, OPTION_HEIGHT, False)
-        
-        draw_menu("Prev", "Select", "Next")
-        state['button_A'] = 'previous_option'
-        state['button_B'] = 'select_option'
-        state['button_C'] = 'next_option'
+            draw_options(options, selected, state['selection'], 0, y, width, CONTROL_HEIGHT, OPTION_HEIGHT, multiselect)
                 
-    elif type == 'inputText' and control['readOnly'] == False:
-        display.text(value, WIDTH // 2 - (display.measure_text(value, TITLE_TEXT_SIZE) // 2), y + (CONTROL_HEIGHT - TITLE_HEIGHT) // 2, WIDTH, TITLE_TEXT_SIZE)
-        
-        draw_menu("<", CHARS[state['char_index']], ">")
-        state['button_A'] = 'previous_char'
-        state['button_B'] = 'select_char'
-        state['button_C'] = 'next_char'
+    elif type == 'inputText' or type == 'inputNumeric':
+        draw_value(value) # text, and the value of a read-only numeric control; notes usually have none
 
-    #elif type == 'inputText' and control['readOnly'] == True: # TODO: note
-    #elif type == 'inputNumeric' and control['kind'] == 'Decimal': # TODO: decimal
+    if menu is not None:
+        labels, actions = menu
+        draw_menu(*labels)
+        state['button_A'], state['button_B'], state['button_C'] = actions
+    else:
+        draw_menu(None, None, None) # a note: only Up and Down do anything
+        state['button_A'] = state['button_B'] = state['button_C'] = None
 
     draw_scrollbar(state['current'], len(controls))
 
+
+def redraw_dirty():
+    # Redraws the parts of the current control listed in `dirty` and returns the rectangle
+    # around them, grown to the 8 pixel bands the panel is updated in. Returns None when the
+    # whole screen has to be redrawn instead.
+    current = state['current']
+    control = controls[current]
+    value = state['values'][current]
+    width = WIDTH - SCROLLBAR_WIDTH - 2
+    y = TITLE_HEIGHT // 2 + TITLE_HEIGHT # top of the control area, as in show_current_control()
+
+    wheel = control['type'] == 'inputNumeric' and not control['readOnly']
+    if ('value', None) in dirty and not wheel and display.measure_text(value, TITLE_TEXT_SIZE) > width:
+        return None # a long value wraps over other parts of the screen
+
+    # A label that wraps to a second line runs into the first row of options, so it is drawn
+    # again when they are, and then all of that row has to be redrawn over it
+    wraps = label_wraps(control)
+    parts = []
+    if control['type'] in ('inputSelectOne', 'inputSelectMany'):
+        columns, options_per_page, positions = option_layout(control['options'], width, CONTROL_HEIGHT, OPTION_HEIGHT)
+        start = (state['selection'] // options_per_page) * options_per_page
+        indexes = [index for part, index in dirty if part == 'option']
+        if wraps and indexes:
+            for i in range(len(positions)):
+                if positions[i][1] == 0 and start + i < len(control['options']) and start + i not in indexes:
+                    indexes.append(start + i)
+        for index in indexes:
+            if index < start or index >= start + len(positions):
+                continue # not on the page shown
+            item_x, item_y = positions[index - start]
+            parts.append(('option', index, (item_x, item_y + y - (OPTION_HEIGHT // 2), width // columns, OPTION_HEIGHT)))
+    if ('value', None) in dirty:
+        parts.append(('value', None, (0, value_y() - TITLE_HEIGHT, WIDTH - SCROLLBAR_WIDTH, TITLE_HEIGHT * 2)))
+    elif wheel:
+        text = wheel_text(control, value)
+        for part, index in dirty:
+            if part == 'digit':
+                parts.append(('digit', index, digit_rect(text, index)))
+    if ('menu', None) in dirty:
+        parts.append(('menu', None, (0, HEIGHT - MENU_HEIGHT, width, MENU_HEIGHT)))
+    if not parts:
+        return 0, 0, 0, 0 # nothing visible changed
+
+    # Clear them all, then draw in the same order as show_current_control()
+    display.set_pen(WHITE)
+    for _, _, rect in parts:
+        display.rectangle(*rect)
+    if wraps:
+        draw_label(control)
+
+    x0, y0, x1, y1 = WIDTH, HEIGHT, 0, 0
+    for part, index, rect in parts:
+        if part == 'option':
+            draw_option(control['options'][index], selected_options(control, value)[index], index == state['selection'],
+                        (rect[0], rect[1] - y + (OPTION_HEIGHT // 2)), 0, y, rect[2], OPTION_HEIGHT, control['type'] == 'inputSelectMany')
+        elif part == 'value' and wheel:
+            draw_wheel(control, value)
+        elif part == 'value':
+            display.set_pen(BLACK)
+            draw_value(value)
+        elif part == 'digit':
+            draw_wheel(control, value, index)
+        else:
+            draw_menu(*control_menu(control)[0])
+        x0 = min(x0, rect[0])
+        y0 = min(y0, rect[1])
+        x1 = max(x1, rect[0] + rect[2])
+        y1 = max(y1, rect[1] + rect[3])
+
+    display.set_pen(BLACK)
+    y0 = max(0, y0 // 8 * 8)
+    y1 = min(HEIGHT, -(-y1 // 8) * 8)
+    return x0, y0, x1 - x0, y1 - y0
+
+def compose_screen():
+    # Draw the whole current page into the framebuffer, without updating the panel
+    display.set_pen(WHITE)
+    display.clear()
+    display.set_pen(BLACK)
+
+    if state['at_start']:
+        show_start_page()
+    elif state['at_end']:
+        show_end_page()
+    else:
+        show_current_control()
+
 # ------------------------------
 #       Main
 # ------------------------------
@@ -849,6 +1092,9 @@ while True:
         display.keepalive()
 
         if badger2040.woken_by_button() or display.pressed_any():
+            # The question and answer before the buttons are handled, to see if the answer changed
+            asked = None if state['at_start'] or state['at_end'] else (state['current'], state['values'][state['current']])
+
             if display.pressed(badger2040.BUTTON_UP):
                 show_previous()
             elif display.pressed(badger2040.BUTTON_DOWN):
@@ -876,27 +1122,37 @@ while True:
                 handler = state['button_C']
                 if handler is not None:
                     locals()[handler]()
+
+            # Re-evaluate only the relevance and calculated values that depend on a changed answer
+            if asked is not None and state['values'] and state['values'][asked[0]] != asked[1]:
+                logic.changed(state['values'], asked[0])
         
 
             
         badger2040.reset_pressed_to_wake()
         
+        region = None
+        if dirty and not composed and not needs_refresh:
+            # Right after waking (on battery, every press) the framebuffer is empty but the panel
+            # still shows the page as it was: draw it all again without an update, so only the
+            # changed parts below are pushed
+            compose_screen()
+            composed = True
+        if dirty and not needs_refresh:
+            region = redraw_dirty()
+            if region is None:
+                needs_refresh = True
+            elif region[2] > 0:
+                display.partial_update(*region)
+        dirty = []
+
         if needs_refresh:
-            display.set_pen(WHITE)
-            display.clear()
-            display.set_pen(BLACK)
-    
-            if state['at_start']:
-                show_start_page()
-            elif state['at_end']:
-                show_end_page()
-            else:
-                show_current_control()
-                
-        display.update()
+            compose_screen()
+            display.update()
+            composed = True
         display.set_update_speed(badger2040.UPDATE_TURBO)
 
-        badger_os.state_save("form", state)
+        journal.save(state) # appends only what changed, if anything
         print("state:", state)
         needs_refresh = False
         
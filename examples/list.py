@@ -1,7 +1,7 @@
 import binascii
 
 import badger2040
-import badger_os
+from state_journal import StateJournal
 
 # **** Put your list title here *****
 list_title = "Checklist"
@@ -52,7 +52,7 @@ try:
             list_items.append(item)
         state["items_hash"] = binascii.crc32("\n".join(list_items))
 
-        badger_os.state_save("list", state)
+        StateJournal("list").compact(state)
         save_checklist = True
     else:
         list_items = [item.strip() for item in raw_list_items.strip().split("\n")]
@@ -165,7 +165,8 @@ changed = True
 state = {
     "current_item": 0,
 }
-badger_os.state_load("list", state)
+journal = StateJournal("list")
+journal.load(state)
 items_hash = binascii.crc32("\n".join(list_items))
 if "items_hash" not in state or state["items_hash"] != items_hash:
     # Item list changed, or not yet written reset the list
@@ -245,7 +246,7 @@ while True:
                 changed = True
 
     if changed:
-        badger_os.state_save("list", state)
+        journal.save(state)
 
         display.set_pen(15)
         display.clear()
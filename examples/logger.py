@@ -6,11 +6,18 @@ import badger2040
 from badger2040 import WIDTH, HEIGHT
 import os
 from pcf85063a import PCF85063A
+from decimate import LTTB
+from ring_log import RingLog, import_csv, export_csv
+from tail import reverse_lines
 
 # ==== CONFIGURATION ====
 csv_file_path = "data/logged_data.csv"
+log_file_path = "data/logged_data.bin"
+log_format = "ring"  # "ring": fixed size binary log (lib/ring_log.py), "csv": append to csv_file_path
+LOG_CAPACITY = 17520  # samples kept in the ring log, a year at LOG_INTERVAL = 1800
 LOG_INTERVAL = 1800  # seconds between measurements
 y_scale = 100
+history_points = 50  # entries read back for the chart
 
 # ==== INIT HARDWARE ====
 display = badger2040.Badger2040()
@@ -26,6 +33,21 @@ except OSError as e:
     if e.args[0] != 17:
         raise
 
+def file_exists(path):
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        return False
+
+ring_log = None
+if log_format == "ring":
+    migrate = not file_exists(log_file_path) and file_exists(csv_file_path)
+    ring_log = RingLog(log_file_path, LOG_CAPACITY)
+    if migrate:
+        # Carry the readings of an existing text log over to the new binary log
+        print("Imported", import_csv(csv_file_path, ring_log), "rows from", csv_file_path)
+
 # ==== FUNCTIONS ====
 
 def clear():
@@ -42,35 +64,79 @@ def clear():
     display.set_pen(15)
     display.text("Temp/Humidity Logger", 10, 1, WIDTH, 0.6)
 
-def get_iso_timestamp():
-    now = rtc.datetime()
+def get_iso_timestamp(now=None):
+    if now is None:
+        now = rtc.datetime()
     return "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}".format(*now[:6])
 
-def read_last_n_entries_from_csv(n=50):
-    ts, temps, hums = [], [], []
+def newest_readings_from_csv(n):
+    # Read backwards from the end of the file, so this takes as long for a year of
+    # readings as for a day
+    count = 0
     try:
-        with open(csv_file_path, "r") as f:
-            lines = f.readlines()[-n:]
+        lines = reverse_lines(csv_file_path)
+        try:
             for line in lines:
                 parts = line.strip().split(',')
-                if len(parts) == 3:
-                    try:
-                        tstamp, temp, hum = parts
-                        ts.append(tstamp)
-                        temps.append(float(temp))
-                        hums.append(float(hum))
-                    except ValueError:
-                        continue
+                if len(parts) != 3:
+                    continue
+                try:
+                    temp, hum = float(parts[1]), float(parts[2])
+                except ValueError:
+                    continue
+                yield temp, hum
+                count += 1
+                if count == n:
+                    break
+        finally:
+            lines.close()  # closes the file now rather than when the generator is collected
     except OSError as e:
         if e.args[0] != 2:
             raise
-    return ts, temps, hums
+
+def newest_readings(n):
+    # (temperature, humidity) of the last n readings, newest first, streamed from the log
+    if ring_log is None:
+        return newest_readings_from_csv(n)
+    return ((temp, hum) for _, temp, hum in ring_log.reverse_records(n))
+
+def chart_series(n, width):
+    # The last n readings as at most width bars, oldest first, plus their averages. Longer
+    # histories go through LTTB one reading at a time (x is the age of a reading, so the
+    # newest-first stream is in ascending x), never holding more than width of them.
+    count = 0
+    sum_temp = sum_hum = 0.0
+    temps, hums = [], []
+    for temp, hum in newest_readings(n):
+        count += 1
+        sum_temp += temp
+        sum_hum += hum
+        if count <= width:
+            temps.append(temp)
+            hums.append(hum)
+    if count == 0:
+        return temps, hums, None, None
+    if count > width:
+        temps = LTTB(0, count - 1, width)
+        hums = LTTB(0, count - 1, width)
+        for age, (temp, hum) in enumerate(newest_readings(count)):
+            temps.add_average(age, temp)
+            hums.add_average(age, hum)
+        for age, (temp, hum) in enumerate(newest_readings(count)):
+            temps.add(age, temp)
+            hums.add(age, hum)
+        temps = list(temps.points()[1])
+        hums = list(hums.points()[1])
+    temps.reverse()
+    hums.reverse()
+    return temps, hums, sum_temp / count, sum_hum / count
 
 # ==== CHART AREA ====
 chart_width = 200
 chart_height = 80
 chart_origin_x = int(0.5 * (WIDTH - chart_width))
 chart_origin_y = int(0.5 * (HEIGHT - chart_height))
+max_bars = chart_width // 2  # a bar pair needs at least 2 px, longer histories are decimated
 legend_origin_x = chart_origin_x + chart_width + 20
 legend_origin_y = chart_origin_y
 
@@ -80,14 +146,18 @@ try:
         # === Read sensor ===
         temperature = sensor.temperature
         humidity = sensor.relative_humidity
-        timestamp = get_iso_timestamp()
+        now = rtc.datetime()
+        timestamp = get_iso_timestamp(now)
 
         # === Log to file ===
-        with open(csv_file_path, "a") as f:
-            f.write(f"{timestamp}, {temperature:.2f}, {humidity:.2f}\n")
+        if ring_log is not None:
+            ring_log.append(now, temperature, humidity)
+        else:
+            with open(csv_file_path, "a") as f:
+                f.write(f"{timestamp}, {temperature:.2f}, {humidity:.2f}\n")
 
         # === Read data ===
-        _, temperature_values, humidity_values = read_last_n_entries_from_csv()
+        temperature_values, humidity_values, avg_temp, avg_hum = chart_series(history_points, max_bars)
         num_points = len(temperature_values)
 
         # === Handle y_scale button ===
@@ -96,6 +166,11 @@ try:
             print("Changed y_scale to:", y_scale)
             utime.sleep_ms(200)
 
+        # === Export the ring log as CSV (same format as the text log) ===
+        if ring_log is not None and display.pressed(badger2040.BUTTON_C):
+            export_csv(ring_log, csv_file_path)
+            print("Exported", len(ring_log), "rows to", csv_file_path)
+
         # === Full clear and redraw ===
         display.set_update_speed(badger2040.UPDATE_NORMAL)
         display.set_pen(15)
@@ -147,10 +222,7 @@ try:
                                   int(bar_unit // 2), hum_height)
 
         # === Summary stats ===
-        if temperature_values:
-            avg_temp = sum(temperature_values) / len(temperature_values)
-            avg_hum = sum(humidity_values) / len(humidity_values)
-
+        if num_points > 0:
             # White text over black bars
             display.set_pen(15)
             display.text(f"Now: {temperature:.1f}°C | {humidity:.1f}%RH", 170, 1, WIDTH, 0.6)
@@ -3,16 +3,14 @@ from badger2040 import WIDTH
 import machine
 from urllib import urequest
 import gc
-import qrcode
 import badger_os
+from qr_render import draw_qr
 
 # URLS to use (Entertainment, Science and Technology)
 URL = ["http://feeds.bbci.co.uk/news/entertainment_and_arts/rss.xml",
        "http://feeds.bbci.co.uk/news/science_and_environment/rss.xml",
        "http://feeds.bbci.co.uk/news/technology/rss.xml"]
 
-code = qrcode.QRCode()
-
 state = {
     "current_page": 0,
     "feed": 2
@@ -103,23 +101,6 @@ def parse_xml_stream(s, accept_tags, group_by, max_items=3):
             text += char
 
 
-def measure_qr_code(size, code):
-    w, h = code.get_size()
-    module_size = int(size / w)
-    return module_size * w, module_size
-
-
-def draw_qr_code(ox, oy, size, code):
-    size, module_size = measure_qr_code(size, code)
-    display.set_pen(15)
-    display.rectangle(ox, oy, size, size)
-    display.set_pen(0)
-    for x in range(size):
-        for y in range(size):
-            if code.get_module(x, y):
-                display.rectangle(ox + x * module_size, oy + y * module_size, module_size, module_size)
-
-
 # A function to get the data from an RSS Feed, this in case BBC News.
 def get_rss(url):
     try:
@@ -162,8 +143,7 @@ def draw_page():
         page = state["current_page"]
         display.set_pen(0)
         display.text(feed[page]["title"], 2, 30, WIDTH - 130, 2)
-        code.set_text(feed[page]["guid"])
-        draw_qr_code(WIDTH - 100, 25, 100, code)
+        draw_qr(display, feed[page]["guid"], WIDTH - 100, 25, 100)
 
     else:
         display.set_pen(0)
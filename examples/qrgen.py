@@ -1,8 +1,8 @@
 import badger2040
-import qrcode
 import time
 import os
 import badger_os
+from qr_render import measure_qr, draw_qr
 
 # Check that the qrcodes directory exists, if not, make it
 try:
@@ -55,30 +55,11 @@ for codename in CODES:
 
 display = badger2040.Badger2040()
 
-code = qrcode.QRCode()
-
 state = {
     "current_qr": 0
 }
 
 
-def measure_qr_code(size, code):
-    w, h = code.get_size()
-    module_size = int(size / w)
-    return module_size * w, module_size
-
-
-def draw_qr_code(ox, oy, size, code):
-    size, module_size = measure_qr_code(size, code)
-    display.set_pen(15)
-    display.rectangle(ox, oy, size, size)
-    display.set_pen(0)
-    for x in range(size):
-        for y in range(size):
-            if code.get_module(x, y):
-                display.rectangle(ox + x * module_size, oy + y * module_size, module_size, module_size)
-
-
 def draw_qr_file(n):
     display.led(128)
     file = CODES[n]
@@ -94,10 +75,9 @@ def draw_qr_file(n):
     display.clear()
     display.set_pen(0)
 
-    code.set_text(code_text)
-    size, _ = measure_qr_code(128, code)
+    size, _ = measure_qr(code_text, 128)
     left = top = int((badger2040.HEIGHT / 2) - (size / 2))
-    draw_qr_code(left, top, 128, code)
+    draw_qr(display, code_text, left, top, 128)
 
     left = 128 + 5
 
@@ -1,10 +1,10 @@
-import urequests
-import binascii
 import network
 import os
-import uos
 import time
 import badger2040
+from submission_index import SubmissionIndex, import_existing, SENT, EXPORTED
+from odk_uploader import Uploader
+from batch_export import write_bundle, pending_instances, export_path
 
 # Initialize the Badger eINK display
 display = badger2040.Badger2040()
@@ -15,7 +15,7 @@ display.set_update_speed(2)
 WIDTH = 250  # Width of the Badger2040 display
 HEIGHT = 122  # Height of the Badger2040 display
 
-# Your existing functions (connect_to_wifi, base64_encode, submit_submission, log_submission, walk, load_submitted_files, submit_xml_files_in_folder) go here...
+# Your existing functions (connect_to_wifi, log_submission, submit_xml_files_in_folder, export_batch) go here...
 
 def connect_to_wifi(ssid, password):
     # set up the screen with a black background and black pen
@@ -41,131 +41,72 @@ def connect_to_wifi(ssid, password):
     display.text('Network config:' + str(wlan.ifconfig()), 10, 60)
     display.update()
 
-def base64_encode(string):
-    # Encoding the string to bytes
-    encoded_bytes = string.encode('utf-8')
-
-    # Encoding bytes to base64
-    encoded_base64_bytes = binascii.b2a_base64(encoded_bytes)
-
-    # Decoding base64 bytes to string
-    encoded_base64_string = encoded_base64_bytes.decode('utf-8').strip()
-
-    return encoded_base64_string
-
-def submit_submission(file_path, url, username, password):
-    with open(file_path, 'r') as file:
-        xml_data = file.read()
-
-    encoded_credentials = base64_encode(username + ':' + password)
-
-    headers = {
-        'Content-Type': 'application/xml',
-        'Authorization': 'Basic ' + encoded_credentials
-    }
-
-    response = urequests.post(url, headers=headers, data=xml_data)
-
-    if response.status_code in (200, 201):
-    	display.set_pen(0)  # Change this to 0 if a white background is used
-    	display.clear()
-    	display.set_pen(15)    	
-        display.text('Submission successful', 10, 60)
-        display.update()
-        log_submission(file_path, success=True, response_text=response.text)
-    else:
-    	display.set_pen(0)  # Change this to 0 if a white background is used
-    	display.clear()
-    	display.set_pen(15)    	
-        display.text('Submission failed: ' + str(response.status_code), 10, 40)
-        display.text('Response: ' + response.text, 10, 60)
-        display.update()
-        log_submission(file_path, success=False, response_text=response.text)
-
 def log_submission(file_path, success, response_text):
+    # Human readable history only; what has been sent is kept in the submission index
     with open('log.txt', 'a') as log_file:
         status = 'Success' if success else 'Failure'
         log_entry = f"File: {file_path}, Status: {status}, Response: {response_text}\n"
         log_file.write(log_entry)
 
 
-def walk(directory):
-    file_paths = []
-    for entry in uos.listdir(directory):
-        entry_path = directory + '/' + entry
-        if uos.stat(entry_path)[0] & 0x4000:
-            file_paths.extend(walk(entry_path))
-        else:
-            file_paths.append(entry_path)
-    return file_paths
-
-
-def load_submitted_files():
-    submitted_files = set()
-    if 'log.txt' in uos.listdir():
-        print("Log file exists")
-        with open('log.txt', 'r') as log_file:
-            for line in log_file:
-                file_path, status, _ = line.strip().split(', ')
-                if status == 'Status: Success':  # Correct the status check
-                    # Extract the filename from the full file path
-                    filename = file_path.split('/')[-1]
-                    print("Adding filename to submitted files:", filename)
-                    submitted_files.add(filename)
-                else:
-                    print("Skipping file:", file_path, "with status:", status)
-    else:
-        print("Log file does not exist")
-    print("Submitted files:", submitted_files)
-    return submitted_files
-
-def count_unique_uuids(log_file_path):
-    unique_uuids = set()
-    if log_file_path in uos.listdir():
-        with open(log_file_path, 'r') as log_file:
-            for line in log_file:
-                file_path, _, response = line.strip().split(', ')
-                uuid = response.split('/')[-1]
-                unique_uuids.add(uuid)
-    return len(unique_uuids)
-
-def submit_xml_files_in_folder(folder_path, url, username, password):
-    # Load the set of submitted files from the log
-    submitted_files = load_submitted_files()
-
-    # Add a counter for successful submissions
-    successful_submissions = 0
-
-    file_paths = walk(folder_path)
-    for file_path in file_paths:
-        if file_path.endswith('.xml'):
-            # Extract the filename from the full file path
-            filename = file_path.split('/')[-1]
-            if filename not in submitted_files:
-                print('Submitting file:', file_path)
-
-                # Instead of printing, use the Badger eINK display to show the submission status.
-                display.set_pen(0)  # Change this to 0 if a white background is used
-                display.clear()
-                display.set_pen(15)
-                display.text('Submitting file:', 10, 40)
-                display.text(file_path, 10, 60)
-                display.update()
+def show_message(*lines):
+    display.set_pen(0)  # Change this to 0 if a white background is used
+    display.clear()
+    display.set_pen(15)
+    for i, line in enumerate(lines):
+        display.text(line, 10, 20 + 20 * i)
+    display.update()
 
-                submit_submission(file_path, url, username, password)
-                print('---')
 
-                # Update the log and counter only after a successful submission
-                if filename not in submitted_files:
-                    log_submission(file_path, success=True, response_text='')
-                    successful_submissions += 1
+def show_progress(sent, failed, pending):
+    display.set_pen(0)  # Change this to 0 if a white background is used
+    display.clear()
+    display.set_pen(15)
+    display.text('Submitting files...', 10, 20)
+    display.text('Sent: ' + str(sent) + ' of ' + str(pending), 10, 40)
+    if failed:
+        display.text('Failed: ' + str(failed), 10, 60)
+    display.update()
 
-                submitted_files.add(filename)  # Update the set with the filename
 
-    # Get the total number of unique UUID numbers in the log file
-    unique_uuid_count = count_unique_uuids('log.txt')
+def submit_xml_files_in_folder(folder_path, url, username, password):
+    # The index says which instances are still to send, so there is no need to list the
+    # folder or read log.txt; the first run builds it from both (see lib/submission_index.py)
+    index = SubmissionIndex(folder_path + '/index.bin')
+    if not index.exists():
+        print("Indexing", folder_path)
+        import_existing(index, folder_path, 'log.txt')
+
+    # What the uploader will go through: queued and failed instances, not exported ones
+    pending = sum(1 for _ in index.pending())
+    show_progress(0, 0, pending)
+
+    def path_for(uuid):
+        return folder_path + '/uuid' + uuid + '.xml'
+
+    def on_result(uuid, status, response_text):
+        success = status in (200, 201, 409)
+        print('Submitted', path_for(uuid), status)
+        log_submission(path_for(uuid), success, response_text)
+
+    # One keep-alive connection for the whole run, each answer recorded in the index as it
+    # arrives (so an interrupted run resumes at the next unsent instance) and the screen
+    # redrawn every 10 files or 30 seconds rather than around every file
+    uploader = Uploader(url, username, password)
+    start = time.time()
+    try:
+        successful_submissions, failed = uploader.upload(
+            index, path_for, on_result,
+            lambda sent, failed: show_progress(sent, failed, pending))
+    except OSError as e:
+        print('Upload stopped:', e)
+        successful_submissions = failed = 0
+    finally:
+        uploader.close()
+    print('Sent', successful_submissions, 'failed', failed, 'in', time.time() - start, 's')
 
     # Display the total number of successful submissions
+    _, total_sent = index.counts()
     display.set_pen(0)  # Change this to 0 if a white background is used
     display.clear()
     display.set_pen(15)
@@ -173,22 +114,87 @@ def submit_xml_files_in_folder(folder_path, url, username, password):
     display.text('Submissions Sent Now:', 10, 20)
     display.text(str(successful_submissions), 10, 40)
     display.text('Total Submissions :', 10, 60)
-    display.text(str(unique_uuid_count), 10, 80)
+    display.text(str(total_sent), 10, 80)
+    if failed:
+        display.text('Failed: ' + str(failed), 10, 100)
     display.update()
 
-    print("Submitted files:", submitted_files)
+
+def export_batch(folder_path, batch_url, username, password, csv_path=None):
+    # Pack all pending instances (or the submissions CSV when csv_path is given) into one
+    # compressed bundle (see lib/batch_export.py) and send it to batch_url in one request,
+    # or leave it in exports/ for USB pickup when batch_url is None. host/unpack_bundle.py
+    # turns the bundle back into instance files for Central.
+    index = SubmissionIndex(folder_path + '/index.bin')
+    if not index.exists():
+        print("Indexing", folder_path)
+        import_existing(index, folder_path, 'log.txt')
+
+    if csv_path:
+        instances = []
+        files = [('submissions.csv', csv_path)]
+    else:
+        instances = pending_instances(index, folder_path)
+        files = [(name, path) for _, name, path in instances]
+    if not files:
+        show_message('Nothing to export')
+        return
+
+    show_message('Packing ' + str(len(files)) + ' files...')
+    if batch_url is None:
+        bundle = export_path('{:04d}{:02d}{:02d}-{:02d}{:02d}{:02d}'.format(*time.localtime()[:6]))
+    else:
+        bundle = export_path('outgoing')  # never one waiting for USB pickup
+    size = write_bundle(bundle, files)
+    print('Packed', len(files), 'files into', bundle, size, 'bytes')
+
+    if batch_url is None:
+        for uuid, _, _ in instances:
+            index.record(uuid, EXPORTED)
+        show_message('Exported ' + str(len(files)) + ' files to', bundle, str(size) + ' bytes')
+        return
+
+    show_message('Sending ' + str(len(files)) + ' files...', str(size) + ' bytes')
+    uploader = Uploader(batch_url, username, password, content_type='application/octet-stream')
+    try:
+        status, response_text = uploader.post(bundle)
+    except OSError as e:
+        status, response_text = None, str(e)
+    finally:
+        uploader.close()
+    success = status in (200, 201)
+    log_submission(bundle, success, response_text)
+    os.remove(bundle)  # the instances stay pending if it failed, and go in the next bundle
+
+    if success:
+        for uuid, _, _ in instances:
+            index.record(uuid, SENT)
+        show_message('Batch sent:', str(len(files)) + ' files')
+    else:
+        show_message('Batch failed: ' + str(status), response_text)
 
 
 ##########################
 # MAIN
 ##########################
 
-print("Connecting to Wi-Fi...")
-connect_to_wifi('YOURNETWORKSSID', 'YOURNETWORKPASSWORD")
-
 folder_path = 'instances'  # Update with the actual folder path
 url = 'https://YOURCENTRALURL/v1/projects/YOURPROJECTID/forms/YOURFORMNAME/submissions'
-username = 'YOURCENTRALUSERNAME"
+username = 'YOURCENTRALUSERNAME'
 password = 'YOURCENTRALPASSWORD'
 
-submit_xml_files_in_folder(folder_path, url, username, password)
+# 'upload' sends each instance to Central, 'batch' sends them all as one bundle to batch_url
+# (a machine running host/unpack_bundle.py --serve) and 'usb' writes the bundle to exports/
+mode = 'upload'
+batch_url = 'http://YOURBATCHHOST:8384/bundles'
+export_csv = False  # True bundles /forms/submissions.csv instead of the instances
+
+if mode == 'usb':
+    export_batch(folder_path, None, username, password, '/forms/submissions.csv' if export_csv else None)
+else:
+    print("Connecting to Wi-Fi...")
+    connect_to_wifi('YOURNETWORKSSID', 'YOURNETWORKPASSWORD')
+    if mode == 'batch':
+        export_batch(folder_path, batch_url, username, password, '/forms/submissions.csv' if export_csv else None)
+    else:
+        submit_xml_files_in_folder(folder_path, url, username, password)
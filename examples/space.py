@@ -3,8 +3,9 @@
 
 import badger2040
 from badger2040 import WIDTH
-import urequests
+from fetch_cache import FetchCache, read_json, read_text
 import jpegdec
+from icon_cache import draw_icon
 import machine
 
 rtc = machine.RTC()
@@ -31,14 +32,15 @@ display.set_update_speed(2)
 
 jpeg = jpegdec.JPEG(display.display)
 
+# The last forecast and solar data stay on flash between wakes, so an unchanged feed is not
+# downloaded again
+fetch_cache = FetchCache()
 
 
 def get_data():
     global weathercode, temperature, windspeed, winddirection, date, time, day_weathercode, apparent_temperature_max, apparent_temperature_min, sunrise, sunset, precipitation_sum, precipitation_probability_max, winddirection_10m_dominant
     print(f"Requesting URL: {URL}")
-    r = urequests.get(URL)
-    # open the json data
-    j = r.json()
+    j = fetch_cache.get(URL, read_json)
     print("Data obtained!")
     print(j)
 
@@ -66,7 +68,6 @@ def get_data():
     precipitation_probability_max =    daily["precipitation_probability_max"]
     winddirection_10m_dominant =     daily["winddirection_10m_dominant"]
     winddirection_10m_dominant = calculate_bearing(winddirection_10m_dominant[1])
-    r.close()
 
 
 def get_solar_weather():
@@ -85,13 +86,14 @@ def get_solar_weather():
 
     jpeg = jpegdec.JPEG(display.display)
 
-    # Make a GET request to the URL using urequests
-    response = urequests.get(solar_url)
+    # Get the content as a string, from the cache while hamqsl.com has nothing new
+    try:
+        xml_content = fetch_cache.get(solar_url, read_text)
+    except OSError as e:
+        xml_content = None
+        print("Error:", e)
 
-    # Check if the request was successful
-    if response.status_code == 200:
-        # Get the content as a string
-        xml_content = response.content.decode('utf-8')
+    if xml_content is not None:
 
         # Manually extract data
         source = extract_element(xml_content, "source")
@@ -157,8 +159,6 @@ def get_solar_weather():
             print(line)
         
 
-    else:
-        print("Error:", response.status_code)
 
 # define function to extract elements of xml data
 def extract_element(content, element_name):
@@ -213,17 +213,19 @@ def draw_page():
         # Choose an appropriate icon based on the weather code
         # Weather codes from https://open-meteo.com/en/docs
         # Weather icons from https://fontawesome.com/
+        icon = None
         if weathercode in [71, 73, 75, 77, 85, 86]:  # codes for snow
-            jpeg.open_file("/icons/icon-snow.jpg")
+            icon = "/icons/icon-snow.jpg"
         elif weathercode in [51, 53, 55, 56, 57, 61, 63, 65, 66, 67, 80, 81, 82]:  # codes for rain
-            jpeg.open_file("/icons/icon-rain.jpg")
+            icon = "/icons/icon-rain.jpg"
         elif weathercode in [1, 2, 3, 45, 48]:  # codes for cloud
-            jpeg.open_file("/icons/icon-cloud.jpg")
+            icon = "/icons/icon-cloud.jpg"
         elif weathercode in [0]:  # codes for sun
-            jpeg.open_file("/icons/icon-sun.jpg")
+            icon = "/icons/icon-sun.jpg"
         elif weathercode in [95, 96, 99]:  # codes for storm
-            jpeg.open_file("/icons/icon-storm.jpg")
-        jpeg.decode(260,5, jpegdec.JPEG_SCALE_HALF)
+            icon = "/icons/icon-storm.jpg"
+        if icon is not None:
+            draw_icon(display, jpeg, icon, 260, 5, jpegdec.JPEG_SCALE_HALF)
 
         # show current temperature, with highs and lows
         display.set_pen(0)
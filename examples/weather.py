@@ -6,8 +6,9 @@
 # Adds new method to prevent screenburn which inverts colours each time the screen refreshes
 import badger2040
 from badger2040 import WIDTH
-import urequests
+from fetch_cache import FetchCache, read_json
 import jpegdec
+from icon_cache import draw_icon
 import machine
 import random
 
@@ -35,14 +36,15 @@ display.set_update_speed(2)
 
 jpeg = jpegdec.JPEG(display.display)
 
+# The last forecasts stay on flash between wakes, so an unchanged feed is not downloaded again
+fetch_cache = FetchCache()
+
 
 
 def get_data():
     global weathercode, temperature, windspeed, winddirection, date, time, day_weathercode, apparent_temperature_max, apparent_temperature_min, sunrise, sunset, precipitation_sum, precipitation_probability_max, winddirection_10m_dominant
     print(f"Requesting URL: {URL}")
-    r = urequests.get(URL)
-    # open the json data
-    j = r.json()
+    j = fetch_cache.get(URL, read_json)
     print("Data obtained!")
     print(j)
 
@@ -70,16 +72,12 @@ def get_data():
     precipitation_probability_max =    daily["precipitation_probability_max"]
     winddirection_10m_dominant =     daily["winddirection_10m_dominant"]
     winddirection_10m_dominant = calculate_bearing(winddirection_10m_dominant[1])
-    r.close()
 
 def get_data_airquality():
     global pm10, pm2_5, alder_pollen, uv_index, birch_pollen, grass_pollen, mugwort_pollen, olive_pollen, ragweed_pollen
 
     print(f"Requesting URL: {URL2}")
-    r2 = urequests.get(URL2)
-
-    # open the json data
-    j2 = r2.json()
+    j2 = fetch_cache.get(URL2, read_json)
     print("Airquality Data obtained!")
     print(j2)
 
@@ -104,8 +102,6 @@ def get_data_airquality():
 
     print(f"{uv_index} UVIndex ")
 
-    r2.close()
-
 
 def calculate_bearing(d):
     # calculates a compass direction from the wind direction in degrees
@@ -114,16 +110,33 @@ def calculate_bearing(d):
     return dirs[ix % len(dirs)]
 
 
+def weather_icon(code):
+    # Icon name for an open-meteo weather code (https://open-meteo.com/en/docs)
+    if code in [71, 73, 75, 77, 85, 86]:  # codes for snow
+        return "snow"
+    elif code in [51, 53, 55, 56, 57, 61, 63, 65, 66, 67, 80, 81, 82]:  # codes for rain
+        return "rain"
+    elif code in [1, 2, 3, 45, 48]:  # codes for cloud
+        return "cloud"
+    elif code in [0]:  # codes for sun
+        return "sun"
+    elif code in [95, 96, 99]:  # codes for storm
+        return "storm"
+    return None
+
+
+def draw_weather_icon(code, icon_prefix, x, y, scale):
+    name = weather_icon(code)
+    if name is not None:
+        draw_icon(display, jpeg, f"/icons/icon-{name}{icon_prefix}.jpg", x, y, scale)
+
+
 def draw_page(text_color, background_color):
     
     # Define the icon file names based on the text color for simplicity
     # Assuming white text (15) uses dark icons and black text (0) uses light icons
     icon_prefix = "_dark" if text_color == 15 else ""
-    icon_snow = f"/icons/icon-snow{icon_prefix}.jpg"
     icon_rain = f"/icons/icon-rain{icon_prefix}.jpg"
-    icon_cloud = f"/icons/icon-cloud{icon_prefix}.jpg"
-    icon_sun = f"/icons/icon-sun{icon_prefix}.jpg"
-    icon_storm = f"/icons/icon-storm{icon_prefix}.jpg"
     
     # Clear the display with the background color
     display.set_pen(background_color)
@@ -142,19 +155,8 @@ def draw_page(text_color, background_color):
         # Choose an appropriate icon based on the weather code
         # Weather codes from https://open-meteo.com/en/docs
         # Weather icons from https://fontawesome.com/
-        if weathercode in [71, 73, 75, 77, 85, 86]:  # codes for snow
-            jpeg.open_file(icon_snow)
-        elif weathercode in [51, 53, 55, 56, 57, 61, 63, 65, 66, 67, 80, 81, 82]:  # codes for rain
-            jpeg.open_file(icon_rain)
-        elif weathercode in [1, 2, 3, 45, 48]:  # codes for cloud
-            jpeg.open_file(icon_cloud)
-        elif weathercode in [0]:  # codes for sun
-            jpeg.open_file(icon_sun)
-        elif weathercode in [95, 96, 99]:  # codes for storm
-            jpeg.open_file(icon_storm)
-            
         try:
-            jpeg.decode(10,30, jpegdec.JPEG_SCALE_FULL)
+            draw_weather_icon(weathercode, icon_prefix, 10, 30, jpegdec.JPEG_SCALE_FULL)
         except Exception as e:
             print("Error opening or decoding JPEG:", e)
 
@@ -164,8 +166,7 @@ def draw_page(text_color, background_color):
         display.text(f"{apparent_temperature_min[1]}°C, {apparent_temperature_max[1]}°C", 20, 115, WIDTH - 50, 1)
 
         # show prob and amount of rain today
-        jpeg.open_file(icon_rain)
-        jpeg.decode(100,20, jpegdec.JPEG_SCALE_HALF)
+        draw_icon(display, jpeg, icon_rain, 100, 20, jpegdec.JPEG_SCALE_HALF)
         display.set_pen(text_color)
         display.text(f"{precipitation_probability_max[1]}% ", 135, 25, WIDTH - 105, 2)
         display.text(f"{precipitation_sum[1]} mm ", 135, 45, WIDTH - 105, 1)
@@ -183,35 +184,15 @@ def draw_page(text_color, background_color):
 # Show tomorrow's weather
         print("Daily weathercodes")
         print(day_weathercode)
-        if day_weathercode[2] in [71, 73, 75, 77, 85, 86]:  # codes for snow
-            jpeg.open_file(icon_snow)
-        elif day_weathercode[2] in [51, 53, 55, 56, 57, 61, 63, 65, 66, 67, 80, 81, 82]:  # codes for rain
-            jpeg.open_file(icon_rain)
-        elif day_weathercode[2] in [1, 2, 3, 45, 48]:  # codes for cloud
-            jpeg.open_file(icon_cloud)
-        elif day_weathercode[2] in [0]:  # codes for sun
-            jpeg.open_file(icon_sun)
-        elif day_weathercode[2] in [95, 96, 99]:  # codes for storm
-            jpeg.open_file(icon_storm)
         display.set_pen(text_color)
         display.text("+1 Day", 160, 110, WIDTH - 105, 1.5)
-        jpeg.decode(190,90, jpegdec.JPEG_SCALE_HALF)
+        draw_weather_icon(day_weathercode[2], icon_prefix, 190, 90, jpegdec.JPEG_SCALE_HALF)
 
 # Show day after tomorrow's weather
 
-        if day_weathercode[3] in [71, 73, 75, 77, 85, 86]:  # codes for snow
-            jpeg.open_file(icon_snow)
-        elif day_weathercode[3] in [51, 53, 55, 56, 57, 61, 63, 65, 66, 67, 80, 81, 82]:  # codes for rain
-            jpeg.open_file(icon_rain)
-        elif day_weathercode[3] in [1, 2, 3, 45, 48]:  # codes for cloud
-            jpeg.open_file(icon_cloud)
-        elif day_weathercode[3] in [0]:  # codes for sun
-            jpeg.open_file(icon_sun)
-        elif day_weathercode[3] in [95, 96, 99]:  # codes for storm
-            jpeg.open_file(icon_storm)
         display.set_pen(text_color)
         display.text("+2 Day", 230, 110, WIDTH - 105, 1.5)
-        jpeg.decode(260,90, jpegdec.JPEG_SCALE_HALF)
+        draw_weather_icon(day_weathercode[3], icon_prefix, 260, 90, jpegdec.JPEG_SCALE_HALF)
 
 #        display.text(f"Wind Direction: {winddirection}", int(WIDTH / 3), 68, WIDTH - 105, 2)
         display.set_pen(text_color)
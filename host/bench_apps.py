@@ -0,0 +1,245 @@
+# -----------------------------------------------------------------------------------------------
+# bench_apps.py - draw-call and refresh-time benchmark for the example apps
+#
+# Description:
+#    Runs each app headless on the host emulator (see host/run_app.py) against the fixtures in
+#    host/emulator/fixtures with a fixed button script, and reports for each one:
+#
+#      * wall time for the whole run and the slowest screen to compose (best of N runs)
+#      * draw calls and measure_text calls, in total and for the busiest screen
+#      * peak Python heap while the app runs (tracemalloc, separate run)
+#      * estimated e-ink cost: updates, bytes pushed to the panel and refresh time
+#
+#    The results are written as JSON. Draw calls, measure_text calls and e-ink cost are
+#    deterministic, so any change against a saved baseline is a real change; heap is compared
+#    with a tolerance. Wall time varies from run to run by more than most changes move it, so
+#    it is only reported against the baseline, never counted as a regression.
+#
+# Usage:
+#    python3 host/bench_apps.py                          # print a table
+#    python3 host/bench_apps.py --out host/bench_apps_baseline.json
+#    python3 host/bench_apps.py --compare host/bench_apps_baseline.json
+#    python3 host/bench_apps.py form dash               # only some scenarios
+# -----------------------------------------------------------------------------------------------
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import run_app  # noqa: E402
+
+# Each scenario is one app run: the app, the presses (as for run_app.py --press), extra files
+# and emulator options. All of them use the shared fixtures.
+SCENARIOS = [
+    {
+        # start page, text, select one, select many, picture options, end page, saved page + QR
+        "name": "form",
+        "app": "examples/form.py",
+        "press": "B,C,B,DOWN,C,C,B,DOWN,B,DOWN,C,B,DOWN,B,DOWN,B,A",
+    },
+    {
+        # the same on battery: halt() powers off, so every press starts the app again
+        "name": "form_bat",
+        "app": "examples/form.py",
+        "press": "B,C,B,DOWN,C,C,B,DOWN,B,DOWN,C,B,DOWN,B,DOWN,B,A",
+        "options": {"battery": True},
+    },
+    {
+        "name": "heatmap",
+        "app": "Charts/heatmap.py",
+        "files": ["Charts/data.csv", "Charts/data2.csv"],
+    },
+    {
+        "name": "logger",
+        "app": "examples/logger.py",
+        "options": {"max_updates": 5},
+    },
+    {
+        "name": "dash",
+        "app": "examples/dash.py",
+        "options": {"max_updates": 3},
+    },
+    {
+        "name": "weather",
+        "app": "examples/weather.py",
+        "options": {"max_updates": 2},
+    },
+    {
+        "name": "ebook",
+        "app": "examples/ebook.py",
+        "press": "DOWN,DOWN,DOWN,UP",
+    },
+    {
+        "name": "list",
+        "app": "examples/list.py",
+        "press": "DOWN,B,DOWN,B,UP,A",
+    },
+]
+
+# Slack allowed before heap counts as a regression, and before wall time is reported as
+# slower: relative, plus an absolute floor so a run of a few ms does not trip on noise
+TOLERANCE = 0.25
+NOISE_FLOOR = 2.0
+
+# Metrics that do not depend on the host, compared exactly
+EXACT = ("updates", "full_updates", "partial_updates", "bytes", "estimated_ms", "draw_call_total",
+         "max_draw_calls", "measure_text", "max_measure_text")
+NOISY = ("peak_heap_kb",)
+# Host timings, informational only
+TIMING = ("wall_ms", "max_compose_ms")
+
+
+def run_once(scenario, trace=False):
+    files = list(scenario.get("files", [])) + list(run_app.FIXTURE_FILES)
+    root = run_app.make_root(files)
+    peak = [0]
+
+    def setup():
+        # Weather picks light/dark mode at random; keep runs comparable
+        random.seed(0)
+        if trace:
+            tracemalloc.start()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        summary, updates, reason = run_app.run_app(
+            os.path.join(run_app.REPO, scenario["app"]),
+            root=root,
+            presses=run_app.parse_presses(scenario.get("press", "")),
+            http=run_app.fixture_http(),
+            setup=setup,
+            **scenario.get("options", {})
+        )
+        wall = time.perf_counter() - start
+        if trace:
+            peak[0] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return summary, updates, reason, wall, peak[0]
+
+
+def bench(scenario, repeats):
+    best = None
+    for _ in range(repeats):
+        summary, updates, reason, wall, _ = run_once(scenario)
+        if best is None or wall < best[3]:
+            best = (summary, updates, reason, wall)
+    summary, updates, reason, wall = best
+    peak = run_once(scenario, trace=True)[4]
+
+    return {
+        "app": scenario["app"],
+        "stopped": reason,
+        "wall_ms": round(wall * 1000.0, 2),
+        "max_compose_ms": max([u["compose_ms"] for u in updates] or [0]),
+        "updates": summary["updates"],
+        "full_updates": summary["full_updates"],
+        "partial_updates": summary["partial_updates"],
+        "bytes": summary["bytes"],
+        "estimated_ms": summary["estimated_ms"],
+        "draw_call_total": summary["draw_call_total"],
+        "max_draw_calls": max([u["draw_call_total"] for u in updates] or [0]),
+        "draw_calls": summary["draw_calls"],
+        "measure_text": summary["measure_text"],
+        "max_measure_text": max([u["measure_text"] for u in updates] or [0]),
+        "peak_heap_kb": round(peak / 1024.0, 1),
+        "per_update": [
+            {k: u[k] for k in ("kind", "speed", "region", "bytes", "estimated_ms",
+                               "draw_call_total", "measure_text", "compose_ms")}
+            for u in updates
+        ],
+    }
+
+
+def _beyond_noise(old, new):
+    return new > old * (1 + TOLERANCE) + NOISE_FLOOR
+
+
+def compare(results, baseline):
+    # Returns a list of (scenario, metric, old, new) that got worse, and the same for the
+    # timings that were slower than the noise allows
+    worse = []
+    slower = []
+    for name, new in results.items():
+        old = baseline.get("scenarios", {}).get(name)
+        if old is None:
+            continue
+        for metric in EXACT:
+            if new[metric] > old.get(metric, new[metric]):
+                worse.append((name, metric, old[metric], new[metric]))
+        for metric in NOISY:
+            if metric in old and _beyond_noise(old[metric], new[metric]):
+                worse.append((name, metric, old[metric], new[metric]))
+        for metric in TIMING:
+            if metric in old and _beyond_noise(old[metric], new[metric]):
+                slower.append((name, metric, old[metric], new[metric]))
+    return worse, slower
+
+
+def print_table(results, baseline=None):
+    header = "{:9s} {:>9s} {:>9s} {:>7s} {:>8s} {:>9s} {:>6s} {:>8s} {:>9s} {:>9s}".format(
+        "app", "wall ms", "screen ms", "updates", "bytes", "e-ink ms", "draws", "max draw", "measure", "heap kB")
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print("{:9s} {:9.1f} {:9.1f} {:7d} {:8d} {:9.1f} {:6d} {:8d} {:9d} {:9.1f}".format(
+            name, r["wall_ms"], r["max_compose_ms"], r["updates"], r["bytes"], r["estimated_ms"],
+            r["draw_call_total"], r["max_draw_calls"], r["measure_text"], r["peak_heap_kb"]))
+        old = (baseline or {}).get("scenarios", {}).get(name)
+        if old:
+            print("{:9s} {:9.1f} {:9.1f} {:7d} {:8d} {:9.1f} {:6d} {:8d} {:9d} {:9.1f}".format(
+                "  (base)", old["wall_ms"], old["max_compose_ms"], old["updates"], old["bytes"],
+                old["estimated_ms"], old["draw_call_total"], old["max_draw_calls"], old["measure_text"],
+                old["peak_heap_kb"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the example apps on the host emulator")
+    parser.add_argument("names", nargs="*", help="scenarios to run (default: all)")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per scenario, best is kept")
+    parser.add_argument("--out", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON to compare against; exits 1 on a regression")
+    args = parser.parse_args()
+
+    scenarios = [s for s in SCENARIOS if not args.names or s["name"] in args.names]
+    results = {}
+    for scenario in scenarios:
+        results[scenario["name"]] = bench(scenario, args.repeats)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "repeats": args.repeats,
+                "scenarios": results,
+            }, f, indent=1)
+        print("wrote", args.out)
+
+    if baseline is not None:
+        worse, slower = compare(results, baseline)
+        for name, metric, old, new in slower:
+            print("slower (host timing, not a regression) {} {}: {} -> {}".format(name, metric, old, new))
+        for name, metric, old, new in worse:
+            print("REGRESSION {} {}: {} -> {}".format(name, metric, old, new))
+        if worse:
+            sys.exit(1)
+        print("no regressions against", args.compare)
+
+
+if __name__ == "__main__":
+    main()
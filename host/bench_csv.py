@@ -0,0 +1,159 @@
+# -----------------------------------------------------------------------------------------------
+# bench_csv.py - host side benchmark for lib/csv_stream.py
+#
+# Generates x,y,z CSV files (plus a quoted text column and the odd empty / bad value, like
+# real logs) and reads the x, y and z columns with the read_csv() that used to be in
+# Charts/heatmap.py and with csv_stream.read_columns(). Checks both give the same values
+# (to float32 precision) and reports time and peak Python heap for each.
+#
+# Usage: python3 host/bench_csv.py [rows ...]      (default 10000 100000 1000000)
+# -----------------------------------------------------------------------------------------------
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+from csv_stream import read_columns  # noqa: E402
+
+
+# ------------------------------
+# Previous implementation (verbatim from Charts/heatmap.py)
+# ------------------------------
+
+def read_csv(filename, x_name, y_name=None, z_name=None):
+    data = {
+        x_name: []
+    }
+
+    if y_name:
+        data[y_name] = []
+    if z_name:
+        data[z_name] = []
+    # respect the double quote rule about CSV file
+    def split_line_respecting_quotes(line):
+        parts = []
+        temp = ""
+        inside_quotes = False
+
+        for char in line:
+            if char == '"':
+                inside_quotes = not inside_quotes
+            elif char == ',' and not inside_quotes:
+                parts.append(temp.strip())
+                temp = ""
+            else:
+                temp += char
+        if temp:  # Append the last field
+            parts.append(temp.strip())
+
+        return parts
+
+    with open(filename, 'r') as file:
+        lines = file.readlines()
+        headers = split_line_respecting_quotes(lines.pop(0).strip())
+
+        if x_name not in headers:
+            raise ValueError(f"{x_name} column not found in the CSV file.")
+        x_index = headers.index(x_name)
+
+        y_index = headers.index(y_name) if y_name and y_name in headers else None
+        z_index = headers.index(z_name) if z_name and z_name in headers else None
+
+        for line_num, line in enumerate(lines, start=2):  # Starting from 2 because we removed the header
+            values = split_line_respecting_quotes(line.strip())
+
+            if len(values) <= x_index:
+                print(f"Warning: Line {line_num} has incomplete data: {line}")
+                continue
+
+            try:
+                data[x_name].append(float(values[x_index].replace('"', '')) if values[x_index] != "" else None)
+            except ValueError:
+                print(f"Error at line {line_num}: Cannot convert {values[x_index]} to float for {x_name}")
+                data[x_name].append(None)
+
+            if y_name and len(values) > y_index:
+                try:
+                    data[y_name].append(float(values[y_index].replace('"', '')) if values[y_index] != "" else None)
+                except ValueError:
+                    print(f"Error at line {line_num}: Cannot convert {values[y_index]} to float for {y_name}")
+                    data[y_name].append(None)
+
+            if z_name and len(values) > z_index:
+                try:
+                    data[z_name].append(float(values[z_index].replace('"', '')) if values[z_index] != "" else None)
+                except ValueError:
+                    print(f"Error at line {line_num}: Cannot convert {values[z_index]} to float for {z_name}")
+                    data[z_name].append(None)
+
+    return data
+
+
+# ------------------------------
+# Benchmark
+# ------------------------------
+
+def make_csv(path, rows):
+    with open(path, "w") as f:
+        f.write("x,y,z,note\n")
+        for i in range(rows):
+            x = i % 97
+            y = (i * 7) % 53
+            z = "" if i % 1000 == 999 else "{:.2f}".format((i * 13 % 1000) / 100.0)
+            note = '"sensor {}, ok"'.format(i % 5) if i % 10 == 0 else "ok"
+            f.write("{},{},{},{}\n".format(x, y, z, note))
+
+
+def measure(fn):
+    # (result, seconds, peak bytes); timed without tracing, peak measured in a second run
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        del result
+        tracemalloc.start()
+        result = fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def same(old, new):
+    for name in ("x", "y", "z"):
+        a = old[name]
+        b = new[name]
+        if len(a) != len(b):
+            return False
+        for u, v in zip(a, b):
+            if (u is None) != (v is None):
+                return False
+            if u is not None and abs(u - v) > 1e-5 * max(1.0, abs(u)):
+                return False
+    return True
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 100000, 1000000]
+    folder = tempfile.mkdtemp(prefix="bench-csv-")
+    print("{:>9s} {:>9s} {:>10s} {:>10s} {:>11s} {:>11s} {:>8s} {:>6s}".format(
+        "rows", "file MB", "old s", "new s", "old heap MB", "new heap MB", "speedup", "same"))
+    for rows in sizes:
+        path = os.path.join(folder, "data_{}.csv".format(rows))
+        make_csv(path, rows)
+        old, old_time, old_peak = measure(lambda: read_csv(path, "x", "y", "z"))
+        new, new_time, new_peak = measure(lambda: read_columns(path, "x", "y", "z"))
+        print("{:9d} {:9.1f} {:10.2f} {:10.2f} {:11.2f} {:11.2f} {:7.1f}x {:>6s}".format(
+            rows, os.path.getsize(path) / 1e6, old_time, new_time, old_peak / 1e6, new_peak / 1e6,
+            old_time / new_time, "yes" if same(old, new) else "NO"))
+        os.remove(path)
+    os.rmdir(folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# -----------------------------------------------------------------------------------------------
+# bench_dash_scheduler.py - host side benchmark for lib/scheduler.py and dash.py's main loop
+#
+# First drives a Scheduler on a simulated clock through a working day of N meetings (from
+# bench_event_table.py) with dash.py's deadlines - the minute, the TOTP step, the next
+# meeting start or end and the 15 minute refresh - and a button press every few minutes.
+# Checks every redraw, refresh and press happens exactly when it should, and counts the
+# wakeups against the one second polling loop dash.py used to run (60 a minute, and up to a
+# second late for a press).
+#
+# Then runs dash.py itself on the emulator for a while with a few presses and counts its
+# lightsleep() calls, requests and screen updates: full and partial (lib/panel_layout.py),
+# the bytes pushed to the panel and the estimated e-ink time.
+#
+# Usage: python3 host/bench_dash_scheduler.py [--meetings 40] [--hours 2]
+# -----------------------------------------------------------------------------------------------
+
+import argparse
+import os
+import random
+import sys
+
+HOST = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HOST)
+sys.path.insert(0, os.path.join(HOST, "emulator"))
+sys.path.insert(0, os.path.join(HOST, "..", "lib"))
+
+import emulator  # noqa: E402
+import run_app  # noqa: E402
+from bench_event_table import FIRST, LAST, make_day  # noqa: E402
+from event_table import EventTable  # noqa: E402
+from scheduler import Scheduler, next_multiple  # noqa: E402
+
+MINUTE_MS = 60000
+STEP_MS = 30000
+REFRESH_MS = 15 * MINUTE_MS
+POLL_MS = 1000  # the old loop: utime.sleep(1)
+
+
+def simulate(meetings, seed=1):
+    # One day on a simulated clock; returns (wakeups, minutes, presses handled, mistakes)
+    table = EventTable(make_day(meetings, seed))
+    rng = random.Random(seed)
+    presses = sorted(rng.randrange(FIRST * 1000, LAST * 1000) for _ in range((LAST - FIRST) // 300))
+    clock = [FIRST * 1000]
+    log = []
+
+    def wait(ms):
+        # Sleep until ms have passed, or until the next press raises its IRQ
+        end = clock[0] + ms
+        if presses and presses[0] <= end:
+            clock[0] = presses.pop(0)
+            scheduler.pressed(0)
+        else:
+            clock[0] = end
+
+    scheduler = Scheduler(clock=lambda: clock[0], wait=wait)
+
+    def redraw(now):
+        log.append(("redraw", now))
+        boundary = table.next_boundary(now // 1000)
+        if boundary is not None:
+            scheduler.at("calendar_change", boundary * 1000, lambda now: scheduler.at("redraw", now, redraw))
+
+    def repeat(name, period):
+        def fire(now):
+            scheduler.at(name, next_multiple(now, period), fire)
+            scheduler.at("redraw", now, redraw)
+        scheduler.at(name, next_multiple(clock[0], period), fire)
+
+    repeat("minute", MINUTE_MS)
+    repeat("totp", STEP_MS)
+    repeat("refresh", REFRESH_MS)
+    scheduler.watch(0, lambda button: log.append(("press", clock[0])), pin=Pin())
+    expected_presses = list(presses)
+    redraw(clock[0])
+
+    while clock[0] < LAST * 1000:
+        scheduler.run_once()
+
+    end = LAST * 1000
+    redraws = set(now for kind, now in log if kind == "redraw" and now < end)
+    due = set(range(FIRST * 1000, end, STEP_MS))
+    due |= set(t * 1000 for t in table.boundaries if FIRST < t < LAST)
+    handled = [now for kind, now in log if kind == "press"]
+    mistakes = len(due.symmetric_difference(redraws)) + (handled != expected_presses[:len(handled)])
+    minutes = (end - FIRST * 1000) / MINUTE_MS
+    return scheduler.wakeups, minutes, len(handled), mistakes
+
+
+class Pin:
+    IRQ_RISING = 8
+
+    def irq(self, trigger=None, handler=None):
+        self.handler = handler
+
+
+def run_dash(hours):
+    # dash.py on the emulator; returns (lightsleep calls, update summary, requests, minutes, reason)
+    import machine
+    sleeps = [0]
+    lightsleep = machine.lightsleep
+
+    def counted(ms=None):
+        sleeps[0] += 1
+        lightsleep(ms)
+
+    def setup():
+        machine.lightsleep = counted
+
+    # The app gets its own scheduler module, on the emulator's time rather than the host's
+    sys.modules.pop("scheduler", None)
+
+    try:
+        summary, updates, reason = run_app.run_app(
+            os.path.join(run_app.REPO, "examples", "dash.py"),
+            presses=run_app.parse_presses("A,B,C,C"),
+            files=run_app.FIXTURE_FILES,
+            http=run_app.fixture_http(),
+            setup=setup,
+            run_for=hours * 3600,
+        )
+    finally:
+        machine.lightsleep = lightsleep
+    minutes = (emulator.now() - emulator.clock["start"]) / 60.0
+    return sleeps[0], summary, len(emulator.requests), minutes, reason
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--meetings", type=int, default=40)
+    parser.add_argument("--hours", type=float, default=2)
+    args = parser.parse_args()
+
+    wakeups, minutes, pressed, mistakes = simulate(args.meetings)
+    print("simulated day, 07:00-19:00, {} meetings, {} presses".format(args.meetings, pressed))
+    print("{:22s} {:>10s} {:>12s} {:>16s}".format("", "wakeups", "wakeups/min", "press latency ms"))
+    print("{:22s} {:10d} {:12.1f} {:>16s}".format("1 s polling loop", int(minutes * MINUTE_MS / POLL_MS),
+                                                  MINUTE_MS / POLL_MS, "up to {}".format(POLL_MS)))
+    print("{:22s} {:10d} {:12.1f} {:>16s}".format("Scheduler", wakeups, wakeups / minutes, "0"))
+    print("redraws and presses on time: {}".format("yes" if not mistakes else "NO ({} wrong)".format(mistakes)))
+
+    sleeps, summary, requests, minutes, reason = run_dash(args.hours)
+    print("dash.py on the emulator for {:g} min (presses A, B, C, C; stopped: {})".format(minutes, reason))
+    print("  lightsleep calls {} ({:.1f}/min), requests {}".format(sleeps, sleeps / minutes, requests))
+    print("  screen updates {} ({} full, {} partial), {:.0f} kB to the panel, e-ink {:.1f} s".format(
+        summary["updates"], summary["full_updates"], summary["partial_updates"], summary["bytes"] / 1000.0,
+        summary["estimated_ms"] / 1000.0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# -----------------------------------------------------------------------------------------------
+# bench_decimate.py - host side check and benchmark for lib/decimate.py
+#
+# Generates x,y CSV logs (a noisy daily cycle sampled every minute, with the odd empty value)
+# and streams them through MinMaxColumns and LTTB the way plot_line() in Charts/heatmap.py
+# and the logger chart do: one pass for the x range (and, for LTTB, one for the bucket
+# averages), one to feed the reducer. Checks the results against straightforward in-memory
+# versions over every point, and reports time, peak Python heap and the line segments a chart
+# would draw: every point, against what is left after decimation.
+#
+# Usage: python3 host/bench_decimate.py [rows ...]      (default 10000 100000 1000000)
+# -----------------------------------------------------------------------------------------------
+
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+from csv_stream import iter_rows  # noqa: E402
+from decimate import LTTB, MinMaxColumns  # noqa: E402
+from grid_agg import column_ranges  # noqa: E402
+
+WIDTH = 200  # chart_width of plot_line() and the logger
+
+
+def make_csv(path, rows, seed=1):
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        f.write("x,y\n")
+        for i in range(rows):
+            x = i  # minutes: MicroPython floats (float32) cannot hold epoch seconds exactly
+            y = "" if i % 997 == 996 else "{:.2f}".format(
+                20 + 5 * math.sin(i * 2 * math.pi / 1440) + rng.gauss(0, 0.5))
+            f.write("{},{}\n".format(x, y))
+
+
+# ------------------------------
+# Streaming, as on the badger
+# ------------------------------
+
+def points(path):
+    for x, y in iter_rows(path, ("x", "y")):
+        if x is not None and y is not None:
+            yield x, y
+
+
+def stream_minmax(path):
+    (x_min, x_max), _ = column_ranges(path, ("x", "y"))
+    reducer = MinMaxColumns(x_min, x_max, WIDTH)
+    for x, y in points(path):
+        reducer.add(x, y)
+    return list(reducer.columns())
+
+
+def stream_lttb(path):
+    (x_min, x_max), _ = column_ranges(path, ("x", "y"))
+    reducer = LTTB(x_min, x_max, WIDTH)
+    for x, y in points(path):
+        reducer.add_average(x, y)
+    for x, y in points(path):
+        reducer.add(x, y)
+    xs, ys = reducer.points()
+    return list(zip(xs, ys))
+
+
+# ------------------------------
+# Reference, every point in memory
+# ------------------------------
+
+def buckets(xs):
+    lo, hi = xs[0], xs[-1]
+    scale = WIDTH / (hi - lo)
+    return [min(WIDTH - 1, max(0, int((x - lo) * scale))) for x in xs]
+
+
+def reference_minmax(xs, ys):
+    columns = {}
+    for b, y in zip(buckets(xs), ys):
+        if b not in columns:
+            columns[b] = [y, y, y, y]
+        column = columns[b]
+        column[1] = min(column[1], y)
+        column[2] = max(column[2], y)
+        column[3] = y
+    return [(b,) + tuple(columns[b]) for b in sorted(columns)]
+
+
+def reference_lttb(xs, ys):
+    groups = {}
+    for i, b in enumerate(buckets(xs)):
+        groups.setdefault(b, []).append(i)
+    order = sorted(groups)
+    averages = [(sum(xs[i] for i in groups[b]) / len(groups[b]), sum(ys[i] for i in groups[b]) / len(groups[b]))
+                for b in order]
+    chosen = [0]
+    for k in range(1, len(order) - 1):
+        ax, ay = xs[chosen[-1]], ys[chosen[-1]]
+        cx, cy = averages[k + 1]
+        best = max(groups[order[k]], key=lambda i: abs((ax - cx) * (ys[i] - ay) - (ax - xs[i]) * (cy - ay)))
+        chosen.append(best)
+    chosen.append(len(xs) - 1)
+    return [(xs[i], ys[i]) for i in chosen]
+
+
+def close(a, b):
+    return abs(a - b) <= 1e-4 * max(1.0, abs(a))
+
+
+def same_minmax(old, new):
+    if len(old) != len(new):
+        return False
+    return all(o[0] == n[0] and all(close(u, v) for u, v in zip(o[1:], n[1:])) for o, n in zip(old, new))
+
+
+def same_lttb(old, new):
+    # Selections can differ on a near tie of float32 against float64 areas; allow a few
+    if len(old) != len(new):
+        return False
+    differ = sum(1 for o, n in zip(old, new) if not (close(o[0], n[0]) and close(o[1], n[1])))
+    return differ <= len(old) // 50
+
+
+def measure(fn):
+    # (result, seconds, peak bytes); timed without tracing, peak measured in a second run
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 100000, 1000000]
+    folder = tempfile.mkdtemp(prefix="bench-decimate-")
+    print("{:>9s} {:>8s} {:>11s} {:>10s} {:>10s} {:>10s} {:>10s} {:>10s} {:>6s}".format(
+        "rows", "all segs", "minmax segs", "lttb segs", "minmax s", "lttb s", "minmax kB", "lttb kB", "same"))
+    for rows in sizes:
+        path = os.path.join(folder, "log_{}.csv".format(rows))
+        make_csv(path, rows)
+        minmax, minmax_time, minmax_peak = measure(lambda: stream_minmax(path))
+        lttb, lttb_time, lttb_peak = measure(lambda: stream_lttb(path))
+
+        xs, ys = [], []
+        for x, y in points(path):
+            xs.append(x)
+            ys.append(y)
+        same = same_minmax(reference_minmax(xs, ys), minmax) and same_lttb(reference_lttb(xs, ys), lttb)
+
+        # plot_line() draws a column's low-high segment plus a joint to the next column
+        print("{:9d} {:8d} {:11d} {:10d} {:10.2f} {:10.2f} {:10.1f} {:10.1f} {:>6s}".format(
+            rows, len(xs) - 1, 2 * len(minmax) - 1, len(lttb) - 1, minmax_time, lttb_time,
+            minmax_peak / 1024.0, lttb_peak / 1024.0, "yes" if same else "NO"))
+        os.remove(path)
+    os.rmdir(folder)
+
+
+if __name__ == "__main__":
+    main()
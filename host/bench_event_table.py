@@ -0,0 +1,97 @@
+# -----------------------------------------------------------------------------------------------
+# bench_event_table.py - host side benchmark for lib/event_table.py
+#
+# Makes a working day of N meetings (some overlapping, most not on a 15 minute mark) and
+# plays dash.py's minute redraws from 07:00 to 19:00 two ways: as before, with the current
+# and next meeting worked out by scanning the event dicts at each 15 minute calendar
+# refresh and redrawn from those until the next one, and with an EventTable looked up at
+# every redraw. Reports the minutes the panel showed the wrong meeting and the time per
+# lookup, and checks the table against a brute force search at every second of the day.
+#
+# Usage: python3 host/bench_event_table.py [meetings ...]      (default 8 40 400)
+# -----------------------------------------------------------------------------------------------
+
+import calendar
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+from event_table import EventTable  # noqa: E402
+
+DAY = calendar.timegm((2024, 6, 3, 0, 0, 0))
+FIRST = DAY + 7 * 3600
+LAST = DAY + 19 * 3600
+
+
+def ics(timestamp):
+    return time.strftime("%Y%m%dT%H%M%S", time.gmtime(timestamp))
+
+
+def make_day(count, seed=1):
+    rng = random.Random(seed)
+    events = []
+    for i in range(count):
+        start = FIRST + rng.randrange(0, (LAST - FIRST) // 300) * 300
+        events.append((start, start + rng.choice((10, 20, 25, 30, 45, 60)) * 60, "Meeting {}".format(i)))
+    return events
+
+
+def scan(events, current_time):
+    # dash.py's get_current_and_next_events() before the event table
+    current_event = None
+    next_event = None
+    for event in events:
+        if event["start"] <= current_time <= event["end"]:
+            current_event = event
+        elif event["start"] > current_time:
+            if not next_event or event["start"] < next_event["start"]:
+                next_event = event
+    return current_event, next_event
+
+
+def truth(rows, now):
+    # (title, title) of the current and next meeting at now, by brute force
+    started = [row for row in rows if row[0] <= now < row[1]]
+    upcoming = [row for row in rows if row[0] > now]
+    return (started[-1][2] if started else None, upcoming[0][2] if upcoming else None)
+
+
+def main():
+    counts = [int(a) for a in sys.argv[1:]] or [8, 40, 400]
+    print("{:>8s} {:>14s} {:>15s} {:>9s} {:>9s} {:>6s}".format(
+        "meetings", "scan wrong min", "table wrong min", "scan us", "table us", "same"))
+    for count in counts:
+        rows = sorted(make_day(count))
+        dicts = [{"name": title, "start": ics(start), "end": ics(end)} for start, end, title in rows]
+        table = EventTable(rows)
+
+        scan_wrong = table_wrong = 0
+        shown = (None, None)
+        scan_time = table_time = 0.0
+        lookups = 0
+        for now in range(FIRST, LAST, 60):
+            if (now - DAY) % 900 == 0:  # the old 15 minute refresh
+                start = time.perf_counter()
+                current, upcoming = scan(dicts, ics(now))
+                scan_time += time.perf_counter() - start
+                shown = (current["name"] if current else None, upcoming["name"] if upcoming else None)
+            start = time.perf_counter()
+            found = (table.current(now), table.next(now))
+            table_time += time.perf_counter() - start
+            lookups += 1
+            expected = truth(rows, now)
+            scan_wrong += shown != expected
+            table_wrong += tuple(table.title(i) if i >= 0 else None for i in found) != expected
+
+        same = all(tuple(table.title(i) if i >= 0 else None for i in (table.current(now), table.next(now)))
+                   == truth(rows, now) for now in range(FIRST - 60, LAST + 3600, 7 if count > 100 else 1))
+        print("{:8d} {:14d} {:15d} {:9.1f} {:9.2f} {:>6s}".format(
+            count, scan_wrong, table_wrong, scan_time / ((LAST - FIRST) // 900) * 1e6,
+            table_time / lookups * 1e6, "yes" if same else "NO"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# -----------------------------------------------------------------------------------------------
+# bench_export.py - host side benchmark for lib/batch_export.py
+#
+# Makes N saved submissions of a 20 question form and sends them to local stand-in servers
+# two ways: one request per instance with lib/odk_uploader.py (to host/odk_stub_server.py),
+# and one batch export bundle in a single request (to host/unpack_bundle.py --serve). The
+# servers add latency per connection and per request to stand in for Wi-Fi and TLS. Reports
+# bytes on the wire, time to pack the bundle, time to send, and checks the unpacked
+# instances are the same as the originals.
+#
+# Usage: python3 host/bench_export.py [instances ...]      (default 100 500)
+#        [--connect-ms 300] [--request-ms 20]
+# -----------------------------------------------------------------------------------------------
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+HOST = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HOST)
+sys.path.insert(0, os.path.join(HOST, "emulator"))
+sys.path.insert(0, os.path.join(HOST, "..", "lib"))
+
+import unpack_bundle  # noqa: E402
+from batch_export import write_bundle, pending_instances  # noqa: E402
+from odk_stub_server import CentralServer, USERNAME, PASSWORD  # noqa: E402
+from odk_uploader import Uploader  # noqa: E402
+from submission_index import SubmissionIndex  # noqa: E402
+from submission_writer import SubmissionWriter  # noqa: E402
+
+QUESTIONS = 20
+
+
+def make_instances(count):
+    formdef = {"title": "Survey", "version": "3",
+               "controls": [{"name": "question_{}".format(i)} for i in range(QUESTIONS)]}
+    writer = SubmissionWriter(formdef, "Badger-2040-Survey", "1688347654", "submissions.csv")
+    index = SubmissionIndex()
+    for n in range(count):
+        values = [str((n * 7 + i) % 5) if i % 4 else "free text answer {}".format(n % 13)
+                  for i in range(QUESTIONS)]
+        index.queue(writer.save(values, "2024-06-03 09:{:02d}:00".format(n % 60)))
+    return index
+
+
+class LatentBundleHandler(unpack_bundle.BundleHandler):
+    # unpack_bundle.py's handler with the same latency as the stand-in Central
+    def setup(self):
+        super().setup()
+        time.sleep(self.server.connect_ms / 1e3)
+
+    def do_POST(self):
+        time.sleep(self.server.request_ms / 1e3)
+        super().do_POST()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def bundle_server(args, out):
+    server = unpack_bundle.serve(argparse.Namespace(
+        serve=0, out=out, central=None, user=USERNAME, password=PASSWORD))
+    server.RequestHandlerClass = LatentBundleHandler
+    server.connect_ms, server.request_ms = args.connect_ms, args.request_ms
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bundles_url(server):
+    return "http://127.0.0.1:{}/bundles".format(server.server_address[1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("counts", type=int, nargs="*", default=[100, 500])
+    parser.add_argument("--connect-ms", type=float, default=300)
+    parser.add_argument("--request-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    print("latency: {:g} ms per connection, {:g} ms per request".format(args.connect_ms, args.request_ms))
+    print("{:>9s} {:>9s} {:>10s} {:>8s} {:>13s} {:>12s} {:>6s}".format(
+        "instances", "XML KB", "bundle KB", "pack s", "per file s", "bundle s", "same"))
+    here = os.getcwd()
+    for count in args.counts:
+        folder = tempfile.mkdtemp(prefix="bench-export-")
+        os.chdir(folder)
+        central = CentralServer(connect_ms=args.connect_ms, request_ms=args.request_ms).start()
+        bundles = bundle_server(args, os.path.join(folder, "unpacked"))
+        try:
+            index = make_instances(count)
+            instances = pending_instances(index)
+            raw = sum(os.path.getsize(path) for _, _, path in instances)
+
+            start = time.perf_counter()
+            size = write_bundle("batch.bbz", [(name, path) for _, name, path in instances])
+            pack_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            uploader = Uploader(bundles_url(bundles), USERNAME, PASSWORD,
+                                content_type="application/octet-stream")
+            status, _ = uploader.post("batch.bbz")
+            uploader.close()
+            bundle_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            Uploader(central.url(), USERNAME, PASSWORD).upload(
+                index, lambda uuid: "instances/uuid" + uuid + ".xml")
+            per_file_s = time.perf_counter() - start
+
+            same = status == 201 and all(
+                open(path, "rb").read() == open(os.path.join("unpacked", "instances", name), "rb").read()
+                for _, name, path in instances)
+            print("{:9d} {:9.1f} {:10.1f} {:8.3f} {:13.2f} {:12.2f} {:>6s}".format(
+                count, raw / 1e3, size / 1e3, pack_s, per_file_s, bundle_s + pack_s, "yes" if same else "NO"))
+        finally:
+            os.chdir(here)
+            for server in (central, bundles):
+                server.shutdown()
+                server.server_close()
+            shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# -----------------------------------------------------------------------------------------------
+# bench_fetch_cache.py - host side benchmark for lib/fetch_cache.py
+#
+# Plays a day of dash.py refreshes (every 15 minutes, on the emulator's clock) against
+# host/feed_stub_server.py: a 1 MB calendar that changes every 4 hours and the weather
+# fixture, which changes every hour. Each refresh reads both feeds with a plain urequests.get
+# and parse, as the apps used to, or through FetchCache. Run once with ETag / Last-Modified
+# only and once with Cache-Control max-age as well. Reports requests, full answers, 304s,
+# bytes downloaded, how often the feeds were parsed and the radio time under a simple model
+# (a fixed cost per request plus the download at a fixed rate), and checks every result is
+# the same as parsing the feed fresh.
+#
+# Usage: python3 host/bench_fetch_cache.py [--max-age 1800] [--calendar-mb 1]
+# -----------------------------------------------------------------------------------------------
+
+import argparse
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+HOST = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HOST)
+sys.path.insert(0, os.path.join(HOST, "emulator"))
+sys.path.insert(0, os.path.join(HOST, "..", "lib"))
+
+import emulator  # noqa: E402
+from bench_ics import make_calendar  # noqa: E402
+from feed_stub_server import FeedServer  # noqa: E402
+from ics_stream import IcsReader, read_events  # noqa: E402
+
+REFRESH = 15 * 60
+DAY = 24 * 3600
+REQUEST_S = 0.3  # radio on per request: association is already up, DNS + TCP + TLS + headers
+BYTES_PER_S = 50e3
+
+
+def read_calendar(raw, date):
+    day = date.encode()
+    return [fields["SUMMARY"][1] for fields in read_events(IcsReader(raw), day, day)]
+
+
+def read_weather(raw):
+    return json.loads(raw.read())["current_weather"]
+
+
+def run(server, calendar, weather, cached):
+    # One simulated day; returns (server counts, parse runs, results all right)
+    root = tempfile.mkdtemp(prefix="bench-fetch-")
+    emulator.reset(network="host", run_for=2 * DAY)
+    emulator.install()
+    emulator.mount(root)
+    sys.modules.pop("fetch_cache", None)
+    import fetch_cache
+    import urequests
+    try:
+        cache = fetch_cache.FetchCache()
+        server.counts.update(dict.fromkeys(server.counts, 0))
+        parses = [0]
+        right = True
+        start = emulator.now()
+
+        def counted(parse, *args):
+            def run_parse(raw):
+                parses[0] += 1
+                return parse(raw, *args)
+            return run_parse
+
+        while emulator.now() - start < DAY:
+            elapsed = int(emulator.now() - start)
+            server.set("/calendar.ics", calendar[elapsed // (4 * 3600) % len(calendar)])
+            body = json.loads(weather)
+            body["current_weather"]["temperature"] = 15 + elapsed // 3600
+            server.set("/weather.json", json.dumps(body).encode())
+
+            date = "{:04d}{:02d}{:02d}".format(*emulator.localtime()[:3])
+            results = []
+            for path, parse, args, key in (("/calendar.ics", read_calendar, (date,), date),
+                                           ("/weather.json", read_weather, (), "")):
+                if cached:
+                    results.append(cache.get(server.url(path), counted(parse, *args), key=key))
+                else:
+                    r = urequests.get(server.url(path))
+                    results.append(counted(parse, *args)(r.raw))
+                    r.close()
+                expected = parse(io.BytesIO(server.feeds[path][0]), *args)
+                right = right and results[-1] == expected
+            emulator.advance(REFRESH)
+        return dict(server.counts), parses[0], right
+    finally:
+        emulator.unmount()
+        emulator.uninstall()
+        shutil.rmtree(root)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-age", type=int, default=1800)
+    parser.add_argument("--calendar-mb", type=float, default=1)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="bench-fetch-feeds-")
+    calendar = []
+    for version in range(2):
+        path = os.path.join(folder, "calendar.ics")
+        make_calendar(path, args.calendar_mb + version * 0.01)
+        with open(path, "rb") as f:
+            calendar.append(f.read())
+    shutil.rmtree(folder)
+    with open(os.path.join(HOST, "emulator", "fixtures", "weather.json"), "rb") as f:
+        weather = f.read()
+
+    print("{} refreshes of a {:g} MB calendar and the weather".format(DAY // REFRESH, args.calendar_mb))
+    print("{:26s} {:>8s} {:>6s} {:>5s} {:>9s} {:>7s} {:>8s} {:>6s}".format(
+        "", "requests", "full", "304", "MB down", "parses", "radio s", "same"))
+    for max_age in (None, args.max_age):
+        server = FeedServer(max_age=max_age).start()
+        try:
+            for cached in (False, True):
+                counts, parses, right = run(server, calendar, weather, cached)
+                label = "{}, {}".format("FetchCache" if cached else "urequests.get",
+                                        "max-age {}".format(max_age) if max_age else "validators")
+                radio = counts["requests"] * REQUEST_S + counts["bytes"] / BYTES_PER_S
+                print("{:26s} {:8d} {:6d} {:5d} {:9.2f} {:7d} {:8.1f} {:>6s}".format(
+                    label, counts["requests"], counts["full"], counts["not_modified"],
+                    counts["bytes"] / 1e6, parses, radio, "yes" if right else "NO"))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
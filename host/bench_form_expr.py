@@ -0,0 +1,92 @@
+# -----------------------------------------------------------------------------------------------
+# bench_form_expr.py - host side benchmark for lib/form_expr.py
+#
+# Builds forms of 10 to 200 controls where every third control has a relevance on an earlier
+# answer, every fifth a constraint and every seventh a calculate, and times what form.py
+# does after an answer changes: re-parsing and evaluating every expression of the form (what
+# an interpreter working from the expression text would do at each step) against
+# FormLogic.changed() running only the compiled programs that read the changed answer. Both
+# must agree on the relevance and values of every control.
+#
+# Usage: python3 host/bench_form_expr.py [controls ...]      (default 10 50 200)
+# -----------------------------------------------------------------------------------------------
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+from form_expr import FormLogic, compile_expression, compile_programs, run, boolean, string  # noqa: E402
+
+REPEATS = 50
+
+
+def make_form(count):
+    controls = []
+    for i in range(count):
+        control = {"name": "q{}".format(i), "type": "inputNumeric", "kind": "Integer"}
+        if i % 3 == 2:
+            control["relevance"] = "${{q{}}} > 5 or selected(${{q{}}}, '1')".format(i - 2, i - 1)
+        if i % 5 == 4:
+            control["constraint"] = ". >= 0 and . <= 100"
+        if i % 7 == 6:
+            control["calculate"] = "${{q{}}} + ${{q{}}} * 2".format(i - 6, i - 3)
+        control["code"] = compile_programs(control)
+        controls.append(control)
+    return controls
+
+
+def reparse_all(controls, values):
+    # Relevance and values of every control from the expression text
+    names = {control["name"]: i for i, control in enumerate(controls)}
+    lookup = lambda name: values[names[name]]  # noqa: E731
+    relevant = [True] * len(controls)
+    for i, control in enumerate(controls):
+        if control.get("calculate"):
+            values[i] = string(run(compile_expression(control["calculate"]), lookup))
+        if control.get("relevance"):
+            relevant[i] = boolean(run(compile_expression(control["relevance"]), lookup))
+        if control.get("constraint") and values[i] != "":
+            boolean(run(compile_expression(control["constraint"]), lookup, values[i]))
+    return relevant
+
+
+def timed(fn):
+    start = time.perf_counter()
+    for n in range(REPEATS):
+        fn(n)
+    return (time.perf_counter() - start) / REPEATS * 1e3
+
+
+def main():
+    counts = [int(a) for a in sys.argv[1:]] or [10, 50, 200]
+    print("{:>8s} {:>11s} {:>12s} {:>12s} {:>9s} {:>6s}".format(
+        "controls", "expressions", "reparse ms", "compiled ms", "evaluated", "same"))
+    for count in counts:
+        controls = make_form(count)
+        expressions = sum(len(control["code"]) for control in controls)
+        values = [str(i % 10) for i in range(count)]
+        logic = FormLogic(controls)
+        logic.evaluate(values)
+        changed = count // 2
+
+        def reparse(n):
+            values[changed] = str(n % 10)
+            reparse_all(controls, values)
+
+        def compiled(n):
+            values[changed] = str(n % 10)
+            logic.changed(values, changed)
+
+        reparse_ms = timed(reparse)
+        compiled_ms = timed(compiled)
+        evaluated = len(logic.dependents.get(controls[changed]["name"], ()))
+        check = list(values)
+        same = reparse_all(controls, check) == logic.relevant and check == values
+        print("{:8d} {:11d} {:12.3f} {:12.4f} {:9d} {:>6s}".format(
+            count, expressions, reparse_ms, compiled_ms, evaluated, "yes" if same else "NO"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# -----------------------------------------------------------------------------------------------
+# bench_form_load.py - host side benchmark for lib/form_cache.py
+#
+# Loads the sample form in forms/ and a generated form with many controls three ways: the
+# json.load() of the whole .odkbuild that examples/form.py used to do at every wake,
+# load_form() when it has to compile (no cache yet), and load_form() from the cache. Reports
+# file sizes, time and peak Python heap, and checks the cached image matches a fresh compile.
+#
+# Usage: python3 host/bench_form_load.py [controls]      (default 200)
+# -----------------------------------------------------------------------------------------------
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "lib"))
+
+from form_cache import compile_form, image_path, load_form  # noqa: E402
+
+SAMPLE = os.path.join(HERE, "..", "forms", "Badger 2040 Test.odkbuild")
+REPEATS = 20
+
+
+def unused_keys():
+    # The keys ODK Build writes for every control that the badger ignores
+    return {"hint": {}, "requiredText": {}, "invalidText": {}, "short": {}, "image": {},
+            "audio": {}, "video": {}, "bigimage": {}, "guidance": {}, "metadata": {}}
+
+
+def make_form(path, count):
+    controls = []
+    for i in range(count):
+        control = {"name": "q{}".format(i), "label": {"0": "Question number {} of the survey".format(i)},
+                   "defaultValue": "", "readOnly": False, "required": i % 3 == 0,
+                   "relevance": "", "constraint": "", "calculate": ""}
+        control.update(unused_keys())
+        if i % 3 == 0:
+            control.update({"type": "inputText", "length": False})
+        elif i % 3 == 1:
+            control.update({"type": "inputNumeric", "kind": "Integer", "appearance": "Textbox",
+                            "range": {"min": "0", "max": "100", "minInclusive": True, "maxInclusive": True},
+                            "selectRange": {"min": "1", "max": "10"}, "selectStep": "1", "sliderTicks": True})
+        else:
+            control.update({"type": "inputSelectOne", "appearance": "Default", "cascading": False, "other": False,
+                            "options": [{"text": {"0": "Option {}".format(j)}, "cascade": [], "val": str(j)}
+                                        for j in range(10)]})
+        controls.append(control)
+    formdef = {"title": "Generated", "controls": controls,
+               "metadata": {"version": "1", "submission_url": "", "public_key": "", "instance_name": ""}}
+    with open(path, "w") as f:
+        json.dump(formdef, f)
+
+
+def measure(fn):
+    # (result, mean seconds, peak bytes)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            result = fn()
+        elapsed = (time.perf_counter() - start) / REPEATS
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def old_load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def cold_load(path):
+    try:
+        os.remove(image_path(path))
+    except OSError:
+        pass
+    return load_form(path)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    folder = tempfile.mkdtemp(prefix="bench-form-")
+    sample = os.path.join(folder, "sample.odkbuild")
+    shutil.copy(SAMPLE, sample)
+    generated = os.path.join(folder, "generated.odkbuild")
+    make_form(generated, count)
+
+    print("{:>10s} {:>9s} {:>9s} {:>9s} {:>10s} {:>10s} {:>8s} {:>8s} {:>8s} {:>6s}".format(
+        "form", "src KB", "image KB", "json ms", "compile ms", "cached ms", "json KB", "cold KB", "cache KB", "same"))
+    for name, path in (("sample", sample), ("generated", generated)):
+        source, old_time, old_peak = measure(lambda: old_load(path))
+        _, cold_time, cold_peak = measure(lambda: cold_load(path))
+        cached, cached_time, cached_peak = measure(lambda: load_form(path))
+        print("{:>10s} {:9.1f} {:9.1f} {:9.2f} {:10.2f} {:10.2f} {:8.1f} {:8.1f} {:8.1f} {:>6s}".format(
+            name, os.path.getsize(path) / 1e3, os.path.getsize(image_path(path)) / 1e3,
+            old_time * 1e3, cold_time * 1e3, cached_time * 1e3, old_peak / 1e3, cold_peak / 1e3,
+            cached_peak / 1e3, "yes" if cached == compile_form(source) else "NO"))
+    shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# -----------------------------------------------------------------------------------------------
+# bench_icons.py - host side check and benchmark for lib/icon_cache.py
+#
+# Draws every icon in icons/ (and the PNG weather icons in the emulator fixtures) on the
+# emulator framebuffer with the decoder, as the apps used to, and with draw_icon() three
+# ways: the first time (decode and read back), from the bitmap file, and from RAM, at a y on a
+# byte boundary (a slice copy a column) and one off it (columns merged through a mask).
+# Checks the pixels are identical and reports time, the bytes of image files read and the
+# draw calls a cached draw takes. The emulator decoders draw placeholders, so on the badger
+# the decode column is far slower than here.
+#
+# Usage: python3 host/bench_icons.py
+# -----------------------------------------------------------------------------------------------
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+HOST = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HOST, "emulator"))
+sys.path.insert(0, os.path.join(HOST, "..", "lib"))
+
+import emulator  # noqa: E402
+import badger2040  # noqa: E402
+import jpegdec  # noqa: E402
+import pngdec  # noqa: E402
+import icon_cache  # noqa: E402
+
+REPEATS = 20
+POSITIONS = ((10, 16), (10, 21))
+SOURCES = (os.path.join(HOST, "..", "icons"), os.path.join(HOST, "emulator", "fixtures", "icons"))
+
+
+def icons(folder):
+    # (path, decoder, scale) for each icon in folder, at the scales the apps use
+    display = badger2040.Badger2040()
+    jpeg, png = jpegdec.JPEG(display.display), pngdec.PNG(display.display)
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if name.endswith(".jpg"):
+            yield path, jpeg, None
+            yield path, jpeg, jpegdec.JPEG_SCALE_HALF
+        elif name.endswith(".png"):
+            yield path, png, None
+
+
+def run(draw):
+    # (pixels, mean ms, image bytes read per draw)
+    emulator.reset()
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        draw()
+    elapsed = (time.perf_counter() - start) / REPEATS
+    return emulator.framebuffer.pixels.copy(), elapsed * 1e3, emulator.stats.get("image_bytes_read", 0) // REPEATS
+
+
+def main():
+    folder = tempfile.mkdtemp(prefix="bench-icons-")
+    display = badger2040.Badger2040()
+    failed = False
+    print("{:24s} {:>5s} {:>7s} {:>4s} {:>10s} {:>10s} {:>10s} {:>10s} {:>9s} {:>9s} {:>6s} {:>6s}".format(
+        "icon", "scale", "size", "y", "decode ms", "first ms", "file ms", "RAM ms", "read B", "cached B", "draws",
+        "same"))
+    for source_folder in SOURCES:
+        for (source, decoder, scale), (x, y) in ((icon, at) for icon in icons(source_folder) for at in POSITIONS):
+            path = os.path.join(folder, os.path.basename(source))
+            shutil.copy(source, path)
+
+            def decode():
+                decoder.open_file(path)
+                if scale is None:
+                    decoder.decode(x, y)
+                else:
+                    decoder.decode(x, y, scale)
+
+            def first():
+                icon_cache.clear_cache()
+                try:
+                    os.remove(icon_cache.bitmap_path(path, scale))
+                except OSError:
+                    pass
+                icon_cache.draw_icon(display, decoder, path, x, y, scale)
+
+            def from_file():
+                icon_cache.clear_cache()
+                icon_cache.draw_icon(display, decoder, path, x, y, scale)
+
+            def from_ram():
+                icon_cache.draw_icon(display, decoder, path, x, y, scale)
+
+            old, decode_ms, read = run(decode)
+            new, first_ms, _ = run(first)
+            filed, file_ms, _ = run(from_file)
+            ram, ram_ms, ram_read = run(from_ram)
+            same = (old == new).all() and (old == filed).all() and (old == ram).all() and ram_read == 0
+            failed = failed or not same
+            emulator.reset()
+            w, h = icon_cache.draw_icon(display, decoder, path, x, y, scale)
+            print("{:24s} {:>5s} {:>7s} {:4d} {:10.3f} {:10.3f} {:10.3f} {:10.3f} {:9d} {:9d} {:6d} {:>6s}".format(
+                os.path.basename(source), "-" if scale is None else str(scale), "{}x{}".format(w, h), y,
+                decode_ms, first_ms, file_ms, ram_ms, read, os.path.getsize(icon_cache.bitmap_path(path, scale)),
+                sum(emulator.stats["draw_calls"].values()), "yes" if same else "NO"))
+    shutil.rmtree(folder)
+    print("pixels identical" if not failed else "pixels differ")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
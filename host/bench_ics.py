@@ -0,0 +1,231 @@
+# -----------------------------------------------------------------------------------------------
+# bench_ics.py - host side benchmark for lib/ics_stream.py
+#
+# Writes a shared calendar of the given size (5 MB by default): a VTIMEZONE, then a dozen
+# events a day over several years, with folded DESCRIPTIONs and VALARMs, in two time zones.
+# Finds one day's events the way examples/dash.py used to (accumulating 2 KB chunks,
+# splitlines, every VEVENT collected and converted with mktime, every line printed - to
+# /dev/null here) and with ics_stream.read_events() plus dash.py's conversion of the events
+# left. Checks both find the same events and reports time and peak Python heap for each.
+#
+# Usage: python3 host/bench_ics.py [MB ...]      (default 1 5)
+# -----------------------------------------------------------------------------------------------
+
+import contextlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+from ics_stream import IcsReader, read_events  # noqa: E402
+
+CHUNK = 2048
+FIRST_DAY = 19000  # days since 1970: 2022-01-08
+EVENTS_PER_DAY = 12
+TIMEZONES = (("Greenwich Mean Time", "+0000"), ("Central European Time", "+0100"))
+
+DESCRIPTION = ("Agenda: review of the collection round, the forms that came back incomplete, "
+               "the badgers still to be charged and who takes which route tomorrow. Bring the "
+               "printed maps and the spare cables. Dial-in details are in the shared folder.")
+
+
+def day_string(day):
+    return time.strftime("%Y%m%d", time.gmtime(day * 86400))
+
+
+def fold(line):
+    # RFC 5545 folding: lines of at most 75 octets, continued after a space
+    parts = [line[:75]]
+    line = line[75:]
+    while line:
+        parts.append(" " + line[:74])
+        line = line[74:]
+    return "\r\n".join(parts) + "\r\n"
+
+
+def make_calendar(path, megabytes):
+    # Returns (events written, the day in the middle of them)
+    target = megabytes * 1000000
+    size = 0
+    count = 0
+    day = FIRST_DAY
+    with open(path, "w", newline="") as f:
+        head = ("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//badger bench//EN\r\n"
+                "BEGIN:VTIMEZONE\r\nTZID:Central European Time\r\nBEGIN:STANDARD\r\n"
+                "DTSTART:16010101T030000\r\nTZOFFSETFROM:+0200\r\nTZOFFSETTO:+0100\r\n"
+                "END:STANDARD\r\nEND:VTIMEZONE\r\n")
+        f.write(head)
+        size += len(head)
+        while size < target:
+            date = day_string(day)
+            for n in range(EVENTS_PER_DAY):
+                tzid = TIMEZONES[n % 2][0]
+                event = "".join((
+                    "BEGIN:VEVENT\r\n",
+                    "UID:{}-{}@bench\r\n".format(day, n),
+                    "DTSTAMP:20220101T000000Z\r\n",
+                    "DTSTART;TZID={}:{}T{:02d}{:02d}00\r\n".format(tzid, date, 7 + n, n * 5 % 60),
+                    "DTEND;TZID={}:{}T{:02d}{:02d}00\r\n".format(tzid, date, 7 + n, 50),
+                    "SUMMARY:Meeting {} of day {}\r\n".format(n, day),
+                    fold("DESCRIPTION:" + DESCRIPTION) if n % 3 == 0 else "",
+                    "LOCATION:Room {}\r\n".format(n % 4),
+                    "BEGIN:VALARM\r\nTRIGGER:-PT15M\r\nACTION:DISPLAY\r\nDESCRIPTION:Reminder\r\nEND:VALARM\r\n" if n % 2 else "",
+                    "END:VEVENT\r\n"))
+                f.write(event)
+                size += len(event)
+                count += 1
+            day += 1
+        f.write("END:VCALENDAR\r\n")
+    return count, (FIRST_DAY + day) // 2
+
+
+# examples/dash.py before lib/ics_stream.py, reading from a file instead of urequests
+def old_fetch_and_process_ics(raw):
+    buffer = ""
+    in_event = False
+    event_data = []
+    while True:
+        chunk = raw.read(CHUNK)
+        if not chunk:
+            break
+        buffer += chunk.decode('utf-8')
+        lines = buffer.splitlines(keepends=True)
+        buffer = ""
+        for line in lines:
+            if line.startswith("BEGIN:VEVENT"):
+                in_event = True
+                event_data = []
+            if in_event:
+                event_data.append(line)
+            if line.startswith("END:VEVENT"):
+                in_event = False
+                yield event_data
+                event_data = []
+        if lines[-1][-1] != '\n':
+            buffer = lines[-1]
+
+
+def old_parse_ics(ics_generator, timezone_offsets, today):
+    events = []
+    for event_data in ics_generator:
+        event = {}
+        tzoffsetfrom = None
+        tzid = None
+        print("\nProcessing new event...")
+        for line in event_data:
+            line = line.strip()
+            print(line)
+            if line.startswith("SUMMARY:"):
+                event["name"] = line[len("SUMMARY:"):].strip()
+            elif line.startswith("DTSTART;TZID="):
+                tzid = line.split("=")[1].split(":")[0].strip()
+                event["start"] = line.split(":")[-1].strip()
+                print(f"Event start time (before adjustment): {event['start']}")
+            elif line.startswith("DTEND;TZID="):
+                tzid = line.split("=")[1].split(":")[0].strip()
+                event["end"] = line.split(":")[-1].strip()
+            elif line.startswith("TZOFFSETFROM:"):
+                tzoffsetfrom = line[len("TZOFFSETFROM:"):].strip()
+        if tzoffsetfrom is None and tzid is not None:
+            tzoffsetfrom = timezone_offsets.get(tzid, "+0000")
+
+        def parse_datetime(dt_str):
+            return time.mktime((int(dt_str[0:4]), int(dt_str[4:6]), int(dt_str[6:8]), int(dt_str[9:11]),
+                                int(dt_str[11:13]), int(dt_str[13:15]), 0, 0, -1))
+
+        def format_datetime(timestamp):
+            tm = time.localtime(timestamp)
+            return "{:04d}{:02d}{:02d}T{:02d}{:02d}{:02d}".format(tm[0], tm[1], tm[2], tm[3], tm[4], tm[5])
+
+        def apply_offset(event_time, tz_offset):
+            sign = 1 if tz_offset[0] == '+' else -1
+            seconds = int(tz_offset[1:3]) * sign * 3600 + int(tz_offset[3:5]) * sign * 60
+            adjusted = parse_datetime(event_time) - seconds
+            print(f"   Adjusted to UTC: {time.localtime(adjusted)}")
+            return format_datetime(adjusted)
+
+        if "start" in event:
+            event["start"] = apply_offset(event["start"], tzoffsetfrom)
+        if "end" in event:
+            event["end"] = apply_offset(event["end"], tzoffsetfrom)
+        if event.get("start", "")[:8] == today:
+            events.append(event)
+    return events
+
+
+# examples/dash.py with lib/ics_stream.py
+def new_parse_ics(raw, timezone_offsets, today):
+    def apply_offset(event_time, params):
+        tz_offset = "+0000"
+        at = params.find("TZID=")
+        if at >= 0:
+            tz_offset = timezone_offsets.get(params[at + len("TZID="):].split(";")[0].strip('"'), "+0000")
+        sign = 1 if tz_offset[0] == '+' else -1
+        seconds = int(tz_offset[1:3]) * sign * 3600 + int(tz_offset[3:5]) * sign * 60
+        stamp = time.mktime((int(event_time[0:4]), int(event_time[4:6]), int(event_time[6:8]), int(event_time[9:11] or 0),
+                             int(event_time[11:13] or 0), int(event_time[13:15] or 0), 0, 0, -1))
+        tm = time.localtime(stamp - seconds)
+        return "{:04d}{:02d}{:02d}T{:02d}{:02d}{:02d}".format(tm[0], tm[1], tm[2], tm[3], tm[4], tm[5])
+
+    stamp = time.mktime((int(today[0:4]), int(today[4:6]), int(today[6:8]), 12, 0, 0, 0, 0, -1))
+    first = time.strftime("%Y%m%d", time.localtime(stamp - 86400)).encode()
+    last = time.strftime("%Y%m%d", time.localtime(stamp + 86400)).encode()
+    events = []
+    for fields in read_events(IcsReader(raw, CHUNK), first, last):
+        params, start = fields["DTSTART"]
+        params_end, end = fields.get("DTEND", fields["DTSTART"])
+        event = {"name": fields.get("SUMMARY", ("", ""))[1].strip()}
+        event["start"] = apply_offset(start, params)
+        event["end"] = apply_offset(end, params_end)
+        if event["start"][:8] == today:
+            events.append(event)
+    return events
+
+
+def measure(fn):
+    # (result, seconds, peak bytes); timed without tracing, peak measured in a second run
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    os.environ["TZ"] = "UTC"  # the badger's clock is in UTC
+    time.tzset()
+    sizes = [float(a) for a in sys.argv[1:]] or [1, 5]
+    offsets = dict(TIMEZONES)
+    folder = tempfile.mkdtemp(prefix="bench-ics-")
+    print("{:>4s} {:>7s} {:>6s} {:>9s} {:>9s} {:>11s} {:>11s} {:>6s}".format(
+        "MB", "events", "today", "old s", "new s", "old heap KB", "new heap KB", "same"))
+    for megabytes in sizes:
+        path = os.path.join(folder, "calendar.ics")
+        count, day = make_calendar(path, megabytes)
+        today = day_string(day)
+
+        def old():
+            with open(path, "rb") as raw, open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+                return old_parse_ics(old_fetch_and_process_ics(raw), offsets, today)
+
+        def new():
+            with open(path, "rb") as raw:
+                return new_parse_ics(raw, offsets, today)
+
+        old_events, old_time, old_peak = measure(old)
+        new_events, new_time, new_peak = measure(new)
+        print("{:4g} {:7d} {:6d} {:9.3f} {:9.3f} {:11.1f} {:11.1f} {:>6s}".format(
+            megabytes, count, len(new_events), old_time, new_time, old_peak / 1e3, new_peak / 1e3,
+            "yes" if old_events == new_events and new_events else "NO"))
+        os.remove(path)
+    os.rmdir(folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# -----------------------------------------------------------------------------------------------
+# bench_qr.py - host side check and benchmark for lib/qr_render.py
+#
+# Draws the same payloads with the old per-pixel draw_qr_code() that used to be copied into
+# form.py / news.py / qrgen.py and with lib/qr_render.py on the emulator framebuffer, checks
+# the pixels are identical, and compares draw calls and time, including a cached redraw.
+#
+# Usage: python3 host/bench_qr.py
+# -----------------------------------------------------------------------------------------------
+
+import os
+import sys
+import time
+
+HOST = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HOST, "emulator"))
+sys.path.insert(0, os.path.join(HOST, "..", "lib"))
+
+import emulator  # noqa: E402
+import qrcode  # noqa: E402
+import qr_render  # noqa: E402
+
+display = emulator.framebuffer
+
+PAYLOADS = {
+    "news guid": "https://www.bbc.co.uk/news/technology-68912345",
+    "form csv": "Badger 2040 Test,2,e6614c311b2d5a2f,2024-06-03 09:00:00,GARETH BESTOR,42,F,a c d,4,a b c d",
+    "long csv": ",".join(["Badger 2040 Test", "2", "e6614c311b2d5a2f", "2024-06-03 09:00:00"] + ["answer %d" % i for i in range(30)]),
+}
+
+
+# ------------------------------
+# Previous implementation (verbatim from examples/form.py)
+# ------------------------------
+
+def measure_qr_code(size, code):
+    w, h = code.get_size()
+    module_size = int(size / w)
+    return module_size * w, module_size
+
+
+def draw_qr_code(ox, oy, size, code):
+    size, module_size = measure_qr_code(size, code)
+    display.set_pen(15)
+    display.rectangle(ox, oy, size, size)
+    display.set_pen(0)
+    for x in range(size):
+        for y in range(size):
+            if code.get_module(x, y):
+                display.rectangle(ox + x * module_size, oy + y * module_size, module_size, module_size)
+
+
+def old_draw(text):
+    code = qrcode.QRCode()
+    code.set_text(text)
+    size, _ = measure_qr_code(128, code)
+    draw_qr_code(296 - size, (128 - size) // 2, 128, code)
+
+
+def new_draw(text):
+    size, _ = qr_render.measure_qr(text, 128)
+    qr_render.draw_qr(display, text, 296 - size, (128 - size) // 2, 128)
+
+
+def run(draw, text):
+    emulator.reset()
+    start = time.perf_counter()
+    draw(text)
+    elapsed = time.perf_counter() - start
+    return emulator.framebuffer.pixels.copy(), sum(emulator.stats["draw_calls"].values()), elapsed
+
+
+def main():
+    failed = False
+    print("{:10s} {:>7s} {:>10s} {:>10s} {:>10s} {:>10s} {:>12s}".format(
+        "payload", "modules", "old calls", "new calls", "old ms", "new ms", "cached ms"))
+    for name, text in PAYLOADS.items():
+        qr_render.clear_cache()
+        old_pixels, old_calls, old_time = run(old_draw, text)
+        new_pixels, new_calls, new_time = run(new_draw, text)
+        _, _, cached_time = run(new_draw, text)
+        if not (old_pixels == new_pixels).all():
+            failed = True
+            print("MISMATCH for", name)
+        modules = qr_render.qr_rects(text)[0]
+        print("{:10s} {:7d} {:10d} {:10d} {:10.2f} {:10.2f} {:12.3f}".format(
+            name, modules, old_calls, new_calls, old_time * 1000, new_time * 1000, cached_time * 1000))
+    print("pixels identical" if not failed else "pixels differ")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# -----------------------------------------------------------------------------------------------
+# bench_ring_log.py - host side benchmark for lib/ring_log.py
+#
+# For each size, writes a logger CSV (the old data/logged_data.csv format) and a ring log
+# holding the same samples, then times one append and reading the last 50 samples both ways:
+# the old logger appended a line and called readlines() on the whole file, the ring log
+# writes one record plus its header and seeks straight to the tail. Also checks that
+# export_csv() reproduces the CSV byte for byte and that import_csv() reads it back.
+#
+# Usage: python3 host/bench_ring_log.py [records ...]      (default 1000 10000 100000 1000000)
+# -----------------------------------------------------------------------------------------------
+
+import os
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+import ring_log  # noqa: E402
+from ring_log import RingLog, export_csv, import_csv, iso_timestamp  # noqa: E402
+
+REPEATS = 200
+TAIL = 50
+START = ring_log.to_seconds((2024, 1, 1, 0, 0, 0))
+
+
+# ------------------------------
+# Previous implementation (from examples/logger.py)
+# ------------------------------
+
+def read_last_n_entries_from_csv(csv_file_path, n=50):
+    ts, temps, hums = [], [], []
+    with open(csv_file_path, "r") as f:
+        lines = f.readlines()[-n:]
+        for line in lines:
+            parts = line.strip().split(',')
+            if len(parts) == 3:
+                try:
+                    tstamp, temp, hum = parts
+                    ts.append(tstamp)
+                    temps.append(float(temp))
+                    hums.append(float(hum))
+                except ValueError:
+                    continue
+    return ts, temps, hums
+
+
+def append_csv(csv_file_path, timestamp, temperature, humidity):
+    with open(csv_file_path, "a") as f:
+        f.write(f"{timestamp}, {temperature:.2f}, {humidity:.2f}\n")
+
+
+# ------------------------------
+# Benchmark
+# ------------------------------
+
+def sample(i):
+    # Half hourly readings with values that are exact at two decimals
+    return START + i * 1800, (1500 + i * 37 % 1500) / 100, (3000 + i * 53 % 4000) / 100
+
+
+def make_files(folder, records):
+    csv_path = os.path.join(folder, "log_{}.csv".format(records))
+    bin_path = os.path.join(folder, "log_{}.bin".format(records))
+    with open(csv_path, "w") as csv_file, open(bin_path, "wb") as bin_file:
+        # The ring log is written directly, full but not yet wrapped, to save time
+        bin_file.write(struct.pack(ring_log.HEADER, ring_log.MAGIC, ring_log.VERSION,
+                                   ring_log.RECORD_SIZE, 0, records, 0, 0, records))
+        chunk = []
+        for i in range(records):
+            seconds, temp, hum = sample(i)
+            csv_file.write(f"{iso_timestamp(seconds)}, {temp:.2f}, {hum:.2f}\n")
+            chunk.append(struct.pack(ring_log.RECORD, seconds, round(temp * 100), round(hum * 100)))
+            if len(chunk) == 4096:
+                bin_file.write(b"".join(chunk))
+                chunk = []
+        bin_file.write(b"".join(chunk))
+    return csv_path, bin_path
+
+
+def timed(fn):
+    # mean seconds per call over REPEATS calls, and the peak heap of one call
+    start = time.perf_counter()
+    for i in range(REPEATS):
+        fn(i)
+    elapsed = (time.perf_counter() - start) / REPEATS
+    tracemalloc.start()
+    fn(REPEATS)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def check_format(folder):
+    csv_path, bin_path = make_files(folder, 5000)
+    log = RingLog(bin_path)
+    out_path = os.path.join(folder, "export.csv")
+    export_csv(log, out_path)
+    exported = open(out_path).read() == open(csv_path).read()
+    os.remove(bin_path)
+    log = RingLog(bin_path, capacity=5000)
+    imported = import_csv(csv_path, log) == 5000 and list(RingLog(bin_path).records()) == [
+        sample(i) for i in range(5000)]
+    for path in (csv_path, bin_path, out_path):
+        os.remove(path)
+    return exported and imported
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [1000, 10000, 100000, 1000000]
+    folder = tempfile.mkdtemp(prefix="bench-ring-")
+    print("export/import round trip matches the CSV format:", "yes" if check_format(folder) else "NO")
+    print()
+    print("{:>9s} {:>8s} {:>8s} {:>11s} {:>11s} {:>11s} {:>11s} {:>11s} {:>11s}".format(
+        "records", "csv MB", "ring MB", "csv app us", "ring app us", "csv read us",
+        "ring read us", "csv read KB", "ring read KB"))
+    for records in sizes:
+        csv_path, bin_path = make_files(folder, records)
+        csv_size = os.path.getsize(csv_path)
+        bin_size = os.path.getsize(bin_path)
+
+        def csv_append(i):
+            seconds, temp, hum = sample(records + i)
+            append_csv(csv_path, iso_timestamp(seconds), temp, hum)
+
+        def ring_append(i):
+            log.append(*sample(records + i))
+
+        log = RingLog(bin_path)
+        csv_app, _ = timed(csv_append)
+        ring_app, _ = timed(ring_append)
+        csv_read, csv_peak = timed(lambda i: read_last_n_entries_from_csv(csv_path, TAIL))
+        ring_read, ring_peak = timed(lambda i: log.read_last(TAIL))
+
+        expected = [sample(i) for i in range(records + REPEATS + 1 - TAIL, records + REPEATS + 1)]
+        assert log.read_last(TAIL) == expected, "ring log tail differs"
+        assert len(log) == records and os.path.getsize(bin_path) == bin_size
+
+        print("{:9d} {:8.1f} {:8.1f} {:11.1f} {:11.1f} {:11.1f} {:11.1f} {:11.1f} {:11.1f}".format(
+            records, csv_size / 1e6, bin_size / 1e6, csv_app * 1e6, ring_app * 1e6,
+            csv_read * 1e6, ring_read * 1e6, csv_peak / 1e3, ring_peak / 1e3))
+        os.remove(csv_path)
+        os.remove(bin_path)
+    os.rmdir(folder)
+
+
+if __name__ == "__main__":
+    main()
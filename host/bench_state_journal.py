@@ -0,0 +1,146 @@
+# -----------------------------------------------------------------------------------------------
+# bench_state_journal.py - host side benchmark for lib/state_journal.py
+#
+# Replays button sessions of form.py, ebook.py and list.py against their state dicts and
+# counts what reaches the filesystem: the apps used to call badger_os.state_save() on every
+# pass through their loop, rewriting the whole JSON state, and now call StateJournal.save(),
+# which appends only what changed. Reports files written and bytes written per press, and
+# checks that loading the journal gives back the final state, and that a change saved after
+# the journal's last record is cut short (a reset mid-append) survives the next load.
+#
+# Usage: python3 host/bench_state_journal.py [presses]      (default 1000)
+# -----------------------------------------------------------------------------------------------
+
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+from state_journal import StateJournal  # noqa: E402
+
+CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+# ------------------------------
+# Sessions: each step changes the state the way one button press does (or leaves it alone)
+# ------------------------------
+
+def form_session(presses, rng):
+    state = {"at_start": True, "at_end": False, "current": 0, "saved": False, "selection": 0,
+             "magnitude": 1, "char_index": 0, "values": [], "timestamp": "", "button_A": None,
+             "button_B": None, "button_C": None}
+    yield state
+    controls = 20
+    state["at_start"] = False
+    state["values"] = [""] * controls
+    state["timestamp"] = "2024-06-03 09:00:00"
+    yield state
+    for _ in range(presses):
+        press = rng.random()
+        current = state["current"]
+        if press < 0.1:
+            state["current"] = (current + 1) % controls
+            state["selection"] = state["char_index"] = 0
+        elif press < 0.4:
+            state["char_index"] = (state["char_index"] + 1) % len(CHARS)
+        elif press < 0.7:
+            state["values"][current] = (state["values"][current] + CHARS[state["char_index"]])[-24:]
+        elif press < 0.8:
+            state["selection"] = (state["selection"] + 1) % 5
+        # else: a press that changes nothing (wake, or a button with no action here)
+        yield state
+
+
+def ebook_session(presses, rng):
+    state = {"last_offset": 0, "current_page": 0, "font_idx": 0, "text_size": 0.5, "offsets": []}
+    yield state
+    for _ in range(presses):
+        if rng.random() < 0.9:
+            state["current_page"] += 1
+        elif state["current_page"] > 0:
+            state["current_page"] -= 1
+        if state["current_page"] >= len(state["offsets"]):
+            state["offsets"].append(len(state["offsets"]) * 140 + rng.randrange(100))
+        yield state
+
+
+def list_session(presses, rng):
+    items = 40
+    state = {"current_item": 0, "items_hash": 123456789, "checked": [False] * items}
+    yield state
+    for _ in range(presses):
+        press = rng.random()
+        if press < 0.5:
+            state["current_item"] = (state["current_item"] + 1) % items
+        elif press < 0.8:
+            state["checked"][state["current_item"]] = not state["checked"][state["current_item"]]
+        yield state
+
+
+# ------------------------------
+# Benchmark
+# ------------------------------
+
+def json_save(path, state):
+    # badger_os.state_save()
+    data = json.dumps(state)
+    with open(path, "w") as f:
+        f.write(data)
+    return len(data)
+
+
+def run(name, session, presses, folder):
+    old_writes = old_bytes = new_writes = new_bytes = 0
+    journal = StateJournal(name, folder=folder)
+    final = None
+    for i, state in enumerate(session(presses, random.Random(1))):
+        if i == 0:
+            journal.load(state)
+        old_bytes += json_save(os.path.join(folder, name + ".json"), state)
+        old_writes += 1
+        written = journal.save(state)
+        if written:
+            new_writes += 1
+            new_bytes += written
+        final = state
+    restored = {}
+    StateJournal(name, folder=folder).load(restored)
+    return (old_writes, old_bytes, new_writes, new_bytes, os.path.getsize(journal.path),
+            restored == json.loads(json.dumps(final)))
+
+
+def survives_cut(name, folder):
+    path = StateJournal(name, folder=folder).path
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 3)
+    state = {}
+    journal = StateJournal(name, folder=folder)
+    journal.load(state)
+    state["after_cut"] = True
+    journal.save(state)
+    restored = {}
+    StateJournal(name, folder=folder).load(restored)
+    return restored == state
+
+
+def main():
+    presses = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    folder = tempfile.mkdtemp(prefix="bench-state-")
+    print("{:6s} {:>7s} {:>10s} {:>10s} {:>10s} {:>10s} {:>9s} {:>9s} {:>10s} {:>9s} {:>9s}".format(
+        "app", "presses", "json files", "json KB", "jnl writes", "jnl KB", "json B/pr", "jnl B/pr",
+        "jnl size B", "restored", "after cut"))
+    for name, session in (("form", form_session), ("ebook", ebook_session), ("list", list_session)):
+        old_writes, old_bytes, new_writes, new_bytes, size, same = run(name, session, presses, folder)
+        cut = survives_cut(name, folder)
+        print("{:6s} {:7d} {:10d} {:10.1f} {:10d} {:10.1f} {:9.1f} {:9.1f} {:10d} {:>9s} {:>9s}".format(
+            name, presses, old_writes, old_bytes / 1e3, new_writes, new_bytes / 1e3, old_bytes / presses,
+            new_bytes / presses, size, "yes" if same else "NO", "yes" if cut else "NO"))
+    shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
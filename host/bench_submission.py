@@ -0,0 +1,151 @@
+# -----------------------------------------------------------------------------------------------
+# bench_submission.py - host side benchmark for lib/submission_writer.py
+#
+# Saves submissions of generated forms with 10 to 500 controls the way examples/form.py's
+# save() used to and with SubmissionWriter, in a scratch folder. Checks both write the same
+# CSV row and XML instance (apart from the random UUID) and reports the time per save and
+# the number of write() calls.
+#
+# Usage: python3 host/bench_submission.py [controls ...]      (default 10 100 500)
+# -----------------------------------------------------------------------------------------------
+
+import builtins
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+HOST = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HOST, "emulator"))
+sys.path.insert(0, os.path.join(HOST, "..", "lib"))
+
+import machine  # noqa: E402
+import ubinascii  # noqa: E402
+from submission_writer import SubmissionWriter  # noqa: E402
+
+REPEATS = 50
+SERVER_FORM = "Badger-2040-Test-Acquire"
+VERSION_ID = "1688347654"
+TIMESTAMP = "2024-06-03 09:00:00"
+
+
+# ------------------------------
+# Previous implementation (from examples/form.py)
+# ------------------------------
+
+def old_save(formdef, values, submissions):
+    controls = formdef['controls']
+    uuid = '-'.join([''.join([random.choice('0123456789abcdef') for _ in range(8)]),
+                    ''.join([random.choice('0123456789abcdef') for _ in range(4)]),
+                    ''.join([random.choice('0123456789abcdef') for _ in range(4)]),
+                    ''.join([random.choice('0123456789abcdef') for _ in range(4)]),
+                    ''.join([random.choice('0123456789abcdef') for _ in range(12)])])
+
+    deviceid = ubinascii.hexlify(machine.unique_id()).decode("utf-8")
+    row = [formdef['title'], str(formdef['version']), deviceid, TIMESTAMP] + values
+    with open(submissions, "a") as f:
+        f.write(f"uuid:{uuid},{','.join(row)}\n")
+
+    folder_name = "instances/"
+    try:
+        os.mkdir("instances")
+    except OSError:
+        pass
+    try:
+        os.mkdir(folder_name)
+    except OSError:
+        pass
+
+    with open(folder_name + f"/uuid{uuid}.xml", "w") as xml_file:
+        xml_file.write(
+            f"<data xmlns:jr=\"http://openrosa.org/javarosa\" xmlns:orx=\"http://openrosa.org/xforms\" id=\"{SERVER_FORM}\"  version=\"{VERSION_ID}\">\n")
+        for i, control in enumerate(controls):
+            name = control['name']
+            xml_file.write(f"  <{name}>{values[i]}</{name}>\n")
+        xml_file.write(f"  <timestamp>{TIMESTAMP}</timestamp>\n")
+        deviceid = ubinascii.hexlify(machine.unique_id()).decode("utf-8")
+        xml_file.write(f"  <device_id>{deviceid}</device_id>\n")
+        xml_file.write(f"  <meta><instanceID>uuid:{uuid}</instanceID></meta>\n")
+        xml_file.write("</data>")
+    return uuid
+
+
+# ------------------------------
+# Benchmark
+# ------------------------------
+
+class CountingFile:
+    def __init__(self, f, counter):
+        self._f = f
+        self._counter = counter
+
+    def write(self, data):
+        self._counter[0] += 1
+        return self._f.write(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._f.close()
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+def counted(fn):
+    # (mean ms, write() calls per call) of fn()
+    counter = [0]
+    real_open = builtins.open
+    builtins.open = lambda *a, **k: CountingFile(real_open(*a, **k), counter)
+    try:
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            fn()
+        elapsed = (time.perf_counter() - start) / REPEATS
+    finally:
+        builtins.open = real_open
+    return elapsed * 1e3, counter[0] // REPEATS
+
+
+def make_form(count):
+    controls = [{"name": "q{}".format(i)} for i in range(count)]
+    values = ["answer {}".format(i) if i % 3 else str(i) for i in range(count)]
+    return {"title": "Generated", "version": "3", "controls": controls}, values
+
+
+def saved(folder, uuid):
+    with open(os.path.join(folder, "submissions.csv")) as f:
+        row = f.read().splitlines()[-1]
+    with open(os.path.join(folder, "instances", "uuid{}.xml".format(uuid))) as f:
+        xml = f.read()
+    return (row + xml).replace(uuid, "UUID")
+
+
+def main():
+    counts = [int(a) for a in sys.argv[1:]] or [10, 100, 500]
+    folder = tempfile.mkdtemp(prefix="bench-submission-")
+    here = os.getcwd()
+    os.chdir(folder)
+    print("{:>8s} {:>8s} {:>8s} {:>10s} {:>10s} {:>6s}".format(
+        "controls", "old ms", "new ms", "old writes", "new writes", "same"))
+    try:
+        for count in counts:
+            formdef, values = make_form(count)
+            submissions = os.path.join(folder, "submissions.csv")
+            writer = SubmissionWriter(formdef, SERVER_FORM, VERSION_ID, submissions)
+            old_ms, old_writes = counted(lambda: old_save(formdef, values, submissions))
+            new_ms, new_writes = counted(lambda: writer.save(values, TIMESTAMP))
+            same = saved(folder, old_save(formdef, values, submissions)) == saved(
+                folder, writer.save(values, TIMESTAMP))
+            print("{:8d} {:8.3f} {:8.3f} {:10d} {:10d} {:>6s}".format(
+                count, old_ms, new_ms, old_writes, new_writes, "yes" if same else "NO"))
+    finally:
+        os.chdir(here)
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
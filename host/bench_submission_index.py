@@ -0,0 +1,124 @@
+# -----------------------------------------------------------------------------------------------
+# bench_submission_index.py - host side benchmark for lib/submission_index.py
+#
+# Makes an instances folder with N saved submissions, half of them already in an old style
+# log.txt as sent, and times what sendODK.py does before its first upload: the old code
+# parsed log.txt, walked the folder with a stat() per entry and parsed log.txt again to
+# count; the new code asks the index for the first pending instance and the counts. Also
+# times the one-off import_existing() and single lookups, and checks both agree on what is
+# left to send.
+#
+# Usage: python3 host/bench_submission_index.py [instances ...]      (default 500 5000)
+# -----------------------------------------------------------------------------------------------
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid as uuidlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+import submission_index  # noqa: E402
+from submission_index import SubmissionIndex, import_existing  # noqa: E402
+
+LOOKUPS = 1000
+
+
+# ------------------------------
+# Previous implementation (from examples/sendODK.py)
+# ------------------------------
+
+def walk(directory):
+    file_paths = []
+    for entry in os.listdir(directory):
+        entry_path = directory + '/' + entry
+        if os.stat(entry_path)[0] & 0x4000:
+            file_paths.extend(walk(entry_path))
+        else:
+            file_paths.append(entry_path)
+    return file_paths
+
+
+def load_submitted_files():
+    submitted_files = set()
+    if 'log.txt' in os.listdir():
+        with open('log.txt', 'r') as log_file:
+            for line in log_file:
+                file_path, status, _ = line.strip().split(', ')
+                if status == 'Status: Success':
+                    submitted_files.add(file_path.split('/')[-1])
+    return submitted_files
+
+
+def count_unique_uuids(log_file_path):
+    unique_uuids = set()
+    if log_file_path in os.listdir():
+        with open(log_file_path, 'r') as log_file:
+            for line in log_file:
+                file_path, _, response = line.strip().split(', ')
+                unique_uuids.add(response.split('/')[-1])
+    return len(unique_uuids)
+
+
+def old_start():
+    submitted = load_submitted_files()
+    pending = [p for p in walk("instances") if p.endswith(".xml") and p.split("/")[-1] not in submitted]
+    return pending, count_unique_uuids("log.txt")
+
+
+# ------------------------------
+# Benchmark
+# ------------------------------
+
+def make_folder(folder, count):
+    os.mkdir(os.path.join(folder, "instances"))
+    uuids = [str(uuidlib.UUID(bytes=os.urandom(16), version=4)) for _ in range(count)]
+    with open(os.path.join(folder, "log.txt"), "w") as log:
+        for i, uuid in enumerate(uuids):
+            with open(os.path.join(folder, "instances", "uuid{}.xml".format(uuid)), "w") as f:
+                f.write("<data><meta><instanceID>uuid:{}</instanceID></meta></data>".format(uuid))
+            if i % 2 == 0:
+                log.write("File: instances//uuid{}.xml, Status: Success, Response: <ok id=uuid:{}/>\n".format(
+                    uuid, uuid))
+    return uuids
+
+
+def timed(fn, repeats=1):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeats * 1e3
+
+
+def main():
+    counts = [int(a) for a in sys.argv[1:]] or [500, 5000]
+    here = os.getcwd()
+    print("{:>9s} {:>12s} {:>10s} {:>12s} {:>11s} {:>9s} {:>6s}".format(
+        "instances", "old start ms", "import ms", "new start ms", "lookup us", "index KB", "same"))
+    for count in counts:
+        folder = tempfile.mkdtemp(prefix="bench-index-")
+        os.chdir(folder)
+        try:
+            uuids = make_folder(folder, count)
+            (old_pending, _), old_ms = timed(old_start)
+            index = SubmissionIndex()
+            _, import_ms = timed(lambda: import_existing(index))
+
+            def new_start():
+                return next(SubmissionIndex().pending(), None), index.counts()
+            _, new_ms = timed(new_start, 20)
+            _, lookup_ms = timed(lambda: [index.status(u) for u in uuids[:LOOKUPS]])
+            new_pending = sorted(index.pending())
+            same = new_pending == sorted(submission_index.instance_uuid(p) for p in old_pending)
+            print("{:9d} {:12.1f} {:10.1f} {:12.3f} {:11.1f} {:9.1f} {:>6s}".format(
+                count, old_ms, import_ms, new_ms, lookup_ms * 1e3 / min(LOOKUPS, count),
+                os.path.getsize(index.path) / 1e3, "yes" if same else "NO"))
+        finally:
+            os.chdir(here)
+            shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# -----------------------------------------------------------------------------------------------
+# bench_tail.py - host side benchmark for lib/tail.py
+#
+# Writes a logger CSV and a form submissions file of the given size (50 MB by default) and
+# reads the last N lines of each with f.readlines()[-n:], as examples/logger.py used to, and
+# with tail.tail_lines(). Checks both give the same lines and reports time and peak Python
+# heap for each.
+#
+# Usage: python3 host/bench_tail.py [MB ...]      (default 1 10 50)
+# -----------------------------------------------------------------------------------------------
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+from tail import tail_lines  # noqa: E402
+
+COUNTS = (1, 50, 500)
+
+
+def readlines_tail(filename, n):
+    with open(filename, "r") as f:
+        return [line.rstrip("\r\n") for line in f.readlines()[-n:]]
+
+
+def logger_line(i):
+    return "2024-{:02d}-{:02d}T{:02d}:{:02d}:00, {:.2f}, {:.2f}\n".format(
+        i // 1440 % 12 + 1, i // 48 % 28 + 1, i // 2 % 24, i % 2 * 30, 15 + i % 997 / 100, 30 + i % 4001 / 100)
+
+
+def submission_line(i):
+    return "uuid:{:08x}-4a1b-4c2d-8e3f-{:012x},Badger 2040 Test,1688347654,e6614c311b7d2a2f,2024-06-03 10:{:02d}:{:02d},yes,{},red green,HELLO\n".format(
+        i, i * 7919, i // 60 % 60, i % 60, i % 100)
+
+
+def make_file(path, megabytes, line):
+    target = megabytes * 1000000
+    size = 0
+    i = 0
+    with open(path, "w") as f:
+        chunk = []
+        while size < target:
+            text = line(i)
+            chunk.append(text)
+            size += len(text)
+            i += 1
+            if len(chunk) == 10000:
+                f.write("".join(chunk))
+                chunk = []
+        f.write("".join(chunk))
+    return i
+
+
+def measure(fn):
+    # (result, seconds, peak bytes); timed without tracing, peak measured in a second run
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [1, 10, 50]
+    folder = tempfile.mkdtemp(prefix="bench-tail-")
+    print("{:>12s} {:>4s} {:>9s} {:>5s} {:>10s} {:>10s} {:>11s} {:>11s} {:>6s}".format(
+        "file", "MB", "lines", "n", "old ms", "new ms", "old heap KB", "new heap KB", "same"))
+    for megabytes in sizes:
+        for name, line in (("logger", logger_line), ("submissions", submission_line)):
+            path = os.path.join(folder, "{}_{}.csv".format(name, megabytes))
+            lines = make_file(path, megabytes, line)
+            for n in COUNTS:
+                old, old_time, old_peak = measure(lambda: readlines_tail(path, n))
+                new, new_time, new_peak = measure(lambda: tail_lines(path, n))
+                print("{:>12s} {:4d} {:9d} {:5d} {:10.2f} {:10.2f} {:11.1f} {:11.1f} {:>6s}".format(
+                    name, megabytes, lines, n, old_time * 1e3, new_time * 1e3, old_peak / 1e3,
+                    new_peak / 1e3, "yes" if old == new else "NO"))
+            os.remove(path)
+    os.rmdir(folder)
+
+
+if __name__ == "__main__":
+    main()
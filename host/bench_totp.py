@@ -0,0 +1,243 @@
+# -----------------------------------------------------------------------------------------------
+# bench_totp.py - host side benchmark for lib/totp_engine.py
+#
+# Checks the engine against the RFC 6238 SHA1 test vectors and against the pure python
+# implementation that used to be copied into totp.py / totp2.py / dash.py, then times both
+# for a badge with a realistic number of accounts, along with the per time step cache.
+#
+# Usage: python3 host/bench_totp.py [accounts] [steps]
+# -----------------------------------------------------------------------------------------------
+
+import base64
+import os
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+from totp_engine import TOTPEngine  # noqa: E402
+
+# ------------------------------
+# Previous implementation (verbatim from examples/totp2.py)
+# ------------------------------
+
+HASH_CONSTANTS = [0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476, 0xC3D2E1F0]
+
+
+def left_rotate(n, b):
+    return ((n << b) | (n >> (32 - b))) & 0xFFFFFFFF
+
+
+def expand_chunk(chunk):
+    w = list(struct.unpack(">16L", chunk)) + [0] * 64
+    for i in range(16, 80):
+        w[i] = left_rotate((w[i - 3] ^ w[i - 8] ^ w[i - 14] ^ w[i - 16]), 1)
+    return w
+
+
+def sha1(message):
+    h = HASH_CONSTANTS
+    padded_message = message + b"\x80" + \
+        (b"\x00" * (63 - (len(message) + 8) % 64)) + \
+        struct.pack(">Q", 8 * len(message))
+    chunks = [padded_message[i:i+64] for i in range(0, len(padded_message), 64)]
+
+    for chunk in chunks:
+        expanded_chunk = expand_chunk(chunk)
+        a, b, c, d, e = h
+        for i in range(0, 80):
+            if 0 <= i < 20:
+                f = (b & c) | ((~b) & d)
+                k = 0x5A827999
+            elif 20 <= i < 40:
+                f = b ^ c ^ d
+                k = 0x6ED9EBA1
+            elif 40 <= i < 60:
+                f = (b & c) | (b & d) | (c & d)
+                k = 0x8F1BBCDC
+            else:  # 60 <= i < 80
+                f = b ^ c ^ d
+                k = 0xCA62C1D6
+            a, b, c, d, e = (
+                (left_rotate(a, 5) + f + e + k + expanded_chunk[i]) & 0xFFFFFFFF,
+                a,
+                left_rotate(b, 30),
+                c,
+                d,
+            )
+        h = (
+            (h[0] + a) & 0xFFFFFFFF,
+            (h[1] + b) & 0xFFFFFFFF,
+            (h[2] + c) & 0xFFFFFFFF,
+            (h[3] + d) & 0xFFFFFFFF,
+            (h[4] + e) & 0xFFFFFFFF,
+        )
+
+    return struct.pack(">5I", *h)
+
+
+def hmac_sha1(key, message):
+    key_block = key + (b'\0' * (64 - len(key)))
+    key_inner = bytes((x ^ 0x36) for x in key_block)
+    key_outer = bytes((x ^ 0x5C) for x in key_block)
+
+    inner_message = key_inner + message
+    outer_message = key_outer + sha1(inner_message)
+
+    return sha1(outer_message)
+
+
+def base32_decode(message):
+    padded_message = message + '=' * (8 - len(message) % 8)
+    chunks = [padded_message[i:i+8] for i in range(0, len(padded_message), 8)]
+
+    decoded = []
+
+    for chunk in chunks:
+        bits = 0
+        bitbuff = 0
+
+        for c in chunk:
+            if 'A' <= c <= 'Z':
+                n = ord(c) - ord('A')
+            elif '2' <= c <= '7':
+                n = ord(c) - ord('2') + 26
+            elif c == '=':
+                continue
+            else:
+                raise ValueError("Not Base32")
+
+            bits += 5
+            bitbuff <<= 5
+            bitbuff |= n
+
+            if bits >= 8:
+                bits -= 8
+                byte = bitbuff >> bits
+                bitbuff &= ~(0xFF << bits)
+                decoded.append(byte)
+
+    return bytes(decoded)
+
+
+def totp(time, key, step_secs=30, digits=6):
+    hmac = hmac_sha1(base32_decode(key), struct.pack(">Q", time // step_secs))
+    offset = hmac[-1] & 0xF
+    code = ((hmac[offset] & 0x7F) << 24 |
+            (hmac[offset + 1] & 0xFF) << 16 |
+            (hmac[offset + 2] & 0xFF) << 8 |
+            (hmac[offset + 3] & 0xFF))
+    code = str(code % 10 ** digits)
+
+    return (
+        "0" * (digits - len(code)) + code,
+        step_secs - time % step_secs
+    )
+
+
+# ------------------------------
+# Checks
+# ------------------------------
+
+# RFC 6238 appendix B, SHA1 column
+RFC6238_SECRET = base64.b32encode(b"12345678901234567890").decode()
+RFC6238_VECTORS = [
+    (59, "94287082"),
+    (1111111109, "07081804"),
+    (1111111111, "14050471"),
+    (1234567890, "89005924"),
+    (2000000000, "69279037"),
+    (20000000000, "65353130"),
+]
+
+
+def check_rfc6238():
+    engine = TOTPEngine([{"name": "rfc6238", "key": RFC6238_SECRET}], 30, 8)
+    for now, expected in RFC6238_VECTORS:
+        codes, _ = engine.codes(now)
+        assert codes[0] == expected, (now, codes[0], expected)
+    print("RFC 6238 vectors: {} / {} ok".format(len(RFC6238_VECTORS), len(RFC6238_VECTORS)))
+
+
+def make_accounts(n):
+    accounts = []
+    for i in range(n):
+        secret = base64.b32encode(os.urandom(20)).decode().rstrip("=")
+        accounts.append({"name": "ACCOUNT {}".format(i), "key": secret})
+    return accounts
+
+
+def check_against_previous(accounts, steps):
+    engine = TOTPEngine(accounts)
+    for step in range(steps):
+        now = 1700000000 + step * 30
+        codes, remaining = engine.codes(now)
+        for account, code in zip(accounts, codes):
+            assert (code, remaining) == totp(now, account["key"], 30, 6), account["name"]
+    print("matches previous implementation for {} accounts x {} steps".format(len(accounts), steps))
+
+
+# ------------------------------
+# Benchmark
+# ------------------------------
+
+def bench(accounts, steps):
+    now = 1700000000
+
+    start = time.perf_counter()
+    for step in range(steps):
+        for account in accounts:
+            totp(now + step * 30, account["key"], 30, 6)
+    previous = (time.perf_counter() - start) / steps
+
+    start = time.perf_counter()
+    engine = TOTPEngine(accounts)
+    setup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for step in range(steps):
+        engine.codes(now + step * 30)
+    current = (time.perf_counter() - start) / steps
+
+    print("{} accounts, mean of {} refreshes".format(len(accounts), steps))
+    print("  previous totp() per refresh : {:8.3f} ms".format(previous * 1000))
+    print("  engine one-off key setup    : {:8.3f} ms".format(setup * 1000))
+    print("  engine.codes() per refresh  : {:8.3f} ms".format(current * 1000))
+    print("  speedup                     : {:8.1f}x".format(previous / current))
+
+
+def bench_cache(accounts, presses):
+    engine = TOTPEngine(accounts)
+    now = 1700000010
+
+    # First press in a step pays for the hashing, the rest are served from the cache
+    start = time.perf_counter()
+    for press in range(presses):
+        engine.cached_codes(now + press % 15)
+    in_step = (time.perf_counter() - start) / presses
+
+    # Idle prefetch ahead of the rollover, then the redraw at rollover itself
+    start = time.perf_counter()
+    engine.prefetch(now)
+    prefetch = time.perf_counter() - start
+    start = time.perf_counter()
+    codes, _ = engine.cached_codes(now + 30)
+    rollover = time.perf_counter() - start
+    assert codes == engine.codes_for_step((now + 30) // 30)
+
+    print("time step cache, {} redraws in one step".format(presses))
+    print("  cached_codes() per redraw   : {:8.3f} ms".format(in_step * 1000))
+    print("  idle prefetch of next step  : {:8.3f} ms".format(prefetch * 1000))
+    print("  redraw at rollover          : {:8.3f} ms".format(rollover * 1000))
+
+
+if __name__ == "__main__":
+    n_accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    n_steps = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    accounts = make_accounts(n_accounts)
+    check_rfc6238()
+    check_against_previous(accounts, 10)
+    bench(accounts, n_steps)
+    bench_cache(accounts, n_steps)
@@ -0,0 +1,169 @@
+# -----------------------------------------------------------------------------------------------
+# bench_upload.py - host side benchmark for lib/odk_uploader.py
+#
+# Makes an instances folder with N saved submissions and an index queuing them, and uploads
+# them to host/odk_stub_server.py (a local stand-in for ODK Central's /submissions endpoint)
+# the way examples/sendODK.py used to - one urequests.post() and so one new connection per
+# instance, with the XML read into RAM - and with Uploader over one keep-alive connection.
+# The server adds latency per connection and per request to stand in for the TLS handshake
+# and Central's answer over Wi-Fi. Reports instances/min, connections made and the e-ink
+# refreshes sendODK.py would do (two per file before, one per 10 files now).
+#
+# Then checks resuming: the upload is cut off part way (as by a power cut) and started
+# again, and every instance must reach the server and be recorded as sent, with at most the
+# requests in flight at the cut sent twice (Central answers those with 409).
+#
+# Usage: python3 host/bench_upload.py [instances ...]      (default 50 200)
+#        [--connect-ms 300] [--request-ms 20] [--pipeline 2]
+# -----------------------------------------------------------------------------------------------
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+HOST = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HOST)
+sys.path.insert(0, os.path.join(HOST, "emulator"))
+sys.path.insert(0, os.path.join(HOST, "..", "lib"))
+
+from odk_stub_server import CentralServer, USERNAME, PASSWORD  # noqa: E402
+from odk_uploader import Uploader, basic_auth  # noqa: E402
+from submission_index import SubmissionIndex, SENT, FAILED  # noqa: E402
+from submission_writer import new_uuid  # noqa: E402
+
+UPDATE_MS = 500  # a full refresh at sendODK.py's update speed 2
+BODY = "<data id=\"badger\">" + "<q>answer</q>" * 40 + "<meta><instanceID>uuid:{}</instanceID></meta></data>"
+
+
+class PowerLoss(Exception):
+    pass
+
+
+# ------------------------------
+# Previous implementation (from examples/sendODK.py)
+# ------------------------------
+
+def old_upload(index, url, username, password):
+    sent = 0
+    for uuid in index.pending():
+        with open("instances/uuid" + uuid + ".xml", "r") as file:
+            xml_data = file.read()
+        headers = {"Content-Type": "application/xml",
+                   "Authorization": "Basic " + basic_auth(username, password)}
+        request = urllib.request.Request(url, data=xml_data.encode(), headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                status = response.status
+                response.read()
+        except urllib.error.HTTPError as e:
+            status = e.code
+        success = status in (200, 201)
+        index.record(uuid, SENT if success else FAILED)
+        sent += success
+    return sent
+
+
+# ------------------------------
+# Benchmark
+# ------------------------------
+
+def make_instances(count):
+    os.mkdir("instances")
+    index = SubmissionIndex()
+    for _ in range(count):
+        uuid = new_uuid()
+        with open("instances/uuid{}.xml".format(uuid), "w") as f:
+            f.write(BODY.format(uuid))
+        index.queue(uuid)
+    return index
+
+
+def path_for(uuid):
+    return "instances/uuid" + uuid + ".xml"
+
+
+def run(count, args, upload):
+    # (elapsed s, instances sent, server) for upload(index, server) in a fresh folder
+    server = CentralServer(connect_ms=args.connect_ms, request_ms=args.request_ms).start()
+    folder = tempfile.mkdtemp(prefix="bench-upload-")
+    here = os.getcwd()
+    os.chdir(folder)
+    try:
+        index = make_instances(count)
+        start = time.perf_counter()
+        upload(index, server)
+        elapsed = time.perf_counter() - start
+        return elapsed, index.counts()[1], server
+    finally:
+        os.chdir(here)
+        shutil.rmtree(folder)
+        server.shutdown()
+        server.server_close()
+
+
+def new_upload(args, updates):
+    def upload(index, server):
+        uploader = Uploader(server.url(), USERNAME, PASSWORD, pipeline=args.pipeline)
+        uploader.upload(index, path_for, on_progress=lambda sent, failed: updates.append(sent))
+    return upload
+
+
+def resume(count, args):
+    # Cut the upload off after a third of the answers, start again; True if it all arrived once
+    def upload(index, server):
+        def on_result(uuid, status, body):
+            answered.append(uuid)
+            if len(answered) == count // 3:
+                raise PowerLoss()
+        answered = []
+        uploader = Uploader(server.url(), USERNAME, PASSWORD, pipeline=args.pipeline)
+        try:
+            uploader.upload(index, path_for, on_result)
+        except PowerLoss:
+            uploader.close()
+        sent, _ = Uploader(server.url(), USERNAME, PASSWORD, pipeline=args.pipeline).upload(
+            SubmissionIndex(), path_for)
+        upload.result = (len(answered), sent)
+    _, recorded, server = run(count, args, upload)
+    first, second = upload.result
+    ok = (recorded == count and len(server.instances) == count
+          and first + second == count
+          and server.counts["requests"] - count <= args.pipeline)
+    return ok, first, server.counts["requests"] - count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("counts", type=int, nargs="*", default=[50, 200])
+    parser.add_argument("--connect-ms", type=float, default=300)
+    parser.add_argument("--request-ms", type=float, default=20)
+    parser.add_argument("--pipeline", type=int, default=2)
+    args = parser.parse_args()
+
+    print("latency: {:g} ms per connection, {:g} ms per request; pipeline {}".format(
+        args.connect_ms, args.request_ms, args.pipeline))
+    print("{:>9s} {:>10s} {:>10s} {:>9s} {:>9s} {:>11s} {:>11s} {:>7s}".format(
+        "instances", "old /min", "new /min", "old conn", "new conn", "old e-ink s", "new e-ink s", "resume"))
+    for count in args.counts:
+        old_s, old_sent, old_server = run(count, args, lambda index, server: old_upload(
+            index, server.url(), USERNAME, PASSWORD))
+        updates = []
+        new_s, new_sent, new_server = run(count, args, new_upload(args, updates))
+        ok, cut, resent = resume(count, args)
+        if old_sent != count or new_sent != count:
+            print("  not all sent: old {} new {}".format(old_sent, new_sent))
+        print("{:9d} {:10.0f} {:10.0f} {:9d} {:9d} {:11.1f} {:11.1f} {:>7s}".format(
+            count, count / old_s * 60, count / new_s * 60,
+            old_server.counts["connections"], new_server.counts["connections"],
+            (2 * count + 1) * UPDATE_MS / 1e3, (len(updates) + 2) * UPDATE_MS / 1e3,
+            "yes" if ok else "NO"))
+        print("          (resume: cut after {} answers, {} sent twice)".format(cut, resent))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# Host stand-in for Pimoroni's badger2040 module, drawing into the emulator framebuffer.
+# https://github.com/pimoroni/badger2040/blob/main/firmware/PIMORONI_BADGER2040/lib/badger2040.py
+
+import emulator
+import machine
+
+WIDTH = emulator.WIDTH
+HEIGHT = emulator.HEIGHT
+
+BUTTON_DOWN = 11
+BUTTON_A = 12
+BUTTON_B = 13
+BUTTON_C = 14
+BUTTON_UP = 15
+BUTTON_USER = None  # User button not available on W
+
+BUTTON_MASK = 0b11111 << 11
+
+BUTTONS = {
+    BUTTON_DOWN: machine.Pin(BUTTON_DOWN, machine.Pin.IN, machine.Pin.PULL_DOWN),
+    BUTTON_A: machine.Pin(BUTTON_A, machine.Pin.IN, machine.Pin.PULL_DOWN),
+    BUTTON_B: machine.Pin(BUTTON_B, machine.Pin.IN, machine.Pin.PULL_DOWN),
+    BUTTON_C: machine.Pin(BUTTON_C, machine.Pin.IN, machine.Pin.PULL_DOWN),
+    BUTTON_UP: machine.Pin(BUTTON_UP, machine.Pin.IN, machine.Pin.PULL_DOWN),
+}
+
+SYSTEM_VERY_SLOW = 0
+SYSTEM_SLOW = 1
+SYSTEM_NORMAL = 2
+SYSTEM_FAST = 3
+SYSTEM_TURBO = 4
+
+UPDATE_NORMAL = 0
+UPDATE_MEDIUM = 1
+UPDATE_FAST = 2
+UPDATE_TURBO = 3
+
+RTC_ALARM = 8
+LED = 22
+ENABLE_3V3 = 10
+BUSY = 26
+
+
+def is_wireless():
+    return True
+
+
+def woken_by_rtc():
+    return False
+
+
+def woken_by_button():
+    return emulator.config["woken_by_button"]
+
+
+def pressed_to_wake(button):
+    return emulator.config["woken_by_button"] and emulator.pressed(button)
+
+
+def reset_pressed_to_wake():
+    emulator.config["woken_by_button"] = False
+
+
+def pressed_to_wake_get_once(button):
+    result = pressed_to_wake(button)
+    reset_pressed_to_wake()
+    return result
+
+
+def system_speed(speed):
+    emulator.stats["system_speed"] = speed
+
+
+def turn_on():
+    pass
+
+
+def turn_off():
+    emulator.halt()
+
+
+def sleep_for(minutes):
+    # RTC wake-up: on the device this powers off until the alarm fires
+    emulator.advance(minutes * 60)
+
+
+class Badger2040:
+    def __init__(self):
+        self._framebuffer = emulator.framebuffer
+        self._update_speed = UPDATE_NORMAL
+        self._led = 0
+
+    @property
+    def display(self):
+        # The PicoGraphics object, whose buffer is the framebuffer: memoryview(display.display)
+        self._framebuffer.sync()
+        return self._framebuffer
+
+    def __getattr__(self, item):
+        # Drawing primitives go straight to the framebuffer, like the real class does
+        return getattr(self._framebuffer, item)
+
+    def led(self, brightness):
+        self._led = brightness
+
+    def invert(self, invert):
+        pass
+
+    def thickness(self, thickness):
+        self._framebuffer.set_thickness(thickness)
+
+    def set_thickness(self, thickness):
+        self._framebuffer.set_thickness(thickness)
+
+    def set_update_speed(self, speed):
+        self._update_speed = speed
+
+    def update_speed(self, speed):
+        self._update_speed = speed
+
+    def update(self):
+        emulator.record_update("full", self._update_speed)
+
+    def partial_update(self, x, y, w, h):
+        emulator.record_update("partial", self._update_speed, x, y, w, h)
+
+    def image(self, data, w, h, x, y):
+        self._framebuffer.image(data, w, h, x, y)
+
+    def pressed(self, button):
+        return emulator.pressed(button)
+
+    def pressed_any(self):
+        return emulator.pressed_any()
+
+    def wait_for_press(self):
+        while not emulator.pressed_any():
+            emulator.halt()
+
+    def keepalive(self):
+        pass
+
+    def halt(self):
+        emulator.halt()
+
+    def connect(self, **args):
+        pass
+
+    def isconnected(self):
+        return emulator.config["wifi"]
+
+    def ip_address(self):
+        return "192.168.0.100" if emulator.config["wifi"] else None
+
+    def status_handler(self, mode, status, ip):
+        pass
@@ -0,0 +1,100 @@
+# Host stand-in for Pimoroni's badger_os module; app state lives in /state/<app>.json on the
+# emulated filesystem, exactly as on the device.
+# https://github.com/pimoroni/badger2040/blob/main/firmware/PIMORONI_BADGER2040/lib/badger_os.py
+
+import json
+import os
+
+import emulator
+
+
+def get_battery_level():
+    return 4
+
+
+def get_disk_usage():
+    f_bsize, f_frsize, f_blocks, f_bfree, _, _, _, _, _, _ = os.statvfs("/")
+    f_total_size = f_frsize * f_blocks
+    f_total_free = f_bsize * f_bfree
+    f_total_used = f_total_size - f_total_free
+    f_used = 100 / f_total_size * f_total_used
+    f_free = 100 / f_total_size * f_total_free
+    return f_total_size, f_used, f_free
+
+
+def state_running():
+    state = {"running": "launcher"}
+    state_load("launcher", state)
+    return state["running"]
+
+
+def state_clear_running():
+    running = state_running()
+    state_modify("launcher", {"running": "launcher"})
+    return running != "launcher"
+
+
+def state_set_running(app):
+    state_modify("launcher", {"running": app})
+
+
+def state_launch():
+    app = state_running()
+    if app is not None and app != "launcher":
+        launch("examples/" + app)
+
+
+def state_delete(app):
+    try:
+        os.remove("/state/{}.json".format(app))
+    except OSError:
+        pass
+
+
+def state_save(app, data):
+    emulator.stats.setdefault("state_writes", []).append(app)
+    try:
+        with open("/state/{}.json".format(app), "w") as f:
+            f.write(json.dumps(data))
+            f.flush()
+    except OSError:
+        try:
+            os.stat("/state")
+        except OSError:
+            os.mkdir("/state")
+            state_save(app, data)
+
+
+def state_modify(app, data):
+    state = {}
+    state_load(app, state)
+    state.update(data)
+    state_save(app, state)
+
+
+def state_load(app, defaults):
+    try:
+        data = json.loads(open("/state/{}.json".format(app), "r").read())
+        if type(data) is dict:
+            defaults.update(data)
+            return True
+    except (OSError, ValueError):
+        pass
+
+    state_save(app, defaults)
+    return False
+
+
+def launch(file):
+    # Returning to the launcher ends the app on the host
+    raise emulator.EmulatorExit("launch " + str(file))
+
+
+def warning(display, message, width=emulator.WIDTH - 20, height=emulator.HEIGHT - 20, line_spacing=20, text_size=0.6):
+    if display is None:
+        return
+    display.set_pen(15)
+    display.rectangle((emulator.WIDTH - width) // 2, (emulator.HEIGHT - height) // 2, width, height)
+    display.set_pen(0)
+    display.text(message, (emulator.WIDTH - width) // 2 + 5, emulator.HEIGHT // 2, width - 10, text_size)
+    display.update()
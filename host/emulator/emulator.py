@@ -0,0 +1,632 @@
+# -----------------------------------------------------------------------------------------------
+# emulator.py - host side Badger 2040 W emulator core
+#
+# Description:
+#    The other modules in this folder stand in for the badger firmware modules (badger2040,
+#    badger_os, jpegdec, pngdec, qrcode, pcf85063a, machine, utime, urequests, ...). They all
+#    share the state kept here:
+#
+#      * a 296x128 4-bit framebuffer (numpy uint8, pen 0 = black .. 15 = white), which is also
+#        the 1-bit buffer memoryview(display.display) writes to on the device
+#      * draw-call and measure_text counters, and one record per update()/partial_update()
+#        with the bytes pushed to the panel and an estimate of the e-ink refresh time
+#      * a virtual clock, so utime.sleep(), lightsleep() and halt() return immediately
+#      * a script of button presses, which also fire Pin.irq() handlers and end lightsleep()
+#      * a mapping from the device filesystem ("/forms/...", "data/...") to a host folder
+#      * canned HTTP responses for urequests
+#
+#    Only needs numpy. Use host/run_app.py to run an app headless.
+# -----------------------------------------------------------------------------------------------
+
+import builtins
+import calendar
+import os
+import struct
+import sys
+import time as _time
+import zlib
+
+import numpy as np
+
+WIDTH = 296
+HEIGHT = 128
+
+# Approximate full-screen refresh times for each badger2040.UPDATE_* speed, in ms
+UPDATE_TIMES_MS = {0: 2000, 1: 1000, 2: 500, 3: 250}
+
+# Glyph advance (px at scale 1) and height for the built-in fonts. Text is "greeked":
+# every non-space character is drawn as a block, which is enough to see layout and to count
+# pixels and calls, but is not a font renderer.
+BITMAP_FONTS = {
+    "bitmap6": (6, 6),
+    "bitmap8": (6, 8),
+    "bitmap14_outline": (10, 14),
+    "bitmap16": (10, 16),
+}
+VECTOR_FONT_ADVANCE = 20
+VECTOR_FONT_HEIGHT = 22
+
+DEFAULT_START_TIME = 1717405200  # 2024-06-03 09:00:00
+
+
+class EmulatorExit(BaseException):
+    # Raised to stop an app's main loop once the script has run out; a BaseException so an
+    # app's own `except Exception` handlers don't swallow it
+    pass
+
+
+class PowerOff(EmulatorExit):
+    # Raised by halt() on battery: the badger powers off and the next press starts the app
+    # again from the top (see run_app.run_app())
+    pass
+
+
+# ------------------------------
+# Framebuffer
+# ------------------------------
+
+class Framebuffer(bytearray):
+    # The bytes are the badger's 1-bit framebuffer, as memoryview(display.display) sees it on
+    # the device: column by column, 8 rows a byte with the top row in the high bit, set bits
+    # white (pens 8..15). Drawing goes to the 4-bit pixels; sync() brings the bytes up to date
+    # with them, and bits written straight into the bytes reach the pixels on the next draw.
+    def __init__(self, width=WIDTH, height=HEIGHT):
+        bytearray.__init__(self, width * height // 8)
+        self.width = width
+        self.height = height
+        self._pixels = np.full((height, width), 15, dtype=np.uint8)
+        self._packed = bytearray(len(self))  # the bytes as the pixels last left them
+        self._stale = True
+        self.pen = 0
+        self.font = "bitmap8"
+        self.thickness = 1
+        self.sync()
+
+    def _take_bytes(self):
+        # Pixels whose bit was written directly become white (15) or black (0)
+        old = np.frombuffer(self._packed, dtype=np.uint8)
+        new = np.frombuffer(self, dtype=np.uint8)
+        column = self.height // 8
+        for x in np.unique(np.flatnonzero(old != new) // column):
+            was = np.unpackbits(old[x * column:(x + 1) * column])
+            now = np.unpackbits(new[x * column:(x + 1) * column])
+            changed = was != now
+            self._pixels[changed, x] = now[changed] * 15
+        self._packed[:] = self
+
+    @property
+    def pixels(self):
+        # Whoever asks for the pixels may draw on them
+        if self._packed != self:
+            self._take_bytes()
+        self._stale = True
+        return self._pixels
+
+    def sync(self):
+        if self._packed != self:
+            self._take_bytes()
+        if self._stale:
+            # A few columns at a time, to keep the host heap the apps are measured by small
+            column = self.height // 8
+            for x in range(0, self.width, 16):
+                self[x * column:(x + 16) * column] = np.packbits(self._pixels[:, x:x + 16].T >= 8, axis=1).tobytes()
+            self._packed[:] = self
+            self._stale = False
+
+    # Counters are kept on the module so every stand-in shares them
+    def _count(self, name):
+        counts = stats["draw_calls"]
+        counts[name] = counts.get(name, 0) + 1
+        totals = stats["total_draw_calls"]
+        totals[name] = totals.get(name, 0) + 1
+
+    def set_pen(self, pen):
+        self.pen = int(pen) & 0xF
+
+    def set_font(self, font):
+        self.font = font
+
+    def set_thickness(self, thickness):
+        self.thickness = max(1, int(thickness))
+
+    def _fill(self, x0, y0, x1, y1):
+        x0 = max(0, int(x0))
+        y0 = max(0, int(y0))
+        x1 = min(self.width, int(x1))
+        y1 = min(self.height, int(y1))
+        if x1 > x0 and y1 > y0:
+            self.pixels[y0:y1, x0:x1] = self.pen
+
+    def clear(self):
+        self._count("clear")
+        self.pixels[:, :] = self.pen
+
+    def pixel(self, x, y):
+        self._count("pixel")
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.pixels[int(y), int(x)] = self.pen
+
+    def pixel_span(self, x, y, length):
+        self._count("pixel_span")
+        self._fill(x, y, x + length, y + 1)
+
+    def rectangle(self, x, y, w, h):
+        self._count("rectangle")
+        self._fill(x, y, x + w, y + h)
+
+    def line(self, x1, y1, x2, y2, thickness=None):
+        self._count("line")
+        t = self.thickness if thickness is None else max(1, int(thickness))
+        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+        steps = max(abs(x2 - x1), abs(y2 - y1), 1)
+        xs = np.rint(np.linspace(x1, x2, steps + 1)).astype(int)
+        ys = np.rint(np.linspace(y1, y2, steps + 1)).astype(int)
+        half = t // 2
+        for x, y in zip(xs, ys):
+            self._fill(x - half, y - half, x - half + t, y - half + t)
+
+    def circle(self, x, y, r):
+        self._count("circle")
+        x0, x1 = max(0, int(x - r)), min(self.width, int(x + r + 1))
+        y0, y1 = max(0, int(y - r)), min(self.height, int(y + r + 1))
+        if x1 <= x0 or y1 <= y0:
+            return
+        yy, xx = np.ogrid[y0:y1, x0:x1]
+        mask = (xx - x) ** 2 + (yy - y) ** 2 <= r * r
+        self.pixels[y0:y1, x0:x1][mask] = self.pen
+
+    def triangle(self, x1, y1, x2, y2, x3, y3):
+        self._count("triangle")
+        self._polygon([(x1, y1), (x2, y2), (x3, y3)])
+
+    def polygon(self, points):
+        self._count("polygon")
+        self._polygon(points)
+
+    def _polygon(self, points):
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        x0, x1 = max(0, int(min(xs))), min(self.width, int(max(xs)) + 1)
+        y0, y1 = max(0, int(min(ys))), min(self.height, int(max(ys)) + 1)
+        if x1 <= x0 or y1 <= y0:
+            return
+        yy, xx = np.mgrid[y0:y1, x0:x1]
+        inside = np.zeros(xx.shape, dtype=bool)
+        n = len(points)
+        for i in range(n):
+            ax, ay = points[i]
+            bx, by = points[(i + 1) % n]
+            crosses = ((ay > yy) != (by > yy)) & (xx < (bx - ax) * (yy - ay) / ((by - ay) or 1e-9) + ax)
+            inside ^= crosses
+        self.pixels[y0:y1, x0:x1][inside] = self.pen
+
+    def image(self, data, w, h, x, y):
+        # As badger2040.Badger2040.image() on the device: data holds one int per row, read
+        # from bit 0 (the left pixel) up, and each clear bit is drawn as a pixel() in the
+        # current pen, so every one of those counts as a pixel draw call
+        self._count("image")
+        for oy in range(h):
+            row = int(data[oy])
+            for ox in range(w):
+                if row & 1 == 0:
+                    self.pixel(x + ox, y + oy)
+                row >>= 1
+
+    def blit_gray(self, gray, x, y):
+        # Used by the jpegdec/pngdec stand-ins: gray is a 2D array of pens 0..15
+        h, w = gray.shape
+        x, y = int(x), int(y)
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(self.width, x + w), min(self.height, y + h)
+        if x1 > x0 and y1 > y0:
+            self.pixels[y0:y1, x0:x1] = gray[y0 - y:y1 - y, x0 - x:x1 - x]
+
+    def __bytes__(self):
+        self.sync()
+        return bytes(self._packed)
+
+    # Text
+
+    def _font_metrics(self, scale):
+        if self.font in BITMAP_FONTS:
+            advance, height = BITMAP_FONTS[self.font]
+            scale = max(1, int(scale))
+            return advance * scale, height * scale, False
+        return max(1, int(VECTOR_FONT_ADVANCE * scale)), max(1, int(VECTOR_FONT_HEIGHT * scale)), True
+
+    def measure_text(self, text, scale=2, spacing=1, fixed_width=False):
+        stats["measure_text"] += 1
+        stats["total_measure_text"] += 1
+        advance, _, _ = self._font_metrics(scale)
+        return len(str(text)) * advance
+
+    def text(self, text, x, y, wordwrap=0x7FFFFFFF, scale=2, angle=0, spacing=1, fixed_width=False):
+        self._count("text")
+        text = str(text)
+        advance, height, centred = self._font_metrics(scale)
+        if centred:
+            y -= height // 2  # vector fonts are drawn around y, bitmap fonts below it
+        glyph_w = max(1, advance - max(1, advance // 6))
+        glyph_h = max(1, height - max(1, height // 4))
+
+        cx, cy = int(x), int(y)
+        for word in text.split(" "):
+            word_w = len(word) * advance
+            if cx > x and cx + word_w - x > wordwrap:
+                cx = int(x)
+                cy += height
+            for char in word:
+                if char == "\n":
+                    cx = int(x)
+                    cy += height
+                    continue
+                self._fill(cx, cy, cx + glyph_w, cy + glyph_h)
+                cx += advance
+            cx += advance
+
+    # Output
+
+    def to_png(self, path):
+        gray = (self.pixels.astype(np.uint16) * 17).astype(np.uint8)
+        write_png(path, gray)
+
+
+def write_png(path, gray):
+    # 8-bit grayscale PNG, no dependencies beyond zlib
+    h, w = gray.shape
+    raw = b"".join(b"\x00" + gray[row].tobytes() for row in range(h))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    with _real_open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 0, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw, 9)))
+        f.write(chunk(b"IEND", b""))
+
+
+# ------------------------------
+# Shared state
+# ------------------------------
+
+framebuffer = Framebuffer()
+
+DEFAULT_CONFIG = {
+    "start_time": DEFAULT_START_TIME,
+    "run_for": 24 * 3600,        # virtual seconds before the app is stopped
+    "max_updates": None,         # stop after this many update()/partial_update() calls
+    "woken_by_button": False,
+    "battery": False,            # halt() powers off, so every press starts the app again
+    "wifi": True,
+    "png_dir": None,             # write a PNG of the panel on every update when set
+    "network": None,             # "host" lets urequests reach the real network for unknown URLs
+}
+config = dict(DEFAULT_CONFIG)
+
+stats = {}
+clock = {"now": 0.0, "start": 0.0}
+buttons = {"queue": [], "active": None, "last_end": 0.0, "idle_polls": 0}
+irqs = {}        # pin -> handler set with machine.Pin.irq(), called when a press starts
+irq_state = {"disabled": False, "pending": []}  # machine.disable_irq(): pins whose handler waits
+
+# Virtual time one pass of a busy polling loop takes on the RP2040, and how many polls with
+# no press left to come and no screen update count as the app having nothing more to do
+POLL_COST = 0.001
+MAX_IDLE_POLLS = 20000
+http = {}        # url -> (status, body) or callable(method, url, headers, data)
+requests = []    # (method, url) of every request made through urequests
+
+
+def reset(**options):
+    # Options not given go back to their defaults, so back to back runs do not leak settings
+    config.clear()
+    config.update(DEFAULT_CONFIG)
+    config.update(options)
+    framebuffer.__init__()
+    stats.clear()
+    stats.update({
+        "draw_calls": {},
+        "total_draw_calls": {},
+        "measure_text": 0,
+        "total_measure_text": 0,
+        "updates": [],
+        "mark": _time.perf_counter(),
+    })
+    clock["start"] = clock["now"] = float(config["start_time"])
+    buttons["queue"] = []
+    buttons["active"] = None
+    buttons["last_end"] = clock["now"]
+    buttons["idle_polls"] = 0
+    irqs.clear()
+    irq_state["disabled"] = False
+    del irq_state["pending"][:]
+    http.clear()
+    del requests[:]
+
+
+# ------------------------------
+# Updates
+# ------------------------------
+
+def record_update(kind, speed, x=0, y=0, w=WIDTH, h=HEIGHT):
+    # The panel is addressed in 8 pixel bands, so partial regions grow to the band edges
+    y0 = (int(y) // 8) * 8
+    y1 = -(-(int(y) + int(h)) // 8) * 8
+    x0 = max(0, int(x))
+    x1 = min(WIDTH, int(x) + int(w))
+    area = max(0, x1 - x0) * max(0, min(HEIGHT, y1) - y0)
+
+    estimate = UPDATE_TIMES_MS.get(speed, UPDATE_TIMES_MS[0])
+    if kind == "partial":
+        estimate = estimate * area / float(WIDTH * HEIGHT)
+
+    record = {
+        "index": len(stats["updates"]),
+        "kind": kind,
+        "speed": speed,
+        "region": (x0, y0, x1 - x0, min(HEIGHT, y1) - y0),
+        "bytes": area // 8,
+        "estimated_ms": round(estimate, 1),
+        "draw_calls": dict(stats["draw_calls"]),
+        "draw_call_total": sum(stats["draw_calls"].values()),
+        "measure_text": stats["measure_text"],
+        "time": clock["now"],
+        # Host wall time since the previous update: composing the screen and any app work
+        "compose_ms": round((_time.perf_counter() - stats["mark"]) * 1000.0, 3),
+    }
+    stats["updates"].append(record)
+    buttons["idle_polls"] = 0
+    stats["draw_calls"] = {}
+    stats["measure_text"] = 0
+
+    if config["png_dir"]:
+        framebuffer.to_png(os.path.join(config["png_dir"], "update_{:03d}.png".format(record["index"])))
+    stats["mark"] = _time.perf_counter()
+
+    if config["max_updates"] is not None and len(stats["updates"]) >= config["max_updates"]:
+        raise EmulatorExit("max_updates reached")
+    return record
+
+
+def summary():
+    updates = stats["updates"]
+    totals = stats["total_draw_calls"]
+    return {
+        "updates": len(updates),
+        "full_updates": len([u for u in updates if u["kind"] == "full"]),
+        "partial_updates": len([u for u in updates if u["kind"] == "partial"]),
+        "bytes": sum(u["bytes"] for u in updates),
+        "estimated_ms": round(sum(u["estimated_ms"] for u in updates), 1),
+        "draw_calls": dict(totals),
+        "draw_call_total": sum(totals.values()),
+        "measure_text": stats["total_measure_text"],
+    }
+
+
+# ------------------------------
+# Virtual clock
+# ------------------------------
+
+def now():
+    return clock["now"]
+
+
+def advance(seconds):
+    clock["now"] += seconds
+    if clock["now"] - clock["start"] > config["run_for"]:
+        raise EmulatorExit("run_for reached")
+
+
+def localtime(secs=None):
+    if secs is None:
+        secs = clock["now"]
+    t = _time.gmtime(int(secs))
+    return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec, t.tm_wday, t.tm_yday)
+
+
+def mktime(t):
+    # Accepts MicroPython 8-tuples as well as 9-tuples
+    return calendar.timegm((t[0], t[1], t[2], t[3], t[4], t[5], 0, 0, 0))
+
+
+# ------------------------------
+# Buttons
+# ------------------------------
+
+def press(*pins, duration_ms=100, after_ms=1000):
+    # Queue a press of one or more buttons. Presses happen in order; after_ms is the idle
+    # gap before this press, counted from the end of the previous one (or the start).
+    buttons["queue"].append((set(pins), duration_ms / 1000.0, after_ms / 1000.0))
+
+
+def _poll():
+    # A press starts at its scheduled time, or when the app next looks at the buttons if it
+    # was busy (a person keeps holding the button until the badge reacts). Every poll costs
+    # a little virtual time so apps that spin on Pin.value() still see the clock move.
+    advance(POLL_COST)
+    active = buttons["active"]
+    if active is not None and clock["now"] >= active[2]:
+        buttons["active"] = active = None
+    if active is None and buttons["queue"]:
+        pins, duration, gap = buttons["queue"][0]
+        if clock["now"] >= buttons["last_end"] + gap:
+            buttons["queue"].pop(0)
+            active = (pins, clock["now"], clock["now"] + duration)
+            buttons["active"] = active
+            buttons["last_end"] = active[2]
+            for pin in sorted(pins & set(irqs)):
+                if irq_state["disabled"]:
+                    irq_state["pending"].append(pin)
+                else:
+                    irqs[pin](pin)
+    if active is None and not buttons["queue"]:
+        buttons["idle_polls"] += 1
+        if buttons["idle_polls"] > MAX_IDLE_POLLS:
+            raise EmulatorExit("no more button presses")
+    else:
+        buttons["idle_polls"] = 0
+    return active
+
+
+def pressed(pin):
+    active = _poll()
+    return active is not None and pin in active[0]
+
+
+def pressed_any():
+    return _poll() is not None
+
+
+def halt():
+    # On the device halt() powers off until a button is pressed; here it jumps straight to
+    # the next scripted press, or stops the app when there are none left. On USB power the
+    # badger stays on and halt() returns; on battery the press powers it up again and the app
+    # starts from the top, with an empty framebuffer and nothing left in RAM.
+    buttons["active"] = None
+    if not buttons["queue"]:
+        raise EmulatorExit("no more button presses")
+    clock["now"] = max(clock["now"], buttons["last_end"] + buttons["queue"][0][2])
+    if config["battery"]:
+        raise PowerOff("halt() powered off")
+    _poll()
+
+
+def power_on():
+    # Back from PowerOff: the panel keeps its image, everything else starts afresh
+    framebuffer.__init__()
+    irqs.clear()
+    irq_state["disabled"] = False
+    del irq_state["pending"][:]
+    config["woken_by_button"] = True
+
+
+def disable_irq():
+    # Handlers of presses that start from now on wait for enable_irq(); a press still ends
+    # lightsleep(), as a pending interrupt wakes the RP2040 from WFI
+    state = irq_state["disabled"]
+    irq_state["disabled"] = True
+    return state
+
+
+def enable_irq(state=False):
+    irq_state["disabled"] = state
+    while not irq_state["disabled"] and irq_state["pending"]:
+        pin = irq_state["pending"].pop(0)
+        if pin in irqs:
+            irqs[pin](pin)
+
+
+def sleep(seconds, wake_on_irq=False):
+    # Sleep on the virtual clock (seconds=None: until woken). Scripted presses of pins with
+    # an IRQ handler that come due in the meantime start on time and call the handler, and
+    # with wake_on_irq the first of them ends the sleep, as a GPIO interrupt ends lightsleep
+    end = None if seconds is None else clock["now"] + seconds
+    while buttons["queue"] and buttons["queue"][0][0] & set(irqs):
+        start = max(clock["now"], buttons["last_end"] + buttons["queue"][0][2])
+        if end is not None and start > end:
+            break
+        advance(start - clock["now"])
+        _poll()
+        if wake_on_irq:
+            return
+    if end is None:
+        raise EmulatorExit("no more button presses")
+    advance(end - clock["now"])
+
+
+# ------------------------------
+# Filesystem
+# ------------------------------
+
+_real_open = builtins.open
+_real_os = {}
+fs = {"root": None}
+
+
+def device_path(path):
+    # "/forms/x" and "forms/x" both live under the emulated filesystem root
+    if fs["root"] is None or not isinstance(path, str):
+        return path
+    if path.startswith(fs["root"]):
+        return path
+    if path.startswith("/"):
+        return os.path.join(fs["root"], path.lstrip("/"))
+    return os.path.join(fs["root"], path)
+
+
+def _mapped_open(path, *args, **kwargs):
+    return _real_open(device_path(path), *args, **kwargs)
+
+
+def _wrap_os(name):
+    real = getattr(os, name)
+    _real_os[name] = real
+
+    def mapped(path=None, *args, **kwargs):
+        if path is None:
+            path = fs["root"] if name in ("listdir", "ilistdir") else path
+        return real(device_path(path), *args, **kwargs)
+    return mapped
+
+
+MAPPED_OS_FUNCTIONS = ("listdir", "mkdir", "remove", "rmdir", "stat", "statvfs")
+
+
+def mount(root):
+    # Map the device filesystem onto a host folder and make it the working directory
+    root = os.path.abspath(root)
+    fs["root"] = root
+    builtins.open = _mapped_open
+    for name in MAPPED_OS_FUNCTIONS:
+        setattr(os, name, _wrap_os(name))
+
+    real_rename = os.rename
+    _real_os["rename"] = real_rename
+    os.rename = lambda a, b: real_rename(device_path(a), device_path(b))
+    os.chdir(root)
+
+
+def unmount():
+    builtins.open = _real_open
+    for name, real in _real_os.items():
+        setattr(os, name, real)
+    _real_os.clear()
+    fs["root"] = None
+
+
+# ------------------------------
+# Installing the stand-ins
+# ------------------------------
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+_saved_modules = {}
+
+
+def install():
+    # Put the stand-ins on the path and swap in MicroPython flavoured time, binascii and
+    # urllib.urequest
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    import ubinascii
+    import utime
+    import urequest
+    import urllib
+
+    for name, module in (("time", utime), ("binascii", ubinascii)):
+        _saved_modules[name] = sys.modules.get(name)
+        sys.modules[name] = module
+    sys.modules["urllib.urequest"] = urequest
+    urllib.urequest = urequest
+
+
+def uninstall():
+    for name in ("time", "binascii"):
+        if name in _saved_modules:
+            sys.modules[name] = _saved_modules.pop(name)
+    sys.modules.pop("urllib.urequest", None)
+    if HERE in sys.path:
+        sys.path.remove(HERE)
+
+
+reset()
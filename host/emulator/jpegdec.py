@@ -0,0 +1,66 @@
+# Host stand-in for the jpegdec module. The file is read and its size taken from the SOF
+# header, but the picture itself is not decoded: a dithered grey placeholder of the right
+# size is drawn instead, which is enough for layout and draw-call measurements.
+
+import numpy as np
+
+import emulator
+
+JPEG_SCALE_FULL = 0
+JPEG_SCALE_HALF = 1
+JPEG_SCALE_QUARTER = 2
+JPEG_SCALE_EIGHTH = 3
+
+
+def jpeg_size(data):
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        length = (data[i + 2] << 8) | data[i + 3]
+        if marker in (0xC0, 0xC1, 0xC2):
+            return (data[i + 7] << 8) | data[i + 8], (data[i + 5] << 8) | data[i + 6]
+        i += 2 + length
+    return 0, 0
+
+
+def placeholder(w, h):
+    # Border in black, inside a 50% checkerboard so it reads as grey in the PNG dumps
+    yy, xx = np.mgrid[0:h, 0:w]
+    gray = np.where((xx + yy) % 2 == 0, 0, 15).astype(np.uint8)
+    if w > 2 and h > 2:
+        gray[0, :] = gray[-1, :] = 0
+        gray[:, 0] = gray[:, -1] = 0
+    return gray
+
+
+class JPEG:
+    def __init__(self, display):
+        self._display = display
+        self._data = b""
+        self._size = (0, 0)
+
+    def open_file(self, path):
+        with open(path, "rb") as f:
+            self._data = f.read()
+        self._size = jpeg_size(self._data)
+        stats = emulator.stats
+        stats["image_bytes_read"] = stats.get("image_bytes_read", 0) + len(self._data)
+
+    def open_RAM(self, data):
+        self._data = bytes(data)
+        self._size = jpeg_size(self._data)
+
+    def get_width(self):
+        return self._size[0]
+
+    def get_height(self):
+        return self._size[1]
+
+    def decode(self, x=0, y=0, scale=JPEG_SCALE_FULL, dither=True):
+        self._display._count("jpeg_decode")
+        w, h = self._size
+        w, h = max(1, w >> scale), max(1, h >> scale)
+        self._display.blit_gray(placeholder(w, h), x, y)
@@ -0,0 +1,143 @@
+# Host stand-in for the parts of MicroPython's machine module the badger apps use. The I2C
+# bus answers as an AHT20 sensor (0x38) with readings taken from emulator.sensor.
+
+import emulator
+
+sensor = {"temperature": 21.5, "humidity": 45.0}
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, pin, mode=None, pull=None, value=None):
+        self.pin = pin
+        self._value = value or 0
+        self._handler = None
+
+    def value(self, value=None):
+        if value is not None:
+            self._value = value
+            return None
+        return 1 if emulator.pressed(self.pin) else self._value
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def irq(self, handler=None, trigger=IRQ_RISING):
+        # The handler runs when a scripted press of this pin starts (emulator.irqs)
+        self._handler = handler
+        if handler is None:
+            emulator.irqs.pop(self.pin, None)
+        else:
+            emulator.irqs[self.pin] = lambda pin: handler(self)
+        return self
+
+
+class I2C:
+    def __init__(self, bus=0, scl=None, sda=None, freq=400000):
+        self._last = {}
+
+    def scan(self):
+        return [0x38, 0x51]
+
+    def writeto(self, address, data, stop=True):
+        self._last[address] = bytes(data)
+        return len(data)
+
+    def readfrom_into(self, address, buf, stop=True):
+        if address != 0x38:
+            raise OSError(19)
+        # Status: calibrated, not busy; then 20 bit humidity and 20 bit temperature
+        humidity = int(sensor["humidity"] * 0x100000 / 100) & 0xFFFFF
+        temperature = int((sensor["temperature"] + 50) * 0x100000 / 200) & 0xFFFFF
+        data = bytes((
+            0x18,
+            (humidity >> 12) & 0xFF,
+            (humidity >> 4) & 0xFF,
+            ((humidity & 0xF) << 4) | ((temperature >> 16) & 0xF),
+            (temperature >> 8) & 0xFF,
+            temperature & 0xFF,
+        ))
+        for i in range(min(len(buf), len(data))):
+            buf[i] = data[i]
+
+    def readfrom(self, address, n, stop=True):
+        buf = bytearray(n)
+        self.readfrom_into(address, buf)
+        return bytes(buf)
+
+
+class RTC:
+    def datetime(self, dt=None):
+        if dt is not None:
+            # (year, month, day, weekday, hours, minutes, seconds, subseconds)
+            emulator.clock["now"] = float(emulator.mktime((dt[0], dt[1], dt[2], dt[4], dt[5], dt[6], 0, 0)))
+            return None
+        t = emulator.localtime()
+        return t[0], t[1], t[2], t[6], t[3], t[4], t[5], 0
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self.kwargs = kwargs
+
+    def init(self, **kwargs):
+        self.kwargs = kwargs
+
+    def deinit(self):
+        pass
+
+
+class ADC:
+    def __init__(self, pin):
+        self.pin = pin
+
+    def read_u16(self):
+        return 40000
+
+
+def unique_id():
+    return b"\xe6\x61\x41\x04\x03\x2b\x58\x2d"
+
+
+def freq(hz=None):
+    return 125000000 if hz is None else None
+
+
+def reset():
+    raise emulator.EmulatorExit("machine.reset()")
+
+
+def soft_reset():
+    raise emulator.EmulatorExit("machine.soft_reset()")
+
+
+def deepsleep(ms=None):
+    raise emulator.EmulatorExit("machine.deepsleep()")
+
+
+def disable_irq():
+    return emulator.disable_irq()
+
+
+def enable_irq(state):
+    emulator.enable_irq(state)
+
+
+def lightsleep(ms=None):
+    # Ends early at a button press when the pin has an IRQ handler
+    emulator.sleep(None if ms is None else ms / 1000.0, wake_on_irq=True)
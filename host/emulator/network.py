@@ -0,0 +1,35 @@
+# Host stand-in for MicroPython's network module
+
+import emulator
+
+STA_IF = 0
+AP_IF = 1
+STAT_GOT_IP = 3
+
+
+class WLAN:
+    def __init__(self, interface=STA_IF):
+        self._active = True
+
+    def active(self, active=None):
+        if active is None:
+            return self._active
+        self._active = active
+
+    def connect(self, ssid=None, password=None):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def isconnected(self):
+        return self._active and emulator.config["wifi"]
+
+    def status(self, param=None):
+        return STAT_GOT_IP if self.isconnected() else 0
+
+    def ifconfig(self):
+        return ("192.168.0.100", "255.255.255.0", "192.168.0.1", "192.168.0.1")
+
+    def config(self, *args, **kwargs):
+        return "badger"
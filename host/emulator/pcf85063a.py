@@ -0,0 +1,45 @@
+# Host stand-in for the PCF85063A RTC driver, backed by the emulator's virtual clock.
+
+import emulator
+
+
+class PCF85063A:
+    def __init__(self, i2c, address=0x51):
+        self._alarm = None
+        self._timer = None
+
+    def datetime(self, dt=None):
+        if dt is not None:
+            year, month, day, hour, minute, second = dt[:6]
+            emulator.clock["now"] = float(emulator.mktime((year, month, day, hour, minute, second, 0, 0)))
+            return None
+        t = emulator.localtime()
+        # (year, month, day, hour, minute, second, weekday)
+        return t[0], t[1], t[2], t[3], t[4], t[5], t[6]
+
+    def set_alarm(self, second=None, minute=None, hour=None, day=None):
+        self._alarm = (second, minute, hour, day)
+
+    def clear_alarm_flag(self):
+        pass
+
+    def read_alarm_flag(self):
+        return False
+
+    def enable_alarm_interrupt(self, enable):
+        pass
+
+    def set_timer(self, ticks, ttp=None):
+        self._timer = ticks
+
+    def enable_timer_interrupt(self, enable, clear_flag=True):
+        pass
+
+    def read_timer_flag(self):
+        return False
+
+    def clear_timer_flag(self):
+        pass
+
+    def unset_timer(self):
+        self._timer = None
@@ -0,0 +1,44 @@
+# Host stand-in for the pngdec module. Like the jpegdec stand-in it reads the file and its
+# IHDR size, then draws a placeholder of that size rather than decoding the image.
+
+import struct
+
+import emulator
+from jpegdec import placeholder
+
+PNG_NO_ROTATE = 0
+PNG_ROTATE_90 = 90
+PNG_ROTATE_180 = 180
+PNG_ROTATE_270 = 270
+
+
+class PNG:
+    def __init__(self, display):
+        self._display = display
+        self._size = (0, 0)
+
+    def _read_header(self, data):
+        if data[:8] != b"\x89PNG\r\n\x1a\n":
+            raise OSError("not a PNG")
+        self._size = struct.unpack(">II", data[16:24])
+
+    def open_file(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        self._read_header(data)
+        stats = emulator.stats
+        stats["image_bytes_read"] = stats.get("image_bytes_read", 0) + len(data)
+
+    def open_RAM(self, data):
+        self._read_header(bytes(data))
+
+    def get_width(self):
+        return self._size[0]
+
+    def get_height(self):
+        return self._size[1]
+
+    def decode(self, x=0, y=0, scale=1, mode=0, source=None, rotate=PNG_NO_ROTATE):
+        self._display._count("png_decode")
+        w, h = self._size
+        self._display.blit_gray(placeholder(max(1, w * scale), max(1, h * scale)), x, y)
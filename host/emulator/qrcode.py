@@ -0,0 +1,59 @@
+# Host stand-in for the qrcode module. get_size()/get_module() behave like the real thing
+# (a square of modules that grows with the text, finder patterns in three corners), but the
+# data modules are a deterministic hash of the text rather than a real QR encoding, so the
+# codes are not scannable. Module counts and density are realistic for draw-call testing.
+
+import hashlib
+
+import emulator
+
+
+def _version_for(length):
+    # Byte mode capacity at error correction level L for QR versions 1..40, roughly
+    capacity = 17
+    version = 1
+    while capacity < length and version < 40:
+        version += 1
+        capacity = int(17 * version * version ** 0.55)
+    return version
+
+
+class QRCode:
+    def __init__(self):
+        self._size = 21
+        self._modules = [[False] * 21 for _ in range(21)]
+
+    def set_text(self, text):
+        emulator.stats["qr_encodes"] = emulator.stats.get("qr_encodes", 0) + 1
+        text = str(text)
+        size = 17 + 4 * _version_for(len(text.encode("utf-8")))
+        seed = hashlib.sha256(text.encode("utf-8")).digest()
+        bits = []
+        counter = 0
+        while len(bits) < size * size:
+            block = hashlib.sha256(seed + counter.to_bytes(4, "big")).digest()
+            for byte in block:
+                for b in range(8):
+                    bits.append(bool((byte >> b) & 1))
+            counter += 1
+
+        modules = [[bits[y * size + x] for x in range(size)] for y in range(size)]
+        for ox, oy in ((0, 0), (size - 7, 0), (0, size - 7)):
+            for y in range(-1, 8):
+                for x in range(-1, 8):
+                    px, py = ox + x, oy + y
+                    if 0 <= px < size and 0 <= py < size:
+                        edge = x in (0, 6) or y in (0, 6)
+                        centre = 2 <= x <= 4 and 2 <= y <= 4
+                        modules[py][px] = (0 <= x <= 6 and 0 <= y <= 6) and (edge or centre)
+        self._size = size
+        self._modules = modules
+
+    def get_size(self):
+        return self._size, self._size
+
+    def get_module(self, x, y):
+        # Outside the code is light, like the real module
+        if 0 <= x < self._size and 0 <= y < self._size:
+            return self._modules[y][x]
+        return False
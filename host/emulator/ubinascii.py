@@ -0,0 +1,10 @@
+# Host stand-in for MicroPython's ubinascii / binascii
+import binascii as _binascii
+from binascii import a2b_base64, b2a_base64, hexlify, unhexlify  # noqa: F401
+
+
+def crc32(data, value=0):
+    # MicroPython accepts str here as well as bytes
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return _binascii.crc32(data, value)
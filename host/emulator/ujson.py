@@ -0,0 +1,2 @@
+# Host stand-in for MicroPython's ujson
+from json import dump, dumps, load, loads  # noqa: F401
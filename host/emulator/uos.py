@@ -0,0 +1,10 @@
+# Host stand-in for MicroPython's uos; the emulator maps paths onto its filesystem root
+from os import listdir, mkdir, remove, rename, rmdir, stat, statvfs, urandom  # noqa: F401
+import os as _os
+
+
+def ilistdir(path="."):
+    for name in _os.listdir(path):
+        full = path.rstrip("/") + "/" + name
+        mode = 0x4000 if _os.path.isdir(full) else 0x8000
+        yield name, mode, 0
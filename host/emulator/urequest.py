@@ -0,0 +1,8 @@
+# Host stand-in for MicroPython's urllib.urequest; installed as urllib.urequest by the emulator
+
+import urequests
+
+
+def urlopen(url, data=None, method="GET"):
+    response = urequests.request(method, url, data=data)
+    return response.raw
@@ -0,0 +1,94 @@
+# Host stand-in for MicroPython's urequests. Responses come from emulator.http, a dict of
+# url -> (status, body) or url -> callable(method, url, headers, data) returning the same.
+# Unknown URLs raise OSError like an unreachable host, unless emulator.config["network"] is
+# "host", in which case the request is made for real (handy against a local test server).
+
+import io
+import json
+
+import emulator
+
+
+class Response:
+    def __init__(self, status_code, body, headers=None):
+        self.status_code = status_code
+        self.reason = b"OK" if status_code < 400 else b"ERROR"
+        self.headers = headers or {}
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self._content = bytes(body)
+        self.raw = io.BytesIO(self._content)
+        self.encoding = "utf-8"
+
+    @property
+    def content(self):
+        return self._content
+
+    @property
+    def text(self):
+        return self._content.decode(self.encoding)
+
+    def json(self):
+        return json.loads(self._content)
+
+    def close(self):
+        self.raw.close()
+
+
+def _host_request(method, url, headers, data):
+    import urllib.error
+    import urllib.request
+
+    req = urllib.request.Request(url, data=data, headers=headers or {}, method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=10) as r:
+            return r.status, r.read(), dict(r.headers)
+    except urllib.error.HTTPError as e:
+        return e.code, e.read(), dict(e.headers)
+
+
+def request(method, url, data=None, json=None, headers=None, stream=None, auth=None, timeout=None):
+    if json is not None:
+        import json as _json
+        data = _json.dumps(json)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    emulator.requests.append((method, url))
+
+    handler = emulator.http.get(url)
+    if handler is None:
+        # "https://host/path*" fixtures match any URL with that prefix
+        for pattern, candidate in emulator.http.items():
+            if pattern.endswith("*") and url.startswith(pattern[:-1]):
+                handler = candidate
+                break
+    if handler is None:
+        if emulator.config.get("network") == "host":
+            return Response(*_host_request(method, url, headers, data))
+        raise OSError(-2, "no emulated response for " + url)
+    result = handler(method, url, headers or {}, data) if callable(handler) else handler
+    return Response(*result)
+
+
+def head(url, **kw):
+    return request("HEAD", url, **kw)
+
+
+def get(url, **kw):
+    return request("GET", url, **kw)
+
+
+def post(url, **kw):
+    return request("POST", url, **kw)
+
+
+def put(url, **kw):
+    return request("PUT", url, **kw)
+
+
+def patch(url, **kw):
+    return request("PATCH", url, **kw)
+
+
+def delete(url, **kw):
+    return request("DELETE", url, **kw)
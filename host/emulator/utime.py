@@ -0,0 +1,58 @@
+# Host stand-in for MicroPython's time/utime module. While an app runs the emulator installs
+# this as `time` too; everything not defined here falls through to the host time module, so
+# host code that times things with perf_counter() keeps working.
+
+import time as _host_time
+
+import emulator
+
+
+def __getattr__(name):
+    return getattr(_host_time, name)
+
+
+def time():
+    return int(emulator.now())
+
+
+def time_ns():
+    return int(emulator.now() * 1000000000)
+
+
+def localtime(secs=None):
+    return emulator.localtime(secs)
+
+
+gmtime = localtime
+
+
+def mktime(t):
+    return emulator.mktime(t)
+
+
+def sleep(seconds):
+    emulator.sleep(seconds)
+
+
+def sleep_ms(ms):
+    emulator.sleep(ms / 1000.0)
+
+
+def sleep_us(us):
+    emulator.sleep(us / 1000000.0)
+
+
+def ticks_ms():
+    return int(emulator.now() * 1000)
+
+
+def ticks_us():
+    return int(emulator.now() * 1000000)
+
+
+def ticks_add(ticks, delta):
+    return ticks + delta
+
+
+def ticks_diff(end, start):
+    return end - start
@@ -0,0 +1,109 @@
+# -----------------------------------------------------------------------------------------------
+# feed_stub_server.py - local HTTP server for testing conditional GETs (lib/fetch_cache.py)
+#
+# Serves files, or bodies set from a script, with an ETag (hash of the body) and a
+# Last-Modified time that change whenever the body does, and optionally Cache-Control
+# max-age. Answers 304 Not Modified to an If-None-Match or If-Modified-Since that still
+# matches. Counts requests, full answers, 304s and body bytes sent, so the apps can be run
+# against it on the emulator with network "host" (see host/bench_fetch_cache.py).
+#
+# Usage: python3 host/feed_stub_server.py FILE... [--port 8385] [--max-age SECONDS]
+#        each FILE is served as /<its name>
+# -----------------------------------------------------------------------------------------------
+
+import argparse
+import hashlib
+import os
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        feed = self.server.feeds.get(self.path.split("?")[0])
+        if feed is None:
+            self.server.count("not_found")
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body, etag, modified = feed
+        matched = (self.headers.get("If-None-Match") == etag
+                   or (self.headers.get("If-None-Match") is None and self.headers.get("If-Modified-Since") == modified))
+        self.send_response(304 if matched else 200)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", modified)
+        if self.server.max_age is not None:
+            self.send_header("Cache-Control", "max-age={}".format(self.server.max_age))
+        if matched:
+            self.server.count("not_modified")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.server.count("full")
+        self.server.count("bytes", len(body))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FeedServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, max_age=None, verbose=False):
+        super().__init__(("127.0.0.1", port), FeedHandler)
+        self.max_age = max_age
+        self.verbose = verbose
+        self.feeds = {}
+        self.counts = {"requests": 0, "full": 0, "not_modified": 0, "not_found": 0, "bytes": 0}
+        self.lock = threading.Lock()
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counts[name] += n
+            if name in ("full", "not_modified", "not_found"):
+                self.counts["requests"] += 1
+
+    def set(self, path, body):
+        # Serve body at path; a new body gets a new ETag and Last-Modified
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest()[:16])
+        old = self.feeds.get(path)
+        if old is None or old[1] != etag:
+            self.feeds[path] = (body, etag, formatdate(time.time(), usegmt=True))
+
+    def url(self, path):
+        return "http://127.0.0.1:{}{}".format(self.server_address[1], path)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--port", type=int, default=8385)
+    parser.add_argument("--max-age", type=int)
+    args = parser.parse_args()
+
+    server = FeedServer(args.port, args.max_age, verbose=True)
+    for path in args.files:
+        with open(path, "rb") as f:
+            server.set("/" + os.path.basename(path), f.read())
+        print("Serving", server.url("/" + os.path.basename(path)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# -----------------------------------------------------------------------------------------------
+# odk_stub_server.py - local stand-in for ODK Central's submissions endpoint
+#
+# Accepts POST .../submissions with Basic authentication and an XML instance body, like
+# Central: 201 with a small XML answer for a new instanceID, 409 Conflict for one it already
+# has, 401 without the right credentials. Speaks HTTP/1.1 with keep-alive, so it can be used
+# to test lib/odk_uploader.py (see host/bench_upload.py) or examples/sendODK.py on the
+# emulator with network "host".
+#
+# Options add latency per connection (standing in for the TCP and TLS handshakes over Wi-Fi)
+# and per request, answer every Nth request with 500, or close the connection after every
+# Nth answer. The server counts connections and requests and keeps the instanceIDs received.
+#
+# Usage: python3 host/odk_stub_server.py [--port 8383] [--connect-ms 300] [--request-ms 50]
+#                                        [--fail-every N] [--close-every N]
+# -----------------------------------------------------------------------------------------------
+
+import argparse
+import base64
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+USERNAME = "badger"
+PASSWORD = "badger"
+INSTANCE_ID = re.compile(rb"<instanceID>([^<]+)</instanceID>")
+
+
+class CentralHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+        time.sleep(self.server.connect_ms / 1e3)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def answer(self, status, body, close=False):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if close:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        data = self.rfile.read(length)
+        number = self.server.count("requests")
+        time.sleep(self.server.request_ms / 1e3)
+        close = bool(self.server.close_every) and number % self.server.close_every == 0
+
+        expected = "Basic " + base64.b64encode(
+            "{}:{}".format(USERNAME, PASSWORD).encode()).decode()
+        if not self.path.endswith("/submissions"):
+            return self.answer(404, "<error>Not found</error>", close)
+        if self.headers.get("Authorization") != expected:
+            return self.answer(401, "<error>Could not authenticate</error>", close)
+        if self.server.fail_every and number % self.server.fail_every == 0:
+            return self.answer(500, "<error>Internal Server Error</error>", close)
+        match = INSTANCE_ID.search(data)
+        if not match:
+            return self.answer(400, "<error>A submission must have an instanceID</error>", close)
+
+        instance = match.group(1).decode()
+        with self.server.lock:
+            duplicate = instance in self.server.instances
+            self.server.instances.add(instance)
+        if duplicate:
+            return self.answer(409, "<error>A submission already exists with this ID</error>", close)
+        self.answer(201, "<OpenRosaResponse><message>full submission upload was successful!"
+                         "</message><instanceID>{}</instanceID></OpenRosaResponse>".format(instance), close)
+
+
+class CentralServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, connect_ms=0, request_ms=0, fail_every=0, close_every=0, verbose=False):
+        super().__init__(("127.0.0.1", port), CentralHandler)
+        self.connect_ms = connect_ms
+        self.request_ms = request_ms
+        self.fail_every = fail_every
+        self.close_every = close_every
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.instances = set()
+        self.counts = {"connections": 0, "requests": 0}
+
+    def handle_error(self, request, client_address):
+        # A client that goes away mid answer (as bench_upload.py's cut off uploads do) is normal
+        if self.verbose:
+            super().handle_error(request, client_address)
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+            return self.counts[name]
+
+    def url(self, project=1, form="badger"):
+        return "http://127.0.0.1:{}/v1/projects/{}/forms/{}/submissions".format(
+            self.server_address[1], project, form)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8383)
+    parser.add_argument("--connect-ms", type=float, default=0)
+    parser.add_argument("--request-ms", type=float, default=0)
+    parser.add_argument("--fail-every", type=int, default=0)
+    parser.add_argument("--close-every", type=int, default=0)
+    args = parser.parse_args()
+    server = CentralServer(args.port, args.connect_ms, args.request_ms, args.fail_every,
+                           args.close_every, verbose=True)
+    print("Submissions URL:", server.url(), " user/password:", USERNAME, PASSWORD)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# -----------------------------------------------------------------------------------------------
+# run_app.py - run a badger app headless on a Linux/Mac host
+#
+# Description:
+#    Runs any of the apps in this repo against the stand-in firmware modules in host/emulator,
+#    on a scratch copy of the badger filesystem (data/, forms/, icons/, lib/). Prints the
+#    draw-call counts, measure_text calls, bytes pushed and estimated refresh time for every
+#    update(), and can write a PNG of the panel after each one.
+#
+# Usage:
+#    python3 host/run_app.py examples/form.py --press B,DOWN,B,DOWN --png-dir /tmp/form
+#    python3 host/run_app.py Charts/heatmap.py --file Charts/data.csv --file Charts/data2.csv
+#    python3 host/run_app.py examples/dash.py --fixtures --max-updates 3
+# -----------------------------------------------------------------------------------------------
+
+import argparse
+import builtins
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+HOST = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(HOST)
+sys.path.insert(0, os.path.join(HOST, "emulator"))
+
+import emulator  # noqa: E402
+
+# Folders copied from the repo onto the emulated filesystem
+DEVICE_FOLDERS = ("data", "forms", "icons", "lib", "examples")
+
+# Sample data so apps that need keys, a calendar or a weather feed run without any setup:
+# files copied onto the device, and canned HTTP responses
+FIXTURES = os.path.join(HOST, "emulator", "fixtures")
+FIXTURE_FILES = (
+    "host/emulator/fixtures/totp_keys.json:data/totp_keys.json",
+    "host/emulator/fixtures/calendar_url.txt:data/calendar_url.txt",
+    "host/emulator/fixtures/books/289-0-wind-in-the-willows-abridged.txt:books/289-0-wind-in-the-willows-abridged.txt",
+) + tuple(
+    "host/emulator/fixtures/icons/icon-{0}.png:icons/icon-{0}.png".format(name)
+    for name in ("sun", "cloud", "rain", "snow", "storm")
+)
+FIXTURE_HTTP = {
+    "http://calendar.example/basic.ics": "calendar.ics",
+    "https://api.open-meteo.com/v1/forecast*": "weather.json",
+    "http://api.open-meteo.com/v1/forecast*": "weather.json",
+    "https://air-quality-api.open-meteo.com/v1/air-quality*": "air_quality.json",
+    "https://www.hamqsl.com/solarxml.php": "solarxml.xml",
+}
+
+BUTTONS = {"A": 12, "B": 13, "C": 14, "UP": 15, "DOWN": 11}
+
+
+def make_root(files=()):
+    root = tempfile.mkdtemp(prefix="badger-")
+    for folder in DEVICE_FOLDERS:
+        src = os.path.join(REPO, folder)
+        if os.path.isdir(src):
+            shutil.copytree(src, os.path.join(root, folder))
+    for spec in files:
+        src, _, dest = spec.partition(":")
+        dest = os.path.join(root, dest.lstrip("/") if dest else os.path.basename(src))
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.copy(os.path.join(REPO, src), dest)
+    return root
+
+
+def run_app(app, root=None, presses=(), files=(), http=None, setup=None, **options):
+    # Run one app to completion (end of the button script, max_updates or run_for) and
+    # return (summary, per-update records, reason it stopped)
+    app = os.path.abspath(app)
+    cwd = os.getcwd()
+    root = root or make_root(files)
+    emulator.reset(**options)
+    for press in presses:
+        if not isinstance(press, (tuple, list)):
+            press = (press,)
+        emulator.press(*press)
+    if http:
+        emulator.http.update(http)
+
+    # Compile up front so setup() (e.g. starting tracemalloc) only sees the app itself
+    with open(app) as f:
+        code = compile(f.read(), app, "exec")
+
+    emulator.install()
+    lib = os.path.join(root, "lib")
+    sys.path.insert(1, lib)
+    emulator.mount(root)
+    reason = "finished"
+    loaded = set(sys.modules)
+    try:
+        if setup is not None:
+            setup()
+        while True:
+            try:
+                exec(code, {"__name__": "__main__", "__file__": app, "__builtins__": builtins})
+                break
+            except emulator.PowerOff:
+                # Powered off in halt() on battery: start again, woken by the next press,
+                # with the app's modules imported afresh
+                for name in set(sys.modules) - loaded:
+                    del sys.modules[name]
+                emulator.power_on()
+    except emulator.EmulatorExit as e:
+        reason = str(e)
+    finally:
+        emulator.unmount()
+        emulator.uninstall()
+        sys.path.remove(lib)
+        os.chdir(cwd)
+    return emulator.summary(), list(emulator.stats["updates"]), reason
+
+
+def fixture_http():
+    http = {}
+    for url, name in FIXTURE_HTTP.items():
+        with open(os.path.join(FIXTURES, name), "rb") as f:
+            http[url] = (200, f.read())
+    return http
+
+
+def parse_presses(text):
+    presses = []
+    for item in filter(None, text.split(",")):
+        presses.append(tuple(BUTTONS[b] for b in item.upper().split("+")))
+    return presses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a badger app headless against the host emulator")
+    parser.add_argument("app", help="path of the app to run, e.g. examples/form.py")
+    parser.add_argument("--press", default="", help="comma separated presses, e.g. B,DOWN,A+C")
+    parser.add_argument("--file", action="append", default=[], help="SRC[:DEST] extra file to copy onto the device")
+    parser.add_argument("--http", action="append", default=[], help="URL=FILE canned 200 response")
+    parser.add_argument("--fixtures", action="store_true", help="use the sample keys, calendar and weather in host/emulator/fixtures")
+    parser.add_argument("--root", help="use this folder as the device filesystem instead of a scratch copy")
+    parser.add_argument("--png-dir", help="write a PNG of the panel after every update")
+    parser.add_argument("--max-updates", type=int, help="stop after this many display updates")
+    parser.add_argument("--run-for", type=float, default=24 * 3600, help="virtual seconds before stopping")
+    parser.add_argument("--woken", action="store_true", help="start as if woken by a button press")
+    parser.add_argument("--battery", action="store_true", help="halt() powers off: every press starts the app again")
+    parser.add_argument("--offline", action="store_true", help="report no Wi-Fi")
+    parser.add_argument("--json", action="store_true", help="print the full per-update records as JSON")
+    args = parser.parse_args()
+
+    files = list(args.file)
+    http = {}
+    if args.fixtures:
+        files.extend(FIXTURE_FILES)
+        http.update(fixture_http())
+    for spec in args.http:
+        url, _, path = spec.partition("=")
+        with open(path, "rb") as f:
+            http[url] = (200, f.read())
+
+    if args.png_dir:
+        os.makedirs(args.png_dir, exist_ok=True)
+
+    summary, updates, reason = run_app(
+        args.app,
+        root=args.root,
+        presses=parse_presses(args.press),
+        files=files,
+        http=http,
+        png_dir=os.path.abspath(args.png_dir) if args.png_dir else None,
+        max_updates=args.max_updates,
+        run_for=args.run_for,
+        woken_by_button=args.woken,
+        battery=args.battery,
+        wifi=not args.offline,
+    )
+
+    if args.json:
+        print(json.dumps({"summary": summary, "updates": updates, "stopped": reason}, indent=2))
+        return
+
+    for u in updates:
+        print("update {index:3d} {kind:7s} speed {speed} region {region} {bytes:5d} bytes "
+              "~{estimated_ms:7.1f} ms  {draw_call_total:5d} draw calls  {measure_text:4d} measure_text".format(**u))
+    print("stopped: {}".format(reason))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# -----------------------------------------------------------------------------------------------
+# unpack_bundle.py - unpacks batch export bundles from examples/sendODK.py
+#
+# A bundle (see lib/batch_export.py) holds the pending instances of a badger, or its
+# submissions CSV, in one compressed file. This writes the files back out under --out:
+# instances to <out>/instances/uuid<uuid>.xml, queued in <out>/instances/index.bin, and
+# anything else (submissions.csv) to <out>. With --central the queued instances are then
+# uploaded to ODK Central with lib/odk_uploader.py, and only once, however many times the
+# same instances arrive.
+#
+# With --serve PORT it is the endpoint for sendODK.py's 'batch' mode instead: every bundle
+# POSTed to it (with the Basic credentials of --user and --password) is unpacked, and
+# uploaded when --central is given, before it answers 201.
+#
+# Usage: python3 host/unpack_bundle.py BUNDLE... [--out DIR]
+#        python3 host/unpack_bundle.py --serve 8384 [--out DIR]
+#        either with [--central URL --user NAME --password PASSWORD]
+# -----------------------------------------------------------------------------------------------
+
+import argparse
+import base64
+import io
+import json
+import os
+import struct
+import sys
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HOST = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HOST, "..", "lib"))
+
+from batch_export import MAGIC, VERSION, HEADER, HEADER_SIZE, ENTRY, ENTRY_SIZE, STORED, ZLIB  # noqa: E402
+from odk_uploader import Uploader  # noqa: E402
+from submission_index import SubmissionIndex, instance_uuid, SENT  # noqa: E402
+
+
+def read_bundle(data):
+    # [(name, bytes)] of the files in a bundle
+    magic, version, method = struct.unpack(HEADER, data[:HEADER_SIZE])
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a batch export bundle")
+    if method == ZLIB:
+        body = zlib.decompress(data[HEADER_SIZE:])
+    elif method == STORED:
+        body = data[HEADER_SIZE:]
+    else:
+        raise ValueError("unknown compression method {}".format(method))
+    stream = io.BytesIO(body)
+    files = []
+    while True:
+        entry = stream.read(ENTRY_SIZE)
+        if len(entry) < ENTRY_SIZE:
+            raise ValueError("bundle is cut short")
+        name_length, size = struct.unpack(ENTRY, entry)
+        if name_length == 0:
+            return files
+        name = stream.read(name_length).decode()
+        content = stream.read(size)
+        if len(content) < size:
+            raise ValueError("bundle is cut short")
+        files.append((name, content))
+
+
+def unpack(data, out):
+    # Write the files of a bundle under out; returns (instances, other files) written
+    instances = os.path.join(out, "instances")
+    os.makedirs(instances, exist_ok=True)
+    index = SubmissionIndex(os.path.join(instances, "index.bin"))
+    counts = [0, 0]
+    for name, content in read_bundle(data):
+        name = os.path.basename(name)  # never outside out
+        uuid = instance_uuid(name)
+        path = os.path.join(instances if uuid else out, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        if uuid:
+            if index.status(uuid) != SENT:
+                index.queue(uuid)
+            counts[0] += 1
+        else:
+            counts[1] += 1
+    return counts
+
+
+def upload(out, central, user, password):
+    # Upload the queued instances under out to Central; returns (sent, failed)
+    instances = os.path.join(out, "instances")
+    index = SubmissionIndex(os.path.join(instances, "index.bin"))
+    uploader = Uploader(central, user, password)
+    try:
+        return uploader.upload(index, lambda uuid: os.path.join(instances, "uuid" + uuid + ".xml"))
+    finally:
+        uploader.close()
+
+
+class BundleHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def answer(self, status, message):
+        body = json.dumps(message).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        args = self.server.args
+        expected = "Basic " + base64.b64encode("{}:{}".format(args.user, args.password).encode()).decode()
+        if args.user and self.headers.get("Authorization") != expected:
+            return self.answer(401, {"message": "Could not authenticate"})
+        with self.server.lock:
+            try:
+                instances, others = unpack(data, args.out)
+            except (ValueError, struct.error, zlib.error) as e:
+                return self.answer(400, {"message": str(e)})
+            message = {"instances": instances, "files": others}
+            if args.central:
+                try:
+                    message["sent"], message["failed"] = upload(args.out, args.central, args.user, args.password)
+                except OSError as e:
+                    message["upload_error"] = str(e)  # unpacked and queued; the next bundle retries
+        self.log_message("bundle: %s", message)
+        self.answer(201, message)
+
+
+def serve(args):
+    server = ThreadingHTTPServer(("0.0.0.0", args.serve), BundleHandler)
+    server.daemon_threads = True
+    server.args = args
+    server.lock = threading.Lock()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("bundles", nargs="*")
+    parser.add_argument("--out", default="unpacked")
+    parser.add_argument("--serve", type=int)
+    parser.add_argument("--central", help="submissions URL to upload the instances to")
+    parser.add_argument("--user", default="")
+    parser.add_argument("--password", default="")
+    args = parser.parse_args()
+
+    if args.serve:
+        server = serve(args)
+        print("Accepting bundles on port", args.serve, "into", args.out)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if not args.bundles:
+        parser.error("give bundle files to unpack, or --serve PORT")
+    for bundle in args.bundles:
+        with open(bundle, "rb") as f:
+            instances, others = unpack(f.read(), args.out)
+        print("{}: {} instances, {} other files".format(bundle, instances, others))
+    if args.central:
+        sent, failed = upload(args.out, args.central, args.user, args.password)
+        print("Uploaded to Central: {} sent, {} failed".format(sent, failed))
+
+
+if __name__ == "__main__":
+    main()
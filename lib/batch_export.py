@@ -0,0 +1,134 @@
+# -----------------------------------------------------------------------------------------------
+# batch_export.py - packs saved form submissions into one compressed bundle, for the Badger 2040 W
+#
+# Description:
+#    Over a poor Wi-Fi link most of the time sendODK.py spends on hundreds of small
+#    instances goes on per request overhead. write_bundle() packs files - the pending
+#    instances/uuid*.xml, or the submissions CSV that form.py keeps - into a single file,
+#    which sendODK.py can send in one request to a collection endpoint or leave in exports/
+#    to be picked up over USB. host/unpack_bundle.py turns a bundle back into the instance
+#    files and can upload them to Central.
+#
+#      header:  b"BBUN", version, method                 ("<4sBB", 6 bytes, not compressed)
+#      body:    entries, each a name length and data length ("<HI"), the name (UTF-8) and the
+#               file's bytes, ended by an entry with an empty name
+#
+#    With method ZLIB the body is one zlib stream: deflate.DeflateIO on MicroPython 1.21 and
+#    later (when the firmware is built with compression), zlib on the host. Without either the
+#    body is STORED as is. Files are copied a chunk at a time, so a bundle of any size is
+#    written without holding it in RAM.
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+import os
+import struct
+
+try:
+    import deflate
+except ImportError:
+    deflate = None
+
+try:
+    import zlib
+except ImportError:
+    zlib = None
+
+MAGIC = b"BBUN"
+VERSION = 1
+HEADER = "<4sBB"
+HEADER_SIZE = struct.calcsize(HEADER)
+ENTRY = "<HI"
+ENTRY_SIZE = struct.calcsize(ENTRY)
+
+STORED = 0
+ZLIB = 1
+
+EXPORTS = "exports"
+CHUNK = 1024
+
+
+class _ZlibWriter:
+    # The writing half of deflate.DeflateIO(stream, deflate.ZLIB) for CPython's zlib
+    def __init__(self, stream):
+        self.stream = stream
+        self.compressor = zlib.compressobj(9)
+
+    def write(self, data):
+        self.stream.write(self.compressor.compress(data))
+
+    def close(self):
+        self.stream.write(self.compressor.flush())
+
+
+def _can_deflate():
+    # Firmware without compression still has deflate.DeflateIO, but writes to it fail
+    try:
+        import io
+        deflate.DeflateIO(io.BytesIO(), deflate.ZLIB).write(b"x")
+        return True
+    except (AttributeError, OSError, ValueError):
+        return False
+
+
+def _body_writer(stream):
+    # (method, writer) for the body of a bundle written to stream
+    if deflate is not None and _can_deflate():
+        return ZLIB, deflate.DeflateIO(stream, deflate.ZLIB)
+    if zlib is not None and hasattr(zlib, "compressobj"):
+        return ZLIB, _ZlibWriter(stream)
+    return STORED, None
+
+
+def write_bundle(path, files, compress=True):
+    # Pack files, a list of (name in the bundle, file path), into a bundle at path. Written
+    # under a temporary name and renamed, so a reset never leaves half a bundle. Returns the
+    # bundle's size in bytes.
+    temp = path + ".tmp"
+    buffer = bytearray(CHUNK)
+    view = memoryview(buffer)
+    with open(temp, "wb") as f:
+        method, writer = _body_writer(f) if compress else (STORED, None)
+        f.write(struct.pack(HEADER, MAGIC, VERSION, method))
+        out = writer or f
+        for name, file_path in files:
+            name = name.encode()
+            out.write(struct.pack(ENTRY, len(name), os.stat(file_path)[6]) + name)
+            with open(file_path, "rb") as src:
+                while True:
+                    n = src.readinto(buffer)
+                    if not n:
+                        break
+                    out.write(view[:n])
+        out.write(struct.pack(ENTRY, 0, 0))
+        if writer is not None:
+            writer.close()
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    os.rename(temp, path)
+    return os.stat(path)[6]
+
+
+def pending_instances(index, folder="instances"):
+    # [(uuid, name, path)] of the pending instances in index whose files are in folder
+    found = []
+    for uuid in index.pending():
+        name = "uuid" + uuid + ".xml"
+        path = folder + "/" + name
+        try:
+            os.stat(path)
+        except OSError:
+            continue
+        found.append((uuid, name, path))
+    return found
+
+
+def export_path(stamp, folder=EXPORTS):
+    # exports/batch-<stamp>.bbz, making the folder if needed
+    try:
+        os.mkdir(folder)
+    except OSError:
+        pass  # The directory already exists
+    return "{}/batch-{}.bbz".format(folder, stamp)
@@ -0,0 +1,188 @@
+# -----------------------------------------------------------------------------------------------
+# csv_stream.py - streaming CSV reader with column projection for the Badger 2040 W
+#
+# Description:
+#    Reads numeric columns out of a CSV file one line at a time, so the file never has to fit
+#    in RAM. Only the requested columns are converted: each line is split (in C) just far
+#    enough to reach the last wanted column, and the quote-aware splitter is only used for
+#    lines that actually contain a double quote.
+#
+#    read_columns() stores the values in array('f') columns (4 bytes a value instead of a
+#    float object and a list slot) with a validity bitmap per column in place of None.
+#    iter_rows() yields one tuple per line for code that can work in a single pass.
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+from array import array
+
+
+# ------------------------------
+# Tokenising
+# ------------------------------
+
+def split_quoted(line, maxsplit=-1):
+    # Split on commas outside double quotes; quotes are dropped. Fields are collected as
+    # slices of the line rather than grown a character at a time.
+    parts = []
+    start = 0
+    inside_quotes = False
+    quoted = False
+    for i in range(len(line)):
+        char = line[i]
+        if char == '"':
+            inside_quotes = not inside_quotes
+            quoted = True
+        elif char == ',' and not inside_quotes:
+            field = line[start:i]
+            parts.append(field.replace('"', '') if quoted else field)
+            start = i + 1
+            quoted = False
+            if len(parts) == maxsplit:
+                break
+    field = line[start:]
+    parts.append(field.replace('"', '') if quoted else field)
+    return parts
+
+
+def split_fields(line, maxsplit=-1):
+    if '"' in line:
+        return split_quoted(line, maxsplit)
+    return line.split(',', maxsplit)
+
+
+def read_header(file):
+    # Column names from the first line of an open file
+    return [name.strip() for name in split_fields(file.readline().strip())]
+
+
+def column_indexes(headers, names):
+    indexes = []
+    for name in names:
+        if name not in headers:
+            raise ValueError(f"{name} column not found in the CSV file.")
+        indexes.append(headers.index(name))
+    return indexes
+
+
+# ------------------------------
+# Row streaming
+# ------------------------------
+
+def iter_rows(filename, names):
+    # Yields a tuple of floats (None where empty, missing or not a number) per data line,
+    # in the order of names. Blank lines are skipped.
+    with open(filename, 'r') as file:
+        indexes = column_indexes(read_header(file), names)
+        maxsplit = max(indexes) + 1
+        line_num = 1
+        for line in file:
+            line_num += 1
+            line = line.strip()
+            if not line:
+                continue
+            values = split_fields(line, maxsplit)
+            row = []
+            for index in indexes:
+                if index >= len(values):
+                    row.append(None)
+                    continue
+                field = values[index].strip()
+                if field == "":
+                    row.append(None)
+                    continue
+                try:
+                    row.append(float(field))
+                except ValueError:
+                    print(f"Error at line {line_num}: Cannot convert {field} to float")
+                    row.append(None)
+            yield tuple(row)
+
+
+# ------------------------------
+# Columnar storage
+# ------------------------------
+
+class Column:
+    # array('f') of values plus a bitmap with a bit set for every row that has a value.
+    # Indexing and iteration give None for rows without one, like the old lists did.
+    def __init__(self):
+        self.values = array('f')
+        self.valid = bytearray()
+
+    def append(self, value):
+        n = len(self.values)
+        if n & 7 == 0:
+            self.valid.append(0)
+        if value is None:
+            self.values.append(0.0)
+        else:
+            self.values.append(value)
+            self.valid[n >> 3] |= 1 << (n & 7)
+
+    def is_valid(self, i):
+        return (self.valid[i >> 3] >> (i & 7)) & 1
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self.values)
+        if (self.valid[i >> 3] >> (i & 7)) & 1:
+            return self.values[i]
+        return None
+
+    def __iter__(self):
+        values = self.values
+        valid = self.valid
+        for i in range(len(values)):
+            if (valid[i >> 3] >> (i & 7)) & 1:
+                yield values[i]
+            else:
+                yield None
+
+    def count(self):
+        # Number of rows with a value
+        total = 0
+        for byte in self.valid:
+            while byte:
+                byte &= byte - 1
+                total += 1
+        return total
+
+
+def read_columns(filename, *names):
+    # {name: Column} for the requested columns, read in a single streaming pass. Same
+    # parsing as iter_rows(), written out inline since this loop runs once per value.
+    columns = [Column() for _ in names]
+    with open(filename, 'r') as file:
+        indexes = column_indexes(read_header(file), names)
+        maxsplit = max(indexes) + 1
+        targets = [(index, column.values, column.valid) for index, column in zip(indexes, columns)]
+        n = 0
+        line_num = 1
+        for line in file:
+            line_num += 1
+            line = line.strip()
+            if not line:
+                continue
+            values = split_fields(line, maxsplit)
+            count = len(values)
+            byte = n >> 3
+            bit = 1 << (n & 7)
+            for index, out, valid in targets:
+                if bit == 1:
+                    valid.append(0)
+                if index < count:
+                    field = values[index].strip()
+                    if field:
+                        try:
+                            out.append(float(field))
+                            valid[byte] |= bit
+                            continue
+                        except ValueError:
+                            print(f"Error at line {line_num}: Cannot convert {field} to float")
+                out.append(0.0)
+            n += 1
+    return dict(zip(names, columns))
@@ -0,0 +1,178 @@
+# -----------------------------------------------------------------------------------------------
+# decimate.py - reduce a data series to the pixel width of a chart on the Badger 2040 W
+#
+# Description:
+#    There is no point drawing more points than the chart has pixel columns: the extra
+#    primitives cost time and just overdraw each other. Both reducers here split the x range
+#    into one bucket per pixel column and keep a fixed amount of state per bucket, so memory
+#    and the number of draw calls depend on the chart width, not on the number of rows.
+#    Points are fed in one at a time, straight from csv_stream.iter_rows() or from a list.
+#
+#    MinMaxColumns  first, min, max and last y per pixel column (M4). Drawn as a vertical
+#                   segment per column plus a joint to the next, it gives the same picture
+#                   as drawing every point. One pass, any order.
+#    LTTB           Largest-Triangle-Three-Buckets: picks the one real point per column that
+#                   best keeps the shape of the series. Two passes (bucket averages, then
+#                   selection), points in ascending x.
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+from array import array
+
+
+def _bucketer(lo, hi, width):
+    # Maps x in [lo, hi] to a bucket 0..width-1
+    if hi <= lo or width <= 1:
+        return lambda x: 0
+    scale = width / (hi - lo)
+    last = width - 1
+
+    def bucket(x):
+        b = int((x - lo) * scale)
+        if b < 0:
+            return 0
+        return b if b < last else last
+
+    return bucket
+
+
+class MinMaxColumns:
+    def __init__(self, lo, hi, width):
+        self.width = width
+        self.bucket = _bucketer(lo, hi, width)
+        self.counts = array('I', [0] * width)
+        self.firsts = array('f', [0] * width)
+        self.lasts = array('f', [0] * width)
+        self.mins = array('f', [0] * width)
+        self.maxs = array('f', [0] * width)
+
+    def add(self, x, y):
+        b = self.bucket(x)
+        if self.counts[b] == 0:
+            self.firsts[b] = self.mins[b] = self.maxs[b] = y
+        elif y < self.mins[b]:
+            self.mins[b] = y
+        elif y > self.maxs[b]:
+            self.maxs[b] = y
+        self.lasts[b] = y
+        self.counts[b] += 1
+
+    def columns(self):
+        # (column, first, min, max, last) for every column that has points, left to right
+        for b in range(self.width):
+            if self.counts[b]:
+                yield b, self.firsts[b], self.mins[b], self.maxs[b], self.lasts[b]
+
+
+class LTTB:
+    def __init__(self, lo, hi, width):
+        self.width = width
+        self.bucket = _bucketer(lo, hi, width)
+        self.counts = array('I', [0] * width)
+        self.sum_x = array('f', [0] * width)
+        self.sum_y = array('f', [0] * width)
+        self.xs = array('f')
+        self.ys = array('f')
+        self._next = None
+        self._current = -1
+        self._first = -1
+        self._best_area = -1.0
+        self._best = None
+        self._last = None
+
+    # First pass: average of each bucket
+
+    def add_average(self, x, y):
+        b = self.bucket(x)
+        self.counts[b] += 1
+        self.sum_x[b] += x
+        self.sum_y[b] += y
+
+    def _link(self):
+        # For every bucket, the next bucket that has points (-1 for none)
+        self._next = array('h', [-1] * self.width)
+        following = -1
+        for b in range(self.width - 1, -1, -1):
+            self._next[b] = following
+            if self.counts[b]:
+                following = b
+
+    # Second pass: selection
+
+    def _emit(self, x, y):
+        self.xs.append(x)
+        self.ys.append(y)
+
+    def _finish_bucket(self):
+        if self._best is not None:
+            self._emit(self._best[0], self._best[1])
+        self._best = None
+        self._best_area = -1.0
+
+    def add(self, x, y):
+        if self._next is None:
+            self._link()
+        b = self.bucket(x)
+        self._last = (x, y)
+
+        if not self.xs:
+            # The first point is always kept, and stands for its whole bucket
+            self._emit(x, y)
+            self._current = self._first = b
+            return
+        if b == self._first:
+            return  # rest of the first bucket
+        if b != self._current:
+            self._finish_bucket()
+            self._current = b
+
+        n = self._next[b]
+        if n < 0:
+            return  # last bucket: the last point is kept by points()
+        ax = self.xs[-1]
+        ay = self.ys[-1]
+        cx = self.sum_x[n] / self.counts[n]
+        cy = self.sum_y[n] / self.counts[n]
+        area = abs((ax - cx) * (y - ay) - (ax - x) * (cy - ay))
+        if area > self._best_area:
+            self._best_area = area
+            self._best = (x, y)
+
+    def points(self):
+        # (xs, ys) of the selected points. The last bucket is represented by the last point.
+        if self._current >= 0 and self._current != self._first:
+            if self._next[self._current] < 0:
+                self._best = self._last
+            self._finish_bucket()
+        self._current = -1
+        return self.xs, self.ys
+
+
+# ------------------------------
+# Helpers for series already in memory
+# ------------------------------
+
+def lttb(ys, width, xs=None):
+    # LTTB of a list/array of y values (x is the index unless xs is given)
+    n = len(ys)
+    if xs is None:
+        xs = range(n)
+    if n <= width:
+        return array('f', xs), array('f', ys)
+    reducer = LTTB(xs[0], xs[n - 1], width)
+    for i in range(n):
+        reducer.add_average(xs[i], ys[i])
+    for i in range(n):
+        reducer.add(xs[i], ys[i])
+    return reducer.points()
+
+
+def minmax(ys, width, xs=None):
+    n = len(ys)
+    if xs is None:
+        xs = range(n)
+    reducer = MinMaxColumns(xs[0], xs[n - 1], width) if n else MinMaxColumns(0, 0, width)
+    for i in range(n):
+        reducer.add(xs[i], ys[i])
+    return reducer
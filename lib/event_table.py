@@ -0,0 +1,78 @@
+# -----------------------------------------------------------------------------------------------
+# event_table.py - sorted table of calendar events with binary search, for the Badger 2040 W
+#
+# Description:
+#    dash.py used to find the current and next meeting by scanning a list of event dicts
+#    made by a fresh fetch and parse of the calendar, every 15 minutes, so the panel only
+#    moved on to the next meeting at the next fetch. EventTable holds the day's events once,
+#    as arrays sorted by start time - start and end (in seconds) and the offset of the title
+#    in one byte string - and answers from them with binary searches:
+#
+#      table = EventTable([(start, end, "Stand-up"), ...])
+#      current = table.current(now)         # index of the meeting going on at now, or -1
+#      upcoming = table.next(now)           # index of the first one starting after now, or -1
+#      table.next_boundary(now)             # when either of those next changes, or None
+#
+#    An event runs from its start up to, but not including, its end. When meetings overlap
+#    the current one is the one that started last.
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+from array import array
+
+
+def bisect_right(values, x):
+    # Index of the first item of the sorted values greater than x
+    low = 0
+    high = len(values)
+    while low < high:
+        middle = (low + high) // 2
+        if x < values[middle]:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+class EventTable:
+    def __init__(self, events):
+        rows = sorted(events)
+        self.starts = array("l", [row[0] for row in rows])
+        self.ends = array("l", [row[1] for row in rows])
+
+        # Latest end of the events up to each index, to stop looking back for a current event
+        self.latest_end = array("l", self.ends)
+        for i in range(1, len(rows)):
+            if self.latest_end[i] < self.latest_end[i - 1]:
+                self.latest_end[i] = self.latest_end[i - 1]
+
+        titles = [row[2].encode() for row in rows]
+        self.offsets = array("I", [0])
+        for title in titles:
+            self.offsets.append(self.offsets[-1] + len(title))
+        self.titles = b"".join(titles)
+
+        self.boundaries = array("l", sorted(set(self.starts) | set(self.ends)))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def title(self, i):
+        return self.titles[self.offsets[i]:self.offsets[i + 1]].decode()
+
+    def current(self, now):
+        i = bisect_right(self.starts, now) - 1 # the last event to have started
+        while i >= 0 and self.latest_end[i] > now:
+            if self.ends[i] > now:
+                return i
+            i -= 1
+        return -1
+
+    def next(self, now):
+        i = bisect_right(self.starts, now)
+        return i if i < len(self.starts) else -1
+
+    def next_boundary(self, now):
+        i = bisect_right(self.boundaries, now)
+        return self.boundaries[i] if i < len(self.boundaries) else None
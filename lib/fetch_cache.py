@@ -0,0 +1,211 @@
+# -----------------------------------------------------------------------------------------------
+# fetch_cache.py - conditional HTTP GETs with a cache on flash, for the Badger 2040 W
+#
+# Description:
+#    The radio is the badger's biggest battery drain, and the feeds the apps read (calendar,
+#    weather, space weather) mostly have not changed since the last time. FetchCache.get()
+#    keeps, for each URL, the parsed result of the last download along with its ETag,
+#    Last-Modified and Cache-Control max-age, in cache/<hash of the URL>.json:
+#
+#      * while max-age has not run out it returns the stored result without any request;
+#      * after that it sends If-None-Match / If-Modified-Since, and on 304 Not Modified
+#        returns the stored result without downloading or parsing anything;
+#      * otherwise parse() reads the body from the response as it arrives.
+#
+#      cache = FetchCache()
+#      weather = cache.get(URL, read_json)
+#      events = cache.get(ics_url, read_todays_events, key=today)
+#
+#    parse(stream) gets the response body as a stream (read(n) and read()) and must return
+#    something ujson can store. When the result also depends on something other than the
+#    body, such as today's date for a calendar, pass that as key: the stored result is only
+#    used for the same key. For that case bodies up to max_body bytes are kept too
+#    (cache/<hash>.body), so a new key can be parsed from flash after a 304. A larger body is
+#    not kept, and the next request with a new key is not made conditional.
+#
+#    Network errors, and answers other than 200 and 304, raise OSError as urequests would.
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+import os
+import time
+import hashlib
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+try:
+    import ubinascii as binascii
+except ImportError:
+    import binascii
+
+import urequests
+
+CACHE = "cache"
+MAX_BODY = 64 * 1024
+
+
+def read_json(stream):
+    return json.loads(stream.read())
+
+
+def read_text(stream):
+    return stream.read().decode("utf-8")
+
+
+def header(headers, name):
+    # Value of a response header whatever its case, or "" (name in lower case)
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return ""
+
+
+def max_age(headers):
+    # Seconds a response may be used without asking again: Cache-Control max-age less Age
+    control = header(headers, "cache-control").lower()
+    if "no-cache" in control or "no-store" in control:
+        return 0
+    at = control.find("max-age=")
+    if at < 0:
+        return 0
+    digits = control[at + len("max-age="):].split(",")[0].strip()
+    try:
+        return max(0, int(digits) - int(header(headers, "age") or 0))
+    except ValueError:
+        return 0
+
+
+class _Tee:
+    # The response body as parse() reads it, copied into a file (if path is given) until it
+    # passes max_body
+    def __init__(self, stream, path, max_body):
+        self.stream = stream
+        self.path = path
+        self.left = max_body
+        self.ended = False
+        self.file = open(path, "wb") if path else None
+
+    def read(self, size=-1):
+        data = self.stream.read() if size is None or size < 0 else self.stream.read(size)
+        if not data or size is None or size < 0:
+            self.ended = True
+        if self.file is not None and data:
+            self.left -= len(data)
+            if self.left < 0:
+                self._drop()
+            else:
+                self.file.write(data)
+        return data
+
+    def _drop(self):
+        self.file.close()
+        self.file = None
+        os.remove(self.path)
+
+    def close(self):
+        # Whether the whole body is in the file
+        if self.file is None:
+            return False
+        if not self.ended:
+            self._drop()
+            return False
+        self.file.close()
+        return True
+
+
+class FetchCache:
+    def __init__(self, folder=CACHE, max_body=MAX_BODY):
+        self.folder = folder
+        self.max_body = max_body
+        try:
+            os.mkdir(folder)
+        except OSError:
+            pass  # The directory already exists
+
+    def _path(self, url, suffix):
+        digest = binascii.hexlify(hashlib.sha256(url.encode()).digest()).decode()
+        return "{}/{}{}".format(self.folder, digest[:16], suffix)
+
+    def _load(self, url):
+        try:
+            with open(self._path(url, ".json"), "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("url") == url else None
+
+    def _save(self, url, entry):
+        path = self._path(url, ".json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(entry, f)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        os.rename(path + ".tmp", path)
+
+    def _reparse(self, url, entry, parse, key):
+        # The result for a new key, from the body kept on flash
+        with open(self._path(url, ".body"), "rb") as f:
+            entry["result"] = parse(f)
+        entry["key"] = key
+        self._save(url, entry)
+        return entry["result"]
+
+    def get(self, url, parse, key=""):
+        entry = self._load(url)
+        now = time.time()
+        if entry is not None and now < entry["expires"]:
+            if entry["key"] == key:
+                return entry["result"]
+            if entry["body"]:
+                return self._reparse(url, entry, parse, key)
+
+        headers = {}
+        if entry is not None and (entry["key"] == key or entry["body"]):
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["modified"]:
+                headers["If-Modified-Since"] = entry["modified"]
+
+        response = urequests.get(url, headers=headers)
+        try:
+            if response.status_code == 304 and headers:
+                age = max_age(response.headers)
+                entry["expires"] = now + age
+                if entry["key"] != key:
+                    return self._reparse(url, entry, parse, key)
+                if age:
+                    self._save(url, entry) # without a max-age the entry on flash is as good
+                return entry["result"]
+            if response.status_code != 200:
+                raise OSError("HTTP {} from {}".format(response.status_code, url))
+
+            body = self._path(url, ".body")
+            tee = _Tee(response.raw, body + ".tmp" if key else None, self.max_body)
+            try:
+                result = parse(tee)
+            finally:
+                kept = tee.close()
+            try:
+                os.remove(body)
+            except OSError:
+                pass
+            if kept:
+                os.rename(body + ".tmp", body)
+            self._save(url, {
+                "url": url,
+                "etag": header(response.headers, "etag"),
+                "modified": header(response.headers, "last-modified"),
+                "expires": now + max_age(response.headers),
+                "key": key,
+                "body": kept,
+                "result": result,
+            })
+            return result
+        finally:
+            response.close()
@@ -0,0 +1,169 @@
+# -----------------------------------------------------------------------------------------------
+# form_cache.py - compiled ODK Build form definitions for examples/form.py
+#
+# Description:
+#    An .odkbuild file carries a dozen keys per control that the badger never uses (hint,
+#    audio, video, bigimage, guidance, metadata...) and nests every label and option text in
+#    a {"0": text} dict, so parsing it is most of the time between a button press and the
+#    first paint. compile_form() keeps only what the form engine needs, with labels and
+#    option texts flattened and the option values in their own list:
+#
+#      {"title", "version", "submission_url", "required": number of required controls,
+#       "controls": [{"name", "type", "label", "required", "readOnly", "defaultValue",
+#                     "kind", "appearance", "range": {min, max, minInclusive, maxInclusive},
+#                     "options": [text, ...], "vals": [value, ...],
+#                     "relevance", "constraint", "calculate", "code"}, ...]}
+#
+#    (kind, appearance, range and options/vals only for the controls that have them, and the
+#    relevance, constraint and calculate expressions only when they are not empty. "code"
+#    holds those expressions compiled by lib/form_expr.py, so they are not parsed at wake.)
+#
+#    load_form() stores the compiled image next to the source ("x.odkbuild" -> "x.odkc"),
+#    behind a header line with the SHA-256, size and modification time of the source. On the
+#    next wake the image is used after one stat() of the source and one read of the image;
+#    the source is only hashed when its size or time changed, and only parsed again when the
+#    hash differs too.
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+import json
+import os
+import hashlib
+
+from form_expr import EXPRESSION_KEYS, compile_programs
+
+try:
+    import ubinascii as binascii
+except ImportError:
+    import binascii
+
+FORMAT = "odkc2"
+EXTENSION = ".odkc"
+
+CONTROL_KEYS = ("name", "type", "defaultValue")
+OPTIONAL_KEYS = ("kind", "appearance")
+RANGE_KEYS = ("min", "max", "minInclusive", "maxInclusive")
+
+
+# ------------------------------
+# Compiling
+# ------------------------------
+
+def _text(texts):
+    # ODK Build keeps translations as {"0": text, ...}; the badger shows the first language
+    if isinstance(texts, dict):
+        return texts.get("0", "")
+    return texts if texts is not None else ""
+
+
+def compile_control(control):
+    compiled = {"label": _text(control.get("label"))}
+    for key in CONTROL_KEYS:
+        compiled[key] = control.get(key, "")
+    compiled["required"] = control.get("required") is True
+    compiled["readOnly"] = control.get("readOnly") is True
+    for key in OPTIONAL_KEYS:
+        if key in control:
+            compiled[key] = control[key]
+    for key in EXPRESSION_KEYS:
+        if control.get(key):
+            compiled[key] = control[key]
+    programs = compile_programs(compiled)
+    if programs:
+        compiled["code"] = programs
+    if "range" in control:
+        compiled["range"] = {key: control["range"].get(key, "") for key in RANGE_KEYS}
+    if "options" in control:
+        compiled["options"] = [_text(option.get("text")) for option in control["options"]]
+        compiled["vals"] = [option.get("val", "") for option in control["options"]]
+    return compiled
+
+
+def compile_form(formdef):
+    metadata = formdef.get("metadata", {})
+    controls = [compile_control(control) for control in formdef.get("controls", [])]
+    return {
+        "title": formdef.get("title", ""),
+        "version": metadata.get("version", ""),
+        "submission_url": metadata.get("submission_url", ""),
+        "required": len([control for control in controls if control["required"]]),
+        "controls": controls,
+    }
+
+
+# ------------------------------
+# Cache file
+# ------------------------------
+
+def image_path(source):
+    dot = source.rfind(".")
+    if dot > source.rfind("/"):
+        source = source[:dot]
+    return source + EXTENSION
+
+
+def _stat_key(source):
+    stat = os.stat(source)
+    return "{} {}".format(stat[6], stat[8])  # size, modification time
+
+
+def source_hash(source):
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        while True:
+            chunk = f.read(1024)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return binascii.hexlify(digest.digest()).decode()
+
+
+def _dumps(image):
+    try:
+        return json.dumps(image, separators=(",", ":"))
+    except TypeError:
+        return json.dumps(image)  # older MicroPython json has no separators argument
+
+
+def _write_image(path, header, body):
+    try:
+        with open(path, "w") as f:
+            f.write(header + "\n" + body)
+    except OSError as e:
+        # e.g. the filesystem is read only while mounted over USB; use the form uncached
+        print("could not write form cache {}: {}".format(path, e))
+
+
+def load_form(source):
+    # The compiled form for an .odkbuild file, from the cache next to it when it is current
+    path = image_path(source)
+    stat_key = _stat_key(source)
+
+    header = body = None
+    try:
+        with open(path, "r") as f:
+            text = f.read()
+        newline = text.find("\n")
+        if newline > 0:
+            header = text[:newline].split(" ", 2)
+            body = text[newline + 1:]
+    except OSError:
+        pass
+
+    if header is not None and len(header) == 3 and header[0] == FORMAT:
+        if header[2] == stat_key:
+            return json.loads(body)
+        digest = source_hash(source)
+        if header[1] == digest:
+            # Touched but not changed: keep the image and remember the new size and time
+            _write_image(path, " ".join((FORMAT, digest, stat_key)), body)
+            return json.loads(body)
+    else:
+        digest = source_hash(source)
+
+    print("compiling '{}'".format(source))
+    with open(source, "r") as f:
+        image = compile_form(json.load(f))
+    _write_image(path, " ".join((FORMAT, digest, stat_key)), _dumps(image))
+    return image
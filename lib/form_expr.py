@@ -0,0 +1,512 @@
+# -----------------------------------------------------------------------------------------------
+# form_expr.py - relevance, constraint and calculate expressions for examples/form.py
+#
+# Description:
+#    ODK Build controls carry XPath expressions: `relevance` (ask this question only when
+#    true), `constraint` (an answer is only accepted when true, with "." standing for it) and
+#    `calculate` (the value of the control is worked out from other answers).
+#    compile_expression() turns one of them into a postfix program, a flat list of
+#    opcode/argument pairs that survives a round trip through JSON, so lib/form_cache.py
+#    keeps it in the compiled form and the text is parsed once per change of the form
+#    rather than on every button press:
+#
+#      ${age} >= 18 and selected(${ate}, 'fruit')
+#      -> [FIELD, "age", CONST, 18, BINARY, ">=", FIELD, "ate", CONST, "fruit",
+#          CALL, ["selected", 2], BINARY, "and"]
+#
+#    The subset covers what forms on the badger need: ${name}, /data/name and "." references;
+#    string and number literals; or, and, =, !=, <, <=, >, >=, +, -, *, div, mod and unary
+#    minus; and the functions in FUNCTIONS. Values follow XPath 1.0: answers are strings, an
+#    empty or non-numeric answer is NaN in arithmetic and comparisons, and = compares as
+#    numbers when either side is one.
+#
+#    A program that fails at run time (substr() of NaN, regex() with a bad pattern) gives "",
+#    which is false, rather than stopping the form.
+#
+#    FormLogic holds the programs of a whole form with, for every control, the controls whose
+#    relevance or calculate read it, so after an answer changes only those are evaluated
+#    again (and, when a calculated value changes, the ones that read that in turn). They are
+#    evaluated in dependency order, worked out once, so a control reading several values
+#    that recalculate is only evaluated after all of them.
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+import math
+
+try:
+    import re
+except ImportError:
+    re = None
+
+CONST = 0
+FIELD = 1
+CURRENT = 2
+BINARY = 3
+NEGATE = 4
+CALL = 5
+
+EXPRESSION_KEYS = ("relevance", "constraint", "calculate")
+NAN = float("nan")
+
+PRECEDENCE = {
+    "or": 1, "and": 2,
+    "=": 3, "!=": 3,
+    "<": 4, "<=": 4, ">": 4, ">=": 4,
+    "+": 5, "-": 5,
+    "*": 6, "div": 6, "mod": 6,
+}
+WORD_OPERATORS = ("or", "and", "div", "mod")
+NAME_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-:"
+
+
+# ------------------------------
+# Values
+# ------------------------------
+
+def is_number(x):
+    return isinstance(x, (int, float)) and not isinstance(x, bool)
+
+
+def number(x):
+    if isinstance(x, bool):
+        return 1.0 if x else 0.0
+    if is_number(x):
+        return float(x)
+    try:
+        return float(x.strip())
+    except ValueError:
+        return NAN
+
+
+def string(x):
+    if isinstance(x, bool):
+        return "true" if x else "false"
+    if is_number(x):
+        if x != x:
+            return "NaN"
+        if x == int(x) and abs(x) < 1e15:
+            return str(int(x))
+        return str(x)
+    return x
+
+
+def boolean(x):
+    if isinstance(x, bool):
+        return x
+    if is_number(x):
+        return x == x and x != 0  # NaN and 0 are false
+    return x != ""
+
+
+def _equal(a, b):
+    if isinstance(a, bool) or isinstance(b, bool):
+        return boolean(a) == boolean(b)
+    if is_number(a) or is_number(b):
+        return number(a) == number(b)
+    return a == b
+
+
+def _divide(a, b):
+    a = number(a)
+    b = number(b)
+    if b == 0:
+        if a != a or a == 0:
+            return NAN
+        return float("inf") if a > 0 else float("-inf")
+    return a / b
+
+
+def _modulo(a, b):
+    a = number(a)
+    b = number(b)
+    if b == 0 or a != a or b != b:
+        return NAN
+    result = abs(a) % abs(b)
+    return -result if a < 0 else result  # the sign of the dividend, as in XPath
+
+
+BINARY_OPERATORS = {
+    "or": lambda a, b: boolean(a) or boolean(b),
+    "and": lambda a, b: boolean(a) and boolean(b),
+    "=": _equal,
+    "!=": lambda a, b: not _equal(a, b),
+    "<": lambda a, b: number(a) < number(b),
+    "<=": lambda a, b: number(a) <= number(b),
+    ">": lambda a, b: number(a) > number(b),
+    ">=": lambda a, b: number(a) >= number(b),
+    "+": lambda a, b: number(a) + number(b),
+    "-": lambda a, b: number(a) - number(b),
+    "*": lambda a, b: number(a) * number(b),
+    "div": _divide,
+    "mod": _modulo,
+}
+
+
+# ------------------------------
+# Functions
+# ------------------------------
+
+def _round(x, places=0):
+    x = number(x)
+    if x != x:
+        return x
+    scale = 10 ** int(number(places))
+    return math.floor(x * scale + 0.5) / scale  # halves round up, as in XPath
+
+
+def _int(x):
+    x = number(x)
+    return float(int(x)) if x == x and abs(x) != float("inf") else x
+
+
+def _substr(s, start, end=None):
+    s = string(s)
+    start = int(number(start))
+    return s[start:] if end is None else s[start:int(number(end))]
+
+
+def _regex(s, pattern):
+    if re is None:
+        raise ValueError("regex() needs the re module")
+    return re.match("(" + string(pattern) + ")$", string(s)) is not None
+
+
+FUNCTIONS = {
+    # name: (function, least arguments, most arguments or None for any)
+    "selected": (lambda s, v: string(v) in string(s).split(), 2, 2),
+    "count-selected": (lambda s: float(len(string(s).split())), 1, 1),
+    "string-length": (lambda s: float(len(string(s))), 1, 1),
+    "not": (lambda x: not boolean(x), 1, 1),
+    "true": (lambda: True, 0, 0),
+    "false": (lambda: False, 0, 0),
+    "boolean": (boolean, 1, 1),
+    "number": (number, 1, 1),
+    "string": (string, 1, 1),
+    "int": (_int, 1, 1),
+    "round": (_round, 1, 2),
+    "if": (lambda c, a, b: a if boolean(c) else b, 3, 3),
+    "coalesce": (lambda a, b: a if string(a) != "" else b, 2, 2),
+    "concat": (lambda *parts: "".join(string(p) for p in parts), 0, None),
+    "contains": (lambda s, t: string(t) in string(s), 2, 2),
+    "starts-with": (lambda s, t: string(s).startswith(string(t)), 2, 2),
+    "ends-with": (lambda s, t: string(s).endswith(string(t)), 2, 2),
+    "substr": (_substr, 2, 3),
+    "regex": (_regex, 2, 2),
+}
+
+
+# ------------------------------
+# Compiling
+# ------------------------------
+
+def tokenize(text):
+    # [(kind, value)] with kind one of num, str, field, current, func, op
+    tokens = []
+    i = 0
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c in " \t\r\n":
+            i += 1
+        elif c == "$" and text[i + 1:i + 2] == "{":
+            end = text.find("}", i)
+            if end < 0:
+                raise ValueError("unclosed ${")
+            tokens.append(("field", text[i + 2:end].strip()))
+            i = end + 1
+        elif c == "'" or c == '"':
+            end = text.find(c, i + 1)
+            if end < 0:
+                raise ValueError("unclosed string")
+            tokens.append(("str", text[i + 1:end]))
+            i = end + 1
+        elif c.isdigit() or (c == "." and text[i + 1:i + 2].isdigit()):
+            start = i
+            while i < n and (text[i].isdigit() or text[i] == "."):
+                i += 1
+            literal = text[start:i]
+            tokens.append(("num", float(literal) if "." in literal else int(literal)))
+        elif c == "/":
+            # an absolute path such as /data/age names the field at its last step
+            start = i
+            while i < n and (text[i] in NAME_CHARS or text[i] in "/."):
+                i += 1
+            tokens.append(("field", text[start:i].rstrip("/").split("/")[-1]))
+        elif text[i:i + 2] in ("!=", "<=", ">="):
+            tokens.append(("op", text[i:i + 2]))
+            i += 2
+        elif c in "=<>+-*(),":
+            tokens.append(("op", c))
+            i += 1
+        elif c == ".":
+            tokens.append(("current", None))
+            i += 1
+        elif c in NAME_CHARS:
+            start = i
+            while i < n and text[i] in NAME_CHARS:
+                i += 1
+            name = text[start:i]
+            j = i
+            while j < n and text[j] in " \t":
+                j += 1
+            if j < n and text[j] == "(":
+                tokens.append(("func", name))
+            elif name in WORD_OPERATORS:
+                tokens.append(("op", name))
+            else:
+                tokens.append(("field", name))
+        else:
+            raise ValueError("unexpected '{}'".format(c))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.position = 0
+        self.program = []
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def expect(self, op):
+        if self.take() != ("op", op):
+            raise ValueError("expected '{}'".format(op))
+
+    def emit(self, op, arg=None):
+        self.program.append(op)
+        self.program.append(arg)
+
+    def expression(self, least=1):
+        # precedence climbing: operands are emitted as they are read, each operator after them
+        self.unary()
+        while True:
+            kind, op = self.peek()
+            precedence = PRECEDENCE.get(op) if kind == "op" else None
+            if precedence is None or precedence < least:
+                return
+            self.take()
+            self.expression(precedence + 1)
+            self.emit(BINARY, op)
+
+    def unary(self):
+        if self.peek() == ("op", "-"):
+            self.take()
+            self.unary()
+            self.emit(NEGATE)
+        else:
+            self.primary()
+
+    def primary(self):
+        kind, value = self.take()
+        if kind == "num" or kind == "str":
+            self.emit(CONST, value)
+        elif kind == "field":
+            self.emit(FIELD, value)
+        elif kind == "current":
+            self.emit(CURRENT)
+        elif kind == "func":
+            if value not in FUNCTIONS:
+                raise ValueError("unknown function {}()".format(value))
+            self.expect("(")
+            count = 0
+            if self.peek() != ("op", ")"):
+                while True:
+                    self.expression()
+                    count += 1
+                    if self.peek() != ("op", ","):
+                        break
+                    self.take()
+            self.expect(")")
+            _, least, most = FUNCTIONS[value]
+            if count < least or (most is not None and count > most):
+                raise ValueError("wrong number of arguments to {}()".format(value))
+            self.emit(CALL, [value, count])
+        elif (kind, value) == ("op", "("):
+            self.expression()
+            self.expect(")")
+        else:
+            raise ValueError("unexpected {}".format(value if value is not None else "end"))
+
+
+def compile_expression(text):
+    # The postfix program for an expression; raises ValueError when it is not in the subset
+    parser = _Parser(text)
+    parser.expression()
+    if parser.position < len(parser.tokens):
+        raise ValueError("unexpected {}".format(parser.peek()[1]))
+    return parser.program
+
+
+def dependencies(program):
+    # Names of the fields a program reads
+    return set(program[i + 1] for i in range(0, len(program), 2) if program[i] == FIELD)
+
+
+def run(program, lookup, current=""):
+    # The value of a program; lookup(name) gives the answer of a field, current is "."
+    try:
+        return _run(program, lookup, current)
+    except Exception:  # ValueError, OverflowError, re.error ...: the answers don't fit the expression
+        return ""
+
+
+def _run(program, lookup, current):
+    stack = []
+    for i in range(0, len(program), 2):
+        op = program[i]
+        arg = program[i + 1]
+        if op == CONST:
+            stack.append(arg)
+        elif op == FIELD:
+            stack.append(lookup(arg))
+        elif op == CURRENT:
+            stack.append(current)
+        elif op == BINARY:
+            b = stack.pop()
+            stack.append(BINARY_OPERATORS[arg](stack.pop(), b))
+        elif op == NEGATE:
+            stack.append(-number(stack.pop()))
+        else:
+            name, count = arg
+            start = len(stack) - count
+            args = stack[start:]
+            del stack[start:]
+            stack.append(FUNCTIONS[name][0](*args))
+    return stack[-1]
+
+
+def compile_programs(control):
+    # {key: program} for the expressions of a compiled control, leaving out any that do not compile
+    programs = {}
+    for key in EXPRESSION_KEYS:
+        text = control.get(key)
+        if text:
+            try:
+                programs[key] = compile_expression(text)
+            except ValueError as e:
+                print("ignoring {} of '{}': {} ({})".format(key, control.get("name"), text, e))
+    return programs
+
+
+# ------------------------------
+# Form
+# ------------------------------
+
+class FormLogic:
+    def __init__(self, controls):
+        # controls as compiled by lib/form_cache.py, with their programs under "code"
+        self.controls = controls
+        self.names = {}
+        self.relevance = []
+        self.constraint = []
+        self.calculate = []
+        self.dependents = {}  # field name -> indexes of the controls whose relevance or calculate read it
+        for i, control in enumerate(controls):
+            self.names[control["name"]] = i
+            programs = control.get("code")
+            if programs is None:
+                programs = compile_programs(control)  # a form that did not come through the cache
+            self.relevance.append(programs.get("relevance"))
+            self.constraint.append(programs.get("constraint"))
+            self.calculate.append(programs.get("calculate"))
+            for key in ("relevance", "calculate"):
+                if key in programs:
+                    for name in dependencies(programs[key]):
+                        readers = self.dependents.setdefault(name, [])
+                        if i not in readers:
+                            readers.append(i)
+        self.order = self._dependency_order()
+        self.rank = [0] * len(controls)
+        for position, i in enumerate(self.order):
+            self.rank[i] = position
+        self.relevant = [True] * len(controls)
+        self.values = []
+
+    def _dependency_order(self):
+        # Control indexes with every control after the controls it reads, otherwise in form
+        # order; controls in a cycle of calculates go last, in form order
+        count = len(self.controls)
+        waiting = [0] * count  # controls each one reads that are not placed yet
+        for name, readers in self.dependents.items():
+            if name in self.names:
+                for reader in readers:
+                    waiting[reader] += 1
+        order = []
+        ready = [i for i in range(count) if waiting[i] == 0]
+        while ready:
+            i = min(ready)
+            ready.remove(i)
+            order.append(i)
+            for reader in self.dependents.get(self.controls[i]["name"], ()):
+                waiting[reader] -= 1
+                if waiting[reader] == 0:
+                    ready.append(reader)
+        if len(order) < count:
+            placed = set(order)
+            order.extend(i for i in range(count) if i not in placed)
+        return order
+
+    def _lookup(self, name):
+        i = self.names.get(name)
+        return self.values[i] if i is not None and i < len(self.values) else ""
+
+    def _update(self, i):
+        # Evaluate relevance and calculate of control i; True when its value changed
+        if self.relevance[i] is not None:
+            self.relevant[i] = boolean(run(self.relevance[i], self._lookup))
+        if self.calculate[i] is not None:
+            value = string(run(self.calculate[i], self._lookup))
+            if value != self.values[i]:
+                self.values[i] = value
+                return True
+        return False
+
+    def evaluate(self, values):
+        # Evaluate every control against values (updated in place with calculated values)
+        self.values = values
+        for i in self.order:
+            self._update(i)
+
+    def changed(self, values, i):
+        # The answer of control i changed: evaluate the controls that read it, and the ones
+        # reading any value that recalculates in turn, each after everything it reads. Each
+        # control is evaluated once.
+        self.values = values
+        pending = list(self.dependents.get(self.controls[i]["name"], ()))
+        done = set()
+        while pending:
+            reader = min(pending, key=self.rank.__getitem__)
+            pending.remove(reader)
+            done.add(reader)
+            if self._update(reader):
+                for later in self.dependents.get(self.controls[reader]["name"], ()):
+                    if later not in done and later not in pending:
+                        pending.append(later)
+
+    def valid(self, values, i):
+        # Whether the answer of control i meets its constraint; an empty answer always does
+        self.values = values
+        if self.constraint[i] is None or values[i] == "":
+            return True
+        return boolean(run(self.constraint[i], self._lookup, values[i]))
+
+    def next_relevant(self, i, step=1):
+        # The first relevant control from i on in the direction of step, or None
+        while 0 <= i < len(self.controls):
+            if self.relevant[i]:
+                return i
+            i += step
+        return None
+
+    def submitted(self, values):
+        # The values to save: non-relevant questions are left empty, as ODK Collect does
+        return [value if self.relevant[i] else "" for i, value in enumerate(values)]
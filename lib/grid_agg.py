@@ -0,0 +1,127 @@
+# -----------------------------------------------------------------------------------------------
+# grid_agg.py - single pass grid aggregation for the Badger 2040 W charts
+#
+# Description:
+#    Bins one or two columns of a CSV into a grid of cells and keeps count, sum, mean, min and
+#    max of a third column per cell, in flat preallocated arrays indexed by
+#    (xbin - 1) * ny + (ybin - 1). Memory depends on the number of cells, not the number of
+#    rows, so charts can be drawn from logs that would never fit in RAM.
+#
+#    A chart reads the file twice: column_ranges() finds min/max of every column in one
+#    streaming pass, then the rows are streamed again into a Grid.
+#
+#    Bins are numbered 1..count the same way the old bin_data() in Charts/heatmap.py did.
+#
+#    Copy this file (and csv_stream.py) to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+from array import array
+
+from csv_stream import iter_rows
+
+
+def column_ranges(filename, names):
+    # [(min, max), ...] of each named column over the rows where it has a value, one pass.
+    # A column with no values at all gets (None, None).
+    lows = [None] * len(names)
+    highs = [None] * len(names)
+    for row in iter_rows(filename, names):
+        for i in range(len(row)):
+            value = row[i]
+            if value is None:
+                continue
+            if lows[i] is None:
+                lows[i] = highs[i] = value
+            elif value < lows[i]:
+                lows[i] = value
+            elif value > highs[i]:
+                highs[i] = value
+    return list(zip(lows, highs))
+
+
+class Bins:
+    # count equal bins from lo to hi; the lowest value lands in bin 1 and the highest in bin
+    # count. Values outside the range are clipped.
+    def __init__(self, lo, hi, count):
+        self.lo = lo
+        self.hi = hi
+        self.count = count
+        if count > 1 and hi > lo:
+            self.size = (hi - lo) / (count - 1)
+        else:
+            self.size = 0
+
+    def bin(self, value):
+        if self.size == 0:
+            return 1
+        b = 1 + int((value - self.lo) / self.size)
+        if b < 1:
+            return 1
+        return b if b < self.count else self.count
+
+
+STATS = ("count", "sum", "mean", "min", "max")
+
+
+class Grid:
+    def __init__(self, x_bins, y_bins=None, stats=("count",)):
+        for stat in stats:
+            if stat not in STATS:
+                raise ValueError("unknown statistic " + stat)
+        self.x_bins = x_bins
+        self.y_bins = y_bins
+        self.nx = x_bins.count
+        self.ny = y_bins.count if y_bins is not None else 1
+        n = self.nx * self.ny
+
+        self.counts = array('I', [0] * n)
+        # Rows with a z value, which sum, mean, min and max are taken over; count is all rows
+        self.z_counts = array('I', [0] * n) if any(stat != "count" for stat in stats) else None
+        self.sums = array('f', [0] * n) if ("sum" in stats or "mean" in stats) else None
+        self.mins = array('f', [0] * n) if "min" in stats else None
+        self.maxs = array('f', [0] * n) if "max" in stats else None
+        # Cells in the order they first received a value
+        self.order = array('I')
+
+    def add(self, x, y=None, z=None):
+        i = (self.x_bins.bin(x) - 1) * self.ny
+        if self.y_bins is not None:
+            i += self.y_bins.bin(y) - 1
+        count = self.counts[i]
+        if count == 0:
+            self.order.append(i)
+        self.counts[i] = count + 1
+        if z is not None and self.z_counts is not None:
+            z_count = self.z_counts[i]
+            self.z_counts[i] = z_count + 1
+            if self.sums is not None:
+                self.sums[i] += z
+            if self.mins is not None and (z_count == 0 or z < self.mins[i]):
+                self.mins[i] = z
+            if self.maxs is not None and (z_count == 0 or z > self.maxs[i]):
+                self.maxs[i] = z
+        return i
+
+    def cell(self, i):
+        # (xbin, ybin) of a cell index, both 1-based
+        return i // self.ny + 1, i % self.ny + 1
+
+    def value(self, i, stat):
+        if stat == "count":
+            return self.counts[i]
+        if self.z_counts is None or self.z_counts[i] == 0:
+            return None
+        if stat == "sum":
+            return self.sums[i]
+        if stat == "mean":
+            return self.sums[i] / self.z_counts[i]
+        if stat == "min":
+            return self.mins[i]
+        return self.maxs[i]
+
+    def cells(self):
+        # Cell indexes that have at least one row, in the order they were first filled
+        return self.order
+
+    def max_count(self):
+        return max(self.counts) if len(self.counts) else 0
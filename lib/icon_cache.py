@@ -0,0 +1,253 @@
+# -----------------------------------------------------------------------------------------------
+# icon_cache.py - decoded icons kept as 1-bit bitmaps for the Badger 2040 W
+#
+# Description:
+#    form.py (picture options), weather.py, space.py and dash.py open and decode their JPEG
+#    and PNG icons every time a page is drawn - weather.py the rain icon twice a page.
+#    draw_icon() decodes an icon the first time it is drawn, twice: over a white box and over
+#    a black one. Pixels that come out the same both times are the ones the decoder draws;
+#    the others (transparent PNG pixels) it leaves alone. The icon is kept as a 1-bit bitmap
+#    laid out like the framebuffer (a column of bytes, top row in the high bit, set = white)
+#    plus, when it has transparent pixels, a mask of the pixels drawn. A later draw copies
+#    the bitmap straight into the framebuffer: one slice a column when the icon starts on a
+#    byte boundary (y and height multiples of 8) and has no mask, otherwise each column is
+#    merged through its mask, so whatever the app drew under transparent pixels stays (dash.py's
+#    inverted colours included).
+#
+#    The bitmap is kept in a file next to the icon ("icon-rain.jpg" drawn at JPEG_SCALE_HALF
+#    -> "icon-rain.jpg.1.bits") and in RAM for the last few icons drawn, so later draws open
+#    no image file and run no decoder. A file records the size and modification time of the
+#    icon it was made from and is made again when either changes. Icons that are not entirely
+#    on screen can't be read back and are decoded every time.
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+import os
+import struct
+
+MAGIC = b"BICN"
+VERSION = 3
+# magic, version, scale, has a mask, width, height, icon size, icon modification time
+HEADER = "<4sBBBxHHII"
+HEADER_SIZE = struct.calcsize(HEADER)
+EXTENSION = ".bits"
+NO_SCALE = 255
+
+WHITE = 15
+BLACK = 0
+
+# The badger framebuffer: one bit a pixel (set = white), column by column from the left, each
+# column 128 rows in 16 bytes with the top row in the high bit
+SCREEN_WIDTH = 296
+SCREEN_HEIGHT = 128
+COLUMN_BYTES = SCREEN_HEIGHT // 8
+
+# Number of icons kept in RAM, enough for a page of picture options or the weather icons
+CACHE_SIZE = 8
+
+_cache = {}  # (icon path, scale) -> (width, height, bitmap, mask or None)
+_order = []  # keys of _cache, least recently drawn first
+
+
+# ------------------------------
+# Bitmaps
+# ------------------------------
+
+def _layout(y, h):
+    # For an icon h rows high at y: bytes of a bitmap column, framebuffer bytes it covers,
+    # how far to shift a bitmap column up to line it up with those bytes, and the bits of a
+    # bitmap column that are rows of the icon
+    n = (h + 7) // 8
+    span = ((y & 7) + h + 7) // 8
+    up = 8 * (span - n) - (y & 7)
+    rows = ((1 << h) - 1) << (8 * n - h)
+    return n, span, up, rows
+
+
+def _shift(value, up):
+    return value << up if up >= 0 else value >> -up
+
+
+def _column(frame, x, y, h, col):
+    # Column col of the h rows at x, y in frame, as a bitmap column (an int, top row high)
+    n, span, up, rows = _layout(y, h)
+    start = (x + col) * COLUMN_BYTES + (y >> 3)
+    return _shift(int.from_bytes(frame[start:start + span], "big"), -up) & rows
+
+
+def blit(display, entry, x, y):
+    # Copy an icon into the framebuffer at x, y (entirely on screen)
+    w, h, bitmap, mask = entry
+    frame = memoryview(display.display)
+    n, span, up, rows = _layout(y, h)
+    start = x * COLUMN_BYTES + (y >> 3)
+    if mask is None and up == 0 and span == n and h & 7 == 0:
+        for i in range(0, w * n, n):
+            frame[start:start + n] = bitmap[i:i + n]
+            start += COLUMN_BYTES
+        return
+
+    keep = (1 << 8 * span) - 1
+    drawn = _shift(rows, up)
+    for i in range(0, w * n, n):
+        if mask is not None:
+            drawn = _shift(int.from_bytes(mask[i:i + n], "big"), up)
+        old = int.from_bytes(frame[start:start + span], "big")
+        new = (old & (keep ^ drawn)) | (_shift(int.from_bytes(bitmap[i:i + n], "big"), up) & drawn)
+        frame[start:start + span] = new.to_bytes(span, "big")
+        start += COLUMN_BYTES
+
+# ------------------------------
+# Decoding
+# ------------------------------
+
+def _scaled_size(source, w, h, scale):
+    # jpegdec scales are a shift (JPEG_SCALE_HALF = 1), pngdec scales a multiplier
+    if scale is None:
+        return w, h
+    if source.endswith(".png"):
+        return w * scale, h * scale
+    return max(1, w >> scale), max(1, h >> scale)
+
+
+def _decode(decoder, source, x, y, scale):
+    decoder.open_file(source)
+    if scale is None:
+        decoder.decode(x, y)
+    else:
+        decoder.decode(x, y, scale)
+
+
+def _decoded_over(display, decoder, source, x, y, w, h, scale, pen):
+    # The framebuffer after decoding the icon over a w x h box of pen
+    display.set_pen(pen)
+    display.rectangle(x, y, w, h)
+    _decode(decoder, source, x, y, scale)
+    return bytes(display.display)
+
+
+def capture(display, decoder, source, x, y, w, h, scale):
+    # Decode the icon at x, y (entirely on screen) and return its entry for blit(). The
+    # screen is left as a single decode would have left it.
+    before = bytes(display.display)
+    on_white = _decoded_over(display, decoder, source, x, y, w, h, scale, WHITE)
+    on_black = _decoded_over(display, decoder, source, x, y, w, h, scale, BLACK)
+
+    n, span, up, rows = _layout(y, h)
+    bitmap = bytearray()
+    mask = bytearray()
+    transparent = False
+    for col in range(w):
+        white = _column(on_black, x, y, h, col)
+        drawn = rows ^ (white ^ _column(on_white, x, y, h, col))
+        transparent = transparent or drawn != rows
+        bitmap.extend((white & drawn).to_bytes(n, "big"))
+        mask.extend(drawn.to_bytes(n, "big"))
+
+    # Put back what was under the icon, then draw it as it will be drawn from now on
+    frame = memoryview(display.display)
+    start = x * COLUMN_BYTES + (y >> 3)
+    for col in range(w):
+        frame[start:start + span] = before[start:start + span]
+        start += COLUMN_BYTES
+    entry = (w, h, bytes(bitmap), bytes(mask) if transparent else None)
+    blit(display, entry, x, y)
+    return entry
+
+
+# ------------------------------
+# Bitmap files
+# ------------------------------
+
+def bitmap_path(source, scale=None):
+    if scale is None:
+        return source + EXTENSION
+    return "{}.{}{}".format(source, scale, EXTENSION)
+
+
+def _stat_key(source):
+    stat = os.stat(source)
+    return stat[6], stat[8]  # size, modification time
+
+
+def _read_entry(path, scale, stat_key):
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE:
+                return None
+            magic, version, saved_scale, masked, w, h, size, mtime = struct.unpack(HEADER, header)
+            if magic != MAGIC or version != VERSION or saved_scale != scale or (size, mtime) != stat_key:
+                return None
+            length = w * ((h + 7) // 8)
+            bitmap = f.read(length)
+            mask = f.read(length) if masked else None
+    except OSError:
+        return None
+    if len(bitmap) != length or (mask is not None and len(mask) != length):
+        return None
+    return w, h, bitmap, mask
+
+
+def _write_entry(path, scale, stat_key, entry):
+    w, h, bitmap, mask = entry
+    try:
+        with open(path, "wb") as f:
+            f.write(struct.pack(HEADER, MAGIC, VERSION, scale, mask is not None, w, h, stat_key[0], stat_key[1]))
+            f.write(bitmap)
+            if mask is not None:
+                f.write(mask)
+    except OSError as e:
+        # e.g. the filesystem is read only while mounted over USB; decode again next time
+        print("could not write icon cache {}: {}".format(path, e))
+
+
+# ------------------------------
+# Drawing
+# ------------------------------
+
+def _on_screen(x, y, w, h):
+    return x >= 0 and y >= 0 and x + w <= SCREEN_WIDTH and y + h <= SCREEN_HEIGHT
+
+
+def _draw(display, decoder, source, x, y, scale, entry):
+    if _on_screen(x, y, entry[0], entry[1]):
+        blit(display, entry, x, y)
+    else:
+        _decode(decoder, source, x, y, scale)
+
+
+def draw_icon(display, decoder, source, x, y, scale=None):
+    # Draw the icon at source with its top left corner at x, y, the way decoder.decode() would
+    # (decoder is the app's jpegdec.JPEG or pngdec.PNG). Returns the width and height drawn.
+    key = (source, scale)
+    entry = _cache.get(key)
+    if entry is None:
+        saved_scale = NO_SCALE if scale is None else scale
+        path = bitmap_path(source, scale)
+        stat_key = _stat_key(source)
+        entry = _read_entry(path, saved_scale, stat_key)
+        if entry is None:
+            decoder.open_file(source)
+            w, h = _scaled_size(source, decoder.get_width(), decoder.get_height(), scale)
+            if not _on_screen(x, y, w, h):
+                _decode(decoder, source, x, y, scale)
+                return w, h
+            entry = capture(display, decoder, source, x, y, w, h, scale)
+            _write_entry(path, saved_scale, stat_key, entry)
+        else:
+            _draw(display, decoder, source, x, y, scale, entry)
+        if len(_order) >= CACHE_SIZE:
+            del _cache[_order.pop(0)]
+        _cache[key] = entry
+    else:
+        _draw(display, decoder, source, x, y, scale, entry)
+        _order.remove(key)
+    _order.append(key)
+    return entry[0], entry[1]
+
+
+def clear_cache():
+    _cache.clear()
+    del _order[:]
@@ -0,0 +1,128 @@
+# -----------------------------------------------------------------------------------------------
+# ics_stream.py - streaming reader for iCalendar (.ics) feeds, for the Badger 2040 W
+#
+# Description:
+#    Shared calendars run to several MB, far more than the badger can hold. IcsReader reads
+#    the feed a chunk at a time and hands out one content line at a time, with folded lines
+#    (continued on the next line after a space or tab) joined back up. read_events() only
+#    looks inside VEVENTs, keeps the few properties the display uses and checks DTSTART
+#    first: an event starting outside the window of dates asked for is skipped by searching
+#    the raw bytes for its END:VEVENT, without splitting or decoding any of its lines.
+#
+#      for event in read_events(IcsReader(response.raw), b"20240602", b"20240604"):
+#          params, start = event["DTSTART"]     # ("TZID=GMT Standard Time", "20240603T083000")
+#
+#    Recurring events (RRULE) are not expanded: like any other event they are kept when
+#    their first DTSTART is in the window.
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+CHUNK = 2048
+
+KEEP = (b"SUMMARY", b"DTSTART", b"DTEND")
+
+
+class IcsReader:
+    def __init__(self, stream, chunk=CHUNK):
+        self.stream = stream
+        self.chunk = chunk
+        self.data = b""
+        self.pos = 0 # start of the next physical line in data
+        self.held = None # the physical line after the last one handed out, read to see if it was folded
+
+    def _fill(self):
+        # Append a chunk to the unread data, keeping the line end before it for skip_past()
+        chunk = self.stream.read(self.chunk)
+        if not chunk:
+            return False
+        keep = self.pos - 1 if self.pos else 0
+        self.data = self.data[keep:] + chunk
+        self.pos -= keep
+        return True
+
+    def _physical(self):
+        # The next line as stored, without its line end, or None at the end of the stream
+        while True:
+            end = self.data.find(b"\n", self.pos)
+            if end >= 0:
+                line = self.data[self.pos:end]
+                self.pos = end + 1
+                return line[:-1] if line[-1:] == b"\r" else line
+            if not self._fill():
+                if self.pos < len(self.data):
+                    line = self.data[self.pos:]
+                    self.pos = len(self.data)
+                    return line.rstrip(b"\r")
+                return None
+
+    def readline(self):
+        # The next content line (bytes) with any folded continuations joined, or None at the end
+        line = self.held if self.held is not None else self._physical()
+        self.held = None
+        if line is None:
+            return None
+        while True:
+            following = self._physical()
+            if following is None or following[:1] not in (b" ", b"\t"):
+                self.held = following
+                return line
+            line += following[1:]
+
+    def skip_past(self, marker):
+        # Skip everything up to and including the next line starting with marker. Returns
+        # False if the stream ends first.
+        held = self.held
+        self.held = None
+        if held is not None and held.startswith(marker):
+            return True
+        needle = b"\n" + marker
+        while True:
+            at = self.data.find(needle, self.pos - 1 if self.pos else 0)
+            if at >= 0:
+                self.pos = at + 1
+                self._physical()
+                return True
+            self.pos = max(self.pos, len(self.data) - len(marker)) # the marker may straddle two chunks
+            if not self._fill():
+                return False
+
+
+def split_property(line):
+    # b"DTSTART;TZID=X:20240603T083000" -> (b"DTSTART", b"TZID=X", b"20240603T083000")
+    colon = line.find(b":")
+    if colon < 0:
+        return line, b"", b""
+    semicolon = line.find(b";", 0, colon)
+    if semicolon < 0:
+        return line[:colon], b"", line[colon + 1:]
+    return line[:semicolon], line[semicolon + 1:colon], line[colon + 1:]
+
+
+def read_events(reader, first, last, keep=KEEP):
+    # Yield a dict {name: (parameters, value)} of the kept properties of each VEVENT whose
+    # DTSTART date (b"YYYYMMDD", as written in the feed) is from first to last inclusive
+    while True:
+        line = reader.readline()
+        if line is None:
+            return
+        if line != b"BEGIN:VEVENT":
+            continue
+        event = {}
+        while True:
+            line = reader.readline()
+            if line is None:
+                return
+            if line == b"END:VEVENT":
+                if "DTSTART" in event:
+                    yield event
+                break
+            name, params, value = split_property(line)
+            if name not in keep or name.decode() in event:
+                continue # the first one counts, not those of a VALARM inside the event
+            if name == b"DTSTART":
+                date = value[:8]
+                if date < first or date > last:
+                    reader.skip_past(b"END:VEVENT")
+                    break
+            event[name.decode()] = (params.decode(), value.decode())
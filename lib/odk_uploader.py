@@ -0,0 +1,263 @@
+# -----------------------------------------------------------------------------------------------
+# odk_uploader.py - uploads saved form submissions to ODK Central, for the Badger 2040 W
+#
+# Description:
+#    sendODK.py posted each instance with urequests.post(): a new TCP (and TLS) connection
+#    per instance, the whole XML read into RAM first, and two full e-ink refreshes around
+#    every file. Uploader keeps one HTTP/1.1 keep-alive connection to Central open for the
+#    whole run and streams each instance from flash in CHUNK byte pieces behind a
+#    Content-Length header. Up to `pipeline` requests are written before their responses are
+#    read, so the next upload is on the wire while Central answers the previous one.
+#
+#    Which instances to send comes from lib/submission_index.py: pending() gives the queued
+#    and failed ones, and every response is recorded in the index as soon as it is read, so
+#    after a power cut the next run starts at the first instance without a recorded answer.
+#    Requests that were sent but not answered when a connection drops are sent again on a
+#    new connection; Central rejects a second copy of an instanceID with 409 Conflict, which
+#    is counted as sent.
+#
+#    The caller's on_progress(sent, failed) is called every `update_every` answers or
+#    `update_seconds` seconds, whichever comes first, so the screen is not redrawn per file.
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+import os
+import time
+
+try:
+    import usocket as socket
+except ImportError:
+    import socket
+
+try:
+    import ussl as ssl
+except ImportError:
+    import ssl
+
+try:
+    import ubinascii as binascii
+except ImportError:
+    import binascii
+
+from submission_index import SENT, FAILED
+
+CHUNK = 1024
+PIPELINE = 2
+TIMEOUT = 30
+MAX_RECONNECTS = 3
+BODY_KEPT = 200  # bytes of each response body kept for the log
+
+
+def parse_url(url):
+    # "https://host[:port]/path" -> (tls, host, port, path)
+    scheme, _, rest = url.partition("://")
+    tls = scheme == "https"
+    host, slash, path = rest.partition("/")
+    port = 443 if tls else 80
+    if ":" in host:
+        host, port = host.split(":", 1)
+        port = int(port)
+    return tls, host, port, slash + path
+
+
+def basic_auth(username, password):
+    return binascii.b2a_base64((username + ":" + password).encode()).decode().strip()
+
+
+class Uploader:
+    def __init__(self, url, username, password, pipeline=PIPELINE, timeout=TIMEOUT,
+                 content_type="application/xml"):
+        self.tls, self.host, self.port, self.path = parse_url(url)
+        self.pipeline = max(1, pipeline)
+        self.timeout = timeout
+        self.head = ("POST {} HTTP/1.1\r\nHost: {}\r\nAuthorization: Basic {}\r\n"
+                     "Content-Type: {}\r\nConnection: keep-alive\r\n").format(
+                         self.path, self.host, basic_auth(username, password), content_type)
+        self.buffer = bytearray(CHUNK)
+        self.stream = self._socket = None
+        self.connections = 0
+
+    # ------------------------------
+    # Connection
+    # ------------------------------
+
+    def connect(self):
+        address = socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM)[0][-1]
+        sock = socket.socket()
+        sock.settimeout(self.timeout)
+        sock.connect(address)
+        if self.tls:
+            if hasattr(ssl, "create_default_context"):
+                sock = ssl.create_default_context().wrap_socket(sock, server_hostname=self.host)
+            else:
+                sock = ssl.wrap_socket(sock, server_hostname=self.host)
+        self.stream = sock.makefile("rwb") if hasattr(sock, "makefile") else sock
+        self._socket = sock
+        self.connections += 1
+
+    def close(self):
+        if self.stream is not None:
+            for closable in (self.stream, self._socket):
+                try:
+                    closable.close()
+                except OSError:
+                    pass
+        self.stream = None
+
+    # ------------------------------
+    # HTTP
+    # ------------------------------
+
+    def send(self, file_path):
+        # Write one request, streaming the instance file as its body
+        size = os.stat(file_path)[6]
+        stream = self.stream
+        stream.write("{}Content-Length: {}\r\n\r\n".format(self.head, size).encode())
+        buffer = self.buffer
+        view = memoryview(buffer)
+        with open(file_path, "rb") as f:
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                stream.write(view[:n])
+        if hasattr(stream, "flush"):
+            stream.flush()
+
+    def _read_exactly(self, n, keep):
+        # Read and drop n bytes of body, returning the first `keep` of them
+        kept = b""
+        while n > 0:
+            data = self.stream.read(min(n, CHUNK))
+            if not data:
+                raise OSError("connection closed in response body")
+            if len(kept) < keep:
+                kept += data[:keep - len(kept)]
+            n -= len(data)
+        return kept
+
+    def read_response(self):
+        # (status code, start of the body, whether the server will close the connection)
+        line = self.stream.readline()
+        if not line:
+            raise OSError("connection closed")
+        parts = line.split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith(b"HTTP/"):
+            raise OSError("bad status line")
+        status = int(parts[1])
+        close = parts[0] == b"HTTP/1.0"
+        length = None
+        chunked = False
+        while True:
+            line = self.stream.readline()
+            if not line:
+                raise OSError("connection closed in headers")
+            if line in (b"\r\n", b"\n"):
+                break
+            name, _, value = line.partition(b":")
+            name = name.strip().lower()
+            value = value.strip().lower()
+            if name == b"content-length":
+                length = int(value)
+            elif name == b"transfer-encoding" and value == b"chunked":
+                chunked = True
+            elif name == b"connection":
+                close = value == b"close"
+
+        if chunked:
+            body = b""
+            while True:
+                size = int(self.stream.readline().split(b";")[0], 16)
+                if size == 0:
+                    self.stream.readline()
+                    break
+                body += self._read_exactly(size, BODY_KEPT - len(body))
+                self.stream.readline()
+        elif length is not None:
+            body = self._read_exactly(length, BODY_KEPT)
+        else:
+            body = self.stream.read()  # no length: the body runs to the end of the connection
+            close = True
+        return status, body.decode("utf-8", "replace")[:BODY_KEPT], close
+
+    def post(self, file_path):
+        # Send one file and return (status code, start of the body)
+        if self.stream is None:
+            self.connect()
+        try:
+            self.send(file_path)
+            status, body, close = self.read_response()
+        except OSError:
+            self.close()
+            raise
+        if close:
+            self.close()
+        return status, body
+
+    # ------------------------------
+    # Upload run
+    # ------------------------------
+
+    def upload(self, index, path_for, on_result=None, on_progress=None, update_every=10, update_seconds=30):
+        # Send every pending instance in index; path_for(uuid) is the instance file. Returns
+        # (sent, failed) for this run. on_result(uuid, status code or None, body) is called
+        # for each answer, on_progress(sent, failed) as described above.
+        pending = index.pending()
+        in_flight = []
+        sent = failed = 0
+        reconnects = 0
+        last_progress = time.time()
+        exhausted = False
+
+        while True:
+            try:
+                if self.stream is None:
+                    self.connect()
+                    for uuid in in_flight:  # unanswered on the last connection
+                        self.send(path_for(uuid))
+                while not exhausted and len(in_flight) < self.pipeline:
+                    uuid = next(pending, None)
+                    if uuid is None:
+                        exhausted = True
+                        break
+                    try:
+                        os.stat(path_for(uuid))
+                    except OSError:
+                        index.record(uuid, FAILED)
+                        failed += 1
+                        if on_result:
+                            on_result(uuid, None, "instance file missing")
+                        continue
+                    in_flight.append(uuid)
+                    self.send(path_for(uuid))
+                if not in_flight:
+                    break
+                status, body, close = self.read_response()
+            except OSError as e:
+                self.close()
+                reconnects += 1
+                if reconnects > MAX_RECONNECTS:
+                    raise OSError("upload stopped: {}".format(e))
+                continue
+            reconnects = 0
+
+            uuid = in_flight.pop(0)
+            ok = status in (200, 201, 409)
+            index.record(uuid, SENT if ok else FAILED)
+            if ok:
+                sent += 1
+            else:
+                failed += 1
+            if on_result:
+                on_result(uuid, status, body)
+            if close:
+                self.close()
+
+            now = time.time()
+            if on_progress and ((sent + failed) % update_every == 0 or now - last_progress >= update_seconds):
+                on_progress(sent, failed)
+                last_progress = now
+
+        self.close()
+        return sent, failed
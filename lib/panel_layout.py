@@ -0,0 +1,99 @@
+# -----------------------------------------------------------------------------------------------
+# panel_layout.py - screen split into panels that refresh on their own, for the Badger 2040 W
+#
+# Description:
+#    An app that redraws the whole screen and calls update() for every change flashes the
+#    whole panel even when only the clock digits moved. Layout splits the screen into
+#    rectangular panels, each drawn by its own function from the content it was last given.
+#    refresh() recomposes only the panels whose content has changed since it was last shown
+#    (compared by hash) and pushes them with one partial_update() of the area around them:
+#
+#      layout = Layout(display, full_every=30)
+#      layout.add("time", 0, 8, 128, 80, draw_time)   # draw_time(x, y, w, h, date, hhmm)
+#      layout.set("time", "2024-06-03", "09:00")
+#      layout.refresh()                                 # "full", "partial" or None
+#
+#    A draw function fills its whole rectangle, background included, and draws nothing
+#    outside it. Panel y and height must be multiples of 8 (keep x and width on 8 too), as
+#    the panel refreshes in 8 pixel bands.
+#
+#    Partial updates leave a little ghosting behind, so after full_every of them, when the
+#    changed area is more than half the screen, or when asked to, refresh() redraws every
+#    panel and runs a full update() instead.
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+FULL_EVERY = 30
+
+
+class Panel:
+    def __init__(self, x, y, w, h, draw):
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        self.draw = draw
+        self.content = ()
+        self.shown = None  # hash of the content on the screen, None when it has to be drawn
+
+    def compose(self):
+        self.draw(self.x, self.y, self.w, self.h, *self.content)
+        self.shown = hash(self.content)
+
+
+class Layout:
+    def __init__(self, display, full_every=FULL_EVERY):
+        self.display = display
+        self.full_every = full_every
+        self.panels = {}
+        self.order = []      # panels in the order they were added, which is the drawing order
+        self.area = 0        # of all the panels: the screen when they tile it
+        self.partials = 0    # partial updates since the last full one
+        self.full = True     # the next refresh has to be a full one
+
+    def add(self, name, x, y, w, h, draw):
+        panel = Panel(x, y, w, h, draw)
+        self.area += w * h
+        self.panels[name] = panel
+        self.order.append(panel)
+        return panel
+
+    def set(self, name, *content):
+        self.panels[name].content = content
+
+    def invalidate(self, name=None):
+        # Redraw a panel at the next refresh, or with no name everything, with a full update:
+        # for when something else has drawn over the screen
+        if name is None:
+            self.full = True
+        else:
+            self.panels[name].shown = None
+
+    def changed(self):
+        return [panel for panel in self.order if panel.shown != hash(panel.content)]
+
+    def refresh(self, full=False):
+        # Push what changed; returns "full", "partial" or None when nothing had
+        changed = self.changed()
+        if not (changed or full or self.full):
+            return None
+
+        if changed:
+            x0 = min(panel.x for panel in changed)
+            y0 = min(panel.y for panel in changed)
+            x1 = max(panel.x + panel.w for panel in changed)
+            y1 = max(panel.y + panel.h for panel in changed)
+        if full or self.full or self.partials >= self.full_every or (x1 - x0) * (y1 - y0) * 2 > self.area:
+            for panel in self.order:
+                panel.compose()
+            self.display.update()
+            self.partials = 0
+            self.full = False
+            return "full"
+
+        for panel in changed:
+            panel.compose()
+        self.display.partial_update(x0, y0, x1 - x0, y1 - y0)
+        self.partials += 1
+        return "partial"
@@ -0,0 +1,98 @@
+# -----------------------------------------------------------------------------------------------
+# qr_render.py - shared QR code renderer for the Badger 2040 W
+#
+# Description:
+#    Replaces the draw_qr_code() that was copied into form.py, news.py and qrgen.py. That
+#    version looped over every *pixel* of the code and drew one rectangle per dark module.
+#    Here the modules are walked once per payload and turned into rectangles: horizontal runs
+#    of dark modules become one rectangle, and a run with the same columns as the one directly
+#    above it grows that rectangle down instead of starting a new one. The rectangles are
+#    kept per payload (as a compact array of module coordinates), so drawing the same code
+#    again - e.g. redrawing a form's end page - needs no encoding and no get_module() calls.
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+from array import array
+
+import qrcode
+
+# Number of payloads whose rectangles are kept in RAM
+CACHE_SIZE = 4
+
+_code = None
+_cache = {}  # payload -> (modules across, array of x, y, w, h in modules)
+
+
+def _encoder():
+    global _code
+    if _code is None:
+        _code = qrcode.QRCode()
+    return _code
+
+
+def module_rects(code):
+    # Dark modules of an already encoded code as rectangles: array("H") of x, y, w, h
+    modules, _ = code.get_size()
+    get_module = code.get_module
+    rects = array("H")
+    above = {}  # (x, w) -> index in rects of a rectangle that ends on the previous row
+
+    for y in range(modules):
+        row = {}
+        x = 0
+        while x < modules:
+            if not get_module(x, y):
+                x += 1
+                continue
+            start = x
+            while x < modules and get_module(x, y):
+                x += 1
+            key = (start, x - start)
+            i = above.get(key)
+            if i is None:
+                i = len(rects)
+                rects.extend((start, y, x - start, 1))
+            else:
+                rects[i + 3] += 1
+            row[key] = i
+        above = row
+
+    return modules, rects
+
+
+def qr_rects(text):
+    # Cached module_rects() for a payload
+    entry = _cache.get(text)
+    if entry is None:
+        code = _encoder()
+        code.set_text(text)
+        entry = module_rects(code)
+        if len(_cache) >= CACHE_SIZE:
+            del _cache[next(iter(_cache))]
+        _cache[text] = entry
+    return entry
+
+
+def measure_qr(text, size):
+    # Pixel size of the code drawn to fit in size x size, and the size of one module
+    modules, _ = qr_rects(text)
+    module_size = int(size / modules)
+    return module_size * modules, module_size
+
+
+def draw_qr(display, text, ox, oy, size, background=15, foreground=0):
+    modules, rects = qr_rects(text)
+    module_size = int(size / modules)
+    size = module_size * modules
+
+    display.set_pen(background)
+    display.rectangle(ox, oy, size, size)
+    display.set_pen(foreground)
+    for i in range(0, len(rects), 4):
+        display.rectangle(ox + rects[i] * module_size, oy + rects[i + 1] * module_size,
+                          rects[i + 2] * module_size, rects[i + 3] * module_size)
+
+
+def clear_cache():
+    _cache.clear()
@@ -0,0 +1,263 @@
+# -----------------------------------------------------------------------------------------------
+# ring_log.py - fixed size binary ring buffer for sensor logs on the Badger 2040 W
+#
+# Description:
+#    A text log that is appended to forever has to be read from the start to find its last
+#    lines, and eventually fills the flash. Here every sample is one 8 byte record and the file
+#    holds at most `capacity` of them; once full, the oldest record is overwritten. A small
+#    header keeps the head (oldest record), tail (next slot to write) and count, so:
+#
+#      append()     one record write plus one header write, whatever the size of the log
+#      read_last()  seeks straight to the last n records (at most two reads when they wrap)
+#      reverse_records()  streams the newest records backwards, a chunk at a time
+#
+#    File layout (little endian):
+#      header  "BLOG", version (B), record size (B), reserved (H), capacity, head, tail,
+#              count (4 x I)                                                    24 bytes
+#      record  seconds since 2000-01-01 (I), temperature * 100 (h), humidity * 100 (h)
+#
+#    The record is written before the header, so a reset between the two loses at most the
+#    newest sample. export_csv() writes the same "timestamp, temp, hum" lines as the old
+#    data/logged_data.csv and import_csv() migrates such a file into a ring log.
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+import struct
+
+MAGIC = b"BLOG"
+VERSION = 1
+HEADER = "<4sBBHIIII"
+HEADER_SIZE = struct.calcsize(HEADER)
+RECORD = "<Ihh"
+RECORD_SIZE = struct.calcsize(RECORD)
+SCALE = 100
+
+DEFAULT_CAPACITY = 17520  # a year of samples every 30 minutes, 140 KB
+
+
+# ------------------------------
+# Timestamps
+# ------------------------------
+# Seconds since 2000-01-01 00:00:00, worked out here rather than with utime.mktime() so the
+# file reads the same on the badger and on a computer (their epochs differ).
+
+def _days_from_civil(year, month, day):
+    year -= month <= 2
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 730425  # 730425 = days from 0000-03-01 to 2000-01-01
+
+
+def _civil_from_days(days):
+    days += 730425
+    era = days // 146097
+    doe = days - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = mp + 3 if mp < 10 else mp - 9
+    return yoe + era * 400 + (month <= 2), month, day
+
+
+def to_seconds(dt):
+    # (year, month, day, hour, minute, second, ...) -> seconds since 2000-01-01
+    year, month, day, hour, minute, second = dt[:6]
+    return ((_days_from_civil(year, month, day) * 24 + hour) * 60 + minute) * 60 + second
+
+
+def from_seconds(seconds):
+    # seconds since 2000-01-01 -> (year, month, day, hour, minute, second)
+    days, rest = divmod(seconds, 86400)
+    year, month, day = _civil_from_days(days)
+    return year, month, day, rest // 3600, rest // 60 % 60, rest % 60
+
+
+def iso_timestamp(seconds):
+    return "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}".format(*from_seconds(seconds))
+
+
+def parse_iso(text):
+    # "YYYY-MM-DDTHH:MM:SS" -> seconds since 2000-01-01
+    text = text.strip()
+    return to_seconds((int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                       int(text[11:13]), int(text[14:16]), int(text[17:19])))
+
+
+def _scaled(value):
+    value = int(round(value * SCALE))
+    if value > 32767:
+        return 32767
+    return value if value > -32768 else -32768
+
+
+# ------------------------------
+# Ring buffer file
+# ------------------------------
+
+class RingLog:
+    def __init__(self, path, capacity=DEFAULT_CAPACITY):
+        # Opens the log at path, creating an empty one with the given capacity if there is
+        # none. An existing log keeps the capacity it was created with.
+        self.path = path
+        try:
+            with open(path, "rb") as f:
+                self._read_header(f.read(HEADER_SIZE))
+        except OSError as e:
+            if e.args[0] != 2:
+                raise
+            self.capacity = capacity
+            self.head = self.tail = self.count = 0
+            with open(path, "wb") as f:
+                f.write(self._header())
+
+    def _read_header(self, data):
+        if len(data) < HEADER_SIZE:
+            raise ValueError("not a ring log: " + self.path)
+        magic, version, size, _, capacity, head, tail, count = struct.unpack(HEADER, data)
+        if magic != MAGIC or version != VERSION or size != RECORD_SIZE or capacity == 0:
+            raise ValueError("not a ring log: " + self.path)
+        self.capacity = capacity
+        self.head = head
+        self.tail = tail
+        self.count = count
+
+    def _header(self):
+        return struct.pack(HEADER, MAGIC, VERSION, RECORD_SIZE, 0,
+                           self.capacity, self.head, self.tail, self.count)
+
+    def __len__(self):
+        return self.count
+
+    def append(self, seconds, temperature, humidity):
+        # seconds may also be an RTC datetime tuple
+        if not isinstance(seconds, int):
+            seconds = to_seconds(seconds)
+        record = struct.pack(RECORD, seconds, _scaled(temperature), _scaled(humidity))
+        with open(self.path, "r+b") as f:
+            f.seek(HEADER_SIZE + self.tail * RECORD_SIZE)
+            f.write(record)
+            self.tail = (self.tail + 1) % self.capacity
+            if self.count == self.capacity:
+                self.head = self.tail
+            else:
+                self.count += 1
+            f.seek(0)
+            f.write(self._header())
+
+    def _write_records(self, f, records):
+        # Packed records written in one go at the tail; they must not run past the end of
+        # the buffer. The caller writes the header afterwards.
+        f.seek(HEADER_SIZE + self.tail * RECORD_SIZE)
+        f.write(b"".join(records))
+        n = len(records)
+        self.tail = (self.tail + n) % self.capacity
+        if self.count + n >= self.capacity:
+            self.count = self.capacity
+            self.head = self.tail
+        else:
+            self.count += n
+
+    def _read_span(self, f, start, n, out):
+        f.seek(HEADER_SIZE + start * RECORD_SIZE)
+        data = f.read(n * RECORD_SIZE)
+        for offset in range(0, len(data) - RECORD_SIZE + 1, RECORD_SIZE):
+            seconds, temp, hum = struct.unpack_from(RECORD, data, offset)
+            out.append((seconds, temp / SCALE, hum / SCALE))
+
+    def read_last(self, n):
+        # The newest n records (fewer if the log is shorter), oldest first, as
+        # (seconds, temperature, humidity)
+        n = min(n, self.count)
+        records = []
+        if n <= 0:
+            return records
+        start = (self.tail - n) % self.capacity
+        with open(self.path, "rb") as f:
+            if start + n <= self.capacity:
+                self._read_span(f, start, n, records)
+            else:
+                first = self.capacity - start
+                self._read_span(f, start, first, records)
+                self._read_span(f, 0, n - first, records)
+        return records
+
+    def reverse_records(self, n=None, chunk=64):
+        # The newest n records (all of them if n is None), newest first, read chunk records
+        # at a time
+        left = self.count if n is None else min(n, self.count)
+        with open(self.path, "rb") as f:
+            end = self.tail
+            out = []
+            while left > 0:
+                if end == 0:
+                    end = self.capacity
+                k = min(chunk, left, end)
+                self._read_span(f, end - k, k, out)
+                for i in range(len(out) - 1, -1, -1):
+                    yield out[i]
+                out = []
+                end -= k
+                left -= k
+
+    def records(self, chunk=64):
+        # Every record, oldest first, read chunk records at a time
+        with open(self.path, "rb") as f:
+            index = self.head
+            left = self.count
+            out = []
+            while left:
+                n = min(chunk, left, self.capacity - index)
+                self._read_span(f, index, n, out)
+                for record in out:
+                    yield record
+                out = []
+                index = (index + n) % self.capacity
+                left -= n
+
+
+# ------------------------------
+# CSV conversion
+# ------------------------------
+
+def csv_line(record):
+    # Same format examples/logger.py used for data/logged_data.csv
+    seconds, temperature, humidity = record
+    return f"{iso_timestamp(seconds)}, {temperature:.2f}, {humidity:.2f}\n"
+
+
+def export_csv(log, csv_path):
+    with open(csv_path, "w") as out:
+        for record in log.records():
+            out.write(csv_line(record))
+
+
+def import_csv(csv_path, log):
+    # Appends the rows of a "timestamp, temp, hum" CSV to a ring log; returns how many.
+    # Rows are written in chunks, with the header updated once at the end.
+    added = 0
+    pending = []
+    with open(csv_path, "r") as f, open(log.path, "r+b") as out:
+        for line in f:
+            parts = line.strip().split(',')
+            if len(parts) != 3:
+                continue
+            try:
+                record = struct.pack(RECORD, parse_iso(parts[0]),
+                                     _scaled(float(parts[1])), _scaled(float(parts[2])))
+            except ValueError:
+                continue
+            pending.append(record)
+            if len(pending) == 64 or log.tail + len(pending) == log.capacity:
+                log._write_records(out, pending)
+                added += len(pending)
+                pending = []
+        if pending:
+            log._write_records(out, pending)
+            added += len(pending)
+        out.seek(0)
+        out.write(log._header())
+    return added
@@ -0,0 +1,136 @@
+# -----------------------------------------------------------------------------------------------
+# scheduler.py - deadline and button scheduler for the Badger 2040 W
+#
+# Description:
+#    An app that polls - wake every second, read the clock, check the buttons, sleep again -
+#    keeps the RP2040 busy sixty times a minute to do something once a minute. Scheduler
+#    instead keeps named deadlines and takes button presses from pin interrupts, and sleeps
+#    until the earliest deadline or a press, whichever comes first:
+#
+#      scheduler = Scheduler()
+#      scheduler.watch(badger2040.BUTTON_A, on_a)          # on_a(button) after a press of A
+#      scheduler.at("minute", next_multiple(scheduler.now(), 60000), on_minute)
+#      while True:
+#          scheduler.run_once()     # sleep, then run the presses and deadlines that are due
+#
+#    Deadlines are one-shot: a callback, called with the time, sets its next deadline with
+#    at() again. Setting a name that is already waiting replaces it. Times are integer ms
+#    (MicroPython floats cannot hold a date to the second).
+#
+#    By default it sleeps with machine.lightsleep(), which a pin interrupt ends early on the
+#    RP2040. Pass clock and wait to drive it from anything else, such as a simulated clock
+#    on the host (see host/bench_dash_scheduler.py).
+#
+#    Interrupts are disabled only while checking for presses, not through the sleep, which
+#    would hold off USB, Wi-Fi and timer interrupts too for up to a minute. A press landing
+#    between the check and the sleep is handled on the next pass, after that sleep.
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+import time
+
+try:
+    import machine
+except ImportError:
+    machine = None
+
+try:
+    import badger2040
+except ImportError:
+    badger2040 = None
+
+DEBOUNCE_MS = 200
+
+
+def clock_ms():
+    return time.time_ns() // 1000000
+
+
+def lightsleep(ms):
+    # Sleep for ms, or until an interrupt when ms is None
+    if ms is None:
+        machine.lightsleep()
+    else:
+        machine.lightsleep(max(1, ms))
+
+
+def disable_irq():
+    return None if machine is None else machine.disable_irq()
+
+
+def enable_irq(state):
+    if machine is not None:
+        machine.enable_irq(state)
+
+
+def next_multiple(now, period):
+    # The first multiple of period after now: next_multiple(now, 60000) is the next minute
+    return (now // period + 1) * period
+
+
+class Scheduler:
+    def __init__(self, clock=clock_ms, wait=lightsleep):
+        self.clock = clock
+        self.wait = wait
+        self.deadlines = {}   # name -> (time, callback)
+        self.handlers = {}    # button -> callback
+        self.presses = []     # buttons pressed since they were last handled, from the IRQ
+        self.last_press = {}  # button -> time of its last press, for debouncing
+        self.wakeups = 0
+
+    def now(self):
+        return self.clock()
+
+    def at(self, name, when, callback):
+        if when is None:
+            self.cancel(name)
+        else:
+            self.deadlines[name] = (when, callback)
+
+    def cancel(self, name):
+        self.deadlines.pop(name, None)
+
+    def watch(self, button, callback, pin=None):
+        # Call callback(button) after each press of button (a badger2040.BUTTON_* number)
+        self.handlers[button] = callback
+        if pin is None:
+            pin = badger2040.BUTTONS[button]
+        pin.irq(trigger=machine.Pin.IRQ_RISING, handler=lambda _, button=button: self.pressed(button))
+
+    def pressed(self, button):
+        # Runs in the pin's IRQ: only note the press
+        now = self.clock()
+        if now - self.last_press.get(button, now - DEBOUNCE_MS) >= DEBOUNCE_MS:
+            self.last_press[button] = now
+            self.presses.append(button)
+
+    def next_deadline(self):
+        if not self.deadlines:
+            return None
+        return min(when for when, _ in self.deadlines.values())
+
+    def run_once(self):
+        # Sleep until the earliest deadline or a button press, then handle the presses and
+        # run the deadlines that are due, earliest first
+        state = disable_irq()
+        idle = not self.presses
+        enable_irq(state)  # a press held off while checking runs its handler now
+        if idle:
+            earliest = self.next_deadline()
+            delay = None if earliest is None else earliest - self.clock()
+            if delay is None or delay > 0:
+                self.wait(delay)
+                self.wakeups += 1
+
+        while self.presses:
+            button = self.presses.pop(0)
+            self.handlers[button](button)
+
+        now = self.clock()
+        due = sorted((when, name) for name, (when, _) in self.deadlines.items() if when <= now)
+        for when, name in due:
+            entry = self.deadlines.get(name)
+            if entry is not None and entry[0] == when:
+                del self.deadlines[name]
+                entry[1](now)
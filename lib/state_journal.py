@@ -0,0 +1,234 @@
+# -----------------------------------------------------------------------------------------------
+# state_journal.py - append-only app state for the Badger 2040 W
+#
+# Description:
+#    badger_os.state_save() serialises an app's whole state dict and rewrites
+#    /state/<app>.json, and form.py, ebook.py and list.py call it on every pass through
+#    their main loop whether anything changed or not. StateJournal keeps a copy of the state
+#    as last written and on save() appends only what changed to /state/<app>.jnl:
+#
+#      file:    b"BSJ1", size of the snapshot it starts with (4 bytes), then records
+#      record:  op (1 byte), key length (1 byte), value length (2 bytes, little endian),
+#               key, value as JSON; for ITEM records the value is [index, item]
+#
+#      SET   state[key] = value
+#      ITEM  state[key][index] = item (index == len appends)
+#
+#    so turning a page or changing one answer costs a record of a few dozen bytes, and an
+#    unchanged state costs nothing. load() replays the records over the app's defaults. When
+#    the journal grows past COMPACT_SIZE, or twice its starting snapshot for a big state, it
+#    is rewritten as a snapshot of one SET per key, into a new file that then replaces the
+#    old one. A record cut short by a reset is ignored on replay, and the next save() rewrites
+#    the journal instead of appending after it.
+#
+#    The first load() of an app that has only a badger_os /state/<app>.json imports it.
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+import json
+import os
+import struct
+
+MAGIC = b"BSJ1"
+HEADER = "<4sI"
+HEADER_SIZE = struct.calcsize(HEADER)
+RECORD = "<BBH"
+RECORD_SIZE = struct.calcsize(RECORD)
+SET = 1
+ITEM = 2
+
+STATE_DIR = "/state"
+EXTENSION = ".jnl"
+COMPACT_SIZE = 4096
+
+
+def _copy(value):
+    # Lists and dicts in the state are changed in place, so the saved copy must not share them
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    return value
+
+
+def _record(op, key, value):
+    key = key.encode()
+    value = json.dumps(value).encode()
+    return struct.pack(RECORD, op, len(key), len(value)) + key + value
+
+
+def _list_changes(old, new):
+    # [index, item] for each item of new that differs from old, or None if new is better
+    # written whole (it is shorter than old, or most of it changed)
+    if len(new) < len(old):
+        return None
+    changes = []
+    for i in range(len(new)):
+        if i >= len(old) or new[i] != old[i]:
+            changes.append([i, new[i]])
+    if len(changes) > 1 and len(changes) * 2 > len(new):
+        return None
+    return changes
+
+
+class StateJournal:
+    def __init__(self, app, folder=STATE_DIR):
+        self.app = app
+        self.path = "{}/{}{}".format(folder, app, EXTENSION)
+        self.legacy_path = "{}/{}.json".format(folder, app)
+        self.folder = folder
+        self._saved = {}
+        self._size = 0
+        self._snapshot = 0
+
+    # ------------------------------
+    # Reading
+    # ------------------------------
+
+    def _replay(self, path, state):
+        # Apply the journal at path to state; returns the number of bytes of whole records read
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE:
+                return 0
+            magic, self._snapshot = struct.unpack(HEADER, header)
+            if magic != MAGIC:
+                return 0
+            size = HEADER_SIZE
+            while True:
+                header = f.read(RECORD_SIZE)
+                if len(header) < RECORD_SIZE:
+                    break
+                op, key_length, value_length = struct.unpack(RECORD, header)
+                key = f.read(key_length)
+                value = f.read(value_length)
+                if len(key) < key_length or len(value) < value_length:
+                    break
+                try:
+                    key = key.decode()
+                    value = json.loads(value)
+                except (UnicodeError, ValueError):
+                    break
+                if op == SET:
+                    state[key] = value
+                elif op == ITEM:
+                    items = state.get(key)
+                    if not isinstance(items, list) or not isinstance(value, list) or len(value) != 2 \
+                            or value[0] > len(items):
+                        break
+                    index, item = value
+                    if index == len(items):
+                        items.append(item)
+                    else:
+                        items[index] = item
+                else:
+                    break
+                size += RECORD_SIZE + key_length + value_length
+        return size
+
+    def _import_legacy(self, state):
+        try:
+            with open(self.legacy_path, "r") as f:
+                data = json.loads(f.read())
+        except (OSError, ValueError):
+            return False
+        if type(data) is not dict:
+            return False
+        state.update(data)
+        return True
+
+    def load(self, state):
+        # Update state (the app's defaults) with the saved state; returns True if there was one
+        found = False
+        self._size = 0
+        # A reset while compacting can leave only the new file, under its temporary name
+        for path in (self.path, self.path + ".tmp"):
+            try:
+                self._size = self._replay(path, state)
+                length = os.stat(path)[6]
+            except OSError:
+                continue
+            found = self._size > 0
+            if path != self.path or self._size < length:
+                # Under its temporary name, or ending in a record cut short: the next save()
+                # writes a fresh snapshot rather than appending after what replay stopped at
+                self._size = 0
+            break
+        if not found and self._import_legacy(state):
+            found = True
+            self.compact(state)
+            try:
+                os.remove(self.legacy_path)
+            except OSError:
+                pass
+        self._saved = _copy(state)
+        return found
+
+    # ------------------------------
+    # Writing
+    # ------------------------------
+
+    def _changes(self, state):
+        records = []
+        saved = self._saved
+        for key, value in state.items():
+            if key in saved and saved[key] == value:
+                continue
+            old = saved.get(key)
+            changes = None
+            if isinstance(value, list) and isinstance(old, list):
+                changes = _list_changes(old, value)
+            if changes is None:
+                records.append(_record(SET, key, value))
+            else:
+                for change in changes:
+                    records.append(_record(ITEM, key, change))
+        return records
+
+    def _ensure_folder(self):
+        try:
+            os.stat(self.folder)
+        except OSError:
+            os.mkdir(self.folder)
+
+    def save(self, state):
+        # Append what changed since the last load() or save(); returns the bytes written
+        records = self._changes(state)
+        if not records:
+            return 0
+        limit = max(COMPACT_SIZE, 2 * self._snapshot)
+        if self._size == 0 or self._size + sum(len(record) for record in records) > limit:
+            return self.compact(state)
+        data = b"".join(records)
+        with open(self.path, "ab") as f:
+            f.write(data)
+        self._size += len(data)
+        self._saved = _copy(state)
+        return len(data)
+
+    def compact(self, state):
+        # Rewrite the journal as one record per key; returns the bytes written
+        self._ensure_folder()
+        records = b"".join(_record(SET, key, value) for key, value in state.items())
+        data = struct.pack(HEADER, MAGIC, HEADER_SIZE + len(records)) + records
+        temp = self.path + ".tmp"
+        with open(temp, "wb") as f:
+            f.write(data)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        os.rename(temp, self.path)
+        self._size = self._snapshot = len(data)
+        self._saved = _copy(state)
+        return len(data)
+
+    def delete(self):
+        for path in (self.path, self.legacy_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._saved = {}
+        self._size = self._snapshot = 0
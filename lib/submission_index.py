@@ -0,0 +1,325 @@
+# -----------------------------------------------------------------------------------------------
+# submission_index.py - upload status of saved form submissions, for the Badger 2040 W
+#
+# Description:
+#    sendODK.py used to rebuild its list of uploaded submissions at every run by parsing all
+#    of log.txt (with split(', '), which broke on responses containing commas), stat() every
+#    entry under instances/ and parse log.txt a second time to count them. SubmissionIndex
+#    keeps the upload status of every instance UUID in one file, as an open addressing hash
+#    table on disk, so a lookup or an update is a seek and a read or write of one slot
+#    without loading the index into RAM:
+#
+#      header:  b"BSUB", version, slots, used, sent      ("<4sBxxxIII", 20 bytes)
+#      slot:    UUID (16 bytes), status, attempts, time of the last attempt ("<16sBBI")
+#
+#    The slot of a UUID is its first four bytes (random in a version 4 UUID) modulo the
+#    number of slots, moving on to the next slot while that one holds another UUID. When the
+#    table is 70% full it is rebuilt with twice the slots into a new file that replaces the
+#    old one. Each update writes its slot and the header and is committed when the file is
+#    closed, so a reset leaves either the old or the new status.
+#
+#    form.py queues each submission it saves; sendODK.py uploads the queued and failed ones
+#    (pending()) and records the outcome of each attempt. import_existing() builds the index
+#    the first time from the instances folder and the old log.txt.
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+import os
+import struct
+import time
+
+try:
+    import ubinascii as binascii
+except ImportError:
+    import binascii
+
+MAGIC = b"BSUB"
+VERSION = 1
+HEADER = "<4sBxxxIII"
+HEADER_SIZE = struct.calcsize(HEADER)
+SLOT = "<16sBBI"
+SLOT_SIZE = struct.calcsize(SLOT)
+
+EMPTY = 0
+QUEUED = 1
+SENT = 2
+FAILED = 3
+EXPORTED = 4  # written to a batch export file for USB pickup (see lib/batch_export.py)
+STATUS_NAMES = {QUEUED: "queued", SENT: "sent", FAILED: "failed", EXPORTED: "exported"}
+
+INDEX_PATH = "instances/index.bin"
+INITIAL_SLOTS = 256
+MAX_LOAD = 0.7
+EMPTY_SLOT = bytes(SLOT_SIZE)
+BLOCK_SLOTS = 64  # slots read or written at a time
+
+
+def uuid_bytes(uuid):
+    # "uuid:8-4-4-4-12" or "8-4-4-4-12" -> 16 bytes
+    if uuid.startswith("uuid:"):
+        uuid = uuid[5:]
+    data = binascii.unhexlify(uuid.replace("-", ""))
+    if len(data) != 16:
+        raise ValueError("not a UUID: " + uuid)
+    return data
+
+
+def uuid_text(data):
+    text = binascii.hexlify(data).decode()
+    return "-".join((text[0:8], text[8:12], text[12:16], text[16:20], text[20:32]))
+
+
+def instance_uuid(filename):
+    # The UUID of an instance file written by form.py ("uuid<uuid>.xml"), or None
+    name = filename.split("/")[-1]
+    if name.startswith("uuid") and name.endswith(".xml"):
+        return name[4:-4]
+    return None
+
+
+class SubmissionIndex:
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self.slots = self.used = self.sent = 0
+
+    # ------------------------------
+    # File
+    # ------------------------------
+
+    def _recover(self):
+        # A reset while growing the table can leave only the new file, under its temporary name
+        try:
+            os.stat(self.path)
+        except OSError:
+            try:
+                os.rename(self.path + ".tmp", self.path)
+            except OSError:
+                pass
+
+    def exists(self):
+        self._recover()
+        try:
+            with open(self.path, "rb") as f:
+                self._read_header(f)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def _read_header(self, f):
+        f.seek(0)
+        header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            raise ValueError("index too short")
+        magic, version, self.slots, self.used, self.sent = struct.unpack(HEADER, header)
+        if magic != MAGIC or version != VERSION or self.slots == 0:
+            raise ValueError("not a submission index")
+
+    def _write_header(self, f):
+        f.seek(0)
+        f.write(struct.pack(HEADER, MAGIC, VERSION, self.slots, self.used, self.sent))
+
+    def _create(self, path, slots):
+        folder = path.rsplit("/", 1)[0] if "/" in path else ""
+        if folder:
+            try:
+                os.mkdir(folder)
+            except OSError:
+                pass  # The directory already exists
+        with open(path, "wb") as f:
+            f.write(struct.pack(HEADER, MAGIC, VERSION, slots, 0, 0))
+            block = EMPTY_SLOT * BLOCK_SLOTS
+            for _ in range(slots // BLOCK_SLOTS):
+                f.write(block)
+            f.write(EMPTY_SLOT * (slots % BLOCK_SLOTS))
+
+    def _open(self):
+        # The index open for reading and writing, created empty if there is none
+        self._recover()
+        try:
+            f = open(self.path, "r+b")
+        except OSError:
+            self._create(self.path, INITIAL_SLOTS)
+            f = open(self.path, "r+b")
+        try:
+            self._read_header(f)
+        except ValueError:
+            f.close()
+            self._create(self.path, INITIAL_SLOTS)
+            f = open(self.path, "r+b")
+            self._read_header(f)
+        return f
+
+    # ------------------------------
+    # Slots
+    # ------------------------------
+
+    def _find(self, f, key):
+        # (slot number, slot bytes) of key, or of the empty slot where it would go
+        slot = struct.unpack("<I", key[:4])[0] % self.slots
+        while True:
+            f.seek(HEADER_SIZE + slot * SLOT_SIZE)
+            data = f.read(SLOT_SIZE)
+            if data[:16] == key or data[16] == EMPTY:
+                return slot, data
+            slot = (slot + 1) % self.slots
+
+    def _put(self, f, key, status, attempts, when):
+        slot, data = self._find(f, key)
+        if data[16] == EMPTY:
+            self.used += 1
+        elif data[16] == SENT:
+            self.sent -= 1
+        if status == SENT:
+            self.sent += 1
+        f.seek(HEADER_SIZE + slot * SLOT_SIZE)
+        f.write(struct.pack(SLOT, key, status, min(attempts, 255), when))
+
+    def _records(self, f):
+        # (key, status, attempts, time) of every used slot, in slot order
+        f.seek(HEADER_SIZE)
+        for _ in range(0, self.slots, BLOCK_SLOTS):
+            block = f.read(SLOT_SIZE * BLOCK_SLOTS)
+            for i in range(0, len(block), SLOT_SIZE):
+                if block[i + 16] != EMPTY:
+                    yield struct.unpack(SLOT, block[i:i + SLOT_SIZE])
+
+    def _grow(self):
+        # Rebuild the table with twice the slots into a new file that replaces this one
+        temp = self.path + ".tmp"
+        with open(self.path, "rb") as old:
+            self._read_header(old)
+            slots = self.slots * 2
+            self._create(temp, slots)
+            bigger = SubmissionIndex(temp)
+            with open(temp, "r+b") as f:
+                bigger._read_header(f)
+                for key, status, attempts, when in self._records(old):
+                    bigger._put(f, key, status, attempts, when)
+                bigger._write_header(f)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        os.rename(temp, self.path)
+
+    # ------------------------------
+    # Queries and updates
+    # ------------------------------
+
+    def get(self, uuid):
+        # (status, attempts, time of the last attempt) of uuid, or None if it is not indexed
+        try:
+            f = open(self.path, "rb")
+        except OSError:
+            return None
+        with f:
+            try:
+                self._read_header(f)
+            except ValueError:
+                return None
+            _, data = self._find(f, uuid_bytes(uuid))
+        if data[16] == EMPTY:
+            return None
+        return struct.unpack(SLOT, data)[1:]
+
+    def status(self, uuid):
+        entry = self.get(uuid)
+        return entry[0] if entry else None
+
+    def record(self, uuid, status, when=None):
+        # Set the status of uuid; anything but QUEUED counts as an upload attempt made now
+        key = uuid_bytes(uuid)
+        f = self._open()
+        _, data = self._find(f, key)
+        if data[16] == EMPTY and self.used + 1 > self.slots * MAX_LOAD:
+            f.close()
+            self._grow()
+            f = self._open()
+            _, data = self._find(f, key)
+        with f:
+            attempts = when_before = 0
+            if data[16] != EMPTY:
+                _, _, attempts, when_before = struct.unpack(SLOT, data)
+            if status == QUEUED:
+                when = when_before
+            else:
+                attempts += 1
+                if when is None:
+                    when = int(time.time())
+            self._put(f, key, status, attempts, when)
+            self._write_header(f)
+
+    def queue(self, uuid):
+        self.record(uuid, QUEUED)
+
+    def pending(self):
+        # UUIDs still to upload (queued or failed), in slot order. The index is read a block at
+        # a time and not kept open in between, so the caller can record() as it goes (only a
+        # UUID that is not indexed yet can move the others).
+        start = 0
+        while True:
+            try:
+                f = open(self.path, "rb")
+            except OSError:
+                return
+            with f:
+                try:
+                    self._read_header(f)
+                except ValueError:
+                    return
+                if start >= self.slots:
+                    return
+                f.seek(HEADER_SIZE + start * SLOT_SIZE)
+                block = f.read(SLOT_SIZE * BLOCK_SLOTS)
+            start += BLOCK_SLOTS
+            for i in range(0, len(block), SLOT_SIZE):
+                status = block[i + 16]
+                if status == QUEUED or status == FAILED:
+                    yield uuid_text(block[i:i + 16])
+
+    def counts(self):
+        # (instances indexed, instances sent)
+        if not self.exists():
+            return 0, 0
+        return self.used, self.sent
+
+
+# ------------------------------
+# First run
+# ------------------------------
+
+def _sent_in_log(log_path):
+    # Instance UUIDs the old sendODK.py logged as sent: "File: <path>, Status: Success, ..."
+    sent = set()
+    try:
+        with open(log_path, "r") as log_file:
+            for line in log_file:
+                parts = line.strip().split(", ", 2)  # the response may contain ", " itself
+                if len(parts) > 1 and parts[1] == "Status: Success":
+                    uuid = instance_uuid(parts[0])
+                    if uuid:
+                        sent.add(uuid)
+    except OSError:
+        pass
+    return sent
+
+
+def import_existing(index, folder="instances", log_path="log.txt"):
+    # Index every instance in folder, as sent if log.txt says so; returns the number indexed
+    sent = _sent_in_log(log_path)
+    count = 0
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        names = []
+    for name in names:
+        uuid = instance_uuid(name)
+        if uuid is None:
+            continue
+        try:
+            index.record(uuid, SENT if uuid in sent else QUEUED, 0)
+        except ValueError:
+            continue  # not a UUID we can index
+        count += 1
+    return count
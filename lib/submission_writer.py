@@ -0,0 +1,100 @@
+# -----------------------------------------------------------------------------------------------
+# submission_writer.py - saves form submissions for examples/form.py
+#
+# Description:
+#    form.py's save() made a UUID from 32 random.choice() calls, read and hexlified the
+#    device id twice (once for the CSV row, once for the XML), tried to create the instances
+#    folder twice on every save and wrote the XML instance with one write() per control.
+#    SubmissionWriter does the per-form work once, when the form is loaded: the device id,
+#    the CSV row prefix, the XML prologue and the open/close tag pair of every control. A
+#    save then builds the CSV row and the XML instance as one string each and writes each
+#    file with a single write() call:
+#
+#      <submissions>:           uuid:<uuid>,<title>,<version>,<device id>,<timestamp>,<values...>
+#      instances/uuid<uuid>.xml: <data id=... version=...> <name>value</name>... </data>
+#
+#    UUIDs are random (version 4) UUIDs made from os.urandom(16).
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+import os
+
+import machine
+
+try:
+    import ubinascii as binascii
+except ImportError:
+    import binascii
+
+INSTANCES = "instances"
+
+
+def device_id():
+    return binascii.hexlify(machine.unique_id()).decode("utf-8")
+
+
+def new_uuid():
+    # Random (version 4, RFC 4122 variant) UUID as 8-4-4-4-12 lower case hex digits
+    data = bytearray(os.urandom(16))
+    data[6] = (data[6] & 0x0F) | 0x40
+    data[8] = (data[8] & 0x3F) | 0x80
+    text = binascii.hexlify(data).decode()
+    return "-".join((text[0:8], text[8:12], text[12:16], text[16:20], text[20:32]))
+
+
+class SubmissionWriter:
+    def __init__(self, formdef, server_form, version_id, submissions, folder=INSTANCES):
+        self.submissions = submissions
+        self.folder = folder
+        self.device_id = device_id()
+        self.csv_prefix = "{},{},{},".format(formdef['title'], formdef['version'], self.device_id)
+        self.xml_prologue = ("<data xmlns:jr=\"http://openrosa.org/javarosa\" "
+                             "xmlns:orx=\"http://openrosa.org/xforms\" "
+                             "id=\"{}\"  version=\"{}\">\n").format(server_form, version_id)
+        self.tags = [("  <{}>".format(control['name']), "</{}>\n".format(control['name']))
+                     for control in formdef['controls']]
+        self.xml_epilogue = "  <device_id>{}</device_id>\n".format(self.device_id)
+        self._folder_ready = False
+
+    def csv_row(self, values, timestamp):
+        # title,version,device id,timestamp,values... (also the payload of the form's QR code)
+        row = self.csv_prefix + timestamp
+        if values:
+            row += "," + ",".join(values)
+        return row
+
+    def xml(self, uuid, values, timestamp):
+        parts = [self.xml_prologue]
+        for (open_tag, close_tag), value in zip(self.tags, values):
+            parts.append(open_tag)
+            parts.append(value)
+            parts.append(close_tag)
+        parts.append("  <timestamp>" + timestamp + "</timestamp>\n")
+        parts.append(self.xml_epilogue)
+        parts.append("  <meta><instanceID>uuid:" + uuid + "</instanceID></meta>\n</data>")
+        return "".join(parts)
+
+    def xml_path(self, uuid):
+        return "{}/uuid{}.xml".format(self.folder, uuid)
+
+    def _make_folder(self):
+        if self._folder_ready:
+            return
+        try:
+            os.mkdir(self.folder)
+        except OSError:
+            pass  # The directory already exists
+        self._folder_ready = True
+
+    def save(self, values, timestamp):
+        # Append the CSV row and write the XML instance; returns the submission's UUID
+        uuid = new_uuid()
+        row = "uuid:" + uuid + "," + self.csv_row(values, timestamp) + "\n"
+        with open(self.submissions, "a") as f:
+            f.write(row)
+
+        self._make_folder()
+        with open(self.xml_path(uuid), "w") as f:
+            f.write(self.xml(uuid, values, timestamp))
+        return uuid
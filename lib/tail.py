@@ -0,0 +1,79 @@
+# -----------------------------------------------------------------------------------------------
+# tail.py - read the last lines of a text file from the end, for the Badger 2040 W
+#
+# Description:
+#    Logs and submission files only ever grow, and f.readlines()[-n:] reads (and holds) all of
+#    them to keep a few lines. reverse_lines() instead seeks to the end of the file and reads
+#    fixed size blocks backwards, yielding complete lines newest first, so the work depends on
+#    how many lines are wanted rather than on the size of the file.
+#
+#    Only lines ended by a newline are returned: a last line without one is taken to be still
+#    being written (or cut short by a reset) and is skipped. Blank lines are skipped too.
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+BLOCK = 1024
+
+
+def _blocks_backwards(f, end, block):
+    # (position, bytes) of the blocks before end, last block first
+    pos = end
+    while pos > 0:
+        size = block if pos > block else pos
+        pos -= size
+        f.seek(pos)
+        yield pos, f.read(size)
+
+
+def _decode(line):
+    if line.endswith(b"\r"):
+        line = line[:-1]
+    return line.decode("utf-8")
+
+
+def reverse_lines(filename, block=BLOCK):
+    # Non-empty complete lines of the file, last line first, without their line ending
+    with open(filename, "rb") as f:
+        f.seek(0, 2)
+        end = f.tell()
+
+        # Find the last newline; anything after it is an unfinished line
+        last_newline = -1
+        for pos, data in _blocks_backwards(f, end, block):
+            i = data.rfind(b"\n")
+            if i >= 0:
+                last_newline = pos + i
+                break
+        if last_newline < 0:
+            return
+
+        rest = b""
+        for pos, data in _blocks_backwards(f, last_newline, block):
+            lines = (data + rest).split(b"\n")
+            # The first piece may carry on into the previous block
+            rest = lines[0]
+            for i in range(len(lines) - 1, 0, -1):
+                line = _decode(lines[i])
+                if line:
+                    yield line
+        rest = _decode(rest)
+        if rest:
+            yield rest
+
+
+def tail_lines(filename, n, block=BLOCK):
+    # The last n non-empty complete lines (fewer if the file is shorter), oldest first
+    lines = []
+    if n <= 0:
+        return lines
+    reader = reverse_lines(filename, block)
+    try:
+        for line in reader:
+            lines.append(line)
+            if len(lines) == n:
+                break
+    finally:
+        reader.close()  # closes the file now rather than when the generator is collected
+    lines.reverse()
+    return lines
@@ -0,0 +1,269 @@
+# -----------------------------------------------------------------------------------------------
+# totp_engine.py - shared TOTP engine for the Badger 2040 W
+#
+# Description:
+#    Replaces the copies of sha1 / hmac_sha1 / base32_decode / totp that used to live in
+#    totp.py, totp2.py and dash.py. Each secret is decoded once when the keys are loaded and
+#    the HMAC inner/outer padded key blocks are compressed up front, so generating a code
+#    costs exactly two SHA1 compressions and no allocation. All accounts for a time step are
+#    computed in one call, and results are cached per time step so redraws inside the same
+#    30 second window, and the redraw at rollover once prefetch() has run, need no hashing.
+#
+#    Copy this file to /lib on the badger.
+# -----------------------------------------------------------------------------------------------
+
+import struct
+from array import array
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+MASK = 0xFFFFFFFF
+
+HASH_CONSTANTS = (0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476, 0xC3D2E1F0)
+
+# Bit lengths of the final block of the inner (64 byte key block + 8 byte counter) and
+# outer (64 byte key block + 20 byte digest) HMAC messages
+INNER_BITS = (64 + 8) * 8
+OUTER_BITS = (64 + 20) * 8
+
+BASE32_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+
+# Message schedule, allocated once and reused by every compression
+_w = array("I", [0] * 80)
+
+
+# ------------------------------
+# SHA1
+# ------------------------------
+
+def _compress(h, w):
+    # Expand the 16 words already in w into the full 80 word schedule
+    for i in range(16, 80):
+        x = w[i - 3] ^ w[i - 8] ^ w[i - 14] ^ w[i - 16]
+        w[i] = ((x << 1) | (x >> 31)) & MASK
+
+    a, b, c, d, e = h
+
+    # Four fixed rounds per stage, five rounds per iteration with the roles of a..e
+    # rotated by name instead of shuffled through a tuple. No per-round branching.
+    for i in range(0, 20, 5):
+        e = (((a << 5) | (a >> 27)) + (d ^ (b & (c ^ d))) + e + 0x5A827999 + w[i]) & MASK
+        b = ((b << 30) | (b >> 2)) & MASK
+        d = (((e << 5) | (e >> 27)) + (c ^ (a & (b ^ c))) + d + 0x5A827999 + w[i + 1]) & MASK
+        a = ((a << 30) | (a >> 2)) & MASK
+        c = (((d << 5) | (d >> 27)) + (b ^ (e & (a ^ b))) + c + 0x5A827999 + w[i + 2]) & MASK
+        e = ((e << 30) | (e >> 2)) & MASK
+        b = (((c << 5) | (c >> 27)) + (a ^ (d & (e ^ a))) + b + 0x5A827999 + w[i + 3]) & MASK
+        d = ((d << 30) | (d >> 2)) & MASK
+        a = (((b << 5) | (b >> 27)) + (e ^ (c & (d ^ e))) + a + 0x5A827999 + w[i + 4]) & MASK
+        c = ((c << 30) | (c >> 2)) & MASK
+
+    for i in range(20, 40, 5):
+        e = (((a << 5) | (a >> 27)) + (b ^ c ^ d) + e + 0x6ED9EBA1 + w[i]) & MASK
+        b = ((b << 30) | (b >> 2)) & MASK
+        d = (((e << 5) | (e >> 27)) + (a ^ b ^ c) + d + 0x6ED9EBA1 + w[i + 1]) & MASK
+        a = ((a << 30) | (a >> 2)) & MASK
+        c = (((d << 5) | (d >> 27)) + (e ^ a ^ b) + c + 0x6ED9EBA1 + w[i + 2]) & MASK
+        e = ((e << 30) | (e >> 2)) & MASK
+        b = (((c << 5) | (c >> 27)) + (d ^ e ^ a) + b + 0x6ED9EBA1 + w[i + 3]) & MASK
+        d = ((d << 30) | (d >> 2)) & MASK
+        a = (((b << 5) | (b >> 27)) + (c ^ d ^ e) + a + 0x6ED9EBA1 + w[i + 4]) & MASK
+        c = ((c << 30) | (c >> 2)) & MASK
+
+    for i in range(40, 60, 5):
+        e = (((a << 5) | (a >> 27)) + ((b & c) | (d & (b | c))) + e + 0x8F1BBCDC + w[i]) & MASK
+        b = ((b << 30) | (b >> 2)) & MASK
+        d = (((e << 5) | (e >> 27)) + ((a & b) | (c & (a | b))) + d + 0x8F1BBCDC + w[i + 1]) & MASK
+        a = ((a << 30) | (a >> 2)) & MASK
+        c = (((d << 5) | (d >> 27)) + ((e & a) | (b & (e | a))) + c + 0x8F1BBCDC + w[i + 2]) & MASK
+        e = ((e << 30) | (e >> 2)) & MASK
+        b = (((c << 5) | (c >> 27)) + ((d & e) | (a & (d | e))) + b + 0x8F1BBCDC + w[i + 3]) & MASK
+        d = ((d << 30) | (d >> 2)) & MASK
+        a = (((b << 5) | (b >> 27)) + ((c & d) | (e & (c | d))) + a + 0x8F1BBCDC + w[i + 4]) & MASK
+        c = ((c << 30) | (c >> 2)) & MASK
+
+    for i in range(60, 80, 5):
+        e = (((a << 5) | (a >> 27)) + (b ^ c ^ d) + e + 0xCA62C1D6 + w[i]) & MASK
+        b = ((b << 30) | (b >> 2)) & MASK
+        d = (((e << 5) | (e >> 27)) + (a ^ b ^ c) + d + 0xCA62C1D6 + w[i + 1]) & MASK
+        a = ((a << 30) | (a >> 2)) & MASK
+        c = (((d << 5) | (d >> 27)) + (e ^ a ^ b) + c + 0xCA62C1D6 + w[i + 2]) & MASK
+        e = ((e << 30) | (e >> 2)) & MASK
+        b = (((c << 5) | (c >> 27)) + (d ^ e ^ a) + b + 0xCA62C1D6 + w[i + 3]) & MASK
+        d = ((d << 30) | (d >> 2)) & MASK
+        a = (((b << 5) | (b >> 27)) + (c ^ d ^ e) + a + 0xCA62C1D6 + w[i + 4]) & MASK
+        c = ((c << 30) | (c >> 2)) & MASK
+
+    return (
+        (h[0] + a) & MASK,
+        (h[1] + b) & MASK,
+        (h[2] + c) & MASK,
+        (h[3] + d) & MASK,
+        (h[4] + e) & MASK,
+    )
+
+
+def _compress_block(h, block):
+    words = struct.unpack(">16I", block)
+    for i in range(16):
+        _w[i] = words[i]
+    return _compress(h, _w)
+
+
+def sha1(message):
+    # General purpose SHA1; only needed for keys longer than one block
+    padded = message + b"\x80" + (b"\x00" * (63 - (len(message) + 8) % 64)) + struct.pack(">Q", 8 * len(message))
+    h = HASH_CONSTANTS
+    for i in range(0, len(padded), 64):
+        h = _compress_block(h, padded[i:i + 64])
+    return struct.pack(">5I", *h)
+
+
+# ------------------------------
+# Keys
+# ------------------------------
+
+def base32_decode(message):
+    bits = 0
+    bitbuff = 0
+    decoded = bytearray()
+
+    for c in message.upper():
+        if c == "=" or c == " " or c == "-":
+            continue
+        n = BASE32_ALPHABET.find(c)
+        if n < 0:
+            raise ValueError("Not Base32")
+
+        bitbuff = (bitbuff << 5) | n
+        bits += 5
+        if bits >= 8:
+            bits -= 8
+            decoded.append((bitbuff >> bits) & 0xFF)
+            bitbuff &= (1 << bits) - 1
+
+    return bytes(decoded)
+
+
+def hmac_key_states(key):
+    # Precompute the SHA1 state after the (key ^ ipad) and (key ^ opad) blocks
+    if len(key) > 64:
+        key = sha1(key)
+    key_block = key + (b"\x00" * (64 - len(key)))
+    inner = _compress_block(HASH_CONSTANTS, bytes((x ^ 0x36) for x in key_block))
+    outer = _compress_block(HASH_CONSTANTS, bytes((x ^ 0x5C) for x in key_block))
+    return inner, outer
+
+
+# ------------------------------
+# TOTP
+# ------------------------------
+
+def hotp_from_states(inner, outer, counter, digits=6):
+    w = _w
+
+    # Inner hash: the single remaining block is the 8 byte counter plus padding
+    w[0] = (counter >> 32) & MASK
+    w[1] = counter & MASK
+    w[2] = 0x80000000
+    for i in range(3, 15):
+        w[i] = 0
+    w[15] = INNER_BITS
+    h = _compress(inner, w)
+
+    # Outer hash: the single remaining block is the 20 byte inner digest plus padding
+    w[0], w[1], w[2], w[3], w[4] = h
+    w[5] = 0x80000000
+    for i in range(6, 15):
+        w[i] = 0
+    w[15] = OUTER_BITS
+    h = _compress(outer, w)
+
+    # Dynamic truncation straight from the digest words
+    offset = h[4] & 0xF
+    word = offset >> 2
+    shift = (offset & 3) * 8
+    if shift:
+        code = ((h[word] << shift) | (h[word + 1] >> (32 - shift))) & MASK
+    else:
+        code = h[word]
+    code = str((code & 0x7FFFFFFF) % (10 ** digits))
+    return "0" * (digits - len(code)) + code
+
+
+class TOTPEngine:
+    def __init__(self, accounts, step_secs=30, digits=6):
+        # accounts is a list of {"name": ..., "key": <base32 secret>} as in data/totp_keys.json
+        self.step_secs = step_secs
+        self.digits = digits
+        self.names = []
+        self._states = []
+        self._cache = {}  # time step -> list of codes, indexed like self.names
+        for account in accounts:
+            self.add(account["name"], account["key"])
+
+    def add(self, name, secret):
+        self.names.append(name)
+        self._states.append(hmac_key_states(base32_decode(secret)))
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def step(self, now):
+        return now // self.step_secs
+
+    def remaining(self, now):
+        return self.step_secs - now % self.step_secs
+
+    def code_for_step(self, index, step):
+        inner, outer = self._states[index]
+        return hotp_from_states(inner, outer, step, self.digits)
+
+    def codes_for_step(self, step):
+        digits = self.digits
+        return [hotp_from_states(inner, outer, step, digits) for inner, outer in self._states]
+
+    def codes(self, now):
+        # All codes for the step containing `now`, plus seconds left in that step
+        return self.codes_for_step(now // self.step_secs), self.remaining(now)
+
+    # ------------------------------
+    # Time step cache
+    # ------------------------------
+
+    def _store(self, step, codes):
+        # Only the current and next steps are ever useful, drop anything older
+        for old in [s for s in self._cache if s < step - 1]:
+            del self._cache[old]
+        self._cache[step] = codes
+
+    def cached_codes(self, now):
+        # Same as codes() but only hashes the first time a step is seen
+        step = now // self.step_secs
+        codes = self._cache.get(step)
+        if codes is None:
+            codes = self.codes_for_step(step)
+            self._store(step, codes)
+        return codes, self.remaining(now)
+
+    def cached_code(self, index, now):
+        return self.cached_codes(now)[0][index]
+
+    def prefetch(self, now):
+        # Call while idle: computes the next step's codes ahead of the rollover so the
+        # redraw at the start of the step is served from memory. Returns True if it hashed.
+        step = now // self.step_secs + 1
+        if step in self._cache:
+            return False
+        self._store(step, self.codes_for_step(step))
+        return True
+
+
+def load_engine(path="data/totp_keys.json", step_secs=30, digits=6):
+    with open(path, "r") as json_file:
+        accounts = json.load(json_file)
+    return TOTPEngine(accounts, step_secs, digits)